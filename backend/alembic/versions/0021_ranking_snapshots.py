@@ -0,0 +1,46 @@
+"""daily ranking snapshots (delta-encoded)
+
+Revision ID: 0021_ranking_snapshots
+Revises: 0020_billing_scaffold
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0021_ranking_snapshots"
+down_revision = "0020_billing_scaffold"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ranking_snapshots",
+        sa.Column("snapshot_date", sa.Date(), primary_key=True),
+        sa.Column("ladder_code", sa.Text(), sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True),
+        sa.Column("category_id", sa.Uuid(), sa.ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("rank", sa.Integer(), nullable=True),
+        sa.Column("rating", sa.Integer(), nullable=True),
+    )
+    op.create_index(
+        "ix_ranking_snapshots_scope_user_date",
+        "ranking_snapshots",
+        ["ladder_code", "category_id", "user_id", sa.text("snapshot_date DESC")],
+    )
+
+    op.create_table(
+        "ranking_snapshot_runs",
+        sa.Column("snapshot_date", sa.Date(), primary_key=True),
+        sa.Column("players", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("changed_rows", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("captured_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    )
+
+
+def downgrade():
+    op.drop_table("ranking_snapshot_runs")
+    op.drop_index("ix_ranking_snapshots_scope_user_date", table_name="ranking_snapshots")
+    op.drop_table("ranking_snapshots")
@@ -0,0 +1,116 @@
+"""normalized location dimension (country -> city)
+
+Revision ID: 0022_location_dimension
+Revises: 0021_ranking_snapshots
+Create Date: 2026-10-19
+"""
+
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0022_location_dimension"
+down_revision = "0021_ranking_snapshots"
+branch_labels = None
+depends_on = None
+
+
+# Copia congelada de app.services.locations (las migraciones no importan codigo de app).
+_CITY_QUALIFIER_RE = re.compile(r"[,(\-]")
+
+
+def _city_base(raw: str) -> str:
+    head = _CITY_QUALIFIER_RE.split(raw, maxsplit=1)[0]
+    return " ".join(head.split())
+
+
+def _city_key(raw: str) -> str | None:
+    base = _city_base(raw)
+    if not base:
+        return None
+    decomposed = unicodedata.normalize("NFKD", base)
+    ascii_only = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(ascii_only.replace(".", "").lower().split())
+
+
+def _city_name(raw: str) -> str:
+    base = _city_base(raw)
+    if base == base.lower() or base == base.upper():
+        return base.title()
+    return base
+
+
+def _backfill(bind, table: str, key_column: str, country_column: str):
+    rows = bind.execute(sa.text(f"""
+        SELECT DISTINCT {country_column} AS country, city
+        FROM {table}
+        WHERE city IS NOT NULL
+    """)).mappings().all()
+    for r in rows:
+        key = _city_key(r["city"])
+        if key is None:
+            continue
+        city_id = bind.execute(sa.text("""
+            INSERT INTO location_cities (country_code, city_key, name)
+            VALUES (:country, :key, :name)
+            ON CONFLICT (country_code, city_key) DO UPDATE SET city_key=EXCLUDED.city_key
+            RETURNING id
+        """), {"country": r["country"], "key": key, "name": _city_name(r["city"])}).scalar_one()
+        bind.execute(sa.text(f"""
+            UPDATE {table}
+            SET {key_column}=:city_id
+            WHERE {country_column}=:country AND city=:city
+        """), {"city_id": city_id, "country": r["country"], "city": r["city"]})
+
+
+def upgrade():
+    op.create_table(
+        "location_cities",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("country_code", sa.Text(), nullable=False),
+        sa.Column("city_key", sa.Text(), nullable=False),
+        sa.Column("name", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.UniqueConstraint("country_code", "city_key", name="uq_location_cities_country_key"),
+    )
+    op.create_index("ix_location_cities_key", "location_cities", ["city_key"])
+
+    op.add_column(
+        "user_profiles",
+        sa.Column("city_id", sa.Integer(), sa.ForeignKey("location_cities.id", ondelete="SET NULL"), nullable=True),
+    )
+    op.add_column("clubs", sa.Column("country", sa.Text(), nullable=False, server_default="CO"))
+    op.add_column(
+        "clubs",
+        sa.Column("city_id", sa.Integer(), sa.ForeignKey("location_cities.id", ondelete="SET NULL"), nullable=True),
+    )
+
+    bind = op.get_bind()
+    _backfill(bind, "user_profiles", "city_id", "country")
+    _backfill(bind, "clubs", "city_id", "country")
+
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_user_profiles_city_id_public_user
+        ON user_profiles (city_id, user_id)
+        WHERE is_public = true AND city_id IS NOT NULL
+    """)
+    op.create_index("ix_clubs_city_id", "clubs", ["city_id"])
+    op.execute("DROP INDEX IF EXISTS ix_user_profiles_country_city_public_user")
+
+
+def downgrade():
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS ix_user_profiles_country_city_public_user
+        ON user_profiles (country, lower(city), user_id)
+        WHERE is_public = true AND city IS NOT NULL
+    """)
+    op.drop_index("ix_clubs_city_id", table_name="clubs")
+    op.execute("DROP INDEX IF EXISTS ix_user_profiles_city_id_public_user")
+    op.drop_column("clubs", "city_id")
+    op.drop_column("clubs", "country")
+    op.drop_column("user_profiles", "city_id")
+    op.drop_index("ix_location_cities_key", table_name="location_cities")
+    op.drop_table("location_cities")
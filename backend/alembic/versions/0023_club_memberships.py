@@ -0,0 +1,74 @@
+"""club membership index for club-scoped rankings
+
+Revision ID: 0023_club_memberships
+Revises: 0022_location_dimension
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0023_club_memberships"
+down_revision = "0022_location_dimension"
+branch_labels = None
+depends_on = None
+
+
+# Ventana por defecto de settings.CLUB_RANKING_WINDOW_DAYS al crear la migracion.
+_BACKFILL_WINDOW_DAYS = 90
+
+
+def upgrade():
+    op.create_table(
+        "club_player_activity",
+        sa.Column("club_id", sa.Uuid(), sa.ForeignKey("clubs.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("ladder_code", sa.Text(), sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True),
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("activity_date", sa.Date(), primary_key=True),
+        sa.Column("matches", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.create_index("ix_club_player_activity_date", "club_player_activity", ["activity_date"])
+
+    op.create_table(
+        "club_memberships",
+        sa.Column("club_id", sa.Uuid(), sa.ForeignKey("clubs.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("ladder_code", sa.Text(), sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True),
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("window_matches", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_played_on", sa.Date(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    )
+    op.create_index(
+        "ix_club_memberships_club_ladder_matches",
+        "club_memberships",
+        ["club_id", "ladder_code", "window_matches"],
+    )
+
+    op.execute(f"""
+        INSERT INTO club_player_activity (club_id, ladder_code, user_id, activity_date, matches)
+        SELECT m.club_id,
+               m.ladder_code,
+               mp.user_id,
+               (m.played_at AT TIME ZONE 'UTC')::date,
+               count(*)::int
+        FROM matches m
+        JOIN match_participants mp ON mp.match_id = m.id
+        WHERE m.status = 'verified'
+          AND m.club_id IS NOT NULL
+          AND (m.played_at AT TIME ZONE 'UTC')::date > (now() AT TIME ZONE 'UTC')::date - {_BACKFILL_WINDOW_DAYS}
+        GROUP BY 1, 2, 3, 4
+    """)
+    op.execute("""
+        INSERT INTO club_memberships (club_id, ladder_code, user_id, window_matches, last_played_on, updated_at)
+        SELECT club_id, ladder_code, user_id, sum(matches)::int, max(activity_date), now()
+        FROM club_player_activity
+        GROUP BY club_id, ladder_code, user_id
+    """)
+
+
+def downgrade():
+    op.drop_index("ix_club_memberships_club_ladder_matches", table_name="club_memberships")
+    op.drop_table("club_memberships")
+    op.drop_index("ix_club_player_activity_date", table_name="club_player_activity")
+    op.drop_table("club_player_activity")
@@ -0,0 +1,45 @@
+"""rating histogram buckets per ladder/category
+
+Revision ID: 0024_rating_histograms
+Revises: 0023_club_memberships
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0024_rating_histograms"
+down_revision = "0023_club_memberships"
+branch_labels = None
+depends_on = None
+
+
+# Copia congelada de app.services.rating_distribution.RATING_BUCKET_WIDTH.
+_BUCKET_WIDTH = 25
+
+
+def upgrade():
+    op.create_table(
+        "rating_histogram_buckets",
+        sa.Column("ladder_code", sa.Text(), sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True),
+        sa.Column("category_id", sa.Uuid(), sa.ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("bucket_floor", sa.Integer(), primary_key=True),
+        sa.Column("players", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    )
+
+    op.execute(f"""
+        INSERT INTO rating_histogram_buckets (ladder_code, category_id, bucket_floor, players, updated_at)
+        SELECT ladder_code,
+               category_id,
+               (floor(rating::numeric / {_BUCKET_WIDTH}) * {_BUCKET_WIDTH})::int,
+               count(*)::int,
+               now()
+        FROM user_ladder_state
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade():
+    op.drop_table("rating_histogram_buckets")
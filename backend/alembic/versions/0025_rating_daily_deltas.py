@@ -0,0 +1,41 @@
+"""daily rating delta rollups for top movers
+
+Revision ID: 0025_rating_daily_deltas
+Revises: 0024_rating_histograms
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0025_rating_daily_deltas"
+down_revision = "0024_rating_histograms"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "rating_daily_deltas",
+        sa.Column("ladder_code", sa.Text(), sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True),
+        sa.Column("activity_date", sa.Date(), primary_key=True),
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("delta", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("matches", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+    op.execute("""
+        INSERT INTO rating_daily_deltas (ladder_code, activity_date, user_id, delta, matches)
+        SELECT ladder_code,
+               (created_at AT TIME ZONE 'UTC')::date,
+               user_id,
+               sum(delta)::int,
+               count(*)::int
+        FROM rating_events
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade():
+    op.drop_table("rating_daily_deltas")
@@ -0,0 +1,93 @@
+"""per-user match timeline (fan-out on write)
+
+Revision ID: 0026_user_match_timeline
+Revises: 0025_rating_daily_deltas
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0026_user_match_timeline"
+down_revision = "0025_rating_daily_deltas"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "user_match_timeline",
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("match_id", sa.Uuid(), sa.ForeignKey("matches.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("played_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("ladder_code", sa.Text(), nullable=False),
+        sa.Column("category_id", sa.Uuid(), nullable=False),
+        sa.Column("club_id", sa.Uuid(), nullable=True),
+        sa.Column("status", sa.Text(), nullable=False),
+        sa.Column("confirmation_deadline", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("focus_team_no", sa.SmallInteger(), nullable=False),
+        sa.Column("teammate_id", sa.Uuid(), nullable=True),
+        sa.Column("rival_ids", postgresql.ARRAY(sa.Uuid()), nullable=False, server_default=sa.text("'{}'::uuid[]")),
+        sa.Column("did_win", sa.Boolean(), nullable=True),
+        sa.Column("rating_delta", sa.Integer(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    )
+
+    # Copia congelada de app.services.match_timeline.TIMELINE_UPSERT_SQL (backfill de todos los partidos).
+    op.execute("""
+        INSERT INTO user_match_timeline (
+            user_id, match_id, played_at, ladder_code, category_id, club_id,
+            status, confirmation_deadline, focus_team_no, teammate_id, rival_ids,
+            did_win, rating_delta, updated_at
+        )
+        SELECT
+            mp.user_id,
+            m.id,
+            m.played_at,
+            m.ladder_code,
+            m.category_id,
+            m.club_id,
+            m.status,
+            m.confirmation_deadline,
+            mp.team_no,
+            (
+                SELECT tm.user_id
+                FROM match_participants tm
+                WHERE tm.match_id = m.id
+                  AND tm.team_no = mp.team_no
+                  AND tm.user_id <> mp.user_id
+                LIMIT 1
+            ),
+            ARRAY(
+                SELECT rv.user_id
+                FROM match_participants rv
+                WHERE rv.match_id = m.id
+                  AND rv.team_no <> mp.team_no
+                ORDER BY rv.user_id
+            ),
+            CASE
+                WHEN ms.winner_team_no IS NULL THEN NULL
+                ELSE ms.winner_team_no = mp.team_no
+            END,
+            re.delta,
+            now()
+        FROM matches m
+        JOIN match_participants mp ON mp.match_id = m.id
+        LEFT JOIN match_scores ms ON ms.match_id = m.id
+        LEFT JOIN rating_events re ON re.match_id = m.id AND re.user_id = mp.user_id
+        """)
+
+    op.create_index(
+        "ix_user_match_timeline_user_played",
+        "user_match_timeline",
+        ["user_id", sa.text("played_at DESC"), sa.text("match_id DESC")],
+    )
+    op.create_index("ix_user_match_timeline_match", "user_match_timeline", ["match_id"])
+
+
+def downgrade():
+    op.drop_index("ix_user_match_timeline_match", table_name="user_match_timeline")
+    op.drop_index("ix_user_match_timeline_user_played", table_name="user_match_timeline")
+    op.drop_table("user_match_timeline")
@@ -0,0 +1,67 @@
+"""player pair index for head-to-head and partner/rival filters
+
+Revision ID: 0027_user_match_pairs
+Revises: 0026_user_match_timeline
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0027_user_match_pairs"
+down_revision = "0026_user_match_timeline"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "user_match_pairs",
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("other_user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("match_id", sa.Uuid(), sa.ForeignKey("matches.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("relation", sa.Text(), nullable=False),
+        sa.Column("played_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("status", sa.Text(), nullable=False),
+        sa.Column("confirmation_deadline", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("did_win", sa.Boolean(), nullable=True),
+        sa.CheckConstraint("relation in ('partner','rival')", name="ck_user_match_pairs_relation"),
+    )
+
+    # Copia congelada de app.services.match_timeline.PAIRS_UPSERT_SQL (backfill de todos los partidos).
+    op.execute("""
+        INSERT INTO user_match_pairs (
+            user_id, other_user_id, match_id, relation, played_at, status,
+            confirmation_deadline, did_win
+        )
+        SELECT
+            a.user_id,
+            b.user_id,
+            m.id,
+            CASE WHEN a.team_no = b.team_no THEN 'partner' ELSE 'rival' END,
+            m.played_at,
+            m.status,
+            m.confirmation_deadline,
+            CASE
+                WHEN ms.winner_team_no IS NULL THEN NULL
+                ELSE ms.winner_team_no = a.team_no
+            END
+        FROM matches m
+        JOIN match_participants a ON a.match_id = m.id
+        JOIN match_participants b ON b.match_id = m.id AND b.user_id <> a.user_id
+        LEFT JOIN match_scores ms ON ms.match_id = m.id
+    """)
+
+    op.create_index(
+        "ix_user_match_pairs_pair_played",
+        "user_match_pairs",
+        ["user_id", "other_user_id", sa.text("played_at DESC"), sa.text("match_id DESC")],
+    )
+    op.create_index("ix_user_match_pairs_match", "user_match_pairs", ["match_id"])
+
+
+def downgrade():
+    op.drop_index("ix_user_match_pairs_match", table_name="user_match_pairs")
+    op.drop_index("ix_user_match_pairs_pair_played", table_name="user_match_pairs")
+    op.drop_table("user_match_pairs")
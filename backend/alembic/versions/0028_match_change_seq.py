@@ -0,0 +1,40 @@
+"""monotonic change sequence on user_match_timeline (delta sync)
+
+Revision ID: 0028_match_change_seq
+Revises: 0027_user_match_pairs
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0028_match_change_seq"
+down_revision = "0027_user_match_pairs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE SEQUENCE IF NOT EXISTS match_change_seq AS bigint")
+    # El default volatil se evalua por fila: las filas existentes quedan numeradas.
+    op.add_column(
+        "user_match_timeline",
+        sa.Column(
+            "change_seq",
+            sa.BigInteger(),
+            nullable=False,
+            server_default=sa.text("nextval('match_change_seq')"),
+        ),
+    )
+    op.create_index(
+        "ix_user_match_timeline_user_change",
+        "user_match_timeline",
+        ["user_id", "change_seq"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_user_match_timeline_user_change", table_name="user_match_timeline")
+    op.drop_column("user_match_timeline", "change_seq")
+    op.execute("DROP SEQUENCE IF EXISTS match_change_seq")
@@ -0,0 +1,53 @@
+"""per-user verified timeline facet counters
+
+Revision ID: 0029_user_timeline_facets
+Revises: 0028_match_change_seq
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0029_user_timeline_facets"
+down_revision = "0028_match_change_seq"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "user_timeline_facets",
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("facet", sa.Text(), primary_key=True),
+        sa.Column("facet_key", sa.Text(), primary_key=True),
+        sa.Column("matches", sa.Integer(), nullable=False, server_default="0"),
+        sa.CheckConstraint("facet in ('month','ladder','club','outcome')", name="ck_user_timeline_facets_facet"),
+    )
+
+    # Copia congelada de app.services.timeline_facets.rebuild_timeline_facets.
+    op.execute("""
+        INSERT INTO user_timeline_facets (user_id, facet, facet_key, matches)
+        SELECT mp.user_id, f.facet, f.facet_key, count(*)::int
+        FROM matches m
+        JOIN match_participants mp ON mp.match_id = m.id
+        LEFT JOIN match_scores ms ON ms.match_id = m.id
+        CROSS JOIN LATERAL (
+            VALUES
+                ('month', to_char(m.played_at AT TIME ZONE 'UTC', 'YYYY-MM')),
+                ('ladder', m.ladder_code),
+                ('club', m.club_id::text),
+                ('outcome', CASE
+                    WHEN ms.winner_team_no IS NULL THEN NULL
+                    WHEN ms.winner_team_no = mp.team_no THEN 'win'
+                    ELSE 'loss'
+                END)
+        ) AS f(facet, facet_key)
+        WHERE m.status = 'verified'
+          AND f.facet_key IS NOT NULL
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade():
+    op.drop_table("user_timeline_facets")
@@ -0,0 +1,35 @@
+"""per-user/ladder analytics dashboard snapshots
+
+Revision ID: 0030_dashboard_snapshots
+Revises: 0029_user_timeline_facets
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0030_dashboard_snapshots"
+down_revision = "0029_user_timeline_facets"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Sin backfill: el endpoint construye el snapshot al primer acceso (fallback) y
+    # scripts/rebuild_dashboard_snapshots.py permite precalentarlos.
+    op.create_table(
+        "user_analytics_dashboard_snapshots",
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("ladder_code", sa.Text(), sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True),
+        sa.Column("trend_interval", sa.Text(), primary_key=True),
+        sa.Column("payload", postgresql.JSONB(), nullable=False),
+        sa.Column("related_user_ids", postgresql.ARRAY(sa.Uuid()), nullable=False, server_default=sa.text("'{}'::uuid[]")),
+        sa.Column("built_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.CheckConstraint("trend_interval IN ('match','week','month')", name="ck_user_analytics_dashboard_interval"),
+    )
+
+
+def downgrade():
+    op.drop_table("user_analytics_dashboard_snapshots")
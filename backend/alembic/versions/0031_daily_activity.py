@@ -0,0 +1,45 @@
+"""per-user/ladder daily analytics activity rollup
+
+Revision ID: 0031_daily_activity
+Revises: 0030_dashboard_snapshots
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0031_daily_activity"
+down_revision = "0030_dashboard_snapshots"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "user_analytics_daily_activity",
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("ladder_code", sa.Text(), sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True),
+        sa.Column("activity_date", sa.Date(), primary_key=True),
+        sa.Column("matches", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("wins", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("close_matches", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("rating_delta", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+    op.execute("""
+        INSERT INTO user_analytics_daily_activity (user_id, ladder_code, activity_date, matches, wins, close_matches, rating_delta)
+        SELECT user_id,
+               ladder_code,
+               (played_at AT TIME ZONE 'UTC')::date,
+               count(*)::int,
+               count(*) FILTER (WHERE is_win)::int,
+               count(*) FILTER (WHERE is_close_match)::int,
+               COALESCE(sum(rating_delta), 0)::int
+        FROM user_analytics_match_applied
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade():
+    op.drop_table("user_analytics_daily_activity")
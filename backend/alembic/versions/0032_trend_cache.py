@@ -0,0 +1,33 @@
+"""per-user/ladder cache of LTTB-downsampled full-history trends
+
+Revision ID: 0032_trend_cache
+Revises: 0031_daily_activity
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0032_trend_cache"
+down_revision = "0031_daily_activity"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Sin backfill: cada (user, ladder, points) se calcula en la primera lectura con trend_mode=full.
+    op.create_table(
+        "user_analytics_trend_cache",
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("ladder_code", sa.Text(), sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True),
+        sa.Column("points", sa.SmallInteger(), primary_key=True),
+        sa.Column("state_updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("payload", postgresql.JSONB(), nullable=False),
+        sa.Column("built_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    )
+
+
+def downgrade():
+    op.drop_table("user_analytics_trend_cache")
@@ -0,0 +1,70 @@
+"""ladder-wide partnership and rivalry leaderboard keyed by canonical pair
+
+Revision ID: 0033_pair_leaderboard
+Revises: 0032_trend_cache
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0033_pair_leaderboard"
+down_revision = "0032_trend_cache"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "analytics_pair_leaderboard",
+        sa.Column("ladder_code", sa.Text(), sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True),
+        sa.Column("relation", sa.Text(), primary_key=True),
+        sa.Column("user_low_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("user_high_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("matches", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("wins", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("losses", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("win_rate", sa.Numeric(5, 2), nullable=False, server_default="0.00"),
+        sa.Column("last_played_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.CheckConstraint("relation IN ('partner','rival')", name="ck_analytics_pair_leaderboard_relation"),
+        sa.CheckConstraint("user_low_id < user_high_id", name="ck_analytics_pair_leaderboard_canonical"),
+    )
+    op.create_index(
+        "ix_analytics_pair_leaderboard_partner_best",
+        "analytics_pair_leaderboard",
+        ["ladder_code", sa.text("win_rate DESC"), sa.text("matches DESC"), "user_low_id", "user_high_id"],
+        postgresql_where=sa.text("relation = 'partner'"),
+    )
+    op.create_index(
+        "ix_analytics_pair_leaderboard_rival_played",
+        "analytics_pair_leaderboard",
+        ["ladder_code", sa.text("matches DESC"), "user_low_id", "user_high_id"],
+        postgresql_where=sa.text("relation = 'rival'"),
+    )
+    op.create_index("ix_analytics_pair_leaderboard_high", "analytics_pair_leaderboard", ["user_high_id"])
+
+    op.execute("""
+        INSERT INTO analytics_pair_leaderboard (
+            ladder_code, relation, user_low_id, user_high_id, matches, wins, losses, win_rate, last_played_at
+        )
+        SELECT ladder_code, 'partner', user_id, partner_user_id, matches, wins, losses, win_rate, last_played_at
+        FROM user_analytics_partner_stats
+        WHERE user_id < partner_user_id
+    """)
+    op.execute("""
+        INSERT INTO analytics_pair_leaderboard (
+            ladder_code, relation, user_low_id, user_high_id, matches, wins, losses, win_rate, last_played_at
+        )
+        SELECT ladder_code, 'rival', user_id, rival_user_id, matches, wins, losses, win_rate, last_played_at
+        FROM user_analytics_rival_stats
+        WHERE user_id < rival_user_id
+    """)
+
+
+def downgrade():
+    op.drop_index("ix_analytics_pair_leaderboard_high", table_name="analytics_pair_leaderboard")
+    op.drop_index("ix_analytics_pair_leaderboard_rival_played", table_name="analytics_pair_leaderboard")
+    op.drop_index("ix_analytics_pair_leaderboard_partner_best", table_name="analytics_pair_leaderboard")
+    op.drop_table("analytics_pair_leaderboard")
@@ -0,0 +1,65 @@
+"""asynchronous analytics export jobs
+
+Revision ID: 0034_analytics_export_jobs
+Revises: 0033_pair_leaderboard
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0034_analytics_export_jobs"
+down_revision = "0033_pair_leaderboard"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "analytics_export_jobs",
+        sa.Column("id", sa.Uuid(), primary_key=True, server_default=sa.text("gen_random_uuid()")),
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("ladder_code", sa.Text(), sa.ForeignKey("ladders.code", ondelete="CASCADE"), nullable=False),
+        sa.Column("format", sa.Text(), nullable=False),
+        sa.Column("status", sa.Text(), nullable=False, server_default="queued"),
+        sa.Column("attempts", sa.SmallInteger(), nullable=False, server_default="0"),
+        sa.Column("requested_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("storage_key", sa.Text(), nullable=True),
+        sa.Column("size_bytes", sa.BigInteger(), nullable=True),
+        sa.Column("row_counts", postgresql.JSONB(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.CheckConstraint("format IN ('csv','parquet')", name="ck_analytics_export_jobs_format"),
+        sa.CheckConstraint(
+            "status IN ('queued','running','done','failed','expired')",
+            name="ck_analytics_export_jobs_status",
+        ),
+    )
+    op.create_index(
+        "ix_analytics_export_jobs_user_requested",
+        "analytics_export_jobs",
+        ["user_id", sa.text("requested_at DESC")],
+    )
+    op.create_index(
+        "ix_analytics_export_jobs_pending",
+        "analytics_export_jobs",
+        ["status", "requested_at"],
+        postgresql_where=sa.text("status IN ('queued','running')"),
+    )
+    op.create_index(
+        "ix_analytics_export_jobs_expires",
+        "analytics_export_jobs",
+        ["expires_at"],
+        postgresql_where=sa.text("status = 'done'"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_analytics_export_jobs_expires", table_name="analytics_export_jobs")
+    op.drop_index("ix_analytics_export_jobs_pending", table_name="analytics_export_jobs")
+    op.drop_index("ix_analytics_export_jobs_user_requested", table_name="analytics_export_jobs")
+    op.drop_table("analytics_export_jobs")
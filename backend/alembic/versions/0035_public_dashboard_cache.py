@@ -0,0 +1,48 @@
+"""shared UNLOGGED cache for public analytics dashboards and cache hit/miss stats
+
+Revision ID: 0035_public_dashboard_cache
+Revises: 0034_analytics_export_jobs
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0035_public_dashboard_cache"
+down_revision = "0034_analytics_export_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # UNLOGGED: sin WAL; tras un crash quedan vacias y el cache se rellena en las lecturas.
+    op.create_table(
+        "analytics_public_dashboard_cache",
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("ladder_scope", sa.Text(), primary_key=True),
+        sa.Column("trend_interval", sa.Text(), primary_key=True),
+        sa.Column("trend_mode", sa.Text(), primary_key=True),
+        sa.Column("points", sa.SmallInteger(), primary_key=True),
+        sa.Column("top_n", sa.SmallInteger(), primary_key=True),
+        sa.Column("state_version", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("payload", postgresql.JSONB(), nullable=False),
+        sa.Column("built_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        prefixes=["UNLOGGED"],
+    )
+    op.create_table(
+        "analytics_cache_stats",
+        sa.Column("cache_name", sa.Text(), primary_key=True),
+        sa.Column("stat_date", sa.Date(), primary_key=True),
+        sa.Column("hits", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("misses", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        prefixes=["UNLOGGED"],
+    )
+
+
+def downgrade():
+    op.drop_table("analytics_cache_stats")
+    op.drop_table("analytics_public_dashboard_cache")
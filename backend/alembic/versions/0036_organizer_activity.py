@@ -0,0 +1,90 @@
+"""club and city daily activity rollups for organizer dashboards
+
+Revision ID: 0036_organizer_activity
+Revises: 0035_public_dashboard_cache
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0036_organizer_activity"
+down_revision = "0035_public_dashboard_cache"
+branch_labels = None
+depends_on = None
+
+
+_SCOPES = (
+    # (prefijo, columna clave, tipo, tabla referenciada, expresion sobre matches m JOIN clubs c)
+    ("club", "club_id", sa.Uuid(), "clubs.id", "m.club_id"),
+    ("city", "city_id", sa.Integer(), "location_cities.id", "c.city_id"),
+)
+
+
+def upgrade():
+    for prefix, key, key_type, ref, source in _SCOPES:
+        op.create_table(
+            f"{prefix}_activity_daily",
+            sa.Column(key, key_type, sa.ForeignKey(ref, ondelete="CASCADE"), primary_key=True),
+            sa.Column("activity_date", sa.Date(), primary_key=True),
+            sa.Column("ladder_code", sa.Text(), sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True),
+            sa.Column("matches", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("player_slots", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("rated_players", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("rating_sum", sa.BigInteger(), nullable=False, server_default="0"),
+        )
+        op.create_table(
+            f"{prefix}_activity_weekly_players",
+            sa.Column(key, key_type, sa.ForeignKey(ref, ondelete="CASCADE"), primary_key=True),
+            sa.Column("week_start", sa.Date(), primary_key=True),
+            sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        )
+        op.create_table(
+            f"{prefix}_activity_weekly",
+            sa.Column(key, key_type, sa.ForeignKey(ref, ondelete="CASCADE"), primary_key=True),
+            sa.Column("week_start", sa.Date(), primary_key=True),
+            sa.Column("active_players", sa.Integer(), nullable=False, server_default="0"),
+        )
+
+        op.execute(f"""
+            INSERT INTO {prefix}_activity_daily ({key}, activity_date, ladder_code, matches, player_slots, rated_players, rating_sum)
+            SELECT {source},
+                   (m.played_at AT TIME ZONE 'UTC')::date,
+                   m.ladder_code,
+                   count(DISTINCT m.id)::int,
+                   count(*)::int,
+                   count(re.old_rating)::int,
+                   COALESCE(sum(re.old_rating), 0)
+            FROM matches m
+            JOIN clubs c ON c.id = m.club_id
+            JOIN match_participants mp ON mp.match_id = m.id
+            LEFT JOIN rating_events re ON re.match_id = m.id AND re.user_id = mp.user_id
+            WHERE m.status = 'verified'
+              AND {source} IS NOT NULL
+            GROUP BY 1, 2, 3
+        """)
+        op.execute(f"""
+            INSERT INTO {prefix}_activity_weekly_players ({key}, week_start, user_id)
+            SELECT DISTINCT {source},
+                   date_trunc('week', m.played_at AT TIME ZONE 'UTC')::date,
+                   mp.user_id
+            FROM matches m
+            JOIN clubs c ON c.id = m.club_id
+            JOIN match_participants mp ON mp.match_id = m.id
+            WHERE m.status = 'verified'
+              AND {source} IS NOT NULL
+        """)
+        op.execute(f"""
+            INSERT INTO {prefix}_activity_weekly ({key}, week_start, active_players)
+            SELECT {key}, week_start, count(*)::int
+            FROM {prefix}_activity_weekly_players
+            GROUP BY 1, 2
+        """)
+
+
+def downgrade():
+    for prefix, *_ in reversed(_SCOPES):
+        op.drop_table(f"{prefix}_activity_weekly")
+        op.drop_table(f"{prefix}_activity_weekly_players")
+        op.drop_table(f"{prefix}_activity_daily")
@@ -0,0 +1,50 @@
+"""per-user/ladder histogram of opponent rating differences
+
+Revision ID: 0037_opponent_diff_histogram
+Revises: 0036_organizer_activity
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0037_opponent_diff_histogram"
+down_revision = "0036_organizer_activity"
+branch_labels = None
+depends_on = None
+
+
+# Copia de app.services.analytics (las migraciones no importan codigo de la app).
+_WIDTH = 5
+_MAX = 500
+
+
+def upgrade():
+    op.create_table(
+        "user_analytics_opponent_diff_histogram",
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("ladder_code", sa.Text(), sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True),
+        sa.Column("diff_bucket", sa.SmallInteger(), primary_key=True),
+        sa.Column("matches", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("wins", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+    # La division entera de Postgres trunca hacia cero, igual que rating_diff_bucket().
+    op.execute(f"""
+        INSERT INTO user_analytics_opponent_diff_histogram (user_id, ladder_code, diff_bucket, matches, wins)
+        SELECT user_id,
+               ladder_code,
+               CASE
+                   WHEN rating_before IS NULL OR opponent_avg_rating IS NULL THEN 0
+                   ELSE GREATEST(-{_MAX}, LEAST({_MAX}, ((opponent_avg_rating - rating_before) / {_WIDTH}) * {_WIDTH}))
+               END,
+               count(*)::int,
+               count(*) FILTER (WHERE is_win)::int
+        FROM user_analytics_match_applied
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade():
+    op.drop_table("user_analytics_opponent_diff_histogram")
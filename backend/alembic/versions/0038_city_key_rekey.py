@@ -0,0 +1,146 @@
+"""re-key location_cities: keep hyphenated city names, unify D.C. variants
+
+Revision ID: 0038_city_key_rekey
+Revises: 0037_opponent_diff_histogram
+Create Date: 2026-10-19
+"""
+
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0038_city_key_rekey"
+down_revision = "0037_opponent_diff_histogram"
+branch_labels = None
+depends_on = None
+
+
+# Copia congelada de app.services.locations (las migraciones no importan codigo de app).
+_CITY_QUALIFIER_RE = re.compile(r"[,(]")
+_CITY_DISTRICT_RE = re.compile(r"\s+D\.?\s*C\.?\s*$", re.IGNORECASE)
+_CITY_REGION_KEYS = frozenset({
+    "amazonas", "antioquia", "arauca", "atlantico", "bolivar", "boyaca", "caldas", "caqueta",
+    "casanare", "cauca", "cesar", "choco", "cordoba", "cundinamarca", "guainia", "guaviare",
+    "huila", "la guajira", "magdalena", "meta", "narino", "norte de santander", "putumayo",
+    "quindio", "risaralda", "san andres", "santander", "sucre", "tolima", "valle",
+    "valle del cauca", "vaupes", "vichada",
+})
+
+
+def _fold(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    ascii_only = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(ascii_only.replace(".", "").replace("-", " ").lower().split())
+
+
+def _city_base(raw: str) -> str:
+    head = _CITY_QUALIFIER_RE.split(raw, maxsplit=1)[0]
+    head = _CITY_DISTRICT_RE.sub("", head)
+    city, sep, region = head.rpartition("-")
+    if sep and city.strip() and _fold(region) in _CITY_REGION_KEYS:
+        head = city
+    return " ".join(head.split())
+
+
+def _city_key(raw: str) -> str | None:
+    base = _city_base(raw)
+    if not base:
+        return None
+    return _fold(base) or None
+
+
+def _city_name(raw: str) -> str:
+    base = _city_base(raw)
+    if base == base.lower() or base == base.upper():
+        return base.title()
+    return base
+
+
+def _rekey(bind, table: str) -> set[int]:
+    """Reasigna city_id con la clave nueva; devuelve los ids que dejaron de usarse en la tabla."""
+    rows = bind.execute(sa.text(f"""
+        SELECT DISTINCT country, city, city_id
+        FROM {table}
+        WHERE city IS NOT NULL
+    """)).mappings().all()
+    moved: set[int] = set()
+    for r in rows:
+        key = _city_key(r["city"])
+        if key is None:
+            continue
+        city_id = bind.execute(sa.text("""
+            INSERT INTO location_cities (country_code, city_key, name)
+            VALUES (:country, :key, :name)
+            ON CONFLICT (country_code, city_key) DO UPDATE SET city_key=EXCLUDED.city_key
+            RETURNING id
+        """), {"country": r["country"], "key": key, "name": _city_name(r["city"])}).scalar_one()
+        if city_id == r["city_id"]:
+            continue
+        bind.execute(sa.text(f"""
+            UPDATE {table}
+            SET city_id=:city_id
+            WHERE country=:country AND city=:city
+        """), {"city_id": city_id, "country": r["country"], "city": r["city"]})
+        if r["city_id"] is not None:
+            moved.add(int(r["city_id"]))
+    return moved
+
+
+def upgrade():
+    bind = op.get_bind()
+    moved = _rekey(bind, "user_profiles") | _rekey(bind, "clubs")
+    if not moved:
+        return
+    # Claves viejas sin referencias ("saint", "bogota dc"); sus rollups caen en cascada.
+    bind.execute(sa.text("""
+        DELETE FROM location_cities lc
+        WHERE lc.id = ANY(:ids)
+          AND NOT EXISTS (SELECT 1 FROM user_profiles p WHERE p.city_id = lc.id)
+          AND NOT EXISTS (SELECT 1 FROM clubs c WHERE c.city_id = lc.id)
+    """), {"ids": sorted(moved)})
+
+    # Los clubes pudieron cambiar de ciudad: rollups de ciudad recalculados desde matches.
+    for table in ("city_activity_weekly", "city_activity_weekly_players", "city_activity_daily"):
+        op.execute(f"DELETE FROM {table}")
+    op.execute("""
+        INSERT INTO city_activity_daily (city_id, activity_date, ladder_code, matches, player_slots, rated_players, rating_sum)
+        SELECT c.city_id,
+               (m.played_at AT TIME ZONE 'UTC')::date,
+               m.ladder_code,
+               count(DISTINCT m.id)::int,
+               count(*)::int,
+               count(re.old_rating)::int,
+               COALESCE(sum(re.old_rating), 0)
+        FROM matches m
+        JOIN clubs c ON c.id = m.club_id
+        JOIN match_participants mp ON mp.match_id = m.id
+        LEFT JOIN rating_events re ON re.match_id = m.id AND re.user_id = mp.user_id
+        WHERE m.status = 'verified'
+          AND c.city_id IS NOT NULL
+        GROUP BY 1, 2, 3
+    """)
+    op.execute("""
+        INSERT INTO city_activity_weekly_players (city_id, week_start, user_id)
+        SELECT DISTINCT c.city_id,
+               date_trunc('week', m.played_at AT TIME ZONE 'UTC')::date,
+               mp.user_id
+        FROM matches m
+        JOIN clubs c ON c.id = m.club_id
+        JOIN match_participants mp ON mp.match_id = m.id
+        WHERE m.status = 'verified'
+          AND c.city_id IS NOT NULL
+    """)
+    op.execute("""
+        INSERT INTO city_activity_weekly (city_id, week_start, active_players)
+        SELECT city_id, week_start, count(*)::int
+        FROM city_activity_weekly_players
+        GROUP BY 1, 2
+    """)
+
+
+def downgrade():
+    # Irreversible by design: the previous keys merged distinct cities ("Saint-Denis" -> "saint").
+    pass
@@ -0,0 +1,44 @@
+"""queue of dashboard snapshots to rebuild outside the verification transaction
+
+Revision ID: 0039_dashboard_refresh_queue
+Revises: 0038_city_key_rekey
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0039_dashboard_refresh_queue"
+down_revision = "0038_city_key_rekey"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "user_analytics_dashboard_refresh_queue",
+        sa.Column("user_id", sa.Uuid(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("ladder_code", sa.Text(), sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True),
+        sa.Column("queued_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    )
+    op.create_index("ix_user_analytics_dashboard_refresh_queued", "user_analytics_dashboard_refresh_queue", ["queued_at"])
+
+    # Estados sin snapshot (nunca construidos o pendientes): los rellena el worker.
+    op.execute("""
+        INSERT INTO user_analytics_dashboard_refresh_queue (user_id, ladder_code)
+        SELECT s.user_id, s.ladder_code
+        FROM user_analytics_state s
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM user_analytics_dashboard_snapshots d
+            WHERE d.user_id = s.user_id
+              AND d.ladder_code = s.ladder_code
+              AND d.trend_interval = 'match'
+        )
+    """)
+
+
+def downgrade():
+    op.drop_index("ix_user_analytics_dashboard_refresh_queued", table_name="user_analytics_dashboard_refresh_queue")
+    op.drop_table("user_analytics_dashboard_refresh_queue")
@@ -0,0 +1,30 @@
+"""public dashboard cache: store payload without aliases plus related_user_ids
+
+Revision ID: 0040_public_cache_related_users
+Revises: 0039_dashboard_refresh_queue
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0040_public_cache_related_users"
+down_revision = "0039_dashboard_refresh_queue"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Las entradas actuales llevan alias congelados; el cache es UNLOGGED y se rehace al leer.
+    op.execute("TRUNCATE analytics_public_dashboard_cache")
+    op.add_column(
+        "analytics_public_dashboard_cache",
+        sa.Column("related_user_ids", postgresql.ARRAY(sa.Uuid()), nullable=False, server_default=sa.text("'{}'::uuid[]")),
+    )
+
+
+def downgrade():
+    op.execute("TRUNCATE analytics_public_dashboard_cache")
+    op.drop_column("analytics_public_dashboard_cache", "related_user_ids")
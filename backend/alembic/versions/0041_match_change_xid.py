@@ -0,0 +1,56 @@
+"""change feed watermark: commit-order xid on user_match_timeline instead of a global sequence
+
+Revision ID: 0041_match_change_xid
+Revises: 0040_public_cache_related_users
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0041_match_change_xid"
+down_revision = "0040_public_cache_related_users"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index("ix_user_match_timeline_user_change", table_name="user_match_timeline")
+    op.drop_column("user_match_timeline", "change_seq")
+    op.execute("DROP SEQUENCE IF EXISTS match_change_seq")
+    # Las filas existentes quedan con el xid de esta migracion (ya confirmado al leerlas).
+    op.add_column(
+        "user_match_timeline",
+        sa.Column(
+            "change_xid",
+            sa.BigInteger(),
+            nullable=False,
+            server_default=sa.text("CAST(CAST(pg_current_xact_id() AS text) AS bigint)"),
+        ),
+    )
+    op.create_index(
+        "ix_user_match_timeline_user_change",
+        "user_match_timeline",
+        ["user_id", "change_xid", "match_id"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_user_match_timeline_user_change", table_name="user_match_timeline")
+    op.drop_column("user_match_timeline", "change_xid")
+    op.execute("CREATE SEQUENCE IF NOT EXISTS match_change_seq AS bigint")
+    op.add_column(
+        "user_match_timeline",
+        sa.Column(
+            "change_seq",
+            sa.BigInteger(),
+            nullable=False,
+            server_default=sa.text("nextval('match_change_seq')"),
+        ),
+    )
+    op.create_index(
+        "ix_user_match_timeline_user_change",
+        "user_match_timeline",
+        ["user_id", "change_seq"],
+    )
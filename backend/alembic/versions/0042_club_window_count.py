@@ -0,0 +1,50 @@
+"""club rankings count window matches at read time; drop club_memberships.window_matches
+
+Revision ID: 0042_club_window_count
+Revises: 0041_match_change_xid
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0042_club_window_count"
+down_revision = "0041_match_change_xid"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index("ix_club_memberships_club_ladder_matches", table_name="club_memberships")
+    op.drop_column("club_memberships", "window_matches")
+    op.create_index(
+        "ix_club_memberships_club_ladder_played",
+        "club_memberships",
+        ["club_id", "ladder_code", "last_played_on"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_club_memberships_club_ladder_played", table_name="club_memberships")
+    op.add_column(
+        "club_memberships",
+        sa.Column("window_matches", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.execute("""
+        UPDATE club_memberships cm
+        SET window_matches = a.matches
+        FROM (
+            SELECT club_id, ladder_code, user_id, sum(matches)::int AS matches
+            FROM club_player_activity
+            GROUP BY club_id, ladder_code, user_id
+        ) a
+        WHERE a.club_id = cm.club_id
+          AND a.ladder_code = cm.ladder_code
+          AND a.user_id = cm.user_id
+    """)
+    op.create_index(
+        "ix_club_memberships_club_ladder_matches",
+        "club_memberships",
+        ["club_id", "ladder_code", "window_matches"],
+    )
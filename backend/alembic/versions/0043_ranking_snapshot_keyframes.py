@@ -0,0 +1,27 @@
+"""ranking snapshot keyframes: periodic full captures anchor the delta encoding
+
+Revision ID: 0043_ranking_snapshot_keyframes
+Revises: 0042_club_window_count
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0043_ranking_snapshot_keyframes"
+down_revision = "0042_club_window_count"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Sin keyframes previos: la siguiente captura lee el historial una vez y escribe el primero.
+    op.add_column(
+        "ranking_snapshot_runs",
+        sa.Column("is_keyframe", sa.Boolean(), nullable=False, server_default=sa.text("false")),
+    )
+
+
+def downgrade():
+    op.drop_column("ranking_snapshot_runs", "is_keyframe")
@@ -1,7 +1,10 @@
-from fastapi import Depends, HTTPException
+import hmac
+
+from fastapi import Depends, Header, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.core.security import decode_token
 from app.db.session import get_db
 from app.models.user import User
@@ -41,3 +44,10 @@ def get_authenticated_user(
     if user.status not in {"active", "pending_deletion"}:
         raise HTTPException(status_code=403, detail="Usuario bloqueado")
     return user
+
+
+def require_admin_token(x_admin_token: str | None = Header(default=None)) -> None:
+    if not settings.ADMIN_API_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Token de administracion invalido")
@@ -27,6 +27,25 @@ class Settings(BaseSettings):
 
     ELO_K: int = 32
 
+    CLUB_RANKING_WINDOW_DAYS: int = 90
+    CLUB_RANKING_MIN_MATCHES: int = 3
+    # Cada cuantos dias el snapshot de ranking se guarda completo (ancla del delta encoding).
+    RANKING_SNAPSHOT_KEYFRAME_DAYS: int = 30
+
+    # Endpoints operativos (/analytics/admin/*); sin token quedan deshabilitados.
+    ADMIN_API_TOKEN: str | None = None
+    ANALYTICS_REPAIR_MAX_USERS: int = 200
+
+    # Exports asincronos de analitica (scripts/process_analytics_exports.py); Parquet requiere pyarrow.
+    ANALYTICS_EXPORT_DIR: str = "data/analytics_exports"
+    ANALYTICS_EXPORT_TTL_HOURS: int = 72
+    ANALYTICS_EXPORT_MAX_ACTIVE_JOBS: int = 2
+    ANALYTICS_EXPORT_STALE_MINUTES: int = 60
+
+    # Cache compartido (tabla UNLOGGED) de /analytics/users/{id}/dashboard; 0 lo desactiva.
+    ANALYTICS_PUBLIC_DASHBOARD_CACHE_TTL_SECONDS: int = 300
+    ANALYTICS_CACHE_STATS_FLUSH_SECONDS: int = 30
+
     DB_POOL_SIZE: int = 5
     DB_MAX_OVERFLOW: int = 5
     DB_POOL_TIMEOUT_SECONDS: int = 30
@@ -1,11 +1,12 @@
 from app.models.user import User
+from app.models.location import LocationCity
 from app.models.profile import UserProfile
 from app.models.club import Club
 from app.models.ladder import Ladder
 from app.models.category import Category
 from app.models.user_ladder_state import UserLadderState
 from app.models.match import Match, MatchParticipant, MatchConfirmation, MatchScore, MatchDispute
-from app.models.rating_event import RatingEvent
+from app.models.rating_event import RatingEvent, RatingDailyDelta
 from app.models.audit_log import AuditLog
 from app.models.entitlement import UserEntitlement
 from app.models.avatar import AvatarPreset
@@ -18,8 +19,30 @@ from app.models.billing import (
     BillingWebhookEvent,
 )
 from app.models.analytics import (
+    AnalyticsCacheStats,
+    AnalyticsPairLeaderboard,
+    AnalyticsPublicDashboardCache,
     UserAnalyticsState,
     UserAnalyticsMatchApplied,
     UserAnalyticsPartnerStats,
     UserAnalyticsRivalStats,
+    UserAnalyticsDailyActivity,
+    UserAnalyticsOpponentDiffHistogram,
+    UserAnalyticsDashboardSnapshot,
+    UserAnalyticsDashboardRefreshQueue,
+    UserAnalyticsTrendCache,
 )
+from app.models.analytics_export import AnalyticsExportJob
+from app.models.ranking_snapshot import RankingSnapshot, RankingSnapshotRun
+from app.models.club_membership import ClubMembership, ClubPlayerActivity
+from app.models.organizer_activity import (
+    CityActivityDaily,
+    CityActivityWeekly,
+    CityActivityWeeklyPlayer,
+    ClubActivityDaily,
+    ClubActivityWeekly,
+    ClubActivityWeeklyPlayer,
+)
+from app.models.rating_histogram import RatingHistogramBucket
+from app.models.match_timeline import UserMatchPair, UserMatchTimeline
+from app.models.timeline_facet import UserTimelineFacet
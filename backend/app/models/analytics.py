@@ -1,4 +1,5 @@
 import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.base import Base
@@ -128,3 +129,148 @@ class UserAnalyticsRivalStats(Base):
     __table_args__ = (
         sa.Index("ix_user_analytics_rival_top", "user_id", "ladder_code", sa.text("matches DESC"), sa.text("win_rate DESC")),
     )
+
+
+class UserAnalyticsDailyActivity(Base):
+    __tablename__ = "user_analytics_daily_activity"
+
+    # Daily rollup (UTC day of played_at) maintained on apply; activity windows, ranges
+    # and volume charts aggregate these rows at read time.
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    ladder_code: Mapped[str] = mapped_column(sa.Text, sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True)
+    activity_date: Mapped[sa.Date] = mapped_column(sa.Date, primary_key=True)
+    matches: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    wins: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    close_matches: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    rating_delta: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+
+
+class UserAnalyticsOpponentDiffHistogram(Base):
+    __tablename__ = "user_analytics_opponent_diff_histogram"
+
+    # Record against opponents by (opponent_avg_rating - rating_before), truncated toward zero
+    # to RATING_DIFF_BUCKET_WIDTH and clamped to +-RATING_DIFF_MAX (app.services.analytics).
+    # Unrated matches land in bucket 0, which is "similar" for every threshold. Maintained on
+    # apply; vs_* splits for any threshold multiple of the width are summed at read time.
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    ladder_code: Mapped[str] = mapped_column(sa.Text, sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True)
+    diff_bucket: Mapped[int] = mapped_column(sa.SmallInteger, primary_key=True)
+    matches: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    wins: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+
+
+class UserAnalyticsDashboardSnapshot(Base):
+    __tablename__ = "user_analytics_dashboard_snapshots"
+
+    # Dashboard series per trend interval, dropped by the analytics apply path and rebuilt
+    # off-transaction from the refresh queue; sliced on read. Partner/rival aliases are
+    # resolved at read time via related_user_ids.
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    ladder_code: Mapped[str] = mapped_column(sa.Text, sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True)
+    trend_interval: Mapped[str] = mapped_column(sa.Text, primary_key=True)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    related_user_ids: Mapped[list] = mapped_column(ARRAY(sa.Uuid), nullable=False, server_default=sa.text("'{}'::uuid[]"))
+    built_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()"))
+
+    __table_args__ = (
+        sa.CheckConstraint("trend_interval IN ('match','week','month')", name="ck_user_analytics_dashboard_interval"),
+    )
+
+
+class UserAnalyticsDashboardRefreshQueue(Base):
+    __tablename__ = "user_analytics_dashboard_refresh_queue"
+
+    # (user, ladder) whose dashboard snapshots were dropped by the apply path. The verifying
+    # transaction only enqueues; scripts/refresh_dashboard_snapshots.py rebuilds and dequeues.
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    ladder_code: Mapped[str] = mapped_column(sa.Text, sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True)
+    queued_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()"))
+
+    __table_args__ = (
+        sa.Index("ix_user_analytics_dashboard_refresh_queued", "queued_at"),
+    )
+
+
+class UserAnalyticsTrendCache(Base):
+    __tablename__ = "user_analytics_trend_cache"
+
+    # Full-history rating/win-rate trends downsampled with LTTB to `points` points. A row is
+    # valid while state_updated_at matches user_analytics_state.updated_at, so the apply
+    # path never writes here; the dashboard snapshot worker rebuilds the rows and reads of
+    # stale or missing entries compute the trends live without writing.
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    ladder_code: Mapped[str] = mapped_column(sa.Text, sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True)
+    points: Mapped[int] = mapped_column(sa.SmallInteger, primary_key=True)
+    state_updated_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    built_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()"))
+
+
+class AnalyticsPairLeaderboard(Base):
+    __tablename__ = "analytics_pair_leaderboard"
+
+    # One row per unordered pair (user_low_id < user_high_id) and ladder, projected from the
+    # canonical direction of user_analytics_partner_stats / user_analytics_rival_stats.
+    # For rivals, wins/losses/win_rate are from user_low_id's side.
+    ladder_code: Mapped[str] = mapped_column(sa.Text, sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True)
+    relation: Mapped[str] = mapped_column(sa.Text, primary_key=True)
+    user_low_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    user_high_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    matches: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    wins: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    losses: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    win_rate: Mapped[float] = mapped_column(sa.Numeric(5, 2), nullable=False, server_default="0.00")
+    last_played_at: Mapped[sa.DateTime | None] = mapped_column(sa.DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()"))
+
+    __table_args__ = (
+        sa.CheckConstraint("relation IN ('partner','rival')", name="ck_analytics_pair_leaderboard_relation"),
+        sa.CheckConstraint("user_low_id < user_high_id", name="ck_analytics_pair_leaderboard_canonical"),
+        sa.Index(
+            "ix_analytics_pair_leaderboard_partner_best",
+            "ladder_code", sa.text("win_rate DESC"), sa.text("matches DESC"), "user_low_id", "user_high_id",
+            postgresql_where=sa.text("relation = 'partner'"),
+        ),
+        sa.Index(
+            "ix_analytics_pair_leaderboard_rival_played",
+            "ladder_code", sa.text("matches DESC"), "user_low_id", "user_high_id",
+            postgresql_where=sa.text("relation = 'rival'"),
+        ),
+        sa.Index("ix_analytics_pair_leaderboard_high", "user_high_id"),
+    )
+
+
+class AnalyticsPublicDashboardCache(Base):
+    __tablename__ = "analytics_public_dashboard_cache"
+
+    # Serialized GET /analytics/users/{id}/dashboard response, shared by every API worker.
+    # UNLOGGED: it is lost on crash and rebuilt on read. ladder_scope is HM|WM|MX or ALL.
+    # A row is served only while expires_at is in the future, the profile is public and
+    # state_version still equals max(user_analytics_state.updated_at) for the scope.
+    # Partner/rival aliases are not stored: they are resolved at read time via related_user_ids.
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    ladder_scope: Mapped[str] = mapped_column(sa.Text, primary_key=True)
+    trend_interval: Mapped[str] = mapped_column(sa.Text, primary_key=True)
+    trend_mode: Mapped[str] = mapped_column(sa.Text, primary_key=True)
+    points: Mapped[int] = mapped_column(sa.SmallInteger, primary_key=True)
+    top_n: Mapped[int] = mapped_column(sa.SmallInteger, primary_key=True)
+    state_version: Mapped[sa.DateTime | None] = mapped_column(sa.DateTime(timezone=True), nullable=True)
+    payload: Mapped[list] = mapped_column(JSONB, nullable=False)
+    related_user_ids: Mapped[list] = mapped_column(ARRAY(sa.Uuid), nullable=False, server_default=sa.text("'{}'::uuid[]"))
+    built_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()"))
+    expires_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False)
+
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+
+class AnalyticsCacheStats(Base):
+    __tablename__ = "analytics_cache_stats"
+
+    # Hit/miss counters per cache and UTC day, flushed periodically by each API worker.
+    cache_name: Mapped[str] = mapped_column(sa.Text, primary_key=True)
+    stat_date: Mapped[sa.Date] = mapped_column(sa.Date, primary_key=True)
+    hits: Mapped[int] = mapped_column(sa.BigInteger, nullable=False, server_default="0")
+    misses: Mapped[int] = mapped_column(sa.BigInteger, nullable=False, server_default="0")
+    updated_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()"))
+
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
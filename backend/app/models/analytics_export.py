@@ -0,0 +1,41 @@
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class AnalyticsExportJob(Base):
+    __tablename__ = "analytics_export_jobs"
+
+    # Queued by the API, claimed by scripts/process_analytics_exports.py (SKIP LOCKED); the
+    # archive lives in export storage under storage_key until expires_at.
+    id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, primary_key=True, server_default=sa.text("gen_random_uuid()"))
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    ladder_code: Mapped[str] = mapped_column(sa.Text, sa.ForeignKey("ladders.code", ondelete="CASCADE"), nullable=False)
+    format: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    status: Mapped[str] = mapped_column(sa.Text, nullable=False, server_default="queued")
+    attempts: Mapped[int] = mapped_column(sa.SmallInteger, nullable=False, server_default="0")
+    requested_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()"))
+    started_at: Mapped[sa.DateTime | None] = mapped_column(sa.DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[sa.DateTime | None] = mapped_column(sa.DateTime(timezone=True), nullable=True)
+    expires_at: Mapped[sa.DateTime | None] = mapped_column(sa.DateTime(timezone=True), nullable=True)
+    storage_key: Mapped[str | None] = mapped_column(sa.Text, nullable=True)
+    size_bytes: Mapped[int | None] = mapped_column(sa.BigInteger, nullable=True)
+    row_counts: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    error: Mapped[str | None] = mapped_column(sa.Text, nullable=True)
+
+    __table_args__ = (
+        sa.CheckConstraint("format IN ('csv','parquet')", name="ck_analytics_export_jobs_format"),
+        sa.CheckConstraint(
+            "status IN ('queued','running','done','failed','expired')",
+            name="ck_analytics_export_jobs_status",
+        ),
+        sa.Index("ix_analytics_export_jobs_user_requested", "user_id", sa.text("requested_at DESC")),
+        sa.Index(
+            "ix_analytics_export_jobs_pending",
+            "status", "requested_at",
+            postgresql_where=sa.text("status IN ('queued','running')"),
+        ),
+        sa.Index("ix_analytics_export_jobs_expires", "expires_at", postgresql_where=sa.text("status = 'done'")),
+    )
@@ -8,4 +8,10 @@ class Club(Base):
     id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, primary_key=True, server_default=sa.text("gen_random_uuid()"))
     name: Mapped[str] = mapped_column(sa.Text, nullable=False)
     city: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    country: Mapped[str] = mapped_column(sa.Text, nullable=False, server_default="CO")
+    city_id: Mapped[int | None] = mapped_column(sa.Integer, sa.ForeignKey("location_cities.id", ondelete="SET NULL"), nullable=True)
     is_active: Mapped[bool] = mapped_column(sa.Boolean, nullable=False, server_default=sa.text("true"))
+
+    __table_args__ = (
+        sa.Index("ix_clubs_city_id", "city_id"),
+    )
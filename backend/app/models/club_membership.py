@@ -0,0 +1,36 @@
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class ClubPlayerActivity(Base):
+    __tablename__ = "club_player_activity"
+
+    # Daily buckets of verified matches per club/ladder/player; source for the rolling window.
+    club_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("clubs.id", ondelete="CASCADE"), primary_key=True)
+    ladder_code: Mapped[str] = mapped_column(sa.Text, sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True)
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    activity_date: Mapped[sa.Date] = mapped_column(sa.Date, primary_key=True)
+    matches: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+
+    __table_args__ = (
+        sa.Index("ix_club_player_activity_date", "activity_date"),
+    )
+
+
+class ClubMembership(Base):
+    __tablename__ = "club_memberships"
+
+    # Membership index served by club rankings: players with verified matches in the club
+    # since the last window refresh. The window count is summed from club_player_activity at
+    # read time, so days that left the window never count before the daily refresh runs.
+    club_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("clubs.id", ondelete="CASCADE"), primary_key=True)
+    ladder_code: Mapped[str] = mapped_column(sa.Text, sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True)
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    last_played_on: Mapped[sa.Date] = mapped_column(sa.Date, nullable=False)
+    updated_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()"))
+
+    __table_args__ = (
+        sa.Index("ix_club_memberships_club_ladder_played", "club_id", "ladder_code", "last_played_on"),
+    )
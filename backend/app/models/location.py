@@ -0,0 +1,19 @@
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class LocationCity(Base):
+    __tablename__ = "location_cities"
+
+    id: Mapped[int] = mapped_column(sa.Integer, primary_key=True)
+    country_code: Mapped[str] = mapped_column(sa.Text, nullable=False)  # ISO-2
+    city_key: Mapped[str] = mapped_column(sa.Text, nullable=False)  # ver app.services.locations.normalize_city_key
+    name: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    created_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()"))
+
+    __table_args__ = (
+        sa.UniqueConstraint("country_code", "city_key", name="uq_location_cities_country_key"),
+        sa.Index("ix_location_cities_key", "city_key"),
+    )
@@ -0,0 +1,69 @@
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class UserMatchTimeline(Base):
+    __tablename__ = "user_match_timeline"
+
+    # Fan-out on write: one row per (participant, match), re-synced on create/confirm/rate/expire.
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    match_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("matches.id", ondelete="CASCADE"), primary_key=True)
+
+    played_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False)
+    ladder_code: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    category_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, nullable=False)
+    club_id: Mapped[sa.Uuid | None] = mapped_column(sa.Uuid, nullable=True)
+
+    status: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    confirmation_deadline: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False)
+
+    focus_team_no: Mapped[int] = mapped_column(sa.SmallInteger, nullable=False)
+    teammate_id: Mapped[sa.Uuid | None] = mapped_column(sa.Uuid, nullable=True)
+    rival_ids: Mapped[list] = mapped_column(ARRAY(sa.Uuid), nullable=False, server_default=sa.text("'{}'::uuid[]"))
+    did_win: Mapped[bool | None] = mapped_column(sa.Boolean, nullable=True)
+    rating_delta: Mapped[int | None] = mapped_column(sa.Integer, nullable=True)
+
+    updated_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()"))
+    # xid of the last transaction that wrote the row (pg_current_xact_id); drives
+    # /history/me/changes, which only returns rows below the oldest in-flight xid.
+    change_xid: Mapped[int] = mapped_column(
+        sa.BigInteger,
+        nullable=False,
+        server_default=sa.text("CAST(CAST(pg_current_xact_id() AS text) AS bigint)"),
+    )
+
+    __table_args__ = (
+        sa.Index("ix_user_match_timeline_user_played", "user_id", sa.text("played_at DESC"), sa.text("match_id DESC")),
+        sa.Index("ix_user_match_timeline_match", "match_id"),
+        sa.Index("ix_user_match_timeline_user_change", "user_id", "change_xid", "match_id"),
+    )
+
+
+class UserMatchPair(Base):
+    __tablename__ = "user_match_pairs"
+
+    # One row per (user, other participant, match): relation is partner (same team) or rival.
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    other_user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    match_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("matches.id", ondelete="CASCADE"), primary_key=True)
+
+    relation: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    played_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False)
+    status: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    confirmation_deadline: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False)
+    did_win: Mapped[bool | None] = mapped_column(sa.Boolean, nullable=True)
+
+    __table_args__ = (
+        sa.CheckConstraint("relation in ('partner','rival')", name="ck_user_match_pairs_relation"),
+        sa.Index(
+            "ix_user_match_pairs_pair_played",
+            "user_id",
+            "other_user_id",
+            sa.text("played_at DESC"),
+            sa.text("match_id DESC"),
+        ),
+        sa.Index("ix_user_match_pairs_match", "match_id"),
+    )
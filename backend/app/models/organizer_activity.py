@@ -0,0 +1,66 @@
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class ClubActivityDaily(Base):
+    __tablename__ = "club_activity_daily"
+
+    # Verified matches per club, UTC day and ladder, maintained in the verification transaction.
+    # avg rating = rating_sum / rated_players (pre-match rating of each participant).
+    club_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("clubs.id", ondelete="CASCADE"), primary_key=True)
+    activity_date: Mapped[sa.Date] = mapped_column(sa.Date, primary_key=True)
+    ladder_code: Mapped[str] = mapped_column(sa.Text, sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True)
+    matches: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    player_slots: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    rated_players: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    rating_sum: Mapped[int] = mapped_column(sa.BigInteger, nullable=False, server_default="0")
+
+
+class CityActivityDaily(Base):
+    __tablename__ = "city_activity_daily"
+
+    # Same rollup as club_activity_daily, keyed by the club's city (clubs.city_id).
+    city_id: Mapped[int] = mapped_column(sa.Integer, sa.ForeignKey("location_cities.id", ondelete="CASCADE"), primary_key=True)
+    activity_date: Mapped[sa.Date] = mapped_column(sa.Date, primary_key=True)
+    ladder_code: Mapped[str] = mapped_column(sa.Text, sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True)
+    matches: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    player_slots: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    rated_players: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    rating_sum: Mapped[int] = mapped_column(sa.BigInteger, nullable=False, server_default="0")
+
+
+class ClubActivityWeeklyPlayer(Base):
+    __tablename__ = "club_activity_weekly_players"
+
+    # Presence of a player at a club in an ISO week (Monday, UTC); only read on write,
+    # to count each player once in club_activity_weekly.active_players.
+    club_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("clubs.id", ondelete="CASCADE"), primary_key=True)
+    week_start: Mapped[sa.Date] = mapped_column(sa.Date, primary_key=True)
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+
+
+class CityActivityWeeklyPlayer(Base):
+    __tablename__ = "city_activity_weekly_players"
+
+    city_id: Mapped[int] = mapped_column(sa.Integer, sa.ForeignKey("location_cities.id", ondelete="CASCADE"), primary_key=True)
+    week_start: Mapped[sa.Date] = mapped_column(sa.Date, primary_key=True)
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+
+
+class ClubActivityWeekly(Base):
+    __tablename__ = "club_activity_weekly"
+
+    # Distinct players with a verified match at the club in the week (any ladder).
+    club_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("clubs.id", ondelete="CASCADE"), primary_key=True)
+    week_start: Mapped[sa.Date] = mapped_column(sa.Date, primary_key=True)
+    active_players: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+
+
+class CityActivityWeekly(Base):
+    __tablename__ = "city_activity_weekly"
+
+    city_id: Mapped[int] = mapped_column(sa.Integer, sa.ForeignKey("location_cities.id", ondelete="CASCADE"), primary_key=True)
+    week_start: Mapped[sa.Date] = mapped_column(sa.Date, primary_key=True)
+    active_players: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
@@ -11,6 +11,7 @@ class UserProfile(Base):
     is_public: Mapped[bool] = mapped_column(sa.Boolean, nullable=False, server_default=sa.text("true"))
     country: Mapped[str] = mapped_column(sa.Text, nullable=False, server_default="CO")
     city: Mapped[str | None] = mapped_column(sa.Text, nullable=True)
+    city_id: Mapped[int | None] = mapped_column(sa.Integer, sa.ForeignKey("location_cities.id", ondelete="SET NULL"), nullable=True)
     avatar_mode: Mapped[str] = mapped_column(sa.Text, nullable=False, server_default="preset")  # preset/upload
     avatar_preset_key: Mapped[str | None] = mapped_column(
         sa.Text,
@@ -35,11 +36,10 @@ class UserProfile(Base):
             postgresql_where=sa.text("is_public = true"),
         ),
         sa.Index(
-            "ix_user_profiles_country_city_public_user",
-            "country",
-            sa.text("lower(city)"),
+            "ix_user_profiles_city_id_public_user",
+            "city_id",
             "user_id",
-            postgresql_where=sa.text("is_public = true AND city IS NOT NULL"),
+            postgresql_where=sa.text("is_public = true AND city_id IS NOT NULL"),
         ),
         sa.Index("ix_user_profiles_avatar_mode", "avatar_mode"),
         sa.CheckConstraint("avatar_mode IN ('preset','upload')", name="ck_user_profiles_avatar_mode"),
@@ -0,0 +1,39 @@
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class RankingSnapshot(Base):
+    __tablename__ = "ranking_snapshots"
+
+    # Delta-encoded: one row only when rank/rating changed versus the previous stored row.
+    # rank IS NULL marks that the player left the leaderboard (tombstone).
+    snapshot_date: Mapped[sa.Date] = mapped_column(sa.Date, primary_key=True)
+    ladder_code: Mapped[str] = mapped_column(sa.Text, sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True)
+    category_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    rank: Mapped[int | None] = mapped_column(sa.Integer, nullable=True)
+    rating: Mapped[int | None] = mapped_column(sa.Integer, nullable=True)
+
+    __table_args__ = (
+        sa.Index(
+            "ix_ranking_snapshots_scope_user_date",
+            "ladder_code",
+            "category_id",
+            "user_id",
+            sa.text("snapshot_date DESC"),
+        ),
+    )
+
+
+class RankingSnapshotRun(Base):
+    __tablename__ = "ranking_snapshot_runs"
+
+    snapshot_date: Mapped[sa.Date] = mapped_column(sa.Date, primary_key=True)
+    players: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    changed_rows: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    # Keyframe: every ranked player was written in full that day, so capture only needs the
+    # rows since the latest keyframe to rebuild the previous state.
+    is_keyframe: Mapped[bool] = mapped_column(sa.Boolean, nullable=False, server_default=sa.text("false"))
+    captured_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()"))
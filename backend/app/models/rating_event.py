@@ -24,3 +24,14 @@ class RatingEvent(Base):
         sa.Index("ix_rating_events_user_created", "user_id", sa.text("created_at DESC")),
         sa.Index("ix_rating_events_match", "match_id"),
     )
+
+class RatingDailyDelta(Base):
+    __tablename__ = "rating_daily_deltas"
+
+    # Rollup of rating_events per UTC day; written in the same transaction as the events.
+    ladder_code: Mapped[str] = mapped_column(sa.Text, sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True)
+    activity_date: Mapped[sa.Date] = mapped_column(sa.Date, primary_key=True)
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+
+    delta: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    matches: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
@@ -0,0 +1,16 @@
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class RatingHistogramBucket(Base):
+    __tablename__ = "rating_histogram_buckets"
+
+    # Fixed-width buckets (app.services.rating_distribution.RATING_BUCKET_WIDTH) of user_ladder_state.rating,
+    # maintained in the same transaction as each rating change.
+    ladder_code: Mapped[str] = mapped_column(sa.Text, sa.ForeignKey("ladders.code", ondelete="CASCADE"), primary_key=True)
+    category_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    bucket_floor: Mapped[int] = mapped_column(sa.Integer, primary_key=True)
+    players: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+    updated_at: Mapped[sa.DateTime] = mapped_column(sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()"))
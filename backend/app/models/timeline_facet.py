@@ -0,0 +1,19 @@
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class UserTimelineFacet(Base):
+    __tablename__ = "user_timeline_facets"
+
+    # Verified-match counters per history filter chip (facet: month|ladder|club|outcome),
+    # incremented once per match in the transaction that verifies it.
+    user_id: Mapped[sa.Uuid] = mapped_column(sa.Uuid, sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    facet: Mapped[str] = mapped_column(sa.Text, primary_key=True)
+    facet_key: Mapped[str] = mapped_column(sa.Text, primary_key=True)
+    matches: Mapped[int] = mapped_column(sa.Integer, nullable=False, server_default="0")
+
+    __table_args__ = (
+        sa.CheckConstraint("facet in ('month','ladder','club','outcome')", name="ck_user_timeline_facets_facet"),
+    )
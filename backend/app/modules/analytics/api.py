@@ -1,29 +1,71 @@
+from datetime import date, datetime, timedelta
+
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, JSONResponse
+from pydantic import TypeAdapter
 import sqlalchemy as sa
 from sqlalchemy.orm import Session
 from uuid import UUID
 
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, require_admin_token
+from app.core.config import settings
 from app.core.security import now_utc
 from app.db.session import get_db
+from app.services.analytics import (
+    ACTIVITY_WINDOWS_DAYS,
+    RATING_DIFF_BUCKET_WIDTH,
+    RATING_DIFF_MAX,
+    RIVAL_BUCKET_DELTA,
+    query_opponent_strength,
+    repair_analytics,
+    resolve_repair_targets,
+)
+from app.services.analytics_exports import EXPORT_FORMATS, get_export_storage, parquet_available
+from app.services.analytics_dashboard import (
+    DASHBOARD_TREND_INTERVALS,
+    DASHBOARD_TREND_MODES,
+    dashboard_series_from_snapshot,
+    query_activity_range,
+    query_dashboard_series,
+    query_full_trends,
+)
 from app.services.entitlements import get_user_contract
+from app.services.organizer_activity import query_organizer_activity, week_start
+from app.services.public_dashboard_cache import (
+    PUBLIC_DASHBOARD_ALL_LADDERS,
+    PUBLIC_DASHBOARD_CACHE,
+    PublicDashboardKey,
+    cache_stats,
+    lookup_public_dashboard,
+    public_dashboard_cache_enabled,
+    store_public_dashboard,
+)
 from app.schemas.analytics import (
+    AnalyticsActivityOut,
+    AnalyticsCacheStatsOut,
     AnalyticsDashboardOut,
+    AnalyticsExportJobIn,
+    AnalyticsExportJobOut,
     AnalyticsPublicDashboardOut,
     AnalyticsPublicOut,
+    AnalyticsRepairIn,
+    AnalyticsRepairOut,
     AnalyticsStateOut,
-    PartnerStatOut,
-    RatingTrendPointOut,
-    RivalStatOut,
-    RollingWinRatePointOut,
-    StreakPointOut,
-    VolumePointOut,
+    OrganizerActivityOut,
+    PartnershipLeaderboardOut,
+    PartnershipLeaderboardRowOut,
+    RivalryLeaderboardOut,
+    RivalryLeaderboardRowOut,
 )
 
 router = APIRouter()
 
 _VALID_LADDERS = {"HM", "WM", "MX"}
-_VALID_TREND_INTERVALS = {"match", "week", "month"}
+_VALID_TREND_INTERVALS = set(DASHBOARD_TREND_INTERVALS)
+_VALID_TREND_MODES = set(DASHBOARD_TREND_MODES)
+_ACTIVITY_MAX_RANGE_DAYS = 731
+_ORGANIZER_MAX_WEEKS = 104
+_PUBLIC_DASHBOARD_LIST = TypeAdapter(list[AnalyticsPublicDashboardOut])
 
 
 def _normalize_ladder(ladder: str | None) -> str | None:
@@ -51,6 +93,29 @@ def _normalize_trend_interval(interval: str | None) -> str:
     return out
 
 
+def _normalize_trend_mode(mode: str | None, interval: str) -> str:
+    if mode is None:
+        return "recent"
+    out = mode.strip().lower()
+    if out not in _VALID_TREND_MODES:
+        raise HTTPException(400, "trend_mode debe ser recent|full")
+    if out == "full" and interval != "match":
+        raise HTTPException(400, "trend_mode=full solo admite trend_interval=match")
+    return out
+
+
+def _normalize_vs_threshold(value: int | None) -> int | None:
+    """None si se usa el umbral con que se materializo user_analytics_state."""
+    if value is None:
+        return None
+    if value % RATING_DIFF_BUCKET_WIDTH != 0 or not RATING_DIFF_BUCKET_WIDTH <= value <= RATING_DIFF_MAX:
+        raise HTTPException(
+            400,
+            f"vs_threshold debe ser multiplo de {RATING_DIFF_BUCKET_WIDTH} entre {RATING_DIFF_BUCKET_WIDTH} y {RATING_DIFF_MAX}",
+        )
+    return None if value == RIVAL_BUCKET_DELTA else value
+
+
 def _to_float(value: object | None) -> float:
     return float(value or 0.0)
 
@@ -63,13 +128,36 @@ def _recent_form(bits: int, size: int, max_items: int = 20) -> list[str]:
     return out
 
 
-def _query_states(db: Session, user_id: str, ladder: str | None):
+def _query_states(db: Session, user_id: str, ladder: str | None, dashboard_interval: str | None = None):
     where = ["s.user_id=:u"]
-    params: dict[str, object] = {"u": user_id}
+    # Ventanas de actividad frescas a la fecha de lectura (N dias UTC incluyendo hoy).
+    today = now_utc().date()
+    params: dict[str, object] = {
+        "u": user_id,
+        **{f"since_{days}d": today - timedelta(days=days - 1) for days in ACTIVITY_WINDOWS_DAYS},
+    }
     if ladder is not None:
         where.append("s.ladder_code=:ladder")
         params["ladder"] = ladder
 
+    # Con dashboard_interval el snapshot y los alias de partners/rivals llegan en la misma lectura.
+    snapshot_cols = ""
+    snapshot_join = ""
+    if dashboard_interval is not None:
+        snapshot_cols = """,
+            d.payload AS dashboard_payload,
+            (
+                SELECT jsonb_object_agg(p.user_id::text, p.alias)
+                FROM user_profiles p
+                WHERE p.user_id = ANY(d.related_user_ids)
+            ) AS dashboard_aliases"""
+        snapshot_join = """
+        LEFT JOIN user_analytics_dashboard_snapshots d
+          ON d.user_id = s.user_id
+         AND d.ladder_code = s.ladder_code
+         AND d.trend_interval = :dashboard_interval"""
+        params["dashboard_interval"] = dashboard_interval
+
     return db.execute(sa.text(f"""
         SELECT
             s.user_id::text as user_id,
@@ -90,9 +178,9 @@ def _query_states(db: Session, user_id: str, ladder: str | None):
             s.rolling_5_win_rate,
             s.rolling_20_win_rate,
             s.rolling_50_win_rate,
-            s.matches_7d,
-            s.matches_30d,
-            s.matches_90d,
+            w.matches_7d,
+            w.matches_30d,
+            w.matches_90d,
             s.close_matches,
             s.close_match_rate,
             s.vs_stronger_matches,
@@ -107,13 +195,34 @@ def _query_states(db: Session, user_id: str, ladder: str | None):
             s.current_rating,
             s.peak_rating,
             s.last_match_at,
-            s.updated_at
+            s.updated_at{snapshot_cols}
         FROM user_analytics_state s
+        CROSS JOIN LATERAL (
+            SELECT
+                COALESCE(SUM(a.matches) FILTER (WHERE a.activity_date >= :since_7d), 0)::int AS matches_7d,
+                COALESCE(SUM(a.matches) FILTER (WHERE a.activity_date >= :since_30d), 0)::int AS matches_30d,
+                COALESCE(SUM(a.matches), 0)::int AS matches_90d
+            FROM user_analytics_daily_activity a
+            WHERE a.user_id = s.user_id
+              AND a.ladder_code = s.ladder_code
+              AND a.activity_date >= :since_90d
+        ) w{snapshot_join}
         WHERE {" AND ".join(where)}
         ORDER BY s.ladder_code
     """), params).mappings().all()
 
 
+def _with_vs_threshold(db: Session, rows, *, user_id: str, ladder_code: str | None, threshold: int | None):
+    # Sustituye los vs_* materializados por el reparto del histograma de diferencias de rating.
+    if threshold is None:
+        return rows
+    splits = query_opponent_strength(db, user_id=user_id, ladder_code=ladder_code, threshold=threshold)
+    return [
+        {**r, **splits[r["ladder_code"]], "vs_threshold": threshold} if r["ladder_code"] in splits else r
+        for r in rows
+    ]
+
+
 def _state_common_kwargs(r: dict[str, object]) -> dict[str, object]:
     return {
         "user_id": r["user_id"],
@@ -145,6 +254,7 @@ def _state_common_kwargs(r: dict[str, object]) -> dict[str, object]:
         "vs_weaker_matches": int(r["vs_weaker_matches"] or 0),
         "vs_weaker_wins": int(r["vs_weaker_wins"] or 0),
         "vs_weaker_win_rate": _to_float(r["vs_weaker_win_rate"]),
+        "vs_threshold": int(r.get("vs_threshold") or RIVAL_BUCKET_DELTA),
         "current_rating": int(r["current_rating"]) if r["current_rating"] is not None else None,
         "last_match_at": r["last_match_at"],
     }
@@ -164,310 +274,6 @@ def _public_state_out(r: dict[str, object]) -> AnalyticsPublicOut:
     return AnalyticsPublicOut(**payload)
 
 
-def _trend_bucket_expr(interval: str) -> str:
-    if interval == "week":
-        return "date_trunc('week', played_at)"
-    if interval == "month":
-        return "date_trunc('month', played_at)"
-    raise ValueError("interval debe ser week|month")
-
-
-def _query_rating_trend(
-    db: Session,
-    *,
-    user_id: str,
-    ladder_code: str,
-    trend_interval: str,
-    points: int,
-) -> list[RatingTrendPointOut]:
-    params = {"u": user_id, "l": ladder_code, "limit": points}
-    if trend_interval == "match":
-        rows = db.execute(sa.text("""
-            SELECT
-                t.match_id::text AS match_id,
-                t.played_at AS at,
-                t.rating_after AS rating
-            FROM (
-                SELECT match_id, played_at, rating_after
-                FROM user_analytics_match_applied
-                WHERE user_id=:u
-                  AND ladder_code=:l
-                  AND rating_after IS NOT NULL
-                ORDER BY played_at DESC, match_id DESC
-                LIMIT :limit
-            ) t
-            ORDER BY t.played_at ASC, t.match_id ASC
-        """), params).mappings().all()
-        return [
-            RatingTrendPointOut(
-                at=r["at"],
-                rating=int(r["rating"]) if r["rating"] is not None else None,
-                match_id=r["match_id"],
-            )
-            for r in rows
-        ]
-
-    bucket_expr = _trend_bucket_expr(trend_interval)
-    rows = db.execute(sa.text(f"""
-        WITH bucketed AS (
-            SELECT
-                {bucket_expr} AS bucket_start,
-                played_at,
-                rating_after
-            FROM user_analytics_match_applied
-            WHERE user_id=:u
-              AND ladder_code=:l
-              AND rating_after IS NOT NULL
-        ),
-        latest AS (
-            SELECT DISTINCT ON (bucket_start)
-                bucket_start,
-                played_at,
-                rating_after
-            FROM bucketed
-            ORDER BY bucket_start DESC, played_at DESC
-        ),
-        limited AS (
-            SELECT bucket_start, rating_after
-            FROM latest
-            ORDER BY bucket_start DESC
-            LIMIT :limit
-        )
-        SELECT
-            bucket_start AS at,
-            rating_after AS rating
-        FROM limited
-        ORDER BY at ASC
-    """), params).mappings().all()
-    return [
-        RatingTrendPointOut(
-            at=r["at"],
-            rating=int(r["rating"]) if r["rating"] is not None else None,
-            match_id=None,
-        )
-        for r in rows
-    ]
-
-
-def _query_rolling_win_rate(
-    db: Session,
-    *,
-    user_id: str,
-    ladder_code: str,
-    trend_interval: str,
-    points: int,
-) -> list[RollingWinRatePointOut]:
-    params = {"u": user_id, "l": ladder_code, "limit": points}
-    if trend_interval == "match":
-        rows = db.execute(sa.text("""
-            SELECT
-                t.played_at AS at,
-                t.rolling_10_win_rate,
-                t.rolling_20_win_rate,
-                t.rolling_50_win_rate
-            FROM (
-                SELECT played_at, rolling_10_win_rate, rolling_20_win_rate, rolling_50_win_rate, match_id
-                FROM user_analytics_match_applied
-                WHERE user_id=:u
-                  AND ladder_code=:l
-                ORDER BY played_at DESC, match_id DESC
-                LIMIT :limit
-            ) t
-            ORDER BY t.played_at ASC
-        """), params).mappings().all()
-    else:
-        bucket_expr = _trend_bucket_expr(trend_interval)
-        rows = db.execute(sa.text(f"""
-            WITH bucketed AS (
-                SELECT
-                    {bucket_expr} AS bucket_start,
-                    played_at,
-                    rolling_10_win_rate,
-                    rolling_20_win_rate,
-                    rolling_50_win_rate
-                FROM user_analytics_match_applied
-                WHERE user_id=:u
-                  AND ladder_code=:l
-            ),
-            latest AS (
-                SELECT DISTINCT ON (bucket_start)
-                    bucket_start,
-                    played_at,
-                    rolling_10_win_rate,
-                    rolling_20_win_rate,
-                    rolling_50_win_rate
-                FROM bucketed
-                ORDER BY bucket_start DESC, played_at DESC
-            ),
-            limited AS (
-                SELECT bucket_start, rolling_10_win_rate, rolling_20_win_rate, rolling_50_win_rate
-                FROM latest
-                ORDER BY bucket_start DESC
-                LIMIT :limit
-            )
-            SELECT
-                bucket_start AS at,
-                rolling_10_win_rate,
-                rolling_20_win_rate,
-                rolling_50_win_rate
-            FROM limited
-            ORDER BY at ASC
-        """), params).mappings().all()
-    return [
-        RollingWinRatePointOut(
-            at=r["at"],
-            rolling_10_win_rate=_to_float(r["rolling_10_win_rate"]) if r["rolling_10_win_rate"] is not None else None,
-            rolling_20_win_rate=_to_float(r["rolling_20_win_rate"]) if r["rolling_20_win_rate"] is not None else None,
-            rolling_50_win_rate=_to_float(r["rolling_50_win_rate"]) if r["rolling_50_win_rate"] is not None else None,
-        )
-        for r in rows
-    ]
-
-
-def _query_volume(
-    db: Session,
-    *,
-    user_id: str,
-    ladder_code: str,
-    bucket: str,
-    points: int,
-) -> list[VolumePointOut]:
-    bucket_expr = _trend_bucket_expr(bucket)
-    rows = db.execute(sa.text(f"""
-        WITH grouped AS (
-            SELECT
-                {bucket_expr} AS bucket_start,
-                COUNT(*)::int AS matches
-            FROM user_analytics_match_applied
-            WHERE user_id=:u
-              AND ladder_code=:l
-            GROUP BY bucket_start
-        ),
-        limited AS (
-            SELECT bucket_start, matches
-            FROM grouped
-            ORDER BY bucket_start DESC
-            LIMIT :limit
-        )
-        SELECT
-            bucket_start AS at,
-            matches
-        FROM limited
-        ORDER BY at ASC
-    """), {"u": user_id, "l": ladder_code, "limit": points}).mappings().all()
-    return [VolumePointOut(at=r["at"], matches=int(r["matches"] or 0)) for r in rows]
-
-
-def _query_streak_timeline(
-    db: Session,
-    *,
-    user_id: str,
-    ladder_code: str,
-    points: int,
-) -> list[StreakPointOut]:
-    rows = db.execute(sa.text("""
-        SELECT
-            t.match_id::text AS match_id,
-            t.played_at AS at,
-            t.streak_type_after AS streak_type,
-            t.streak_len_after AS streak_len
-        FROM (
-            SELECT match_id, played_at, streak_type_after, streak_len_after
-            FROM user_analytics_match_applied
-            WHERE user_id=:u
-              AND ladder_code=:l
-              AND streak_type_after IS NOT NULL
-              AND streak_len_after IS NOT NULL
-            ORDER BY played_at DESC, match_id DESC
-            LIMIT :limit
-        ) t
-        ORDER BY t.played_at ASC, t.match_id ASC
-    """), {"u": user_id, "l": ladder_code, "limit": points}).mappings().all()
-    return [
-        StreakPointOut(
-            at=r["at"],
-            match_id=r["match_id"],
-            streak_type=r["streak_type"],
-            streak_len=int(r["streak_len"] or 0),
-        )
-        for r in rows
-    ]
-
-
-def _query_top_partners(
-    db: Session,
-    *,
-    user_id: str,
-    ladder_code: str,
-    top_n: int,
-) -> list[PartnerStatOut]:
-    rows = db.execute(sa.text("""
-        SELECT
-            s.partner_user_id::text AS partner_user_id,
-            p.alias AS partner_alias,
-            s.matches,
-            s.wins,
-            s.losses,
-            s.win_rate,
-            s.last_played_at
-        FROM user_analytics_partner_stats s
-        LEFT JOIN user_profiles p ON p.user_id = s.partner_user_id
-        WHERE s.user_id=:u
-          AND s.ladder_code=:l
-        ORDER BY s.matches DESC, s.win_rate DESC, s.partner_user_id
-        LIMIT :limit
-    """), {"u": user_id, "l": ladder_code, "limit": top_n}).mappings().all()
-    return [
-        PartnerStatOut(
-            partner_user_id=r["partner_user_id"],
-            partner_alias=r["partner_alias"],
-            matches=int(r["matches"] or 0),
-            wins=int(r["wins"] or 0),
-            losses=int(r["losses"] or 0),
-            win_rate=_to_float(r["win_rate"]),
-            last_played_at=r["last_played_at"],
-        )
-        for r in rows
-    ]
-
-
-def _query_top_rivals(
-    db: Session,
-    *,
-    user_id: str,
-    ladder_code: str,
-    top_n: int,
-) -> list[RivalStatOut]:
-    rows = db.execute(sa.text("""
-        SELECT
-            s.rival_user_id::text AS rival_user_id,
-            p.alias AS rival_alias,
-            s.matches,
-            s.wins,
-            s.losses,
-            s.win_rate,
-            s.last_played_at
-        FROM user_analytics_rival_stats s
-        LEFT JOIN user_profiles p ON p.user_id = s.rival_user_id
-        WHERE s.user_id=:u
-          AND s.ladder_code=:l
-        ORDER BY s.matches DESC, s.win_rate DESC, s.rival_user_id
-        LIMIT :limit
-    """), {"u": user_id, "l": ladder_code, "limit": top_n}).mappings().all()
-    return [
-        RivalStatOut(
-            rival_user_id=r["rival_user_id"],
-            rival_alias=r["rival_alias"],
-            matches=int(r["matches"] or 0),
-            wins=int(r["wins"] or 0),
-            losses=int(r["losses"] or 0),
-            win_rate=_to_float(r["win_rate"]),
-            last_played_at=r["last_played_at"],
-        )
-        for r in rows
-    ]
-
-
 def _ensure_target_visible(db: Session, *, current_user_id: str, target_user_id: str):
     if current_user_id == target_user_id:
         return
@@ -494,62 +300,83 @@ def _dashboard_payload(
 ) -> dict[str, object]:
     return {
         "state": state,
-        "rating_trend": _query_rating_trend(
-            db,
-            user_id=user_id,
-            ladder_code=ladder_code,
-            trend_interval=trend_interval,
-            points=points,
-        ),
-        "rolling_win_rate_trend": _query_rolling_win_rate(
+        **query_dashboard_series(
             db,
             user_id=user_id,
             ladder_code=ladder_code,
             trend_interval=trend_interval,
             points=points,
+            top_n=top_n,
         ),
-        "volume_weekly": _query_volume(
-            db,
-            user_id=user_id,
-            ladder_code=ladder_code,
-            bucket="week",
-            points=points,
-        ),
-        "volume_monthly": _query_volume(
+    }
+
+
+def _with_full_trends(db: Session, payload: dict[str, object], *, user_id: str, row, points: int) -> dict[str, object]:
+    # El resto de series sigue saliendo del snapshot; solo las tendencias cubren todo el historial.
+    return {
+        **payload,
+        **query_full_trends(
             db,
             user_id=user_id,
-            ladder_code=ladder_code,
-            bucket="month",
+            ladder_code=str(row["ladder_code"]),
             points=points,
+            state_updated_at=row["updated_at"],
         ),
-        "streak_timeline": _query_streak_timeline(
+    }
+
+
+def _dashboard_rows_payloads(
+    db: Session,
+    *,
+    user_id: str,
+    rows,
+    states: list[AnalyticsStateOut] | list[AnalyticsPublicOut],
+    trend_interval: str,
+    trend_mode: str,
+    points: int,
+    top_n: int,
+) -> list[dict[str, object]]:
+    out: list[dict[str, object]] = []
+    for r, state in zip(rows, states):
+        if r["dashboard_payload"] is not None:
+            out.append({
+                "state": state,
+                **dashboard_series_from_snapshot(
+                    r["dashboard_payload"],
+                    r["dashboard_aliases"],
+                    points=points,
+                    top_n=top_n,
+                ),
+            })
+            continue
+        # Fallback de solo lectura: snapshot en cola (partido recien verificado, rebuild o
+        # reparacion). Lo reconstruye scripts/refresh_dashboard_snapshots.py, no la lectura.
+        out.append(_dashboard_payload(
             db,
             user_id=user_id,
-            ladder_code=ladder_code,
+            ladder_code=str(r["ladder_code"]),
+            state=state,
+            trend_interval=trend_interval,
             points=points,
-        ),
-        "top_partners": _query_top_partners(
-            db,
-            user_id=user_id,
-            ladder_code=ladder_code,
-            top_n=top_n,
-        ),
-        "top_rivals": _query_top_rivals(
-            db,
-            user_id=user_id,
-            ladder_code=ladder_code,
             top_n=top_n,
-        ),
-    }
+        ))
+
+    if trend_mode == "full":
+        out = [_with_full_trends(db, p, user_id=user_id, row=r, points=points) for r, p in zip(rows, out)]
+    return out
 
 
 @router.get("/me", response_model=list[AnalyticsStateOut])
 def analytics_me(
     ladder: str | None = Query(default=None, description="HM|WM|MX"),
+    vs_threshold: int | None = Query(default=None, description="Umbral de rating para vs_stronger/similar/weaker (multiplo de 5)"),
     current=Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    rows = _query_states(db, str(current.id), _normalize_ladder(ladder))
+    threshold = _normalize_vs_threshold(vs_threshold)
+    ladder_code = _normalize_ladder(ladder)
+    rows = _query_states(db, str(current.id), ladder_code)
+    rows = _with_vs_threshold(db, rows, user_id=str(current.id), ladder_code=ladder_code, threshold=threshold)
     return [_private_state_out(r) for r in rows]
 
 
@@ -557,32 +384,37 @@ def analytics_me(
 def analytics_me_dashboard(
     ladder: str | None = Query(default=None, description="HM|WM|MX"),
     trend_interval: str = Query(default="match", description="match|week|month"),
+    trend_mode: str = Query(default="recent", description="recent|full (historial completo reducido con LTTB)"),
     points: int = Query(default=50, ge=5, le=200),
     top_n: int = Query(default=5, ge=1, le=20),
+    vs_threshold: int | None = Query(default=None, description="Umbral de rating para vs_stronger/similar/weaker (multiplo de 5)"),
     current=Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    rows = _query_states(db, str(current.id), _normalize_ladder(ladder))
     interval = _normalize_trend_interval(trend_interval)
-    out: list[AnalyticsDashboardOut] = []
-    for r in rows:
-        state = _private_state_out(r)
-        out.append(AnalyticsDashboardOut(**_dashboard_payload(
-            db,
-            user_id=str(current.id),
-            ladder_code=str(r["ladder_code"]),
-            state=state,
-            trend_interval=interval,
-            points=points,
-            top_n=top_n,
-        )))
-    return out
+    mode = _normalize_trend_mode(trend_mode, interval)
+    threshold = _normalize_vs_threshold(vs_threshold)
+    ladder_code = _normalize_ladder(ladder)
+    rows = _query_states(db, str(current.id), ladder_code, dashboard_interval=interval)
+    rows = _with_vs_threshold(db, rows, user_id=str(current.id), ladder_code=ladder_code, threshold=threshold)
+    payloads = _dashboard_rows_payloads(
+        db,
+        user_id=str(current.id),
+        rows=rows,
+        states=[_private_state_out(r) for r in rows],
+        trend_interval=interval,
+        trend_mode=mode,
+        points=points,
+        top_n=top_n,
+    )
+    return [AnalyticsDashboardOut(**p) for p in payloads]
 
 
 @router.get("/me/export")
 def analytics_me_export(
     ladder: str = Query(..., description="HM|WM|MX"),
     trend_interval: str = Query(default="match", description="match|week|month"),
+    trend_mode: str = Query(default="recent", description="recent|full (historial completo reducido con LTTB)"),
     points: int = Query(default=100, ge=5, le=500),
     top_n: int = Query(default=10, ge=1, le=50),
     current=Depends(get_current_user),
@@ -598,6 +430,7 @@ def analytics_me_export(
         raise HTTPException(404, "No hay analitica disponible para exportar")
 
     interval = _normalize_trend_interval(trend_interval)
+    mode = _normalize_trend_mode(trend_mode, interval)
     row = rows[0]
     state = _private_state_out(row)
     payload = _dashboard_payload(
@@ -609,6 +442,8 @@ def analytics_me_export(
         points=points,
         top_n=top_n,
     )
+    if mode == "full":
+        payload = _with_full_trends(db, payload, user_id=str(current.id), row=row, points=points)
     return {
         "exported_at": now_utc().isoformat(),
         "plan_code": contract.current.plan_code,
@@ -617,45 +452,456 @@ def analytics_me_export(
     }
 
 
+def _ensure_export_plan(db: Session, user_id: str) -> None:
+    contract = get_user_contract(db, user_id)
+    if contract.current.plan_code != "RIVIO_PLUS":
+        raise HTTPException(403, "Export disponible solo para Rivio+")
+
+
+def _export_job_out(r) -> AnalyticsExportJobOut:
+    return AnalyticsExportJobOut(
+        id=r["id"],
+        ladder_code=r["ladder_code"],
+        format=r["format"],
+        status=r["status"],
+        requested_at=r["requested_at"],
+        started_at=r["started_at"],
+        finished_at=r["finished_at"],
+        expires_at=r["expires_at"],
+        size_bytes=int(r["size_bytes"]) if r["size_bytes"] is not None else None,
+        row_counts=r["row_counts"],
+        error=r["error"],
+        download_url=f"/analytics/me/exports/{r['id']}/download" if r["status"] == "done" else None,
+    )
+
+
+def _get_export_job(db: Session, user_id: str, job_id: str):
+    try:
+        job_id_norm = str(UUID(job_id))
+    except Exception:
+        raise HTTPException(400, "job_id invalido")
+    row = db.execute(sa.text("""
+        SELECT id::text AS id, ladder_code, format, status, requested_at, started_at, finished_at,
+               expires_at, storage_key, size_bytes, row_counts, error
+        FROM analytics_export_jobs
+        WHERE id=:id
+          AND user_id=:u
+    """), {"id": job_id_norm, "u": user_id}).mappings().first()
+    if not row:
+        raise HTTPException(404, "Export no encontrado")
+    return row
+
+
+@router.post("/me/exports", response_model=AnalyticsExportJobOut, status_code=202)
+def analytics_me_export_job_create(
+    payload: AnalyticsExportJobIn,
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    user_id = str(current.id)
+    _ensure_export_plan(db, user_id)
+    ladder_code = _normalize_ladder(payload.ladder)
+    fmt = payload.format.strip().lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(400, "format debe ser csv|parquet")
+    if fmt == "parquet" and not parquet_available():
+        raise HTTPException(400, "Formato parquet no disponible en este servidor")
+
+    # Serializa las altas del mismo usuario para que el limite de jobs activos sea exacto.
+    db.execute(sa.text("SELECT pg_advisory_xact_lock(hashtextextended(:k, 0))"), {"k": f"analytics_export:{user_id}"})
+    active = db.execute(sa.text("""
+        SELECT count(*)
+        FROM analytics_export_jobs
+        WHERE user_id=:u
+          AND status IN ('queued','running')
+    """), {"u": user_id}).scalar_one()
+    if active >= settings.ANALYTICS_EXPORT_MAX_ACTIVE_JOBS:
+        raise HTTPException(429, "Ya tienes exports en curso, espera a que terminen")
+
+    row = db.execute(sa.text("""
+        INSERT INTO analytics_export_jobs (user_id, ladder_code, format)
+        VALUES (:u, :l, :f)
+        RETURNING id::text AS id, ladder_code, format, status, requested_at, started_at, finished_at,
+                  expires_at, storage_key, size_bytes, row_counts, error
+    """), {"u": user_id, "l": ladder_code, "f": fmt}).mappings().one()
+    db.commit()
+    return _export_job_out(row)
+
+
+@router.get("/me/exports/{job_id}", response_model=AnalyticsExportJobOut)
+def analytics_me_export_job_status(
+    job_id: str,
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    return _export_job_out(_get_export_job(db, str(current.id), job_id))
+
+
+@router.get("/me/exports/{job_id}/download")
+def analytics_me_export_job_download(
+    job_id: str,
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    row = _get_export_job(db, str(current.id), job_id)
+    if row["status"] == "expired":
+        raise HTTPException(410, "El export expiro, solicita uno nuevo")
+    if row["status"] != "done" or not row["storage_key"]:
+        raise HTTPException(409, "El export aun no esta listo")
+    storage = get_export_storage()
+    if not storage.exists(row["storage_key"]):
+        raise HTTPException(410, "El export expiro, solicita uno nuevo")
+    # FileResponse atiende Range/If-Range; la sesion de DB se cierra antes de enviar el archivo.
+    return FileResponse(
+        storage.path(row["storage_key"]),
+        media_type="application/zip",
+        filename=f"rivio_analytics_{row['ladder_code']}_{row['format']}_{row['id']}.zip",
+    )
+
+
+def _activity_out(
+    db: Session,
+    *,
+    user_id: str,
+    ladder: str,
+    date_from: date | None,
+    date_to: date | None,
+    bucket: str | None,
+) -> AnalyticsActivityOut:
+    ladder_code = _normalize_ladder(ladder)
+    date_to = date_to or now_utc().date()
+    date_from = date_from or (date_to - timedelta(days=89))
+    if date_from > date_to:
+        raise HTTPException(400, "from debe ser anterior o igual a to")
+    if (date_to - date_from).days >= _ACTIVITY_MAX_RANGE_DAYS:
+        raise HTTPException(400, f"El rango maximo es de {_ACTIVITY_MAX_RANGE_DAYS} dias")
+    bucket_norm = None
+    if bucket is not None:
+        bucket_norm = bucket.strip().lower()
+        if bucket_norm not in ("day", "week", "month"):
+            raise HTTPException(400, "bucket debe ser day|week|month")
+
+    out = query_activity_range(
+        db,
+        user_id=user_id,
+        ladder_code=ladder_code,
+        date_from=date_from,
+        date_to=date_to,
+        bucket=bucket_norm,
+    )
+    return AnalyticsActivityOut(user_id=user_id, ladder_code=ladder_code, date_from=date_from, date_to=date_to, **out)
+
+
+@router.get("/me/activity", response_model=AnalyticsActivityOut)
+def analytics_me_activity(
+    ladder: str = Query(..., description="HM|WM|MX"),
+    date_from: date | None = Query(default=None, alias="from", description="Dia UTC inicial (por defecto, to - 89 dias)"),
+    date_to: date | None = Query(default=None, alias="to", description="Dia UTC final (por defecto, hoy)"),
+    bucket: str | None = Query(default=None, description="day|week|month"),
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    return _activity_out(db, user_id=str(current.id), ladder=ladder, date_from=date_from, date_to=date_to, bucket=bucket)
+
+
 @router.get("/users/{user_id}", response_model=list[AnalyticsPublicOut])
 def analytics_user_public(
     user_id: str,
     ladder: str | None = Query(default=None, description="HM|WM|MX"),
+    vs_threshold: int | None = Query(default=None, description="Umbral de rating para vs_stronger/similar/weaker (multiplo de 5)"),
     current=Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     target_user_id = _normalize_user_id(user_id)
     _ensure_target_visible(db, current_user_id=str(current.id), target_user_id=target_user_id)
 
-    rows = _query_states(db, target_user_id, _normalize_ladder(ladder))
+    threshold = _normalize_vs_threshold(vs_threshold)
+    ladder_code = _normalize_ladder(ladder)
+    rows = _query_states(db, target_user_id, ladder_code)
+    rows = _with_vs_threshold(db, rows, user_id=target_user_id, ladder_code=ladder_code, threshold=threshold)
     return [_public_state_out(r) for r in rows]
 
 
+def _public_dashboard_out(
+    db: Session,
+    user_id: str,
+    ladder_code: str | None,
+    trend_interval: str,
+    trend_mode: str,
+    points: int,
+    top_n: int,
+) -> tuple[list[AnalyticsPublicDashboardOut], datetime | None]:
+    """Dashboards publicos y max(updated_at) de los estados leidos (version para el cache)."""
+    rows = _query_states(db, user_id, ladder_code, dashboard_interval=trend_interval)
+    payloads = _dashboard_rows_payloads(
+        db,
+        user_id=user_id,
+        rows=rows,
+        states=[_public_state_out(r) for r in rows],
+        trend_interval=trend_interval,
+        trend_mode=trend_mode,
+        points=points,
+        top_n=top_n,
+    )
+    state_version = max((r["updated_at"] for r in rows), default=None)
+    return [AnalyticsPublicDashboardOut(**p) for p in payloads], state_version
+
+
 @router.get("/users/{user_id}/dashboard", response_model=list[AnalyticsPublicDashboardOut])
 def analytics_user_dashboard_public(
     user_id: str,
     ladder: str | None = Query(default=None, description="HM|WM|MX"),
     trend_interval: str = Query(default="match", description="match|week|month"),
+    trend_mode: str = Query(default="recent", description="recent|full (historial completo reducido con LTTB)"),
     points: int = Query(default=50, ge=5, le=200),
     top_n: int = Query(default=5, ge=1, le=20),
     current=Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     target_user_id = _normalize_user_id(user_id)
-    _ensure_target_visible(db, current_user_id=str(current.id), target_user_id=target_user_id)
-
-    rows = _query_states(db, target_user_id, _normalize_ladder(ladder))
     interval = _normalize_trend_interval(trend_interval)
-    out: list[AnalyticsPublicDashboardOut] = []
-    for r in rows:
-        state = _public_state_out(r)
-        out.append(AnalyticsPublicDashboardOut(**_dashboard_payload(
+    mode = _normalize_trend_mode(trend_mode, interval)
+    ladder_code = _normalize_ladder(ladder)
+    if not public_dashboard_cache_enabled():
+        _ensure_target_visible(db, current_user_id=str(current.id), target_user_id=target_user_id)
+        return _public_dashboard_out(db, target_user_id, ladder_code, interval, mode, points, top_n)[0]
+
+    key = PublicDashboardKey(
+        user_id=target_user_id,
+        ladder_scope=ladder_code or PUBLIC_DASHBOARD_ALL_LADDERS,
+        trend_interval=interval,
+        trend_mode=mode,
+        points=points,
+        top_n=top_n,
+    )
+    is_public, cached = lookup_public_dashboard(db, key)
+    if is_public is None:
+        raise HTTPException(404, "Usuario no encontrado")
+    if not is_public and str(current.id) != target_user_id:
+        raise HTTPException(404, "Analitica no disponible")
+    if cached is not None:
+        cache_stats.record(PUBLIC_DASHBOARD_CACHE, hit=True)
+        # Ya serializado con el mismo response_model (alias resueltos al leer): sin revalidar.
+        return JSONResponse(content=cached)
+
+    out, state_version = _public_dashboard_out(db, target_user_id, ladder_code, interval, mode, points, top_n)
+    if is_public:
+        cache_stats.record(PUBLIC_DASHBOARD_CACHE, hit=False)
+        store_public_dashboard(
             db,
-            user_id=target_user_id,
-            ladder_code=str(r["ladder_code"]),
-            state=state,
-            trend_interval=interval,
-            points=points,
-            top_n=top_n,
-        )))
+            key,
+            state_version=state_version,
+            payload=_PUBLIC_DASHBOARD_LIST.dump_python(out, mode="json"),
+        )
+        db.commit()
     return out
+
+
+@router.get("/users/{user_id}/activity", response_model=AnalyticsActivityOut)
+def analytics_user_activity_public(
+    user_id: str,
+    ladder: str = Query(..., description="HM|WM|MX"),
+    date_from: date | None = Query(default=None, alias="from", description="Dia UTC inicial (por defecto, to - 89 dias)"),
+    date_to: date | None = Query(default=None, alias="to", description="Dia UTC final (por defecto, hoy)"),
+    bucket: str | None = Query(default=None, description="day|week|month"),
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    target_user_id = _normalize_user_id(user_id)
+    _ensure_target_visible(db, current_user_id=str(current.id), target_user_id=target_user_id)
+    return _activity_out(db, user_id=target_user_id, ladder=ladder, date_from=date_from, date_to=date_to, bucket=bucket)
+
+
+def _pair_leaderboard_rows(db: Session, *, relation: str, ladder_code: str, order_by: str, min_matches: int, limit: int):
+    # Range scan sobre el indice parcial de la relacion; solo parejas con ambos perfiles publicos.
+    return db.execute(sa.text(f"""
+        SELECT lb.user_low_id::text AS user_a_id,
+               pa.alias AS user_a_alias,
+               lb.user_high_id::text AS user_b_id,
+               pb.alias AS user_b_alias,
+               lb.matches,
+               lb.wins,
+               lb.losses,
+               lb.win_rate,
+               lb.last_played_at
+        FROM analytics_pair_leaderboard lb
+        JOIN user_profiles pa ON pa.user_id = lb.user_low_id
+        JOIN user_profiles pb ON pb.user_id = lb.user_high_id
+        WHERE lb.ladder_code=:l
+          AND lb.relation=:relation
+          AND lb.matches >= :min_matches
+          AND pa.is_public=true
+          AND pb.is_public=true
+        ORDER BY {order_by}
+        LIMIT :limit
+    """), {"l": ladder_code, "relation": relation, "min_matches": min_matches, "limit": limit}).mappings().all()
+
+
+@router.get("/leaderboards/{ladder_code}/partners", response_model=PartnershipLeaderboardOut)
+def analytics_partnership_leaderboard(
+    ladder_code: str,
+    min_matches: int = Query(default=5, ge=1, le=1000),
+    limit: int = Query(default=20, ge=1, le=100),
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    ladder_norm = _normalize_ladder(ladder_code)
+    rows = _pair_leaderboard_rows(
+        db,
+        relation="partner",
+        ladder_code=ladder_norm,
+        order_by="lb.win_rate DESC, lb.matches DESC, lb.user_low_id, lb.user_high_id",
+        min_matches=min_matches,
+        limit=limit,
+    )
+    return PartnershipLeaderboardOut(
+        ladder_code=ladder_norm,
+        min_matches=min_matches,
+        rows=[
+            PartnershipLeaderboardRowOut(
+                rank=i,
+                user_a_id=r["user_a_id"],
+                user_a_alias=r["user_a_alias"],
+                user_b_id=r["user_b_id"],
+                user_b_alias=r["user_b_alias"],
+                matches=int(r["matches"]),
+                wins=int(r["wins"]),
+                losses=int(r["losses"]),
+                win_rate=_to_float(r["win_rate"]),
+                last_played_at=r["last_played_at"],
+            )
+            for i, r in enumerate(rows, start=1)
+        ],
+    )
+
+
+@router.get("/leaderboards/{ladder_code}/rivalries", response_model=RivalryLeaderboardOut)
+def analytics_rivalry_leaderboard(
+    ladder_code: str,
+    limit: int = Query(default=20, ge=1, le=100),
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    ladder_norm = _normalize_ladder(ladder_code)
+    rows = _pair_leaderboard_rows(
+        db,
+        relation="rival",
+        ladder_code=ladder_norm,
+        order_by="lb.matches DESC, lb.user_low_id, lb.user_high_id",
+        min_matches=1,
+        limit=limit,
+    )
+    return RivalryLeaderboardOut(
+        ladder_code=ladder_norm,
+        rows=[
+            RivalryLeaderboardRowOut(
+                rank=i,
+                user_a_id=r["user_a_id"],
+                user_a_alias=r["user_a_alias"],
+                user_b_id=r["user_b_id"],
+                user_b_alias=r["user_b_alias"],
+                matches=int(r["matches"]),
+                user_a_wins=int(r["wins"]),
+                user_b_wins=int(r["losses"]),
+                last_played_at=r["last_played_at"],
+            )
+            for i, r in enumerate(rows, start=1)
+        ],
+    )
+
+
+def _organizer_activity_out(
+    db: Session,
+    *,
+    scope: str,
+    scope_id: str,
+    key: object,
+    name: str,
+    weeks: int,
+    date_to: date | None,
+) -> OrganizerActivityOut:
+    week_to = week_start(date_to or now_utc().date())
+    week_from = week_to - timedelta(weeks=weeks - 1)
+    out = query_organizer_activity(db, scope=scope, key=key, week_from=week_from, week_to=week_to)
+    return OrganizerActivityOut(scope=scope, scope_id=scope_id, name=name, week_from=week_from, week_to=week_to, **out)
+
+
+@router.get("/clubs/{club_id}/activity", response_model=OrganizerActivityOut)
+def analytics_club_activity(
+    club_id: str,
+    weeks: int = Query(default=12, ge=1, le=_ORGANIZER_MAX_WEEKS),
+    date_to: date | None = Query(default=None, alias="to", description="Dia UTC de la ultima semana (por defecto, hoy)"),
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    try:
+        club_uuid = str(UUID(club_id))
+    except Exception:
+        raise HTTPException(400, "club_id invalido")
+    club = db.execute(sa.text("SELECT name FROM clubs WHERE id=:c"), {"c": club_uuid}).mappings().first()
+    if not club:
+        raise HTTPException(404, "Club no encontrado")
+    return _organizer_activity_out(
+        db, scope="club", scope_id=club_uuid, key=club_uuid, name=club["name"], weeks=weeks, date_to=date_to
+    )
+
+
+@router.get("/cities/{city_id}/activity", response_model=OrganizerActivityOut)
+def analytics_city_activity(
+    city_id: int,
+    weeks: int = Query(default=12, ge=1, le=_ORGANIZER_MAX_WEEKS),
+    date_to: date | None = Query(default=None, alias="to", description="Dia UTC de la ultima semana (por defecto, hoy)"),
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    city = db.execute(sa.text("SELECT name FROM location_cities WHERE id=:c"), {"c": city_id}).mappings().first()
+    if not city:
+        raise HTTPException(404, "Ciudad no encontrada")
+    return _organizer_activity_out(
+        db, scope="city", scope_id=str(city_id), key=city_id, name=city["name"], weeks=weeks, date_to=date_to
+    )
+
+
+@router.post("/admin/repair", response_model=AnalyticsRepairOut, dependencies=[Depends(require_admin_token)])
+def analytics_admin_repair(payload: AnalyticsRepairIn, db: Session = Depends(get_db)):
+    ladder_code = _normalize_ladder(payload.ladder)
+    user_ids, since = resolve_repair_targets(
+        db,
+        [str(u) for u in payload.user_ids],
+        [str(m) for m in payload.match_ids],
+        payload.since,
+    )
+    if not user_ids:
+        raise HTTPException(404, "No hay jugadores para reparar")
+    if len(user_ids) > settings.ANALYTICS_REPAIR_MAX_USERS:
+        raise HTTPException(400, f"Maximo {settings.ANALYTICS_REPAIR_MAX_USERS} jugadores por reparacion")
+
+    stats = repair_analytics(db, user_ids, since=since, ladder_code=ladder_code)
+    db.commit()
+    return AnalyticsRepairOut(since=since, ladder_code=ladder_code, **stats)
+
+
+@router.get("/admin/cache-stats", response_model=list[AnalyticsCacheStatsOut], dependencies=[Depends(require_admin_token)])
+def analytics_admin_cache_stats(
+    days: int = Query(default=7, ge=1, le=90),
+    db: Session = Depends(get_db),
+):
+    # Solo vuelca los contadores de este worker; los demas llegan en su siguiente flush.
+    cache_stats.flush()
+    rows = db.execute(sa.text("""
+        SELECT cache_name, stat_date, hits, misses, updated_at
+        FROM analytics_cache_stats
+        WHERE stat_date >= :since
+        ORDER BY stat_date DESC, cache_name
+    """), {"since": now_utc().date() - timedelta(days=days - 1)}).mappings().all()
+    return [
+        AnalyticsCacheStatsOut(
+            cache_name=r["cache_name"],
+            stat_date=r["stat_date"],
+            hits=int(r["hits"]),
+            misses=int(r["misses"]),
+            hit_rate=round(int(r["hits"]) / (int(r["hits"]) + int(r["misses"])), 4) if (r["hits"] or r["misses"]) else 0.0,
+            updated_at=r["updated_at"],
+        )
+        for r in rows
+    ]
@@ -1,17 +1,30 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 import sqlalchemy as sa
 
 from app.db.session import get_db
-from app.schemas.config import ClubOut, LadderOut, CategoryOut
+from app.schemas.config import CityOut, ClubOut, LadderOut, CategoryOut
 
 router = APIRouter()
 
 @router.get("/clubs", response_model=list[ClubOut])
 def list_clubs(db: Session = Depends(get_db)):
-    rows = db.execute(sa.text("SELECT id::text as id, name, city, is_active FROM clubs WHERE is_active=true ORDER BY name")).mappings().all()
+    rows = db.execute(sa.text("SELECT id::text as id, name, city, country, city_id, is_active FROM clubs WHERE is_active=true ORDER BY name")).mappings().all()
     return [ClubOut(**r) for r in rows]
 
+@router.get("/cities", response_model=list[CityOut])
+def list_cities(country: str = Query(..., description="ISO-2 (ej: CO)"), db: Session = Depends(get_db)):
+    country_norm = country.strip().upper()
+    if len(country_norm) != 2:
+        raise HTTPException(400, "country debe ser ISO-2 (ej. CO)")
+    rows = db.execute(sa.text("""
+        SELECT id, country_code, name
+        FROM location_cities
+        WHERE country_code=:country
+        ORDER BY name
+    """), {"country": country_norm}).mappings().all()
+    return [CityOut(**r) for r in rows]
+
 @router.get("/ladders", response_model=list[LadderOut])
 def list_ladders(db: Session = Depends(get_db)):
     rows = db.execute(sa.text("SELECT code, name, is_active FROM ladders WHERE is_active=true ORDER BY code")).mappings().all()
@@ -1,51 +1,69 @@
 import base64
+import csv
 from datetime import date, datetime
+import io
 import json
-from typing import Literal
+from typing import Iterator, Literal
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 import sqlalchemy as sa
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_current_user
-from app.db.session import get_db
+from app.db.session import SessionLocal, get_db
 from app.schemas.history import (
+    HeadToHeadOut,
+    HeadToHeadRecordOut,
+    HistoryChangesOut,
+    HistoryFacetCountOut,
+    HistoryFacetsOut,
     HistoryMatchDetailOut,
     HistoryParticipantOut,
     HistoryScoreOut,
     HistoryTimelineItemOut,
     HistoryTimelineOut,
+    HistoryTombstoneOut,
 )
+from app.services.locations import resolve_city_ids_by_name
 
 router = APIRouter()
 
 _VALID_LADDERS = {"HM", "WM", "MX"}
-_EFFECTIVE_STATUS_SQL = """
+_EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+_EXPORT_BATCH_ROWS = 500
+
+
+def _effective_status_sql(alias: str) -> str:
+    return f"""
 CASE
-  WHEN m.status='pending_confirm' AND m.confirmation_deadline < now() THEN 'expired'
-  ELSE m.status
+  WHEN {alias}.status='pending_confirm' AND {alias}.confirmation_deadline < now() THEN 'expired'
+  ELSE {alias}.status
 END
 """
-_STATUS_REASON_SQL = f"""
-CASE
-  WHEN {_EFFECTIVE_STATUS_SQL}='verified' THEN 'confirmed_by_both_teams'
-  WHEN {_EFFECTIVE_STATUS_SQL}='pending_confirm' THEN 'awaiting_confirmations'
-  WHEN {_EFFECTIVE_STATUS_SQL}='expired' THEN 'confirmation_window_elapsed'
-  WHEN {_EFFECTIVE_STATUS_SQL}='disputed' THEN 'dispute_open'
-  WHEN {_EFFECTIVE_STATUS_SQL}='void' THEN 'voided'
+
+
+# Sobre t.status ya efectivo (calculado una vez por fila en la pagina del timeline).
+_STATUS_REASON_SQL = """
+CASE t.status
+  WHEN 'verified' THEN 'confirmed_by_both_teams'
+  WHEN 'pending_confirm' THEN 'awaiting_confirmations'
+  WHEN 'expired' THEN 'confirmation_window_elapsed'
+  WHEN 'disputed' THEN 'dispute_open'
+  WHEN 'void' THEN 'voided'
   ELSE 'unknown_status'
 END
 """
-_RANKING_IMPACT_SQL = f"(({_EFFECTIVE_STATUS_SQL}='verified') AND m.rank_processed_at IS NOT NULL)"
-_RANKING_IMPACT_REASON_SQL = f"""
+_RANKING_IMPACT_SQL = "(t.status='verified' AND m.rank_processed_at IS NOT NULL)"
+_RANKING_IMPACT_REASON_SQL = """
 CASE
-  WHEN {_EFFECTIVE_STATUS_SQL}='verified' AND m.rank_processed_at IS NOT NULL THEN 'verified_and_processed'
-  WHEN {_EFFECTIVE_STATUS_SQL}='verified' AND m.rank_processed_at IS NULL THEN 'verified_pending_processing'
-  WHEN {_EFFECTIVE_STATUS_SQL}='pending_confirm' THEN 'not_verified'
-  WHEN {_EFFECTIVE_STATUS_SQL}='expired' THEN 'expired_unconfirmed'
-  WHEN {_EFFECTIVE_STATUS_SQL}='disputed' THEN 'disputed_match'
-  WHEN {_EFFECTIVE_STATUS_SQL}='void' THEN 'void_match'
+  WHEN t.status='verified' AND m.rank_processed_at IS NOT NULL THEN 'verified_and_processed'
+  WHEN t.status='verified' AND m.rank_processed_at IS NULL THEN 'verified_pending_processing'
+  WHEN t.status='pending_confirm' THEN 'not_verified'
+  WHEN t.status='expired' THEN 'expired_unconfirmed'
+  WHEN t.status='disputed' THEN 'disputed_match'
+  WHEN t.status='void' THEN 'void_match'
   ELSE 'unknown'
 END
 """
@@ -73,6 +91,32 @@ def _decode_timeline_cursor(raw: str) -> tuple[datetime, str]:
         raise HTTPException(400, "cursor invalido")
 
 
+# Posicion (change_xid, match_id) del change feed: (xid, _NIL_MATCH_ID) = "todo lo de xid en adelante".
+_NIL_MATCH_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def _encode_sync_token(*, change_xid: int, match_id: str, at: datetime) -> str:
+    payload = {
+        "xid": change_xid,
+        "match_id": match_id,
+        "at": at.isoformat(),
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_sync_token(raw: str) -> tuple[int, str, datetime]:
+    try:
+        data = base64.urlsafe_b64decode(raw.encode("ascii"))
+        payload = json.loads(data.decode("utf-8"))
+        change_xid = int(payload["xid"])
+        match_id = str(UUID(payload["match_id"]))
+        at = datetime.fromisoformat(payload["at"])
+        return change_xid, match_id, at
+    except Exception:
+        raise HTTPException(400, "since invalido")
+
+
 def _normalize_uuid(raw: str, name: str) -> str:
     try:
         return str(UUID(raw))
@@ -80,6 +124,26 @@ def _normalize_uuid(raw: str, name: str) -> str:
         raise HTTPException(400, f"Valor invalido para {name}")
 
 
+def _resolve_pair_filter(
+    db: Session,
+    *,
+    partner_id: str | None,
+    rival_id: str | None,
+    is_public_view: bool,
+) -> tuple[str | None, Literal["partner", "rival"] | None]:
+    if partner_id is not None and rival_id is not None:
+        raise HTTPException(400, "usa partner_id o rival_id, no ambos")
+    if partner_id is None and rival_id is None:
+        return None, None
+    relation: Literal["partner", "rival"] = "partner" if partner_id is not None else "rival"
+    name = "partner_id" if partner_id is not None else "rival_id"
+    other_id = _normalize_uuid(partner_id or rival_id, name)
+    # En vista publica filtrar por un perfil privado revelaria con quien juega.
+    if is_public_view and not _load_profile_visibility(db, other_id):
+        raise HTTPException(404, "Usuario no encontrado")
+    return other_id, relation
+
+
 def _normalize_ladder(ladder: str | None) -> str | None:
     if ladder is None:
         return None
@@ -108,15 +172,18 @@ def _load_profile_visibility(db: Session, target_user_id: str) -> bool:
     return bool(row["is_public"])
 
 
-def _timeline_where_for_scope(scope: Literal["verified", "pending", "all"]) -> str:
+def _timeline_where_for_scope(scope: Literal["verified", "pending", "all"], alias: str = "m") -> str:
     if scope == "verified":
-        return "m.status='verified'"
+        return f"{alias}.status='verified'"
     if scope == "pending":
-        return "(m.status='pending_confirm' AND m.confirmation_deadline >= now())"
-    return "(m.status='verified' OR (m.status='pending_confirm' AND m.confirmation_deadline >= now()))"
+        return f"({alias}.status='pending_confirm' AND {alias}.confirmation_deadline >= now())"
+    return (
+        f"({alias}.status='verified' OR "
+        f"({alias}.status='pending_confirm' AND {alias}.confirmation_deadline >= now()))"
+    )
 
 
-def _query_timeline(
+def _timeline_statement(
     db: Session,
     *,
     target_user_id: str,
@@ -127,11 +194,21 @@ def _query_timeline(
     state_scope: Literal["verified", "pending", "all"],
     club_id: str | None,
     club_city: str | None,
-    limit: int,
+    limit: int | None,
     offset: int,
     cursor: str | None = None,
     match_id: str | None = None,
-):
+    club_city_id: int | None = None,
+    pair_user_id: str | None = None,
+    pair_relation: Literal["partner", "rival"] | None = None,
+    changes_since: tuple[int, str, datetime, int] | None = None,
+) -> tuple[sa.TextClause, dict[str, object]]:
+    """
+    SQL del timeline con filtros y enmascarado; limit=None recorre todo (LIMIT NULL).
+    Con changes_since=(xid, match_id, at, watermark) devuelve el change feed: filas despues
+    de la posicion (xid, match_id) y con change_xid < watermark, en ese orden (todos los
+    estados), mas las ya entregadas que siguen pendientes y cuyo plazo vencio entre `at` y now().
+    """
     is_public_view = visibility_reason == "public_verified_history"
     rival_alias_sql = (
         "up.alias"
@@ -144,57 +221,125 @@ def _query_timeline(
         else "CASE WHEN cp.is_public OR cp.user_id=:target_user_id THEN cp.alias ELSE '[private]' END"
     )
 
-    where = [
-        "1=1",
-        _timeline_where_for_scope(state_scope),
-    ]
+    where = ["t.user_id=:target_user_id"]
+    if changes_since is None:
+        where.append(_timeline_where_for_scope(state_scope, alias="t"))
+    page_from = "user_match_timeline t"
+    page_joins: list[str] = []
+    # Alias que define orden y cursor: con filtro de pareja se recorre ix_user_match_pairs_pair_played.
+    key = "t"
     params: dict[str, object] = {
         "target_user_id": target_user_id,
         "visibility_reason": visibility_reason,
         "limit": limit,
         "offset": offset,
     }
+    if pair_user_id is not None:
+        page_from = (
+            "user_match_pairs pr "
+            "JOIN user_match_timeline t ON t.user_id = pr.user_id AND t.match_id = pr.match_id"
+        )
+        key = "pr"
+        where.append("pr.user_id=:target_user_id")
+        where.append("pr.other_user_id=:pair_user_id")
+        params["pair_user_id"] = pair_user_id
+        if pair_relation is not None:
+            where.append("pr.relation=:pair_relation")
+            params["pair_relation"] = pair_relation
     if cursor is not None:
         if offset != 0:
             raise HTTPException(400, "offset debe ser 0 cuando se usa cursor")
         cursor_played_at, cursor_match_id = _decode_timeline_cursor(cursor)
-        where.append("""
+        where.append(f"""
             (
-                m.played_at < :cursor_played_at
-                OR (m.played_at = :cursor_played_at AND m.id < CAST(:cursor_match_id AS uuid))
+                {key}.played_at < :cursor_played_at
+                OR ({key}.played_at = :cursor_played_at AND {key}.match_id < CAST(:cursor_match_id AS uuid))
             )
         """)
         params["cursor_played_at"] = cursor_played_at
         params["cursor_match_id"] = cursor_match_id
 
     if ladder is not None:
-        where.append("m.ladder_code=:ladder")
+        where.append("t.ladder_code=:ladder")
         params["ladder"] = ladder
     if date_from is not None:
-        where.append("m.played_at >= CAST(:date_from AS date)")
+        where.append("t.played_at >= CAST(:date_from AS date)")
         params["date_from"] = date_from
     if date_to is not None:
-        where.append("m.played_at < (CAST(:date_to AS date) + interval '1 day')")
+        where.append("t.played_at < (CAST(:date_to AS date) + interval '1 day')")
         params["date_to"] = date_to
     if club_id is not None:
-        where.append("m.club_id=:club_id")
+        where.append("t.club_id=:club_id")
         params["club_id"] = _normalize_uuid(club_id, "club_id")
     if club_city is not None:
         city = club_city.strip()
         if not city:
             raise HTTPException(400, "club_city no puede estar vacio")
-        where.append("lower(cl.city)=lower(:club_city)")
-        params["club_city"] = city
+        if club_city_id is not None:
+            raise HTTPException(400, "usa club_city o club_city_id, no ambos")
+        where.append("pcl.city_id = ANY(:club_city_ids)")
+        params["club_city_ids"] = resolve_city_ids_by_name(db, city)
+    if club_city_id is not None:
+        where.append("pcl.city_id=:club_city_id")
+        params["club_city_id"] = club_city_id
+    if club_city is not None or club_city_id is not None:
+        page_joins.append("JOIN clubs pcl ON pcl.id = t.club_id")
     if match_id is not None:
-        where.append("m.id=:match_id")
+        where.append("t.match_id=:match_id")
         params["match_id"] = _normalize_uuid(match_id, "match_id")
 
-    rows = db.execute(sa.text(f"""
-        WITH user_matches AS (
-            SELECT match_id, team_no
-            FROM match_participants
-            WHERE user_id=:target_user_id
-        )
+    page_columns = f"""
+                t.match_id,
+                t.played_at,
+                {_effective_status_sql("t")} as status,
+                t.focus_team_no,
+                t.rival_ids,
+                t.did_win,
+                t.rating_delta,
+                t.change_xid
+    """
+    if changes_since is None:
+        # Pagina = range scan sobre el indice (user_id, played_at DESC, match_id DESC) del alias `key`;
+        # el detalle solo se une para <= limit filas.
+        page_sql = f"""
+            SELECT {page_columns}
+            FROM {page_from}
+            {" ".join(page_joins)}
+            WHERE {" AND ".join(where)}
+            ORDER BY {key}.played_at DESC, {key}.match_id DESC
+            LIMIT :limit OFFSET :offset
+        """
+        order_sql = "t.played_at DESC, t.match_id DESC"
+    else:
+        # Range scan de ix_user_match_timeline_user_change; la expiracion es perezosa (sin escritura),
+        # asi que los vencimientos de la ventana se anaden aparte, sin limite (acotados a sus pendientes).
+        params["since_xid"], params["since_match_id"], params["since_at"], params["watermark"] = changes_since
+        position_sql = "(t.change_xid, t.match_id) > (:since_xid, CAST(:since_match_id AS uuid))"
+        page_sql = f"""
+            (
+                SELECT {page_columns}
+                FROM user_match_timeline t
+                WHERE {" AND ".join(where)}
+                  AND {position_sql}
+                  AND t.change_xid < :watermark
+                ORDER BY t.change_xid, t.match_id
+                LIMIT :limit
+            )
+            UNION ALL
+            (
+                SELECT {page_columns}
+                FROM user_match_timeline t
+                WHERE {" AND ".join(where)}
+                  AND NOT {position_sql}
+                  AND t.status='pending_confirm'
+                  AND t.confirmation_deadline > :since_at
+                  AND t.confirmation_deadline <= now()
+            )
+        """
+        order_sql = "t.change_xid, t.match_id"
+
+    stmt = sa.text(f"""
+        WITH page AS ({page_sql})
         SELECT
             m.id::text as match_id,
             m.ladder_code,
@@ -208,51 +353,90 @@ def _query_timeline(
             m.confirmation_deadline,
             m.confirmed_count,
             m.has_dispute,
-            {_EFFECTIVE_STATUS_SQL} as status,
+            t.status as status,
             {_STATUS_REASON_SQL} as status_reason,
             :visibility_reason as visibility_reason,
             {_RANKING_IMPACT_SQL} as ranking_impact,
             {_RANKING_IMPACT_REASON_SQL} as ranking_impact_reason,
-            um.team_no as focus_team_no,
+            t.focus_team_no as focus_team_no,
             COALESCE(
                 ARRAY(
                     SELECT {rival_alias_sql}
-                    FROM match_participants mp2
-                    JOIN user_profiles up ON up.user_id = mp2.user_id
-                    WHERE mp2.match_id = m.id
-                      AND mp2.team_no <> um.team_no
+                    FROM user_profiles up
+                    WHERE up.user_id = ANY(t.rival_ids)
                     ORDER BY {rival_alias_sql}
                 ),
                 ARRAY[]::text[]
             ) as rival_aliases,
-            ms.winner_team_no as winner_team_no,
             CASE
-                WHEN ms.winner_team_no IS NULL THEN NULL
-                WHEN ms.winner_team_no = um.team_no THEN true
-                ELSE false
-            END as did_focus_user_win,
+                WHEN t.did_win IS NULL THEN NULL
+                WHEN t.did_win THEN t.focus_team_no
+                ELSE 3 - t.focus_team_no
+            END as winner_team_no,
+            t.did_win as did_focus_user_win,
+            t.rating_delta as rating_delta,
+            t.change_xid as change_xid,
             m.created_by::text as created_by,
             {created_by_alias_sql} as created_by_alias
-        FROM user_matches um
-        JOIN matches m ON m.id = um.match_id
+        FROM page t
+        JOIN matches m ON m.id = t.match_id
         JOIN categories c ON c.id = m.category_id
         LEFT JOIN clubs cl ON cl.id = m.club_id
-        LEFT JOIN match_scores ms ON ms.match_id = m.id
         LEFT JOIN user_profiles cp ON cp.user_id = m.created_by
-        WHERE {" AND ".join(where)}
-        ORDER BY m.played_at DESC, m.id DESC
-        LIMIT :limit OFFSET :offset
-    """), params).mappings().all()
-
-    out_rows = [
-        HistoryTimelineItemOut(
-            **{
-                **r,
-                "rival_aliases": list(r["rival_aliases"] or []),
-            }
-        )
-        for r in rows
-    ]
+        ORDER BY {order_sql}
+    """)
+    return stmt, params
+
+
+def _timeline_item_out(row) -> HistoryTimelineItemOut:
+    return HistoryTimelineItemOut(
+        **{
+            **row,
+            "rival_aliases": list(row["rival_aliases"] or []),
+        }
+    )
+
+
+def _query_timeline(
+    db: Session,
+    *,
+    target_user_id: str,
+    visibility_reason: str,
+    ladder: str | None,
+    date_from: date | None,
+    date_to: date | None,
+    state_scope: Literal["verified", "pending", "all"],
+    club_id: str | None,
+    club_city: str | None,
+    limit: int,
+    offset: int,
+    cursor: str | None = None,
+    match_id: str | None = None,
+    club_city_id: int | None = None,
+    pair_user_id: str | None = None,
+    pair_relation: Literal["partner", "rival"] | None = None,
+):
+    stmt, params = _timeline_statement(
+        db,
+        target_user_id=target_user_id,
+        visibility_reason=visibility_reason,
+        ladder=ladder,
+        date_from=date_from,
+        date_to=date_to,
+        state_scope=state_scope,
+        club_id=club_id,
+        club_city=club_city,
+        limit=limit,
+        offset=offset,
+        cursor=cursor,
+        match_id=match_id,
+        club_city_id=club_city_id,
+        pair_user_id=pair_user_id,
+        pair_relation=pair_relation,
+    )
+    rows = db.execute(stmt, params).mappings().all()
+
+    out_rows = [_timeline_item_out(r) for r in rows]
     next_offset = (offset + limit) if (len(out_rows) == limit and cursor is None and match_id is None) else None
     next_cursor = None
     if len(out_rows) == limit and match_id is None:
@@ -269,6 +453,9 @@ def history_me(
     state_scope: Literal["verified", "pending", "all"] = Query(default="verified"),
     club_id: str | None = Query(default=None),
     club_city: str | None = Query(default=None),
+    club_city_id: int | None = Query(default=None),
+    partner_id: str | None = Query(default=None),
+    rival_id: str | None = Query(default=None),
     limit: int = Query(default=20, ge=1, le=100),
     offset: int = Query(default=0, ge=0),
     cursor: str | None = Query(default=None),
@@ -277,6 +464,12 @@ def history_me(
 ):
     if date_from and date_to and date_from > date_to:
         raise HTTPException(400, "date_from no puede ser mayor que date_to")
+    pair_user_id, pair_relation = _resolve_pair_filter(
+        db,
+        partner_id=partner_id,
+        rival_id=rival_id,
+        is_public_view=False,
+    )
 
     rows, next_offset, next_cursor = _query_timeline(
         db,
@@ -291,6 +484,9 @@ def history_me(
         limit=limit,
         offset=offset,
         cursor=cursor,
+        club_city_id=club_city_id,
+        pair_user_id=pair_user_id,
+        pair_relation=pair_relation,
     )
     return HistoryTimelineOut(
         target_user_id=str(current.id),
@@ -302,6 +498,206 @@ def history_me(
     )
 
 
+def _load_timeline_facets(db: Session, target_user_id: str) -> HistoryFacetsOut:
+    # Un range scan del PK (user_id, facet, facet_key); solo cubre state_scope=verified.
+    rows = db.execute(sa.text("""
+        SELECT f.facet, f.facet_key, f.matches, cl.name as club_name
+        FROM user_timeline_facets f
+        LEFT JOIN clubs cl ON f.facet = 'club' AND cl.id::text = f.facet_key
+        WHERE f.user_id=:u
+          AND f.matches > 0
+    """), {"u": target_user_id}).mappings().all()
+
+    groups: dict[str, list[HistoryFacetCountOut]] = {"month": [], "ladder": [], "club": [], "outcome": []}
+    for r in rows:
+        groups[r["facet"]].append(
+            HistoryFacetCountOut(key=r["facet_key"], label=r["club_name"], matches=r["matches"])
+        )
+    groups["month"].sort(key=lambda f: f.key, reverse=True)
+    for facet in ("ladder", "club", "outcome"):
+        groups[facet].sort(key=lambda f: (-f.matches, f.key))
+
+    return HistoryFacetsOut(
+        target_user_id=target_user_id,
+        total=sum(f.matches for f in groups["ladder"]),
+        months=groups["month"],
+        ladders=groups["ladder"],
+        clubs=groups["club"],
+        outcomes=groups["outcome"],
+    )
+
+
+@router.get("/me/facets", response_model=HistoryFacetsOut)
+def history_me_facets(
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    return _load_timeline_facets(db, str(current.id))
+
+
+@router.get("/users/{user_id}/facets", response_model=HistoryFacetsOut)
+def history_user_facets(
+    user_id: str,
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    target_user_id = _normalize_uuid(user_id, "user_id")
+    is_self = str(current.id) == target_user_id
+    if not is_self and not _load_profile_visibility(db, target_user_id):
+        raise HTTPException(404, "Historial de usuario no disponible")
+    return _load_timeline_facets(db, target_user_id)
+
+
+@router.get("/me/changes", response_model=HistoryChangesOut)
+def history_me_changes(
+    since: str | None = Query(default=None, description="Sync token opaco devuelto por la llamada anterior"),
+    limit: int = Query(default=200, ge=1, le=500),
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    target_user_id = str(current.id)
+    # now() es fijo en la transaccion: la ventana de vencimientos queda cerrada en `at`.
+    # watermark = xid mas antiguo aun en curso: todo xid menor ya termino y sus filas son
+    # visibles, asi que avanzar el token hasta ahi no deja huecos aunque los commits lleguen
+    # fuera de orden (sin serializar las escrituras de partidos).
+    clock = db.execute(sa.text("""
+        SELECT now() AS at,
+               CAST(CAST(pg_snapshot_xmin(pg_current_snapshot()) AS text) AS bigint) AS watermark
+    """)).mappings().one()
+    at, watermark = clock["at"], int(clock["watermark"])
+    since_xid, since_match_id, since_at = (
+        _decode_sync_token(since) if since is not None else (0, _NIL_MATCH_ID, at)
+    )
+
+    stmt, params = _timeline_statement(
+        db,
+        target_user_id=target_user_id,
+        visibility_reason="self_participant",
+        ladder=None,
+        date_from=None,
+        date_to=None,
+        state_scope="all",
+        club_id=None,
+        club_city=None,
+        limit=limit,
+        offset=0,
+        changes_since=(since_xid, since_match_id, since_at, watermark),
+    )
+    rows = db.execute(stmt, params).mappings().all()
+
+    out_rows: list[HistoryTimelineItemOut] = []
+    tombstones: list[HistoryTombstoneOut] = []
+    since = (since_xid, since_match_id)
+    last: tuple[int, str] | None = None
+    sequenced = 0
+    for r in rows:
+        position = (int(r["change_xid"]), str(r["match_id"]))
+        if position > since:
+            sequenced += 1
+            last = position
+        if r["status"] == "void":
+            tombstones.append(HistoryTombstoneOut(match_id=r["match_id"], status=r["status"]))
+        else:
+            out_rows.append(_timeline_item_out(r))
+
+    has_more = sequenced == limit
+    # Pagina llena: seguir desde la ultima fila; si no, todo lo anterior al watermark esta entregado.
+    next_xid, next_match_id = last if has_more and last is not None else (max(since_xid, watermark), _NIL_MATCH_ID)
+    return HistoryChangesOut(
+        target_user_id=target_user_id,
+        rows=out_rows,
+        tombstones=tombstones,
+        next_token=_encode_sync_token(change_xid=next_xid, match_id=next_match_id, at=at),
+        has_more=has_more,
+    )
+
+
+@router.get("/me/head-to-head/{other_user_id}", response_model=HeadToHeadOut)
+def history_me_head_to_head(
+    other_user_id: str,
+    relation: Literal["rival", "partner"] | None = Query(default=None),
+    state_scope: Literal["verified", "pending", "all"] = Query(default="verified"),
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: str | None = Query(default=None),
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    target_user_id = str(current.id)
+    other_id = _normalize_uuid(other_user_id, "other_user_id")
+    if other_id == target_user_id:
+        raise HTTPException(400, "other_user_id debe ser distinto del usuario actual")
+
+    # Alias visible solo si el perfil es publico o ya compartieron algun partido.
+    other = db.execute(sa.text("""
+        SELECT
+            CASE
+                WHEN p.is_public OR EXISTS (
+                    SELECT 1
+                    FROM user_match_pairs mp
+                    WHERE mp.user_id=:me
+                      AND mp.other_user_id=:u
+                ) THEN p.alias
+                ELSE '[private]'
+            END as alias
+        FROM user_profiles p
+        WHERE p.user_id=:u
+    """), {"u": other_id, "me": target_user_id}).mappings().first()
+    if not other:
+        raise HTTPException(404, "Usuario no encontrado")
+
+    # Balance sobre partidos verificados: un range scan de ix_user_match_pairs_pair_played.
+    records = {
+        "rival": HeadToHeadRecordOut(),
+        "partner": HeadToHeadRecordOut(),
+    }
+    agg = db.execute(sa.text("""
+        SELECT
+            relation,
+            count(*)::int as matches,
+            count(*) FILTER (WHERE did_win IS TRUE)::int as wins,
+            count(*) FILTER (WHERE did_win IS FALSE)::int as losses
+        FROM user_match_pairs
+        WHERE user_id=:u
+          AND other_user_id=:o
+          AND status='verified'
+        GROUP BY relation
+    """), {"u": target_user_id, "o": other_id}).mappings().all()
+    for r in agg:
+        records[r["relation"]] = HeadToHeadRecordOut(
+            matches=r["matches"],
+            wins=r["wins"],
+            losses=r["losses"],
+        )
+
+    rows, _, next_cursor = _query_timeline(
+        db,
+        target_user_id=target_user_id,
+        visibility_reason="self_participant",
+        ladder=None,
+        date_from=None,
+        date_to=None,
+        state_scope=state_scope,
+        club_id=None,
+        club_city=None,
+        limit=limit,
+        offset=0,
+        cursor=cursor,
+        pair_user_id=other_id,
+        pair_relation=relation,
+    )
+    return HeadToHeadOut(
+        target_user_id=target_user_id,
+        other_user_id=other_id,
+        other_alias=other["alias"],
+        relation=relation,
+        as_rivals=records["rival"],
+        as_partners=records["partner"],
+        rows=rows,
+        limit=limit,
+        next_cursor=next_cursor,
+    )
+
+
 @router.get("/users/{user_id}", response_model=HistoryTimelineOut)
 def history_user(
     user_id: str,
@@ -311,6 +707,9 @@ def history_user(
     state_scope: Literal["verified", "pending", "all"] = Query(default="verified"),
     club_id: str | None = Query(default=None),
     club_city: str | None = Query(default=None),
+    club_city_id: int | None = Query(default=None),
+    partner_id: str | None = Query(default=None),
+    rival_id: str | None = Query(default=None),
     limit: int = Query(default=20, ge=1, le=100),
     offset: int = Query(default=0, ge=0),
     cursor: str | None = Query(default=None),
@@ -329,6 +728,12 @@ def history_user(
 
     effective_scope = _resolve_timeline_scope(state_scope, is_self)
     visibility_reason = "self_participant" if is_self else "public_verified_history"
+    pair_user_id, pair_relation = _resolve_pair_filter(
+        db,
+        partner_id=partner_id,
+        rival_id=rival_id,
+        is_public_view=not is_self,
+    )
 
     rows, next_offset, next_cursor = _query_timeline(
         db,
@@ -343,6 +748,9 @@ def history_user(
         limit=limit,
         offset=offset,
         cursor=cursor,
+        club_city_id=club_city_id,
+        pair_user_id=pair_user_id,
+        pair_relation=pair_relation,
     )
     return HistoryTimelineOut(
         target_user_id=target_user_id,
@@ -354,22 +762,146 @@ def history_user(
     )
 
 
-@router.get("/users/{user_id}/matches/{match_id}", response_model=HistoryMatchDetailOut)
-def history_match_detail(
+def _stream_timeline_export(
+    stmt: sa.TextClause,
+    params: dict[str, object],
+    export_format: Literal["ndjson", "csv"],
+) -> Iterator[str]:
+    # Sesion propia: la de get_db se libera al retornar el endpoint, antes de terminar el streaming.
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            stmt,
+            params,
+            execution_options={"stream_results": True, "yield_per": _EXPORT_BATCH_ROWS},
+        ).mappings()
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=list(HistoryTimelineItemOut.model_fields))
+        if export_format == "csv":
+            writer.writeheader()
+            yield buf.getvalue()
+        for batch in result.partitions():
+            buf.seek(0)
+            buf.truncate(0)
+            for row in batch:
+                item = _timeline_item_out(row).model_dump(mode="json")
+                if export_format == "csv":
+                    writer.writerow({**item, "rival_aliases": "|".join(item["rival_aliases"])})
+                else:
+                    buf.write(json.dumps(item, separators=(",", ":")))
+                    buf.write("\n")
+            yield buf.getvalue()
+    finally:
+        db.close()
+
+
+def _timeline_export_response(
+    stmt: sa.TextClause,
+    params: dict[str, object],
+    *,
+    target_user_id: str,
+    export_format: Literal["ndjson", "csv"],
+) -> StreamingResponse:
+    return StreamingResponse(
+        _stream_timeline_export(stmt, params, export_format),
+        media_type=_EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="history_{target_user_id}.{export_format}"'},
+    )
+
+
+@router.get("/me/export")
+def history_me_export(
+    export_format: Literal["ndjson", "csv"] = Query(default="ndjson", alias="format"),
+    ladder: str | None = Query(default=None, description="HM|WM|MX"),
+    date_from: date | None = Query(default=None),
+    date_to: date | None = Query(default=None),
+    state_scope: Literal["verified", "pending", "all"] = Query(default="verified"),
+    club_id: str | None = Query(default=None),
+    club_city: str | None = Query(default=None),
+    club_city_id: int | None = Query(default=None),
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(400, "date_from no puede ser mayor que date_to")
+
+    stmt, params = _timeline_statement(
+        db,
+        target_user_id=str(current.id),
+        visibility_reason="self_participant",
+        ladder=_normalize_ladder(ladder),
+        date_from=date_from,
+        date_to=date_to,
+        state_scope=state_scope,
+        club_id=club_id,
+        club_city=club_city,
+        limit=None,
+        offset=0,
+        club_city_id=club_city_id,
+    )
+    return _timeline_export_response(stmt, params, target_user_id=str(current.id), export_format=export_format)
+
+
+@router.get("/users/{user_id}/export")
+def history_user_export(
     user_id: str,
-    match_id: str,
+    export_format: Literal["ndjson", "csv"] = Query(default="ndjson", alias="format"),
+    ladder: str | None = Query(default=None, description="HM|WM|MX"),
+    date_from: date | None = Query(default=None),
+    date_to: date | None = Query(default=None),
+    state_scope: Literal["verified", "pending", "all"] = Query(default="verified"),
+    club_id: str | None = Query(default=None),
+    club_city: str | None = Query(default=None),
+    club_city_id: int | None = Query(default=None),
     current=Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(400, "date_from no puede ser mayor que date_to")
+
     target_user_id = _normalize_uuid(user_id, "user_id")
     is_self = str(current.id) == target_user_id
     is_public = _load_profile_visibility(db, target_user_id)
+
     if not is_self and not is_public:
         raise HTTPException(404, "Historial de usuario no disponible")
 
+    effective_scope = _resolve_timeline_scope(state_scope, is_self)
+    visibility_reason = "self_participant" if is_self else "public_verified_history"
+
+    stmt, params = _timeline_statement(
+        db,
+        target_user_id=target_user_id,
+        visibility_reason=visibility_reason,
+        ladder=_normalize_ladder(ladder),
+        date_from=date_from,
+        date_to=date_to,
+        state_scope=effective_scope,
+        club_id=club_id,
+        club_city=club_city,
+        limit=None,
+        offset=0,
+        club_city_id=club_city_id,
+    )
+    return _timeline_export_response(stmt, params, target_user_id=target_user_id, export_format=export_format)
+
+
+@router.get("/users/{user_id}/matches/{match_id}", response_model=HistoryMatchDetailOut)
+def history_match_detail(
+    user_id: str,
+    match_id: str,
+    current=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    target_user_id = _normalize_uuid(user_id, "user_id")
+    match_id_norm = _normalize_uuid(match_id, "match_id")
+    is_self = str(current.id) == target_user_id
+
+    # Visibilidad, evento, participantes y score en un solo round trip; el enmascarado
+    # solo depende de is_self, asi que se resuelve al armar el SQL.
     visibility_reason = "self_participant" if is_self else "public_verified_history"
     state_scope: Literal["verified", "pending", "all"] = "all" if is_self else "verified"
-    rows, _, _ = _query_timeline(
+    event_stmt, params = _timeline_statement(
         db,
         target_user_id=target_user_id,
         visibility_reason=visibility_reason,
@@ -381,12 +913,8 @@ def history_match_detail(
         club_city=None,
         limit=1,
         offset=0,
-        match_id=match_id,
+        match_id=match_id_norm,
     )
-    if not rows:
-        raise HTTPException(404, "Evento de historial no encontrado")
-    event = rows[0]
-
     participant_alias_sql = (
         "up.alias"
         if is_self
@@ -397,25 +925,48 @@ def history_match_detail(
         if is_self
         else "CASE WHEN up.is_public OR up.user_id=:target_user_id THEN up.gender ELSE NULL END"
     )
-    parts = db.execute(sa.text("""
+    row = db.execute(sa.text(f"""
+        WITH ev AS (
+            {event_stmt.text}
+        )
         SELECT
-            mp.user_id::text as user_id,
-            """ + participant_alias_sql + """ as alias,
-            """ + participant_gender_sql + """ as gender,
-            mp.team_no as team_no,
-            COALESCE(mc.status, 'pending') as confirmation_status,
-            mc.decided_at as decided_at
-        FROM match_participants mp
-        JOIN user_profiles up ON up.user_id = mp.user_id
-        LEFT JOIN match_confirmations mc
-          ON mc.match_id = mp.match_id AND mc.user_id = mp.user_id
-        WHERE mp.match_id=:m
-        ORDER BY mp.team_no, up.alias
-    """), {
-        "m": _normalize_uuid(match_id, "match_id"),
-        "target_user_id": target_user_id,
-    }).mappings().all()
-    participants = [HistoryParticipantOut(**p) for p in parts]
+            tp.is_public as target_is_public,
+            ev.*,
+            (
+                SELECT json_agg(
+                    json_build_object(
+                        'user_id', mp.user_id::text,
+                        'alias', {participant_alias_sql},
+                        'gender', {participant_gender_sql},
+                        'team_no', mp.team_no,
+                        'confirmation_status', COALESCE(mc.status, 'pending'),
+                        'decided_at', mc.decided_at
+                    )
+                    ORDER BY mp.team_no, up.alias
+                )
+                FROM match_participants mp
+                JOIN user_profiles up ON up.user_id = mp.user_id
+                LEFT JOIN match_confirmations mc
+                  ON mc.match_id = mp.match_id AND mc.user_id = mp.user_id
+                WHERE mp.match_id = CAST(ev.match_id AS uuid)
+            ) as participants_json,
+            ms.score_json as score_json,
+            ms.winner_team_no as score_winner_team_no
+        FROM user_profiles tp
+        LEFT JOIN ev ON true
+        LEFT JOIN match_scores ms ON ms.match_id = CAST(ev.match_id AS uuid)
+        WHERE tp.user_id=:target_user_id
+    """), params).mappings().first()
+
+    if not row:
+        raise HTTPException(404, "Usuario no encontrado")
+    if not is_self and not row["target_is_public"]:
+        raise HTTPException(404, "Historial de usuario no disponible")
+    if row["match_id"] is None:
+        raise HTTPException(404, "Evento de historial no encontrado")
+
+    event = _timeline_item_out({k: row[k] for k in HistoryTimelineItemOut.model_fields})
+    participants = [HistoryParticipantOut(**p) for p in (row["participants_json"] or [])]
 
     focus_team = event.focus_team_no
     teammate_aliases = [
@@ -424,12 +975,9 @@ def history_match_detail(
     ]
     rival_aliases = [p.alias for p in participants if p.team_no != focus_team]
 
-    score_row = db.execute(sa.text("""
-        SELECT score_json, winner_team_no
-        FROM match_scores
-        WHERE match_id=:m
-    """), {"m": _normalize_uuid(match_id, "match_id")}).mappings().first()
-    score = HistoryScoreOut(**score_row) if score_row else None
+    score = None
+    if row["score_winner_team_no"] is not None:
+        score = HistoryScoreOut(score_json=row["score_json"], winner_team_no=row["score_winner_team_no"])
 
     return HistoryMatchDetailOut(
         focus_user_id=target_user_id,
@@ -14,6 +14,11 @@ from app.db.session import get_db
 from app.services.audit import audit
 from app.services.elo import compute_elo
 from app.services.analytics import apply_verified_match_analytics
+from app.services.club_memberships import apply_verified_match_club_activity
+from app.services.organizer_activity import apply_verified_match_organizer_activity
+from app.services.match_timeline import sync_match_timeline
+from app.services.rating_distribution import apply_rating_histogram_changes
+from app.services.timeline_facets import apply_verified_match_facets
 
 from app.services.score_features import extract_score_features, mov_weight_from_features
 
@@ -295,6 +300,8 @@ def create_match(payload: MatchCreateIn, current=Depends(get_current_user), db:
         WHERE id=:m
     """), {"c": 1, "m": match_id})
 
+    sync_match_timeline(db, str(match_id))
+
     audit(db, current.id, "match", str(match_id), "created", {
         "ladder_code": ladder_code,
         "category_id": category_id,
@@ -422,6 +429,8 @@ def _apply_ranking_for_match(db: Session, match_id: str):
         cap = settings.PROVISIONAL_CAP
         return max(-cap, min(cap, delta))
 
+    # Histograma por categoria del jugador (puede diferir de la categoria etiqueta del partido).
+    histogram_changes: dict[str, list[tuple[int | None, int | None]]] = {}
     for uid in team1_ids:
         old = int(st_by_user[uid]["rating"])
         d = cap_delta(uid, t1_delta)
@@ -440,6 +449,15 @@ def _apply_ranking_for_match(db: Session, match_id: str):
             VALUES (:m, :l, :c, :u, :o, :n, :d, :k, :w)
         """), {"m": match_id, "l": m["ladder_code"], "c": m["category_id"], "u": uid, "o": old, "n": new, "d": d, "k": K_eff, "w": weight_total})
 
+        db.execute(sa.text("""
+            INSERT INTO rating_daily_deltas (ladder_code, activity_date, user_id, delta, matches)
+            VALUES (:l, (now() AT TIME ZONE 'UTC')::date, :u, :d, 1)
+            ON CONFLICT (ladder_code, activity_date, user_id) DO UPDATE
+            SET delta = rating_daily_deltas.delta + EXCLUDED.delta,
+                matches = rating_daily_deltas.matches + 1
+        """), {"l": m["ladder_code"], "u": uid, "d": d})
+        histogram_changes.setdefault(st_by_user[uid]["category_id"], []).append((old, new))
+
     for uid in team2_ids:
         old = int(st_by_user[uid]["rating"])
         d = cap_delta(uid, t2_delta)
@@ -458,6 +476,18 @@ def _apply_ranking_for_match(db: Session, match_id: str):
             VALUES (:m, :l, :c, :u, :o, :n, :d, :k, :w)
         """), {"m": match_id, "l": m["ladder_code"], "c": m["category_id"], "u": uid, "o": old, "n": new, "d": d, "k": K_eff, "w": weight_total})
 
+        db.execute(sa.text("""
+            INSERT INTO rating_daily_deltas (ladder_code, activity_date, user_id, delta, matches)
+            VALUES (:l, (now() AT TIME ZONE 'UTC')::date, :u, :d, 1)
+            ON CONFLICT (ladder_code, activity_date, user_id) DO UPDATE
+            SET delta = rating_daily_deltas.delta + EXCLUDED.delta,
+                matches = rating_daily_deltas.matches + 1
+        """), {"l": m["ladder_code"], "u": uid, "d": d})
+        histogram_changes.setdefault(st_by_user[uid]["category_id"], []).append((old, new))
+
+    for category_id in sorted(histogram_changes):
+        apply_rating_histogram_changes(db, m["ladder_code"], category_id, histogram_changes[category_id])
+
     db.execute(sa.text("UPDATE matches SET rank_processed_at=now() WHERE id=:m"), {"m": match_id})
     
     audit(db, None, "ranking", str(match_id), "applied", {
@@ -550,6 +580,7 @@ def match_detail(match_id: str, current=Depends(get_current_user), db: Session =
             SET status='expired'
             WHERE id=:m AND status='pending_confirm'
         """), {"m": match_id})
+        sync_match_timeline(db, match_id)
         
         db.commit()
         
@@ -629,6 +660,7 @@ def confirm_match(match_id: str, payload: ConfirmIn, current=Depends(get_current
             SET status='expired'
             WHERE id=:m AND status='pending_confirm'
         """), {"m": match_id})
+        sync_match_timeline(db, match_id)
         db.commit()
         raise HTTPException(409, "Partido expirado")
 
@@ -697,6 +729,7 @@ def confirm_match(match_id: str, payload: ConfirmIn, current=Depends(get_current
             SET confirmed_count=1
             WHERE id=:m
         """), {"m": match_id})
+        sync_match_timeline(db, match_id)
 
         db.commit()
         return ConfirmOut(ok=True, confirmed_count=1, teams_confirmed=1)
@@ -757,7 +790,12 @@ def confirm_match(match_id: str, payload: ConfirmIn, current=Depends(get_current
 
         _apply_ranking_for_match(db, match_id)
         apply_verified_match_analytics(db, match_id)
+        apply_verified_match_club_activity(db, match_id)
+        apply_verified_match_organizer_activity(db, match_id)
+        apply_verified_match_facets(db, match_id)
 
+    # Tambien sin verificar: confirmed_count cambio y el change feed debe reflejarlo.
+    sync_match_timeline(db, match_id)
     db.commit()
     return ConfirmOut(ok=True, confirmed_count=confirmed_count, teams_confirmed=teams_confirmed)
 
@@ -23,6 +23,9 @@ from app.schemas.me import (
     ContactChangeConfirmOut,
 )
 from app.services.audit import audit
+from app.services.locations import ensure_city_id
+from app.services.public_dashboard_cache import invalidate_public_dashboards
+from app.services.rating_distribution import apply_rating_histogram_changes
 
 from app.schemas.match import MyMatchesOut, MyMatchRowOut
 
@@ -245,7 +248,7 @@ def _count_user_matches(db: Session, user_id, ladder_code: str | None = None) ->
 
 def _upsert_ladder_state(db: Session, user_id, ladder_code: str, category_id: str):
     existing = db.execute(sa.text("""
-        SELECT verified_matches, category_id::text AS category_id
+        SELECT verified_matches, rating, category_id::text AS category_id
         FROM user_ladder_state
         WHERE user_id=:u AND ladder_code=:l
     """), {"u": user_id, "l": ladder_code}).mappings().first()
@@ -270,6 +273,9 @@ def _upsert_ladder_state(db: Session, user_id, ladder_code: str, category_id: st
             SET category_id=:c, updated_at=now()
             WHERE user_id=:u AND ladder_code=:l
         """), {"u": user_id, "l": ladder_code, "c": category_id})
+        rating = int(existing["rating"])
+        apply_rating_histogram_changes(db, ladder_code, current_cat, [(rating, None)])
+        apply_rating_histogram_changes(db, ladder_code, str(category_id), [(None, rating)])
         return
 
     # No existe aun: crear
@@ -277,6 +283,7 @@ def _upsert_ladder_state(db: Session, user_id, ladder_code: str, category_id: st
         INSERT INTO user_ladder_state (user_id, ladder_code, category_id, rating, verified_matches, is_provisional, trust_score)
         VALUES (:u, :l, :c, 1000, 0, true, 100)
     """), {"u": user_id, "l": ladder_code, "c": category_id})
+    apply_rating_histogram_changes(db, ladder_code, str(category_id), [(None, 1000)])
 
 @router.get("", response_model=MeOut)
 def me(current=Depends(get_current_user), db: Session = Depends(get_db)):
@@ -815,6 +822,14 @@ def update_profile(payload: ProfileUpdateIn, current=Depends(get_current_user),
         updates.append("city=:city")
         params["city"] = city
 
+    if payload.country is not None or payload.city is not None:
+        updates.append("city_id=:city_id")
+        params["city_id"] = ensure_city_id(
+            db,
+            params.get("country", prof["country"]),
+            params["city"] if "city" in params else prof["city"],
+        )
+
     if payload.handedness is not None:
         updates.append("handedness=:handedness")
         params["handedness"] = payload.handedness
@@ -844,6 +859,9 @@ def update_profile(payload: ProfileUpdateIn, current=Depends(get_current_user),
             WHERE user_id=:u
         """), params)
 
+    if payload.is_public is not None and payload.is_public != bool(prof["is_public"]):
+        invalidate_public_dashboards(db, user_ids=[str(current.id)])
+
     gender_eff = payload.gender if payload.gender is not None else prof["gender"]
 
     if payload.primary_category_code is not None and gender_eff not in ("M", "F"):
@@ -1,13 +1,40 @@
+from datetime import date, timedelta
+
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 import sqlalchemy as sa
 from uuid import UUID
 
+from app.core.config import settings
+from app.core.security import now_utc
 from app.db.session import get_db
-from app.schemas.ranking import RankingOut, RankingRow
+from app.schemas.ranking import (
+    RankingMovementOut,
+    RankingMovementRow,
+    RankingMoverRow,
+    RankingMoversOut,
+    RankingOut,
+    RankingRow,
+    RankingSnapshotOut,
+    RankingSnapshotRow,
+    RatingBucketOut,
+    RatingDistributionOut,
+    RatingQuantileOut,
+)
+from app.services.club_memberships import club_window_start
+from app.services.locations import resolve_city_id
+from app.services.rating_distribution import (
+    RATING_BUCKET_WIDTH,
+    histogram_quantile,
+    histogram_share_below,
+)
 
 router = APIRouter()
 _VALID_LADDERS = {"HM", "WM", "MX"}
+_MOVEMENT_WINDOWS = {1, 7, 30}
+_MOVERS_WINDOWS = {7, 30, 90}
+_DEFAULT_QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+_MAX_QUANTILES = 20
 
 
 def _normalize_ladder(ladder_code: str) -> str:
@@ -23,16 +50,13 @@ def _normalize_category_id(category_id: str) -> str:
     except Exception:
         raise HTTPException(400, "category_id debe ser un UUID valido")
 
-@router.get("/{ladder_code}/{category_id}", response_model=RankingOut)
-def ranking(
-    ladder_code: str,
-    category_id: str,
-    country: str | None = Query(default=None, description="ISO-2 (ej: CO)"),
-    city: str | None = Query(default=None),
-    db: Session = Depends(get_db),
-):
-    ladder_norm = _normalize_ladder(ladder_code)
-    category_id_norm = _normalize_category_id(category_id)
+def _location_scope(
+    db: Session,
+    country: str | None,
+    city: str | None,
+    city_id: int | None,
+) -> tuple[list[str], dict[str, object], bool]:
+    """Filtros de ubicacion sobre user_profiles p. El bool indica ciudad inexistente (scope vacio)."""
     country_norm = country.strip().upper() if country is not None else None
     city_norm = city.strip() if city is not None else None
 
@@ -44,22 +68,133 @@ def ranking(
         raise HTTPException(400, "country debe ser ISO-2 (ej. CO)")
     if city_norm is not None and country_norm is None:
         raise HTTPException(400, "el filtro city requiere country")
+    if city_norm is not None and city_id is not None:
+        raise HTTPException(400, "usa city o city_id, no ambos")
+
+    where: list[str] = []
+    params: dict[str, object] = {}
+    if country_norm is not None:
+        where.append("p.country=:country")
+        params["country"] = country_norm
+    if city_norm is not None:
+        city_id = resolve_city_id(db, country_norm, city_norm)
+        if city_id is None:
+            return where, params, True
+    if city_id is not None:
+        where.append("p.city_id=:city_id")
+        params["city_id"] = city_id
+    return where, params, False
+
+
+@router.get("/{ladder_code}/movers", response_model=RankingMoversOut)
+def ranking_movers(
+    ladder_code: str,
+    days: int = Query(default=7, description="7|30|90"),
+    country: str | None = Query(default=None, description="ISO-2 (ej: CO)"),
+    city: str | None = Query(default=None),
+    city_id: int | None = Query(default=None, description="id canonico de /cities"),
+    limit: int = Query(default=50, ge=1, le=200),
+    db: Session = Depends(get_db),
+):
+    # Registrada antes de /{ladder_code}/{category_id} para que "movers" no se tome como categoria.
+    ladder_norm = _normalize_ladder(ladder_code)
+    if days not in _MOVERS_WINDOWS:
+        raise HTTPException(400, "days debe ser 7|30|90")
+    since = now_utc().date() - timedelta(days=days - 1)
+
+    location_where, params, empty_scope = _location_scope(db, country, city, city_id)
+    if empty_scope:
+        return RankingMoversOut(ladder_code=ladder_norm, days=days, since=since, rows=[])
 
+    where = [
+        "d.ladder_code=:l",
+        "d.activity_date >= :since",
+        "p.is_public=true",
+        *location_where,
+    ]
+    params.update({"l": ladder_norm, "since": since, "limit": limit})
+
+    # Solo lee rollups diarios (rating_daily_deltas), nunca rating_events.
+    rows = db.execute(sa.text(f"""
+        SELECT d.user_id::text as user_id,
+               p.alias as alias,
+               s.rating as rating,
+               sum(d.delta)::int as rating_delta,
+               sum(d.matches)::int as matches
+        FROM rating_daily_deltas d
+        JOIN user_profiles p ON p.user_id=d.user_id
+        JOIN user_ladder_state s ON s.user_id=d.user_id AND s.ladder_code=d.ladder_code
+        WHERE {" AND ".join(where)}
+        GROUP BY d.user_id, p.alias, s.rating
+        ORDER BY rating_delta DESC, matches DESC, d.user_id
+        LIMIT :limit
+    """), params).mappings().all()
+
+    return RankingMoversOut(
+        ladder_code=ladder_norm,
+        days=days,
+        since=since,
+        rows=[RankingMoverRow(**r) for r in rows],
+    )
+
+
+@router.get("/{ladder_code}/{category_id}", response_model=RankingOut)
+def ranking(
+    ladder_code: str,
+    category_id: str,
+    country: str | None = Query(default=None, description="ISO-2 (ej: CO)"),
+    city: str | None = Query(default=None),
+    city_id: int | None = Query(default=None, description="id canonico de /cities"),
+    club_id: str | None = Query(default=None, description="UUID de /clubs"),
+    min_matches: int | None = Query(default=None, ge=1, description="partidos verificados en el club dentro de la ventana"),
+    db: Session = Depends(get_db),
+):
+    ladder_norm = _normalize_ladder(ladder_code)
+    category_id_norm = _normalize_category_id(category_id)
+    if min_matches is not None and club_id is None:
+        raise HTTPException(400, "el filtro min_matches requiere club_id")
+
+    location_where, params, empty_scope = _location_scope(db, country, city, city_id)
+    if empty_scope:
+        return RankingOut(ladder_code=ladder_norm, category_id=category_id_norm, rows=[])
+
+    joins = ["JOIN user_profiles p ON p.user_id=s.user_id"]
     where = [
         "s.ladder_code=:l",
         "s.category_id=:c",
         "p.is_public=true",
+        *location_where,
     ]
-    params: dict[str, str] = {
+    params.update({
         "l": ladder_norm,
         "c": category_id_norm,
-    }
-    if country_norm is not None:
-        where.append("p.country=:country")
-        params["country"] = country_norm
-    if city_norm is not None:
-        where.append("lower(p.city)=lower(:city)")
-        params["city"] = city_norm
+    })
+    if club_id is not None:
+        try:
+            params["club_id"] = str(UUID(club_id))
+        except Exception:
+            raise HTTPException(400, "club_id debe ser un UUID valido")
+        # Membresia precalculada (club_memberships); nunca se agrega sobre matches por request.
+        # El conteo sale de los buckets diarios de la ventana actual (PK por jugador), no de un
+        # contador que arrastraria dias ya fuera de la ventana hasta el refresh diario.
+        joins.append(
+            "JOIN club_memberships cm ON cm.user_id=s.user_id "
+            "AND cm.ladder_code=s.ladder_code AND cm.club_id=:club_id"
+        )
+        joins.append("""
+            JOIN LATERAL (
+                SELECT sum(a.matches) AS window_matches
+                FROM club_player_activity a
+                WHERE a.club_id=cm.club_id
+                  AND a.ladder_code=cm.ladder_code
+                  AND a.user_id=cm.user_id
+                  AND a.activity_date >= :window_start
+            ) cw ON true
+        """)
+        where.append("cm.last_played_on >= :window_start")
+        where.append("cw.window_matches >= :min_matches")
+        params["min_matches"] = min_matches or settings.CLUB_RANKING_MIN_MATCHES
+        params["window_start"] = club_window_start(now_utc().date())
 
     rows = db.execute(sa.text(f"""
         SELECT s.user_id::text as user_id,
@@ -68,7 +203,7 @@ def ranking(
                s.verified_matches as verified_matches,
                s.is_provisional as is_provisional
         FROM user_ladder_state s
-        JOIN user_profiles p ON p.user_id=s.user_id
+        {" ".join(joins)}
         WHERE {" AND ".join(where)}
         ORDER BY s.rating DESC, s.verified_matches DESC
         LIMIT 200
@@ -79,3 +214,189 @@ def ranking(
         category_id=category_id_norm,
         rows=[RankingRow(**r) for r in rows],
     )
+
+
+def _latest_snapshot_date(db: Session, as_of: date | None = None) -> date | None:
+    return db.execute(sa.text("""
+        SELECT max(snapshot_date)
+        FROM ranking_snapshot_runs
+        WHERE (CAST(:as_of AS date) IS NULL OR snapshot_date <= CAST(:as_of AS date))
+    """), {"as_of": as_of}).scalar_one()
+
+
+def _snapshot_ranks_sql(date_param: str) -> str:
+    # Ultima fila delta-encoded por jugador a la fecha dada (rank NULL = fuera del leaderboard).
+    return f"""
+        SELECT DISTINCT ON (user_id)
+            user_id,
+            rank,
+            rating
+        FROM ranking_snapshots
+        WHERE ladder_code=:l
+          AND category_id=:c
+          AND snapshot_date <= :{date_param}
+        ORDER BY user_id, snapshot_date DESC
+    """
+
+
+@router.get("/{ladder_code}/{category_id}/snapshot", response_model=RankingSnapshotOut)
+def ranking_snapshot(
+    ladder_code: str,
+    category_id: str,
+    as_of: date = Query(..., description="YYYY-MM-DD"),
+    limit: int = Query(default=200, ge=1, le=200),
+    db: Session = Depends(get_db),
+):
+    ladder_norm = _normalize_ladder(ladder_code)
+    category_id_norm = _normalize_category_id(category_id)
+
+    snapshot_date = _latest_snapshot_date(db, as_of)
+    rows = []
+    if snapshot_date is not None:
+        rows = db.execute(sa.text(f"""
+            SELECT t.user_id::text as user_id,
+                   p.alias as alias,
+                   t.rank as rank,
+                   t.rating as rating
+            FROM ({_snapshot_ranks_sql("d")}) t
+            JOIN user_profiles p ON p.user_id=t.user_id
+            WHERE t.rank IS NOT NULL
+              AND p.is_public=true
+            ORDER BY t.rank
+            LIMIT :limit
+        """), {"l": ladder_norm, "c": category_id_norm, "d": snapshot_date, "limit": limit}).mappings().all()
+
+    return RankingSnapshotOut(
+        ladder_code=ladder_norm,
+        category_id=category_id_norm,
+        as_of=as_of,
+        snapshot_date=snapshot_date,
+        rows=[RankingSnapshotRow(**r) for r in rows],
+    )
+
+
+@router.get("/{ladder_code}/{category_id}/movement", response_model=RankingMovementOut)
+def ranking_movement(
+    ladder_code: str,
+    category_id: str,
+    days: int = Query(default=7, description="1|7|30"),
+    limit: int = Query(default=200, ge=1, le=200),
+    db: Session = Depends(get_db),
+):
+    ladder_norm = _normalize_ladder(ladder_code)
+    category_id_norm = _normalize_category_id(category_id)
+    if days not in _MOVEMENT_WINDOWS:
+        raise HTTPException(400, "days debe ser 1|7|30")
+
+    snapshot_date = _latest_snapshot_date(db)
+    if snapshot_date is None:
+        return RankingMovementOut(
+            ladder_code=ladder_norm,
+            category_id=category_id_norm,
+            days=days,
+            rows=[],
+        )
+    base_date = snapshot_date - timedelta(days=days)
+
+    rows = db.execute(sa.text(f"""
+        WITH cur AS ({_snapshot_ranks_sql("d")}),
+        prev AS ({_snapshot_ranks_sql("base_d")})
+        SELECT cur.user_id::text as user_id,
+               p.alias as alias,
+               cur.rank as rank,
+               cur.rating as rating,
+               prev.rank as previous_rank,
+               prev.rating as previous_rating
+        FROM cur
+        JOIN user_profiles p ON p.user_id=cur.user_id
+        LEFT JOIN prev ON prev.user_id=cur.user_id
+        WHERE cur.rank IS NOT NULL
+          AND p.is_public=true
+        ORDER BY cur.rank
+        LIMIT :limit
+    """), {
+        "l": ladder_norm,
+        "c": category_id_norm,
+        "d": snapshot_date,
+        "base_d": base_date,
+        "limit": limit,
+    }).mappings().all()
+
+    out_rows = []
+    for r in rows:
+        previous_rank = r["previous_rank"]
+        rating_delta = None
+        if r["rating"] is not None and r["previous_rating"] is not None:
+            rating_delta = int(r["rating"]) - int(r["previous_rating"])
+        out_rows.append(RankingMovementRow(
+            user_id=r["user_id"],
+            alias=r["alias"],
+            rank=int(r["rank"]),
+            rating=r["rating"],
+            previous_rank=previous_rank,
+            # Positivo = sube posiciones (ej. 5 -> 2 => +3).
+            rank_delta=(int(previous_rank) - int(r["rank"])) if previous_rank is not None else None,
+            rating_delta=rating_delta,
+        ))
+
+    return RankingMovementOut(
+        ladder_code=ladder_norm,
+        category_id=category_id_norm,
+        days=days,
+        snapshot_date=snapshot_date,
+        base_date=base_date,
+        rows=out_rows,
+    )
+
+
+@router.get("/{ladder_code}/{category_id}/distribution", response_model=RatingDistributionOut)
+def rating_distribution(
+    ladder_code: str,
+    category_id: str,
+    q: list[float] | None = Query(default=None, description="cuantiles 0..1 (repetible)"),
+    rating: int | None = Query(default=None, description="rating para calcular top X%"),
+    db: Session = Depends(get_db),
+):
+    ladder_norm = _normalize_ladder(ladder_code)
+    category_id_norm = _normalize_category_id(category_id)
+    quantiles = q or _DEFAULT_QUANTILES
+    if len(quantiles) > _MAX_QUANTILES:
+        raise HTTPException(400, f"maximo {_MAX_QUANTILES} cuantiles por consulta")
+    if any(x < 0 or x > 1 for x in quantiles):
+        raise HTTPException(400, "q debe estar entre 0 y 1")
+
+    # Buckets de ancho fijo mantenidos al aplicar ranking; costo acotado por el rango de rating.
+    rows = db.execute(sa.text("""
+        SELECT bucket_floor, players
+        FROM rating_histogram_buckets
+        WHERE ladder_code=:l
+          AND category_id=:c
+          AND players > 0
+        ORDER BY bucket_floor
+    """), {"l": ladder_norm, "c": category_id_norm}).mappings().all()
+    buckets = [(int(r["bucket_floor"]), int(r["players"])) for r in rows]
+
+    top_percent = None
+    if rating is not None:
+        share_below = histogram_share_below(buckets, rating)
+        if share_below is not None:
+            top_percent = round(100.0 * (1.0 - share_below), 2)
+
+    out_quantiles = []
+    for x in quantiles:
+        value = histogram_quantile(buckets, x)
+        out_quantiles.append(RatingQuantileOut(q=x, rating=round(value, 1) if value is not None else None))
+
+    return RatingDistributionOut(
+        ladder_code=ladder_norm,
+        category_id=category_id_norm,
+        bucket_width=RATING_BUCKET_WIDTH,
+        players=sum(players for _, players in buckets),
+        buckets=[
+            RatingBucketOut(floor=floor, ceiling=floor + RATING_BUCKET_WIDTH, players=players)
+            for floor, players in buckets
+        ],
+        quantiles=out_quantiles,
+        rating=rating,
+        top_percent=top_percent,
+    )
@@ -1,6 +1,7 @@
-from datetime import datetime
+from datetime import date, datetime
+from uuid import UUID
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class AnalyticsStateOut(BaseModel):
@@ -35,6 +36,7 @@ class AnalyticsStateOut(BaseModel):
     vs_weaker_matches: int
     vs_weaker_wins: int
     vs_weaker_win_rate: float
+    vs_threshold: int
     current_rating: int | None = None
     peak_rating: int | None = None
     last_match_at: datetime | None = None
@@ -71,6 +73,7 @@ class AnalyticsPublicOut(BaseModel):
     vs_weaker_matches: int
     vs_weaker_wins: int
     vs_weaker_win_rate: float
+    vs_threshold: int
     current_rating: int | None = None
     last_match_at: datetime | None = None
 
@@ -120,6 +123,42 @@ class RivalStatOut(BaseModel):
     last_played_at: datetime | None = None
 
 
+class PartnershipLeaderboardRowOut(BaseModel):
+    rank: int
+    user_a_id: str
+    user_a_alias: str
+    user_b_id: str
+    user_b_alias: str
+    matches: int
+    wins: int
+    losses: int
+    win_rate: float
+    last_played_at: datetime | None = None
+
+
+class PartnershipLeaderboardOut(BaseModel):
+    ladder_code: str
+    min_matches: int
+    rows: list[PartnershipLeaderboardRowOut]
+
+
+class RivalryLeaderboardRowOut(BaseModel):
+    rank: int
+    user_a_id: str
+    user_a_alias: str
+    user_b_id: str
+    user_b_alias: str
+    matches: int
+    user_a_wins: int
+    user_b_wins: int
+    last_played_at: datetime | None = None
+
+
+class RivalryLeaderboardOut(BaseModel):
+    ladder_code: str
+    rows: list[RivalryLeaderboardRowOut]
+
+
 class AnalyticsDashboardOut(BaseModel):
     state: AnalyticsStateOut
     rating_trend: list[RatingTrendPointOut] = Field(default_factory=list)
@@ -140,3 +179,103 @@ class AnalyticsPublicDashboardOut(BaseModel):
     streak_timeline: list[StreakPointOut] = Field(default_factory=list)
     top_partners: list[PartnerStatOut] = Field(default_factory=list)
     top_rivals: list[RivalStatOut] = Field(default_factory=list)
+
+
+class AnalyticsActivityBucketOut(BaseModel):
+    start: date
+    matches: int
+    wins: int
+    close_matches: int
+    rating_delta: int
+
+
+class AnalyticsActivityOut(BaseModel):
+    user_id: str
+    ladder_code: str
+    date_from: date
+    date_to: date
+    matches: int
+    wins: int
+    losses: int
+    win_rate: float
+    close_matches: int
+    rating_delta: int
+    buckets: list[AnalyticsActivityBucketOut] = Field(default_factory=list)
+
+
+class OrganizerLadderMixOut(BaseModel):
+    ladder_code: str
+    matches: int
+    share: float
+
+
+class OrganizerWeekOut(BaseModel):
+    week_start: date
+    matches: int
+    active_players: int
+    average_rating: float | None = None
+    ladder_mix: list[OrganizerLadderMixOut] = Field(default_factory=list)
+
+
+class OrganizerActivityOut(BaseModel):
+    scope: str
+    scope_id: str
+    name: str
+    week_from: date
+    week_to: date
+    matches: int
+    average_rating: float | None = None
+    ladder_mix: list[OrganizerLadderMixOut] = Field(default_factory=list)
+    weeks: list[OrganizerWeekOut] = Field(default_factory=list)
+
+
+class AnalyticsRepairIn(BaseModel):
+    user_ids: list[UUID] = Field(default_factory=list)
+    match_ids: list[UUID] = Field(default_factory=list, max_length=50)
+    since: datetime | None = None
+    ladder: str | None = Field(default=None, description="HM|WM|MX")
+
+    @model_validator(mode="after")
+    def validate_targets(self):
+        if not self.user_ids and not self.match_ids:
+            raise ValueError("Indica user_ids o match_ids")
+        return self
+
+
+class AnalyticsRepairOut(BaseModel):
+    users: int
+    since: datetime | None = None
+    ladder_code: str | None = None
+    seeded: int
+    replayed_matches: int
+    applied: int
+    states: int
+
+
+class AnalyticsCacheStatsOut(BaseModel):
+    cache_name: str
+    stat_date: date
+    hits: int
+    misses: int
+    hit_rate: float
+    updated_at: datetime
+
+
+class AnalyticsExportJobIn(BaseModel):
+    ladder: str = Field(description="HM|WM|MX")
+    format: str = Field(default="csv", description="csv|parquet")
+
+
+class AnalyticsExportJobOut(BaseModel):
+    id: str
+    ladder_code: str
+    format: str
+    status: str
+    requested_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    expires_at: datetime | None = None
+    size_bytes: int | None = None
+    row_counts: dict[str, int] | None = None
+    error: str | None = None
+    download_url: str | None = None
@@ -4,8 +4,15 @@ class ClubOut(BaseModel):
     id: str
     name: str
     city: str
+    country: str
+    city_id: int | None = None
     is_active: bool
 
+class CityOut(BaseModel):
+    id: int
+    country_code: str
+    name: str
+
 class LadderOut(BaseModel):
     code: str
     name: str
@@ -24,6 +24,7 @@ class HistoryTimelineItemOut(BaseModel):
     rival_aliases: list[str] = Field(default_factory=list)
     winner_team_no: int | None = None
     did_focus_user_win: bool | None = None
+    rating_delta: int | None = None
     created_by: str
     created_by_alias: str | None = None
 
@@ -37,6 +38,53 @@ class HistoryTimelineOut(BaseModel):
     next_cursor: str | None = None
 
 
+class HistoryFacetCountOut(BaseModel):
+    key: str
+    label: str | None = None
+    matches: int
+
+
+class HistoryFacetsOut(BaseModel):
+    target_user_id: str
+    state_scope: str = "verified"
+    total: int
+    months: list[HistoryFacetCountOut] = Field(default_factory=list)
+    ladders: list[HistoryFacetCountOut] = Field(default_factory=list)
+    clubs: list[HistoryFacetCountOut] = Field(default_factory=list)
+    outcomes: list[HistoryFacetCountOut] = Field(default_factory=list)
+
+
+class HistoryTombstoneOut(BaseModel):
+    match_id: str
+    status: str
+
+
+class HistoryChangesOut(BaseModel):
+    target_user_id: str
+    rows: list[HistoryTimelineItemOut]
+    tombstones: list[HistoryTombstoneOut] = Field(default_factory=list)
+    next_token: str
+    has_more: bool
+
+
+class HeadToHeadRecordOut(BaseModel):
+    matches: int = 0
+    wins: int = 0
+    losses: int = 0
+
+
+class HeadToHeadOut(BaseModel):
+    target_user_id: str
+    other_user_id: str
+    other_alias: str
+    relation: str | None = None
+    as_rivals: HeadToHeadRecordOut
+    as_partners: HeadToHeadRecordOut
+    rows: list[HistoryTimelineItemOut]
+    limit: int
+    next_cursor: str | None = None
+
+
 class HistoryParticipantOut(BaseModel):
     user_id: str
     alias: str
@@ -1,3 +1,5 @@
+from datetime import date
+
 from pydantic import BaseModel
 
 class RankingRow(BaseModel):
@@ -11,3 +13,65 @@ class RankingOut(BaseModel):
     ladder_code: str
     category_id: str
     rows: list[RankingRow]
+
+class RankingSnapshotRow(BaseModel):
+    user_id: str
+    alias: str
+    rank: int
+    rating: int | None = None
+
+class RankingSnapshotOut(BaseModel):
+    ladder_code: str
+    category_id: str
+    as_of: date
+    snapshot_date: date | None = None
+    rows: list[RankingSnapshotRow]
+
+class RankingMovementRow(BaseModel):
+    user_id: str
+    alias: str
+    rank: int
+    rating: int | None = None
+    previous_rank: int | None = None
+    rank_delta: int | None = None
+    rating_delta: int | None = None
+
+class RankingMovementOut(BaseModel):
+    ladder_code: str
+    category_id: str
+    days: int
+    snapshot_date: date | None = None
+    base_date: date | None = None
+    rows: list[RankingMovementRow]
+
+class RankingMoverRow(BaseModel):
+    user_id: str
+    alias: str
+    rating: int
+    rating_delta: int
+    matches: int
+
+class RankingMoversOut(BaseModel):
+    ladder_code: str
+    days: int
+    since: date
+    rows: list[RankingMoverRow]
+
+class RatingBucketOut(BaseModel):
+    floor: int
+    ceiling: int
+    players: int
+
+class RatingQuantileOut(BaseModel):
+    q: float
+    rating: float | None = None
+
+class RatingDistributionOut(BaseModel):
+    ladder_code: str
+    category_id: str
+    bucket_width: int
+    players: int
+    buckets: list[RatingBucketOut]
+    quantiles: list[RatingQuantileOut]
+    rating: int | None = None
+    top_percent: float | None = None
@@ -1,16 +1,56 @@
 from __future__ import annotations
 
-from collections import defaultdict
-from dataclasses import dataclass
-from datetime import datetime, timedelta
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from itertools import groupby
+from typing import Callable, Iterable, Iterator
 
 import sqlalchemy as sa
 from sqlalchemy.orm import Session
 
+from app.services.analytics_dashboard import mark_dashboard_snapshots_stale, rebuild_dashboard_snapshots
+from app.services.public_dashboard_cache import invalidate_public_dashboards
+
 
 MAX_RECENT_FORM = 20
 MAX_ROLLING_FORM = 50
 RIVAL_BUCKET_DELTA = 75
+# Histograma de (opponent_avg - rating_before): umbrales multiplos del ancho, hasta el maximo, son exactos.
+RATING_DIFF_BUCKET_WIDTH = 5
+RATING_DIFF_MAX = 500
+ACTIVITY_WINDOWS_DAYS = (7, 30, 90)
+
+REBUILD_STREAM_ROWS = 2000
+REBUILD_COPY_ROWS = 5000
+REBUILD_PROGRESS_EVERY = 1000
+
+# Tablas del read model por (user_id, ladder_code); orden de borrado (dependientes primero).
+ANALYTICS_REBUILD_TABLES = (
+    "user_analytics_daily_activity",
+    "user_analytics_rival_stats",
+    "user_analytics_partner_stats",
+    "user_analytics_match_applied",
+    "user_analytics_state",
+)
+REBUILD_STAGING_SUFFIX = "_rebuild"
+_REBUILD_LOCK_KEY = "analytics_rebuild"
+
+# rating_diff_bucket() sobre user_analytics_match_applied (la division entera trunca hacia cero).
+_RATING_DIFF_BUCKET_SQL = f"""
+    CASE
+        WHEN rating_before IS NULL OR opponent_avg_rating IS NULL THEN 0
+        ELSE GREATEST(-{RATING_DIFF_MAX}, LEAST({RATING_DIFF_MAX},
+            ((opponent_avg_rating - rating_before) / {RATING_DIFF_BUCKET_WIDTH}) * {RATING_DIFF_BUCKET_WIDTH}))
+    END
+"""
+
+# Fuente de cada relacion de analytics_pair_leaderboard: (tabla por usuario, columna del otro).
+PAIR_LEADERBOARD_SOURCES = {
+    "partner": ("user_analytics_partner_stats", "partner_user_id"),
+    "rival": ("user_analytics_rival_stats", "rival_user_id"),
+}
 
 
 @dataclass
@@ -42,6 +82,19 @@ def _pct(part: int, total: int) -> float:
     return round((part * 100.0) / total, 2)
 
 
+def rating_diff_bucket(self_old: int | None, opponent_avg: int | None) -> int:
+    """
+    Bucket de user_analytics_opponent_diff_histogram: diferencia truncada hacia cero al
+    ancho (asi diff >= T y diff <= -T se conservan para T multiplo) y acotada a +-MAX.
+    Sin ratings, 0: cuenta como "similar" con cualquier umbral, igual que _quality_bucket.
+    """
+    if self_old is None or opponent_avg is None:
+        return 0
+    diff = opponent_avg - self_old
+    bucket = min(abs(diff) // RATING_DIFF_BUCKET_WIDTH * RATING_DIFF_BUCKET_WIDTH, RATING_DIFF_MAX)
+    return bucket if diff >= 0 else -bucket
+
+
 def _quality_bucket(self_old: int | None, opponent_avg: int | None) -> str:
     if self_old is None or opponent_avg is None:
         return "similar"
@@ -137,214 +190,113 @@ def _load_rating_map(db: Session, match_id: str, ladder_code: str, participant_i
     return out
 
 
-def _upsert_partner_stats(
-    db: Session,
-    *,
-    user_id: str,
-    ladder_code: str,
-    partner_user_id: str | None,
-    is_win: bool,
-    played_at: datetime,
-):
-    if not partner_user_id:
-        return
-    wins = 1 if is_win else 0
-    losses = 0 if is_win else 1
-    db.execute(sa.text("""
-        INSERT INTO user_analytics_partner_stats (
-            user_id, ladder_code, partner_user_id, matches, wins, losses, win_rate, last_played_at, updated_at
-        )
-        VALUES (:u, :l, :p, 1, :wins, :losses, :win_rate, :played_at, now())
-        ON CONFLICT (user_id, ladder_code, partner_user_id) DO UPDATE
-        SET matches = user_analytics_partner_stats.matches + 1,
-            wins = user_analytics_partner_stats.wins + :wins,
-            losses = user_analytics_partner_stats.losses + :losses,
-            win_rate = ROUND(((user_analytics_partner_stats.wins + :wins) * 100.0) / (user_analytics_partner_stats.matches + 1), 2),
-            last_played_at = CASE
-                WHEN user_analytics_partner_stats.last_played_at IS NULL THEN :played_at
-                ELSE GREATEST(user_analytics_partner_stats.last_played_at, :played_at)
-            END,
-            updated_at = now()
-    """), {
-        "u": user_id,
-        "l": ladder_code,
-        "p": partner_user_id,
-        "wins": wins,
-        "losses": losses,
-        "win_rate": _pct(wins, 1),
-        "played_at": played_at,
-    })
+# Columnas de user_analytics_state escritas por cada transicion (con su tipo para VALUES).
+_STATE_UPDATE_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("total_verified_matches", "int"),
+    ("wins", "int"),
+    ("losses", "int"),
+    ("win_rate", "numeric"),
+    ("current_streak_type", "text"),
+    ("current_streak_len", "int"),
+    ("best_win_streak", "int"),
+    ("best_loss_streak", "int"),
+    ("recent_form_bits", "bigint"),
+    ("recent_form_size", "int"),
+    ("recent_10_matches", "int"),
+    ("recent_10_wins", "int"),
+    ("recent_10_win_rate", "numeric"),
+    ("rolling_bits_50", "bigint"),
+    ("rolling_size_50", "int"),
+    ("rolling_5_win_rate", "numeric"),
+    ("rolling_20_win_rate", "numeric"),
+    ("rolling_50_win_rate", "numeric"),
+    ("matches_7d", "int"),
+    ("matches_30d", "int"),
+    ("matches_90d", "int"),
+    ("close_matches", "int"),
+    ("close_match_rate", "numeric"),
+    ("vs_stronger_matches", "int"),
+    ("vs_stronger_wins", "int"),
+    ("vs_stronger_win_rate", "numeric"),
+    ("vs_similar_matches", "int"),
+    ("vs_similar_wins", "int"),
+    ("vs_similar_win_rate", "numeric"),
+    ("vs_weaker_matches", "int"),
+    ("vs_weaker_wins", "int"),
+    ("vs_weaker_win_rate", "numeric"),
+    ("current_rating", "int"),
+    ("peak_rating", "int"),
+    ("last_match_id", "uuid"),
+    ("last_match_at", "timestamptz"),
+)
 
+_APPLIED_UPDATE_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("rolling_10_win_rate", "numeric"),
+    ("rolling_20_win_rate", "numeric"),
+    ("rolling_50_win_rate", "numeric"),
+    ("streak_type_after", "text"),
+    ("streak_len_after", "int"),
+)
 
-def _upsert_rival_stats(
-    db: Session,
-    *,
-    user_id: str,
-    ladder_code: str,
-    rival_user_id: str,
-    is_win: bool,
-    played_at: datetime,
-):
-    wins = 1 if is_win else 0
-    losses = 0 if is_win else 1
-    db.execute(sa.text("""
-        INSERT INTO user_analytics_rival_stats (
-            user_id, ladder_code, rival_user_id, matches, wins, losses, win_rate, last_played_at, updated_at
-        )
-        VALUES (:u, :l, :r, 1, :wins, :losses, :win_rate, :played_at, now())
-        ON CONFLICT (user_id, ladder_code, rival_user_id) DO UPDATE
-        SET matches = user_analytics_rival_stats.matches + 1,
-            wins = user_analytics_rival_stats.wins + :wins,
-            losses = user_analytics_rival_stats.losses + :losses,
-            win_rate = ROUND(((user_analytics_rival_stats.wins + :wins) * 100.0) / (user_analytics_rival_stats.matches + 1), 2),
-            last_played_at = CASE
-                WHEN user_analytics_rival_stats.last_played_at IS NULL THEN :played_at
-                ELSE GREATEST(user_analytics_rival_stats.last_played_at, :played_at)
-            END,
-            updated_at = now()
-    """), {
-        "u": user_id,
-        "l": ladder_code,
-        "r": rival_user_id,
-        "wins": wins,
-        "losses": losses,
-        "win_rate": _pct(wins, 1),
-        "played_at": played_at,
-    })
 
+@dataclass
+class _ParticipantApply:
+    user_id: str
+    is_win: bool
+    teammate_user_id: str | None
+    opponent_user_ids: list[str]
+    opponent_avg_rating: int | None
+    quality_bucket: str
+    rating_before: int | None
+    rating_after: int | None
+    rating_delta: int | None
 
-def _load_activity_windows(db: Session, user_id: str, ladder_code: str, played_at: datetime) -> tuple[int, int, int]:
-    cut_7 = played_at - timedelta(days=7)
-    cut_30 = played_at - timedelta(days=30)
-    cut_90 = played_at - timedelta(days=90)
-    row = db.execute(sa.text("""
-        SELECT
-            COUNT(*) FILTER (WHERE played_at >= :cut_7 AND played_at <= :played_at) AS c7,
-            COUNT(*) FILTER (WHERE played_at >= :cut_30 AND played_at <= :played_at) AS c30,
-            COUNT(*) FILTER (WHERE played_at >= :cut_90 AND played_at <= :played_at) AS c90
-        FROM user_analytics_match_applied
-        WHERE user_id=:u
-          AND ladder_code=:l
-          AND played_at <= :played_at
-    """), {
-        "u": user_id,
-        "l": ladder_code,
-        "cut_7": cut_7,
-        "cut_30": cut_30,
-        "cut_90": cut_90,
-        "played_at": played_at,
-    }).mappings().first()
-    return int(row["c7"] or 0), int(row["c30"] or 0), int(row["c90"] or 0)
-
-
-def _apply_participant_result(
-    db: Session,
+
+def _values_sql(
+    rows: list[dict[str, object]],
+    columns: tuple[tuple[str, str], ...],
+    params: dict[str, object],
+    prefix: str,
+) -> str:
+    """VALUES (...) multi-fila con binds tipados (un None en toda la columna no degrada a text)."""
+    tuples: list[str] = []
+    for i, row in enumerate(rows):
+        cells = []
+        for name, sql_type in columns:
+            key = f"{prefix}_{name}_{i}"
+            params[key] = row[name]
+            cells.append(f"CAST(:{key} AS {sql_type})")
+        tuples.append(f"({', '.join(cells)})")
+    return ",\n".join(tuples)
+
+
+def activity_date(played_at: datetime) -> date:
+    """Dia UTC del partido: clave de user_analytics_daily_activity."""
+    return played_at.astimezone(timezone.utc).date()
+
+
+def _activity_cuts(played_at: datetime) -> dict[str, datetime]:
+    return {f"cut_{days}": played_at - timedelta(days=days) for days in ACTIVITY_WINDOWS_DAYS}
+
+
+def _bit_window_wins(bits: int, size: int, window: int) -> tuple[int, int]:
+    n = min(size, window)
+    mask = (1 << n) - 1 if n > 0 else 0
+    return (bits & mask).bit_count(), n
+
+
+def _advance_state(
+    st,
     *,
-    match_id: str,
-    ladder_code: str,
-    played_at: datetime,
-    user_id: str,
     is_win: bool,
     is_close_match: bool,
-    teammate_user_id: str | None,
-    opponent_user_ids: list[str],
-    opponent_avg_rating: int | None,
     quality_bucket: str,
-    rating_before: int | None,
-    rating_after: int | None,
-    rating_delta: int | None,
-    enforce_idempotency: bool,
-):
-    insert_params = {
-        "u": user_id,
-        "m": match_id,
-        "l": ladder_code,
-        "w": is_win,
-        "close": is_close_match,
-        "teammate": teammate_user_id,
-        "opp_a": opponent_user_ids[0] if len(opponent_user_ids) > 0 else None,
-        "opp_b": opponent_user_ids[1] if len(opponent_user_ids) > 1 else None,
-        "opp_avg": opponent_avg_rating,
-        "quality": quality_bucket,
-        "rating_before": rating_before,
-        "rating_after": rating_after,
-        "rating_delta": rating_delta,
-        "p": played_at,
-    }
-    if enforce_idempotency:
-        inserted = db.execute(sa.text("""
-            INSERT INTO user_analytics_match_applied (
-                user_id, match_id, ladder_code, is_win, is_close_match,
-                teammate_user_id, opponent_a_user_id, opponent_b_user_id,
-                opponent_avg_rating, quality_bucket,
-                rating_before, rating_after, rating_delta, played_at
-            )
-            VALUES (
-                :u, :m, :l, :w, :close,
-                :teammate, :opp_a, :opp_b,
-                :opp_avg, :quality,
-                :rating_before, :rating_after, :rating_delta, :p
-            )
-            ON CONFLICT (user_id, match_id) DO NOTHING
-            RETURNING 1
-        """), insert_params).first()
-        if not inserted:
-            return
-    else:
-        db.execute(sa.text("""
-            INSERT INTO user_analytics_match_applied (
-                user_id, match_id, ladder_code, is_win, is_close_match,
-                teammate_user_id, opponent_a_user_id, opponent_b_user_id,
-                opponent_avg_rating, quality_bucket,
-                rating_before, rating_after, rating_delta, played_at
-            )
-            VALUES (
-                :u, :m, :l, :w, :close,
-                :teammate, :opp_a, :opp_b,
-                :opp_avg, :quality,
-                :rating_before, :rating_after, :rating_delta, :p
-            )
-            ON CONFLICT (user_id, match_id) DO NOTHING
-        """), insert_params)
-
-    db.execute(sa.text("""
-        INSERT INTO user_analytics_state (user_id, ladder_code)
-        VALUES (:u, :l)
-        ON CONFLICT (user_id, ladder_code) DO NOTHING
-    """), {"u": user_id, "l": ladder_code})
-
-    st = db.execute(sa.text("""
-        SELECT
-            total_verified_matches,
-            wins,
-            losses,
-            current_streak_type,
-            current_streak_len,
-            best_win_streak,
-            best_loss_streak,
-            recent_form_bits,
-            recent_form_size,
-            rolling_bits_50,
-            rolling_size_50,
-            close_matches,
-            vs_stronger_matches,
-            vs_stronger_wins,
-            vs_similar_matches,
-            vs_similar_wins,
-            vs_weaker_matches,
-            vs_weaker_wins,
-            peak_rating
-        FROM user_analytics_state
-        WHERE user_id=:u AND ladder_code=:l
-        FOR UPDATE
-    """), {"u": user_id, "l": ladder_code}).mappings().first()
-    if not st:
-        return
-
+    current_rating: int | None,
+) -> dict[str, object]:
+    """Transicion pura del estado de analitica de un jugador tras un partido verificado."""
     total = int(st["total_verified_matches"]) + 1
     wins = int(st["wins"]) + (1 if is_win else 0)
     losses = int(st["losses"]) + (0 if is_win else 1)
-    win_rate = _pct(wins, total)
 
     new_type = "W" if is_win else "L"
     prev_type = st["current_streak_type"]
@@ -358,295 +310,1298 @@ def _apply_participant_result(
     else:
         best_loss = max(best_loss, streak_len)
 
-    old_recent_bits = int(st["recent_form_bits"] or 0)
-    old_recent_size = int(st["recent_form_size"] or 0)
-    new_recent_bits = ((old_recent_bits << 1) | (1 if is_win else 0)) & ((1 << MAX_RECENT_FORM) - 1)
-    new_recent_size = min(old_recent_size + 1, MAX_RECENT_FORM)
-
-    old_roll_bits = int(st["rolling_bits_50"] or 0)
-    old_roll_size = int(st["rolling_size_50"] or 0)
-    new_roll_bits = ((old_roll_bits << 1) | (1 if is_win else 0)) & ((1 << MAX_ROLLING_FORM) - 1)
-    new_roll_size = min(old_roll_size + 1, MAX_ROLLING_FORM)
+    recent_bits = ((int(st["recent_form_bits"] or 0) << 1) | (1 if is_win else 0)) & ((1 << MAX_RECENT_FORM) - 1)
+    recent_size = min(int(st["recent_form_size"] or 0) + 1, MAX_RECENT_FORM)
+    roll_bits = ((int(st["rolling_bits_50"] or 0) << 1) | (1 if is_win else 0)) & ((1 << MAX_ROLLING_FORM) - 1)
+    roll_size = min(int(st["rolling_size_50"] or 0) + 1, MAX_ROLLING_FORM)
 
-    recent_10_matches = min(new_recent_size, 10)
-    recent_10_mask = (1 << recent_10_matches) - 1 if recent_10_matches > 0 else 0
-    recent_10_wins = (new_recent_bits & recent_10_mask).bit_count()
-    recent_10_win_rate = _pct(recent_10_wins, recent_10_matches)
-
-    roll_5_n = min(new_roll_size, 5)
-    roll_5_mask = (1 << roll_5_n) - 1 if roll_5_n > 0 else 0
-    roll_5_wins = (new_roll_bits & roll_5_mask).bit_count()
-    rolling_5_win_rate = _pct(roll_5_wins, roll_5_n)
-
-    roll_20_n = min(new_roll_size, 20)
-    roll_20_mask = (1 << roll_20_n) - 1 if roll_20_n > 0 else 0
-    roll_20_wins = (new_roll_bits & roll_20_mask).bit_count()
-    rolling_20_win_rate = _pct(roll_20_wins, roll_20_n)
-
-    roll_50_n = min(new_roll_size, 50)
-    roll_50_mask = (1 << roll_50_n) - 1 if roll_50_n > 0 else 0
-    roll_50_wins = (new_roll_bits & roll_50_mask).bit_count()
-    rolling_50_win_rate = _pct(roll_50_wins, roll_50_n)
+    recent_10_wins, recent_10_matches = _bit_window_wins(recent_bits, recent_size, 10)
+    roll_5_wins, roll_5_n = _bit_window_wins(roll_bits, roll_size, 5)
+    roll_20_wins, roll_20_n = _bit_window_wins(roll_bits, roll_size, 20)
+    roll_50_wins, roll_50_n = _bit_window_wins(roll_bits, roll_size, 50)
 
     close_matches = int(st["close_matches"] or 0) + (1 if is_close_match else 0)
-    close_match_rate = _pct(close_matches, total)
-
-    vs_stronger_matches = int(st["vs_stronger_matches"] or 0)
-    vs_stronger_wins = int(st["vs_stronger_wins"] or 0)
-    vs_similar_matches = int(st["vs_similar_matches"] or 0)
-    vs_similar_wins = int(st["vs_similar_wins"] or 0)
-    vs_weaker_matches = int(st["vs_weaker_matches"] or 0)
-    vs_weaker_wins = int(st["vs_weaker_wins"] or 0)
-
-    if quality_bucket == "stronger":
-        vs_stronger_matches += 1
-        vs_stronger_wins += 1 if is_win else 0
-    elif quality_bucket == "weaker":
-        vs_weaker_matches += 1
-        vs_weaker_wins += 1 if is_win else 0
-    else:
-        vs_similar_matches += 1
-        vs_similar_wins += 1 if is_win else 0
 
-    vs_stronger_win_rate = _pct(vs_stronger_wins, vs_stronger_matches)
-    vs_similar_win_rate = _pct(vs_similar_wins, vs_similar_matches)
-    vs_weaker_win_rate = _pct(vs_weaker_wins, vs_weaker_matches)
-
-    matches_7d, matches_30d, matches_90d = _load_activity_windows(db, user_id, ladder_code, played_at)
-
-    current_rating = rating_after
-    if current_rating is None:
-        rating_row = db.execute(sa.text("""
-            SELECT rating
-            FROM user_ladder_state
-            WHERE user_id=:u AND ladder_code=:l
-        """), {"u": user_id, "l": ladder_code}).mappings().first()
-        current_rating = int(rating_row["rating"]) if rating_row else None
+    vs = {
+        bucket: [int(st[f"vs_{bucket}_matches"] or 0), int(st[f"vs_{bucket}_wins"] or 0)]
+        for bucket in ("stronger", "similar", "weaker")
+    }
+    bucket = quality_bucket if quality_bucket in vs else "similar"
+    vs[bucket][0] += 1
+    vs[bucket][1] += 1 if is_win else 0
 
     peak_rating = int(st["peak_rating"]) if st["peak_rating"] is not None else None
     if current_rating is not None:
         peak_rating = current_rating if peak_rating is None else max(peak_rating, current_rating)
 
-    db.execute(sa.text("""
-        UPDATE user_analytics_state
-        SET total_verified_matches=:total,
-            wins=:wins,
-            losses=:losses,
-            win_rate=:win_rate,
-            current_streak_type=:streak_type,
-            current_streak_len=:streak_len,
-            best_win_streak=:best_win,
-            best_loss_streak=:best_loss,
-            recent_form_bits=:recent_bits,
-            recent_form_size=:recent_size,
-            recent_10_matches=:recent_10_matches,
-            recent_10_wins=:recent_10_wins,
-            recent_10_win_rate=:recent_10_win_rate,
-            rolling_bits_50=:rolling_bits_50,
-            rolling_size_50=:rolling_size_50,
-            rolling_5_win_rate=:rolling_5_win_rate,
-            rolling_20_win_rate=:rolling_20_win_rate,
-            rolling_50_win_rate=:rolling_50_win_rate,
-            matches_7d=:matches_7d,
-            matches_30d=:matches_30d,
-            matches_90d=:matches_90d,
-            close_matches=:close_matches,
-            close_match_rate=:close_match_rate,
-            vs_stronger_matches=:vs_stronger_matches,
-            vs_stronger_wins=:vs_stronger_wins,
-            vs_stronger_win_rate=:vs_stronger_win_rate,
-            vs_similar_matches=:vs_similar_matches,
-            vs_similar_wins=:vs_similar_wins,
-            vs_similar_win_rate=:vs_similar_win_rate,
-            vs_weaker_matches=:vs_weaker_matches,
-            vs_weaker_wins=:vs_weaker_wins,
-            vs_weaker_win_rate=:vs_weaker_win_rate,
-            current_rating=:current_rating,
-            peak_rating=:peak_rating,
-            last_match_id=:match_id,
-            last_match_at=:played_at,
-            updated_at=now()
-        WHERE user_id=:u AND ladder_code=:l
-    """), {
-        "u": user_id,
-        "l": ladder_code,
-        "total": total,
+    out: dict[str, object] = {
+        "total_verified_matches": total,
         "wins": wins,
         "losses": losses,
-        "win_rate": win_rate,
-        "streak_type": new_type,
-        "streak_len": streak_len,
-        "best_win": best_win,
-        "best_loss": best_loss,
-        "recent_bits": new_recent_bits,
-        "recent_size": new_recent_size,
+        "win_rate": _pct(wins, total),
+        "current_streak_type": new_type,
+        "current_streak_len": streak_len,
+        "best_win_streak": best_win,
+        "best_loss_streak": best_loss,
+        "recent_form_bits": recent_bits,
+        "recent_form_size": recent_size,
         "recent_10_matches": recent_10_matches,
         "recent_10_wins": recent_10_wins,
-        "recent_10_win_rate": recent_10_win_rate,
-        "rolling_bits_50": new_roll_bits,
-        "rolling_size_50": new_roll_size,
-        "rolling_5_win_rate": rolling_5_win_rate,
-        "rolling_20_win_rate": rolling_20_win_rate,
-        "rolling_50_win_rate": rolling_50_win_rate,
-        "matches_7d": matches_7d,
-        "matches_30d": matches_30d,
-        "matches_90d": matches_90d,
+        "recent_10_win_rate": _pct(recent_10_wins, recent_10_matches),
+        "rolling_bits_50": roll_bits,
+        "rolling_size_50": roll_size,
+        "rolling_5_win_rate": _pct(roll_5_wins, roll_5_n),
+        "rolling_20_win_rate": _pct(roll_20_wins, roll_20_n),
+        "rolling_50_win_rate": _pct(roll_50_wins, roll_50_n),
         "close_matches": close_matches,
-        "close_match_rate": close_match_rate,
-        "vs_stronger_matches": vs_stronger_matches,
-        "vs_stronger_wins": vs_stronger_wins,
-        "vs_stronger_win_rate": vs_stronger_win_rate,
-        "vs_similar_matches": vs_similar_matches,
-        "vs_similar_wins": vs_similar_wins,
-        "vs_similar_win_rate": vs_similar_win_rate,
-        "vs_weaker_matches": vs_weaker_matches,
-        "vs_weaker_wins": vs_weaker_wins,
-        "vs_weaker_win_rate": vs_weaker_win_rate,
+        "close_match_rate": _pct(close_matches, total),
         "current_rating": current_rating,
         "peak_rating": peak_rating,
-        "match_id": match_id,
-        "played_at": played_at,
-    })
-
-    db.execute(sa.text("""
-        UPDATE user_analytics_match_applied
-        SET rolling_10_win_rate=:rolling_10_win_rate,
-            rolling_20_win_rate=:rolling_20_win_rate,
-            rolling_50_win_rate=:rolling_50_win_rate,
-            streak_type_after=:streak_type_after,
-            streak_len_after=:streak_len_after
-        WHERE user_id=:u AND match_id=:m
-    """), {
-        "u": user_id,
-        "m": match_id,
-        "rolling_10_win_rate": recent_10_win_rate,
-        "rolling_20_win_rate": rolling_20_win_rate,
-        "rolling_50_win_rate": rolling_50_win_rate,
-        "streak_type_after": new_type,
-        "streak_len_after": streak_len,
-    })
-
-    _upsert_partner_stats(
-        db,
-        user_id=user_id,
-        ladder_code=ladder_code,
-        partner_user_id=teammate_user_id,
-        is_win=is_win,
-        played_at=played_at,
-    )
-    for rival_user_id in sorted(set(opponent_user_ids)):
-        _upsert_rival_stats(
-            db,
-            user_id=user_id,
-            ladder_code=ladder_code,
-            rival_user_id=rival_user_id,
-            is_win=is_win,
-            played_at=played_at,
-        )
+    }
+    for name, (matches, bucket_wins) in vs.items():
+        out[f"vs_{name}_matches"] = matches
+        out[f"vs_{name}_wins"] = bucket_wins
+        out[f"vs_{name}_win_rate"] = _pct(bucket_wins, matches)
+    return out
 
 
-def apply_verified_match_analytics(db: Session, match_id: str):
-    ctx = _load_verified_match_context(db, match_id)
-    if not ctx:
-        return
-
-    participant_ids = [p.user_id for p in ctx.participants]
-    ratings = _load_rating_map(db, ctx.match_id, ctx.ladder_code, participant_ids)
+def _participant_applies(ctx: _VerifiedMatchContext, ratings: dict[str, _RatingMeta]) -> list[_ParticipantApply]:
     by_team: dict[int, list[str]] = defaultdict(list)
     for p in ctx.participants:
         by_team[p.team_no].append(p.user_id)
 
+    out: list[_ParticipantApply] = []
     for p in ctx.participants:
         teammates = [uid for uid in by_team[p.team_no] if uid != p.user_id]
         opponents = [uid for tno, ids in by_team.items() if tno != p.team_no for uid in ids]
         opp_old = [ratings[uid].old_rating for uid in opponents if ratings.get(uid) and ratings[uid].old_rating is not None]
         opp_avg = int(round(sum(opp_old) / len(opp_old))) if opp_old else None
         self_meta = ratings.get(p.user_id)
-        quality = _quality_bucket(self_meta.old_rating if self_meta else None, opp_avg)
-
-        _apply_participant_result(
-            db,
-            match_id=ctx.match_id,
-            ladder_code=ctx.ladder_code,
-            played_at=ctx.played_at,
+        out.append(_ParticipantApply(
             user_id=p.user_id,
             is_win=p.is_win,
-            is_close_match=ctx.is_close_match,
             teammate_user_id=teammates[0] if teammates else None,
             opponent_user_ids=opponents[:2],
             opponent_avg_rating=opp_avg,
-            quality_bucket=quality,
+            quality_bucket=_quality_bucket(self_meta.old_rating if self_meta else None, opp_avg),
             rating_before=self_meta.old_rating if self_meta else None,
             rating_after=self_meta.new_rating if self_meta else None,
             rating_delta=self_meta.delta if self_meta else None,
-            enforce_idempotency=True,
+        ))
+    return out
+
+
+def _apply_match_results(db: Session, ctx: _VerifiedMatchContext, ratings: dict[str, _RatingMeta]) -> list[str]:
+    """
+    Aplica el partido a los participantes en bloque: insert multi-fila idempotente en
+    user_analytics_match_applied, una lectura bloqueada de los estados (con ventanas de
+    actividad y rating actual), transicion en Python y escrituras por lotes.
+    Devuelve los user_id efectivamente aplicados.
+    """
+    applies = _participant_applies(ctx, ratings)
+    if not applies:
+        return []
+
+    params: dict[str, object] = {"m": ctx.match_id, "l": ctx.ladder_code, "p": ctx.played_at}
+    applied_rows = [
+        {
+            "user_id": a.user_id,
+            "is_win": a.is_win,
+            "teammate_user_id": a.teammate_user_id,
+            "opponent_a_user_id": a.opponent_user_ids[0] if len(a.opponent_user_ids) > 0 else None,
+            "opponent_b_user_id": a.opponent_user_ids[1] if len(a.opponent_user_ids) > 1 else None,
+            "opponent_avg_rating": a.opponent_avg_rating,
+            "quality_bucket": a.quality_bucket,
+            "rating_before": a.rating_before,
+            "rating_after": a.rating_after,
+            "rating_delta": a.rating_delta,
+        }
+        for a in applies
+    ]
+    values = _values_sql(applied_rows, (
+        ("user_id", "uuid"),
+        ("is_win", "boolean"),
+        ("teammate_user_id", "uuid"),
+        ("opponent_a_user_id", "uuid"),
+        ("opponent_b_user_id", "uuid"),
+        ("opponent_avg_rating", "int"),
+        ("quality_bucket", "text"),
+        ("rating_before", "int"),
+        ("rating_after", "int"),
+        ("rating_delta", "int"),
+    ), params, "a")
+    params["close"] = ctx.is_close_match
+    inserted = db.execute(sa.text(f"""
+        INSERT INTO user_analytics_match_applied (
+            user_id, match_id, ladder_code, is_win, is_close_match,
+            teammate_user_id, opponent_a_user_id, opponent_b_user_id,
+            opponent_avg_rating, quality_bucket,
+            rating_before, rating_after, rating_delta, played_at
+        )
+        SELECT
+            v.user_id, :m, :l, v.is_win, :close,
+            v.teammate_user_id, v.opponent_a_user_id, v.opponent_b_user_id,
+            v.opponent_avg_rating, v.quality_bucket,
+            v.rating_before, v.rating_after, v.rating_delta, :p
+        FROM (VALUES {values}) AS v(
+            user_id, is_win, teammate_user_id, opponent_a_user_id, opponent_b_user_id,
+            opponent_avg_rating, quality_bucket, rating_before, rating_after, rating_delta
         )
+        ON CONFLICT (user_id, match_id) DO NOTHING
+        RETURNING user_id::text
+    """), params).scalars().all()
+    applies = [a for a in applies if a.user_id in set(inserted)]
+    if not applies:
+        return []
 
+    ids = sorted(a.user_id for a in applies)
+    ids_param = sa.bindparam("ids", expanding=True)
+    db.execute(sa.text("""
+        INSERT INTO user_analytics_state (user_id, ladder_code)
+        SELECT CAST(u AS uuid), :l
+        FROM unnest(CAST(:id_list AS text[])) AS u
+        ORDER BY 1
+        ON CONFLICT (user_id, ladder_code) DO NOTHING
+    """), {"l": ctx.ladder_code, "id_list": ids})
 
-def rebuild_analytics(db: Session):
-    db.execute(sa.text("DELETE FROM user_analytics_rival_stats"))
-    db.execute(sa.text("DELETE FROM user_analytics_partner_stats"))
-    db.execute(sa.text("DELETE FROM user_analytics_match_applied"))
-    db.execute(sa.text("DELETE FROM user_analytics_state"))
+    states = db.execute(
+        sa.text("""
+            SELECT
+                s.user_id::text as user_id,
+                s.total_verified_matches,
+                s.wins,
+                s.losses,
+                s.current_streak_type,
+                s.current_streak_len,
+                s.best_win_streak,
+                s.best_loss_streak,
+                s.recent_form_bits,
+                s.recent_form_size,
+                s.rolling_bits_50,
+                s.rolling_size_50,
+                s.close_matches,
+                s.vs_stronger_matches,
+                s.vs_stronger_wins,
+                s.vs_similar_matches,
+                s.vs_similar_wins,
+                s.vs_weaker_matches,
+                s.vs_weaker_wins,
+                s.peak_rating,
+                s.matches_7d,
+                s.matches_30d,
+                s.matches_90d,
+                s.last_match_id::text as last_match_id,
+                s.last_match_at,
+                w.c7,
+                w.c30,
+                w.c90,
+                uls.rating as ladder_rating
+            FROM user_analytics_state s
+            CROSS JOIN LATERAL (
+                SELECT
+                    COUNT(*) FILTER (WHERE a.played_at >= :cut_7) AS c7,
+                    COUNT(*) FILTER (WHERE a.played_at >= :cut_30) AS c30,
+                    COUNT(*) FILTER (WHERE a.played_at >= :cut_90) AS c90
+                FROM user_analytics_match_applied a
+                WHERE a.user_id = s.user_id
+                  AND a.ladder_code = s.ladder_code
+                  AND a.played_at >= :cut_90
+                  AND a.played_at <= :p
+            ) w
+            LEFT JOIN user_ladder_state uls ON uls.user_id = s.user_id AND uls.ladder_code = s.ladder_code
+            WHERE s.ladder_code=:l
+              AND s.user_id::text IN :ids
+            ORDER BY s.user_id
+            FOR UPDATE OF s
+        """).bindparams(ids_param),
+        {"l": ctx.ladder_code, "p": ctx.played_at, "ids": ids, **_activity_cuts(ctx.played_at)},
+    ).mappings().all()
+    state_by_user = {r["user_id"]: r for r in states}
 
-    rows = db.execute(sa.text("""
+    # Partido mas antiguo que el ultimo aplicado del jugador: se reproduce su sufijo.
+    suffixes = _load_applied_suffixes(db, ctx, sorted(
+        uid for uid, st in state_by_user.items()
+        if st["last_match_at"] is not None and st["last_match_at"] >= ctx.played_at
+    ))
+    prefixes = _load_applied_prefixes(db, ctx, sorted(suffixes))
+
+    state_rows: list[dict[str, object]] = []
+    applied_updates: list[dict[str, object]] = []
+    partner_rows: list[dict[str, object]] = []
+    rival_rows: list[dict[str, object]] = []
+    for a in applies:
+        st = state_by_user.get(a.user_id)
+        if not st:
+            continue
+        current_rating = a.rating_after
+        if current_rating is None and st["ladder_rating"] is not None:
+            current_rating = int(st["ladder_rating"])
+        if a.user_id in suffixes:
+            nxt, replayed = _replay_suffix(
+                st, ctx, a, current_rating, prefixes[a.user_id], suffixes[a.user_id]
+            )
+            applied_updates.extend(replayed)
+        else:
+            nxt = _advance_state(
+                st,
+                is_win=a.is_win,
+                is_close_match=ctx.is_close_match,
+                quality_bucket=a.quality_bucket,
+                current_rating=current_rating,
+            )
+            nxt.update({
+                "matches_7d": int(st["c7"] or 0),
+                "matches_30d": int(st["c30"] or 0),
+                "matches_90d": int(st["c90"] or 0),
+                "last_match_id": ctx.match_id,
+                "last_match_at": ctx.played_at,
+            })
+            applied_updates.append(_applied_update(a.user_id, ctx.match_id, nxt))
+        nxt["user_id"] = a.user_id
+        state_rows.append(nxt)
+        wins = 1 if a.is_win else 0
+        if a.teammate_user_id:
+            partner_rows.append({"user_id": a.user_id, "other_user_id": a.teammate_user_id, "wins": wins})
+        for rival_user_id in sorted(set(a.opponent_user_ids)):
+            rival_rows.append({"user_id": a.user_id, "other_user_id": rival_user_id, "wins": wins})
+
+    if not state_rows:
+        return []
+
+    params = {"l": ctx.ladder_code}
+    values = _values_sql(state_rows, (("user_id", "uuid"),) + _STATE_UPDATE_COLUMNS, params, "s")
+    assignments = ",\n            ".join(f"{name}=v.{name}" for name, _ in _STATE_UPDATE_COLUMNS)
+    db.execute(sa.text(f"""
+        UPDATE user_analytics_state AS s
+        SET {assignments},
+            updated_at=now()
+        FROM (VALUES {values}) AS v(user_id, {", ".join(name for name, _ in _STATE_UPDATE_COLUMNS)})
+        WHERE s.user_id = v.user_id
+          AND s.ladder_code = :l
+    """), params)
+
+    params = {}
+    values = _values_sql(applied_updates, (("user_id", "uuid"), ("match_id", "uuid")) + _APPLIED_UPDATE_COLUMNS, params, "r")
+    assignments = ",\n            ".join(f"{name}=v.{name}" for name, _ in _APPLIED_UPDATE_COLUMNS)
+    db.execute(sa.text(f"""
+        UPDATE user_analytics_match_applied AS a
+        SET {assignments}
+        FROM (VALUES {values}) AS v(user_id, match_id, {", ".join(name for name, _ in _APPLIED_UPDATE_COLUMNS)})
+        WHERE a.user_id = v.user_id
+          AND a.match_id = v.match_id
+    """), params)
+
+    for table, other_column, rows in (
+        ("user_analytics_partner_stats", "partner_user_id", partner_rows),
+        ("user_analytics_rival_stats", "rival_user_id", rival_rows),
+    ):
+        if rows:
+            _upsert_pair_stats(db, table, other_column, ctx.ladder_code, ctx.played_at, rows)
+    _sync_pair_leaderboard(db, ctx.ladder_code, {"partner": partner_rows, "rival": rival_rows})
+
+    applied_users = {r["user_id"] for r in state_rows}
+    _upsert_daily_activity(db, ctx, [a for a in applies if a.user_id in applied_users])
+    _upsert_opponent_diff_histogram(db, ctx, [a for a in applies if a.user_id in applied_users])
+
+    return [r["user_id"] for r in state_rows]
+
+
+def _applied_update(user_id: str, match_id: str, nxt: dict[str, object]) -> dict[str, object]:
+    return {
+        "user_id": user_id,
+        "match_id": match_id,
+        "rolling_10_win_rate": nxt["recent_10_win_rate"],
+        "rolling_20_win_rate": nxt["rolling_20_win_rate"],
+        "rolling_50_win_rate": nxt["rolling_50_win_rate"],
+        "streak_type_after": nxt["current_streak_type"],
+        "streak_len_after": nxt["current_streak_len"],
+    }
+
+
+# Orden de aplicacion (igual que el rebuild): (played_at, created_at, id) del partido.
+_MATCH_ORDER_KEY_SQL = "(a.played_at, m.created_at, m.id)"
+_NEW_MATCH_KEY_SQL = "(SELECT nm.played_at, nm.created_at, nm.id FROM matches nm WHERE nm.id = CAST(:m AS uuid))"
+
+
+def _load_applied_suffixes(
+    db: Session,
+    ctx: _VerifiedMatchContext,
+    user_ids: list[str],
+) -> dict[str, list[dict[str, object]]]:
+    """Filas aplicadas posteriores (en orden de aplicacion) al partido nuevo, por jugador."""
+    if not user_ids:
+        return {}
+    rows = db.execute(sa.text(f"""
         SELECT
-            m.id::text as match_id,
-            m.ladder_code,
-            m.played_at,
-            ms.winner_team_no,
-            ms.score_json,
-            mp.user_id::text as user_id,
-            mp.team_no
-        FROM matches m
-        JOIN match_scores ms ON ms.match_id = m.id
-        JOIN match_participants mp ON mp.match_id = m.id
-        WHERE m.status='verified'
-        ORDER BY m.played_at, m.created_at, m.id, mp.team_no, mp.user_id
-    """)).mappings().all()
+            a.user_id::text as user_id,
+            a.match_id::text as match_id,
+            a.is_win,
+            a.is_close_match,
+            a.quality_bucket,
+            a.rating_after,
+            uls.rating as ladder_rating
+        FROM user_analytics_match_applied a
+        JOIN matches m ON m.id = a.match_id
+        LEFT JOIN user_ladder_state uls ON uls.user_id = a.user_id AND uls.ladder_code = a.ladder_code
+        WHERE a.ladder_code = :l
+          AND a.user_id = ANY(CAST(:users AS uuid[]))
+          AND {_MATCH_ORDER_KEY_SQL} > {_NEW_MATCH_KEY_SQL}
+        ORDER BY a.user_id, a.played_at, m.created_at, m.id
+    """), {"l": ctx.ladder_code, "users": user_ids, "m": ctx.match_id}).mappings().all()
+    out: dict[str, list[dict[str, object]]] = defaultdict(list)
+    for r in rows:
+        out[r["user_id"]].append(r)
+    return dict(out)
+
+
+def _load_applied_prefixes(
+    db: Session,
+    ctx: _VerifiedMatchContext,
+    user_ids: list[str],
+) -> dict[str, dict[str, object]]:
+    """
+    Lo que depende del orden antes del partido nuevo: ultima racha, mejores rachas y los
+    ultimos MAX_ROLLING_FORM resultados (mas reciente primero). Una sola sentencia.
+    """
+    if not user_ids:
+        return {}
+    prefix_sql = f"""
+        FROM user_analytics_match_applied a
+        JOIN matches m ON m.id = a.match_id
+        WHERE a.user_id = u.user_id
+          AND a.ladder_code = :l
+          AND {_MATCH_ORDER_KEY_SQL} < {_NEW_MATCH_KEY_SQL}
+    """
+    rows = db.execute(sa.text(f"""
+        SELECT
+            u.user_id::text as user_id,
+            last.streak_type_after,
+            last.streak_len_after,
+            best.best_win_streak,
+            best.best_loss_streak,
+            recent.results
+        FROM unnest(CAST(:users AS uuid[])) AS u(user_id)
+        LEFT JOIN LATERAL (
+            SELECT a.streak_type_after, a.streak_len_after
+            {prefix_sql}
+            ORDER BY a.played_at DESC, m.created_at DESC, m.id DESC
+            LIMIT 1
+        ) last ON true
+        CROSS JOIN LATERAL (
+            SELECT
+                COALESCE(MAX(a.streak_len_after) FILTER (WHERE a.streak_type_after = 'W'), 0) AS best_win_streak,
+                COALESCE(MAX(a.streak_len_after) FILTER (WHERE a.streak_type_after = 'L'), 0) AS best_loss_streak
+            {prefix_sql}
+        ) best
+        CROSS JOIN LATERAL (
+            SELECT COALESCE(array_agg(x.is_win ORDER BY x.pos), '{{}}') AS results
+            FROM (
+                SELECT a.is_win, row_number() OVER (ORDER BY a.played_at DESC, m.created_at DESC, m.id DESC) AS pos
+                {prefix_sql}
+                ORDER BY a.played_at DESC, m.created_at DESC, m.id DESC
+                LIMIT {MAX_ROLLING_FORM}
+            ) x
+        ) recent
+    """), {"l": ctx.ladder_code, "users": user_ids, "m": ctx.match_id}).mappings().all()
+    return {r["user_id"]: r for r in rows}
+
 
-    grouped: dict[str, dict] = defaultdict(lambda: {"participants": []})
+def _replay_suffix(
+    st,
+    ctx: _VerifiedMatchContext,
+    a: _ParticipantApply,
+    current_rating: int | None,
+    prefix,
+    suffix: list,
+) -> tuple[dict[str, object], list[dict[str, object]]]:
+    """
+    Inserta un partido atrasado en la historia del jugador: reconstruye el estado previo
+    (contadores = estado - sufijo; racha y bits desde el prefijo), aplica el partido y
+    reproduce el sufijo en memoria. Devuelve el estado final y las filas a reescribir.
+    """
+    seed: dict[str, object] = {name: st[name] for name in (
+        "total_verified_matches", "wins", "losses", "close_matches", "peak_rating",
+        "vs_stronger_matches", "vs_stronger_wins", "vs_similar_matches", "vs_similar_wins",
+        "vs_weaker_matches", "vs_weaker_wins",
+    )}
+    for r in suffix:
+        bucket = r["quality_bucket"] if r["quality_bucket"] in ("stronger", "similar", "weaker") else "similar"
+        seed["total_verified_matches"] = int(seed["total_verified_matches"]) - 1
+        seed["wins"] = int(seed["wins"]) - (1 if r["is_win"] else 0)
+        seed["losses"] = int(seed["losses"]) - (0 if r["is_win"] else 1)
+        seed["close_matches"] = int(seed["close_matches"]) - (1 if r["is_close_match"] else 0)
+        seed[f"vs_{bucket}_matches"] = int(seed[f"vs_{bucket}_matches"]) - 1
+        seed[f"vs_{bucket}_wins"] = int(seed[f"vs_{bucket}_wins"]) - (1 if r["is_win"] else 0)
+
+    results = list(prefix["results"] or [])
+    bits = 0
+    for i, won in enumerate(results):
+        bits |= (1 if won else 0) << i
+    prefix_total = int(seed["total_verified_matches"])
+    seed.update({
+        "current_streak_type": prefix["streak_type_after"],
+        "current_streak_len": int(prefix["streak_len_after"] or 0),
+        "best_win_streak": int(prefix["best_win_streak"] or 0),
+        "best_loss_streak": int(prefix["best_loss_streak"] or 0),
+        "recent_form_bits": bits & ((1 << MAX_RECENT_FORM) - 1),
+        "recent_form_size": min(prefix_total, MAX_RECENT_FORM),
+        "rolling_bits_50": bits,
+        "rolling_size_50": min(prefix_total, MAX_ROLLING_FORM),
+    })
+
+    nxt = _advance_state(
+        seed,
+        is_win=a.is_win,
+        is_close_match=ctx.is_close_match,
+        quality_bucket=a.quality_bucket,
+        current_rating=current_rating,
+    )
+    updates = [_applied_update(a.user_id, ctx.match_id, nxt)]
+    for r in suffix:
+        rating = r["rating_after"] if r["rating_after"] is not None else r["ladder_rating"]
+        nxt = _advance_state(
+            nxt,
+            is_win=bool(r["is_win"]),
+            is_close_match=bool(r["is_close_match"]),
+            quality_bucket=r["quality_bucket"],
+            current_rating=int(rating) if rating is not None else None,
+        )
+        updates.append(_applied_update(a.user_id, r["match_id"], nxt))
+
+    # El ultimo partido no cambia; las ventanas (ancladas en el) suman el nuevo si cae dentro.
+    cuts = _activity_cuts(st["last_match_at"])
+    nxt.update({
+        "matches_7d": int(st["matches_7d"]) + (1 if ctx.played_at >= cuts["cut_7"] else 0),
+        "matches_30d": int(st["matches_30d"]) + (1 if ctx.played_at >= cuts["cut_30"] else 0),
+        "matches_90d": int(st["matches_90d"]) + (1 if ctx.played_at >= cuts["cut_90"] else 0),
+        "last_match_id": st["last_match_id"],
+        "last_match_at": st["last_match_at"],
+    })
+    return nxt, updates
+
+
+def _upsert_daily_activity(db: Session, ctx: _VerifiedMatchContext, applies: list[_ParticipantApply]) -> None:
+    rows = sorted(
+        ({"user_id": a.user_id, "wins": 1 if a.is_win else 0, "delta": a.rating_delta or 0} for a in applies),
+        key=lambda r: r["user_id"],
+    )
+    if not rows:
+        return
+    params: dict[str, object] = {
+        "l": ctx.ladder_code,
+        "d": activity_date(ctx.played_at),
+        "close": 1 if ctx.is_close_match else 0,
+    }
+    values = _values_sql(rows, (("user_id", "uuid"), ("wins", "int"), ("delta", "int")), params, "d")
+    db.execute(sa.text(f"""
+        INSERT INTO user_analytics_daily_activity (
+            user_id, ladder_code, activity_date, matches, wins, close_matches, rating_delta
+        )
+        SELECT v.user_id, :l, :d, 1, v.wins, :close, v.delta
+        FROM (VALUES {values}) AS v(user_id, wins, delta)
+        ON CONFLICT (user_id, ladder_code, activity_date) DO UPDATE
+        SET matches = user_analytics_daily_activity.matches + 1,
+            wins = user_analytics_daily_activity.wins + EXCLUDED.wins,
+            close_matches = user_analytics_daily_activity.close_matches + EXCLUDED.close_matches,
+            rating_delta = user_analytics_daily_activity.rating_delta + EXCLUDED.rating_delta
+    """), params)
+
+
+def _upsert_opponent_diff_histogram(db: Session, ctx: _VerifiedMatchContext, applies: list[_ParticipantApply]) -> None:
+    rows = sorted(
+        (
+            {
+                "user_id": a.user_id,
+                "bucket": rating_diff_bucket(a.rating_before, a.opponent_avg_rating),
+                "wins": 1 if a.is_win else 0,
+            }
+            for a in applies
+        ),
+        key=lambda r: r["user_id"],
+    )
+    if not rows:
+        return
+    params: dict[str, object] = {"l": ctx.ladder_code}
+    values = _values_sql(rows, (("user_id", "uuid"), ("bucket", "int"), ("wins", "int")), params, "h")
+    db.execute(sa.text(f"""
+        INSERT INTO user_analytics_opponent_diff_histogram (user_id, ladder_code, diff_bucket, matches, wins)
+        SELECT v.user_id, :l, v.bucket, 1, v.wins
+        FROM (VALUES {values}) AS v(user_id, bucket, wins)
+        ON CONFLICT (user_id, ladder_code, diff_bucket) DO UPDATE
+        SET matches = user_analytics_opponent_diff_histogram.matches + 1,
+            wins = user_analytics_opponent_diff_histogram.wins + EXCLUDED.wins
+    """), params)
+
+
+def refresh_opponent_diff_histogram(
+    db: Session,
+    *,
+    ladder_code: str | None = None,
+    user_ids: list[str] | None = None,
+) -> int:
+    """Recalcula el histograma desde user_analytics_match_applied (tras rebuild, swap o reparacion)."""
+    where: list[str] = []
+    params: dict[str, object] = {}
+    if ladder_code is not None:
+        where.append("ladder_code=:l")
+        params["l"] = ladder_code
+    if user_ids is not None:
+        where.append("user_id = ANY(CAST(:users AS uuid[]))")
+        params["users"] = sorted(set(user_ids))
+    scope = f"WHERE {' AND '.join(where)}" if where else ""
+    db.execute(sa.text(f"DELETE FROM user_analytics_opponent_diff_histogram {scope}"), params)
+    return int(db.execute(sa.text(f"""
+        INSERT INTO user_analytics_opponent_diff_histogram (user_id, ladder_code, diff_bucket, matches, wins)
+        SELECT user_id, ladder_code, {_RATING_DIFF_BUCKET_SQL}, count(*)::int, count(*) FILTER (WHERE is_win)::int
+        FROM user_analytics_match_applied
+        {scope}
+        GROUP BY 1, 2, 3
+    """), params).rowcount or 0)
+
+
+def query_opponent_strength(
+    db: Session,
+    *,
+    user_id: str,
+    ladder_code: str | None,
+    threshold: int,
+) -> dict[str, dict[str, object]]:
+    """
+    Reparto vs_stronger/similar/weaker por ladder para un umbral multiplo de
+    RATING_DIFF_BUCKET_WIDTH: suma a lo sumo 2 * MAX / ancho + 1 filas por ladder,
+    sin depender del historial. Con RIVAL_BUCKET_DELTA coincide con user_analytics_state.
+    """
+    params: dict[str, object] = {"u": user_id, "t": threshold}
+    ladder_sql = ""
+    if ladder_code is not None:
+        ladder_sql = "AND ladder_code=:l"
+        params["l"] = ladder_code
+    rows = db.execute(sa.text(f"""
+        SELECT ladder_code,
+               COALESCE(sum(matches) FILTER (WHERE diff_bucket >= :t), 0)::int AS stronger_matches,
+               COALESCE(sum(wins) FILTER (WHERE diff_bucket >= :t), 0)::int AS stronger_wins,
+               COALESCE(sum(matches) FILTER (WHERE diff_bucket > -:t AND diff_bucket < :t), 0)::int AS similar_matches,
+               COALESCE(sum(wins) FILTER (WHERE diff_bucket > -:t AND diff_bucket < :t), 0)::int AS similar_wins,
+               COALESCE(sum(matches) FILTER (WHERE diff_bucket <= -:t), 0)::int AS weaker_matches,
+               COALESCE(sum(wins) FILTER (WHERE diff_bucket <= -:t), 0)::int AS weaker_wins
+        FROM user_analytics_opponent_diff_histogram
+        WHERE user_id=:u {ladder_sql}
+        GROUP BY ladder_code
+    """), params).mappings().all()
+    out: dict[str, dict[str, object]] = {}
     for r in rows:
-        g = grouped[r["match_id"]]
-        g["match_id"] = r["match_id"]
-        g["ladder_code"] = r["ladder_code"]
-        g["played_at"] = r["played_at"]
-        g["winner_team_no"] = int(r["winner_team_no"])
-        score_json = r["score_json"] or {}
-        sets = score_json.get("sets") if isinstance(score_json, dict) else []
-        g["is_close_match"] = isinstance(sets, list) and len(sets) >= 3
-        g["participants"].append((r["user_id"], int(r["team_no"])))
-
-    for g in grouped.values():
-        participant_ids = [uid for uid, _ in g["participants"]]
-        ratings = _load_rating_map(db, g["match_id"], g["ladder_code"], participant_ids)
-        by_team: dict[int, list[str]] = defaultdict(list)
-        for uid, team_no in g["participants"]:
-            by_team[team_no].append(uid)
-
-        for user_id, team_no in g["participants"]:
-            is_win = team_no == g["winner_team_no"]
-            teammates = [uid for uid in by_team[team_no] if uid != user_id]
-            opponents = [uid for tno, ids in by_team.items() if tno != team_no for uid in ids]
-            opp_old = [ratings[uid].old_rating for uid in opponents if ratings.get(uid) and ratings[uid].old_rating is not None]
-            opp_avg = int(round(sum(opp_old) / len(opp_old))) if opp_old else None
-            self_meta = ratings.get(user_id)
-            quality = _quality_bucket(self_meta.old_rating if self_meta else None, opp_avg)
-
-            _apply_participant_result(
+        split: dict[str, object] = {}
+        for name in ("stronger", "similar", "weaker"):
+            matches = int(r[f"{name}_matches"])
+            wins = int(r[f"{name}_wins"])
+            split[f"vs_{name}_matches"] = matches
+            split[f"vs_{name}_wins"] = wins
+            split[f"vs_{name}_win_rate"] = _pct(wins, matches)
+        out[r["ladder_code"]] = split
+    return out
+
+
+def _upsert_pair_stats(
+    db: Session,
+    table: str,
+    other_column: str,
+    ladder_code: str,
+    played_at: datetime,
+    rows: list[dict[str, object]],
+) -> None:
+    # Orden de PK fijo para no cruzar locks con partidos concurrentes.
+    rows = sorted(rows, key=lambda r: (r["user_id"], r["other_user_id"]))
+    params: dict[str, object] = {"l": ladder_code, "p": played_at}
+    values = _values_sql(rows, (("user_id", "uuid"), ("other_user_id", "uuid"), ("wins", "int")), params, "x")
+    db.execute(sa.text(f"""
+        INSERT INTO {table} (
+            user_id, ladder_code, {other_column}, matches, wins, losses, win_rate, last_played_at, updated_at
+        )
+        SELECT v.user_id, :l, v.other_user_id, 1, v.wins, 1 - v.wins, v.wins * 100.0, :p, now()
+        FROM (VALUES {values}) AS v(user_id, other_user_id, wins)
+        ON CONFLICT (user_id, ladder_code, {other_column}) DO UPDATE
+        SET matches = {table}.matches + 1,
+            wins = {table}.wins + EXCLUDED.wins,
+            losses = {table}.losses + EXCLUDED.losses,
+            win_rate = ROUND((({table}.wins + EXCLUDED.wins) * 100.0) / ({table}.matches + 1), 2),
+            last_played_at = CASE
+                WHEN {table}.last_played_at IS NULL THEN EXCLUDED.last_played_at
+                ELSE GREATEST({table}.last_played_at, EXCLUDED.last_played_at)
+            END,
+            updated_at = now()
+    """), params)
+
+
+def _sync_pair_leaderboard(db: Session, ladder_code: str, rows_by_relation: dict[str, list[dict[str, object]]]) -> None:
+    """Copia al leaderboard la fila canonica (user_id < otro) de cada pareja tocada por el partido."""
+    for relation, (table, other_column) in PAIR_LEADERBOARD_SOURCES.items():
+        pairs = sorted({
+            (min(r["user_id"], r["other_user_id"]), max(r["user_id"], r["other_user_id"]))
+            for r in rows_by_relation.get(relation, [])
+        })
+        if not pairs:
+            continue
+        params: dict[str, object] = {"l": ladder_code, "relation": relation}
+        values = _values_sql(
+            [{"low": low, "high": high} for low, high in pairs],
+            (("low", "uuid"), ("high", "uuid")),
+            params,
+            "pl",
+        )
+        db.execute(sa.text(f"""
+            INSERT INTO analytics_pair_leaderboard (
+                ladder_code, relation, user_low_id, user_high_id, matches, wins, losses, win_rate, last_played_at, updated_at
+            )
+            SELECT ps.ladder_code, :relation, ps.user_id, ps.{other_column},
+                   ps.matches, ps.wins, ps.losses, ps.win_rate, ps.last_played_at, now()
+            FROM (VALUES {values}) AS v(low, high)
+            JOIN {table} ps
+              ON ps.user_id = v.low
+             AND ps.{other_column} = v.high
+             AND ps.ladder_code = :l
+            ORDER BY ps.user_id, ps.{other_column}
+            ON CONFLICT (ladder_code, relation, user_low_id, user_high_id) DO UPDATE
+            SET matches = EXCLUDED.matches,
+                wins = EXCLUDED.wins,
+                losses = EXCLUDED.losses,
+                win_rate = EXCLUDED.win_rate,
+                last_played_at = EXCLUDED.last_played_at,
+                updated_at = now()
+        """), params)
+
+
+def refresh_pair_leaderboard(
+    db: Session,
+    *,
+    ladder_code: str | None = None,
+    user_ids: list[str] | None = None,
+) -> dict[str, int]:
+    """
+    Recalcula analytics_pair_leaderboard desde las filas canonicas de partner/rival stats
+    (tras rebuild, swap o reparacion). user_ids limita a las parejas que incluyen a esos jugadores.
+    """
+    where: list[str] = []
+    params: dict[str, object] = {}
+    if ladder_code is not None:
+        where.append("ladder_code=:l")
+        params["l"] = ladder_code
+    if user_ids is not None:
+        params["users"] = sorted(set(user_ids))
+    scope = " AND ".join(where)
+
+    pairs_scope = scope
+    if user_ids is not None:
+        pairs_scope = " AND ".join(where + [
+            "(user_low_id = ANY(CAST(:users AS uuid[])) OR user_high_id = ANY(CAST(:users AS uuid[])))"
+        ])
+    db.execute(sa.text(f"DELETE FROM analytics_pair_leaderboard {'WHERE ' + pairs_scope if pairs_scope else ''}"), params)
+
+    out = {}
+    for relation, (table, other_column) in PAIR_LEADERBOARD_SOURCES.items():
+        source_where = where + [f"user_id < {other_column}"]
+        if user_ids is not None:
+            source_where.append(
+                f"(user_id = ANY(CAST(:users AS uuid[])) OR {other_column} = ANY(CAST(:users AS uuid[])))"
+            )
+        out[relation] = int(db.execute(sa.text(f"""
+            INSERT INTO analytics_pair_leaderboard (
+                ladder_code, relation, user_low_id, user_high_id, matches, wins, losses, win_rate, last_played_at, updated_at
+            )
+            SELECT ladder_code, :relation, user_id, {other_column}, matches, wins, losses, win_rate, last_played_at, now()
+            FROM {table}
+            WHERE {" AND ".join(source_where)}
+        """), {**params, "relation": relation}).rowcount or 0)
+    return out
+
+
+def _apply_verified_match(db: Session, match_id: str) -> tuple[str, list[str]] | None:
+    """Aplica el partido al read model sin tocar snapshots ni cache publica; devuelve (ladder, usuarios aplicados)."""
+    ctx = _load_verified_match_context(db, match_id)
+    if not ctx:
+        return None
+
+    participant_ids = [p.user_id for p in ctx.participants]
+    ratings = _load_rating_map(db, ctx.match_id, ctx.ladder_code, participant_ids)
+    return ctx.ladder_code, _apply_match_results(db, ctx, ratings)
+
+
+def apply_verified_match_analytics(db: Session, match_id: str):
+    result = _apply_verified_match(db, match_id)
+    if not result or not result[1]:
+        return
+    ladder_code, applied = result
+    # Los snapshots se reconstruyen fuera de esta transaccion (refresh_queued_dashboard_snapshots).
+    mark_dashboard_snapshots_stale(db, ladder_code, applied)
+    invalidate_public_dashboards(db, user_ids=applied)
+
+
+# Estado inicial de user_analytics_state (server defaults de la tabla).
+_STATE_DEFAULTS: dict[str, object] = {
+    name: (None if sql_type in ("uuid", "timestamptz", "text") or name in ("current_rating", "peak_rating") else 0)
+    for name, sql_type in _STATE_UPDATE_COLUMNS
+}
+
+_APPLIED_COPY_COLUMNS = (
+    "user_id", "match_id", "ladder_code", "is_win", "is_close_match",
+    "teammate_user_id", "opponent_a_user_id", "opponent_b_user_id",
+    "opponent_avg_rating", "quality_bucket",
+    "rating_before", "rating_after", "rating_delta", "played_at",
+    "rolling_10_win_rate", "rolling_20_win_rate", "rolling_50_win_rate",
+    "streak_type_after", "streak_len_after",
+)
+
+
+def _pair_win_rate(wins: int, matches: int) -> Decimal:
+    # Igual que ROUND((wins * 100.0) / matches, 2) en Postgres (half away from zero).
+    return (Decimal(wins * 100) / Decimal(matches)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def _copy_rows(db: Session, table: str, columns: tuple[str, ...], rows: Iterable[tuple]) -> int:
+    raw = db.connection().connection.driver_connection
+    n = 0
+    with raw.cursor() as cur:
+        with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+                n += 1
+    return n
+
+
+@dataclass
+class _AnalyticsReplay:
+    """
+    Estado en memoria de un replay ordenado por played_at: estados por (user, ladder),
+    ventanas de actividad y agregados de pareja/rival. Misma transicion que el camino
+    incremental (_advance_state).
+    """
+
+    states: dict[tuple[str, str], dict[str, object]] = field(default_factory=dict)
+    windows: dict[tuple[str, str], deque[datetime]] = field(default_factory=lambda: defaultdict(deque))
+    pairs: dict[str, dict[tuple[str, str, str], list]] = field(default_factory=lambda: {"partner": {}, "rival": {}})
+    daily: dict[tuple[str, str, date], list[int]] = field(default_factory=dict)
+    applied: int = 0
+
+    def advance(self, ctx: _VerifiedMatchContext, a: _ParticipantApply, current_rating: int | None) -> dict[str, object]:
+        key = (a.user_id, ctx.ladder_code)
+        st = self.states.get(key)
+        if st is None:
+            st = self.states[key] = dict(_STATE_DEFAULTS)
+
+        cuts = _activity_cuts(ctx.played_at)
+        played = self.windows[key]
+        played.append(ctx.played_at)
+        while played and played[0] < cuts["cut_90"]:
+            played.popleft()
+
+        nxt = _advance_state(
+            st,
+            is_win=a.is_win,
+            is_close_match=ctx.is_close_match,
+            quality_bucket=a.quality_bucket,
+            current_rating=current_rating,
+        )
+        st.update(nxt)
+        st["matches_7d"] = sum(1 for t in played if t >= cuts["cut_7"])
+        st["matches_30d"] = sum(1 for t in played if t >= cuts["cut_30"])
+        st["matches_90d"] = len(played)
+        st["last_match_id"] = ctx.match_id
+        st["last_match_at"] = ctx.played_at
+        self.applied += 1
+
+        day = self.daily.get((a.user_id, ctx.ladder_code, activity_date(ctx.played_at)))
+        if day is None:
+            day = self.daily[(a.user_id, ctx.ladder_code, activity_date(ctx.played_at))] = [0, 0, 0, 0]
+        day[0] += 1
+        day[1] += 1 if a.is_win else 0
+        day[2] += 1 if ctx.is_close_match else 0
+        day[3] += a.rating_delta or 0
+
+        others = [("partner", a.teammate_user_id)] if a.teammate_user_id else []
+        others += [("rival", uid) for uid in sorted(set(a.opponent_user_ids))]
+        for relation, other_id in others:
+            agg = self.pairs[relation].get((a.user_id, ctx.ladder_code, other_id))
+            if agg is None:
+                agg = self.pairs[relation][(a.user_id, ctx.ladder_code, other_id)] = [0, 0, 0, None]
+            agg[0] += 1
+            agg[1] += 1 if a.is_win else 0
+            agg[2] += 0 if a.is_win else 1
+            agg[3] = ctx.played_at if agg[3] is None else max(agg[3], ctx.played_at)
+        return nxt
+
+    def copy_out(self, db: Session, suffix: str = "") -> None:
+        """Carga estados, rollups diarios y agregados de pareja/rival con COPY (las filas aplicadas van aparte)."""
+        state_columns = tuple(name for name, _ in _STATE_UPDATE_COLUMNS)
+        _copy_rows(
+            db,
+            f"user_analytics_state{suffix}",
+            ("user_id", "ladder_code") + state_columns,
+            ((uid, ladder) + tuple(st[name] for name in state_columns) for (uid, ladder), st in sorted(self.states.items())),
+        )
+        _copy_rows(
+            db,
+            f"user_analytics_daily_activity{suffix}",
+            ("user_id", "ladder_code", "activity_date", "matches", "wins", "close_matches", "rating_delta"),
+            (key + tuple(values) for key, values in sorted(self.daily.items())),
+        )
+        for relation, table, other_column in (
+            ("partner", "user_analytics_partner_stats", "partner_user_id"),
+            ("rival", "user_analytics_rival_stats", "rival_user_id"),
+        ):
+            _copy_rows(
                 db,
-                match_id=g["match_id"],
-                ladder_code=g["ladder_code"],
-                played_at=g["played_at"],
-                user_id=user_id,
-                is_win=is_win,
-                is_close_match=bool(g.get("is_close_match")),
-                teammate_user_id=teammates[0] if teammates else None,
-                opponent_user_ids=opponents[:2],
-                opponent_avg_rating=opp_avg,
-                quality_bucket=quality,
-                rating_before=self_meta.old_rating if self_meta else None,
-                rating_after=self_meta.new_rating if self_meta else None,
-                rating_delta=self_meta.delta if self_meta else None,
-                enforce_idempotency=False,
+                f"{table}{suffix}",
+                ("user_id", "ladder_code", other_column, "matches", "wins", "losses", "win_rate", "last_played_at"),
+                (
+                    (uid, ladder, other, matches, wins, losses, _pair_win_rate(wins, matches), last_played_at)
+                    for (uid, ladder, other), (matches, wins, losses, last_played_at) in sorted(self.pairs[relation].items())
+                ),
+            )
+
+
+def _applied_copy_row(ctx: _VerifiedMatchContext, a: _ParticipantApply, nxt: dict[str, object]) -> tuple:
+    return (
+        a.user_id, ctx.match_id, ctx.ladder_code, a.is_win, ctx.is_close_match,
+        a.teammate_user_id,
+        a.opponent_user_ids[0] if len(a.opponent_user_ids) > 0 else None,
+        a.opponent_user_ids[1] if len(a.opponent_user_ids) > 1 else None,
+        a.opponent_avg_rating, a.quality_bucket,
+        a.rating_before, a.rating_after, a.rating_delta, ctx.played_at,
+        nxt["recent_10_win_rate"], nxt["rolling_20_win_rate"], nxt["rolling_50_win_rate"],
+        nxt["current_streak_type"], nxt["current_streak_len"],
+    )
+
+
+def _stream_verified_matches(
+    db: Session,
+    ladder_code: str | None,
+    *,
+    user_ids: list[str] | None = None,
+    since: datetime | None = None,
+) -> Iterator[tuple[_VerifiedMatchContext, dict[str, _RatingMeta], dict[str, int | None]]]:
+    """
+    Recorre los partidos verificados en orden de aplicacion con un cursor server-side.
+    Cada fila trae el rating_event del participante y su rating actual (mismos fallbacks
+    que _load_rating_map y la lectura bloqueada de _apply_match_results). user_ids y since
+    limitan a partidos de esos jugadores desde ese played_at (todos los participantes vienen).
+    """
+    where = ["m.status='verified'"]
+    params: dict[str, object] = {}
+    if ladder_code is not None:
+        where.append("m.ladder_code=:l")
+        params["l"] = ladder_code
+    if since is not None:
+        where.append("m.played_at >= :since")
+        params["since"] = since
+    if user_ids is not None:
+        where.append("""EXISTS (
+                SELECT 1 FROM match_participants x
+                WHERE x.match_id = m.id AND x.user_id = ANY(CAST(:users AS uuid[]))
+            )""")
+        params["users"] = list(user_ids)
+
+    result = db.execute(
+        sa.text(f"""
+            SELECT
+                m.id::text as match_id,
+                m.ladder_code,
+                m.played_at,
+                ms.winner_team_no,
+                ms.score_json,
+                mp.user_id::text as user_id,
+                mp.team_no,
+                re.match_id IS NOT NULL as has_event,
+                re.old_rating,
+                re.new_rating,
+                re.delta,
+                uls.rating as ladder_rating
+            FROM matches m
+            JOIN match_scores ms ON ms.match_id = m.id
+            JOIN match_participants mp ON mp.match_id = m.id
+            LEFT JOIN rating_events re
+              ON re.match_id = m.id AND re.ladder_code = m.ladder_code AND re.user_id = mp.user_id
+            LEFT JOIN user_ladder_state uls
+              ON uls.user_id = mp.user_id AND uls.ladder_code = m.ladder_code
+            WHERE {" AND ".join(where)}
+            ORDER BY m.played_at, m.created_at, m.id, mp.team_no, mp.user_id
+        """),
+        params,
+        execution_options={"stream_results": True, "yield_per": REBUILD_STREAM_ROWS},
+    ).mappings()
+
+    for _, group in groupby(result, key=lambda r: r["match_id"]):
+        rows = list(group)
+        first = rows[0]
+        winner_team_no = int(first["winner_team_no"])
+        score_json = first["score_json"] or {}
+        sets = score_json.get("sets") if isinstance(score_json, dict) else []
+
+        ratings: dict[str, _RatingMeta] = {}
+        ladder_ratings: dict[str, int | None] = {}
+        participants: dict[str, _ParticipantResult] = {}
+        for r in rows:
+            uid = r["user_id"]
+            participants[uid] = _ParticipantResult(
+                user_id=uid,
+                team_no=int(r["team_no"]),
+                is_win=int(r["team_no"]) == winner_team_no,
+            )
+            ladder_rating = int(r["ladder_rating"]) if r["ladder_rating"] is not None else None
+            ladder_ratings[uid] = ladder_rating
+            if r["has_event"]:
+                ratings[uid] = _RatingMeta(
+                    old_rating=int(r["old_rating"]) if r["old_rating"] is not None else None,
+                    new_rating=int(r["new_rating"]) if r["new_rating"] is not None else None,
+                    delta=int(r["delta"]) if r["delta"] is not None else None,
+                )
+            elif ladder_rating is not None:
+                ratings[uid] = _RatingMeta(old_rating=ladder_rating, new_rating=ladder_rating, delta=0)
+            else:
+                ratings[uid] = _RatingMeta(old_rating=None, new_rating=None, delta=None)
+
+        ctx = _VerifiedMatchContext(
+            match_id=first["match_id"],
+            ladder_code=first["ladder_code"],
+            played_at=first["played_at"],
+            is_close_match=isinstance(sets, list) and len(sets) >= 3,
+            participants=list(participants.values()),
+        )
+        yield ctx, ratings, ladder_ratings
+
+
+def _user_shard(user_id: str, shards: int) -> int:
+    return int(user_id.replace("-", ""), 16) % shards
+
+
+def rebuild_analytics(
+    db: Session,
+    *,
+    ladder_code: str | None = None,
+    shard: tuple[int, int] | None = None,
+    staging: bool = False,
+    progress: Callable[[int, int], None] | None = None,
+) -> dict[str, int]:
+    """
+    Reconstruye el read model en streaming: un cursor server-side en orden de played_at,
+    transiciones en memoria (mismas funciones que el camino incremental) y carga con COPY.
+    La memoria crece con jugadores/parejas, no con partidos. ladder_code limita el rebuild
+    a un ladder (el estado nunca cruza ladders).
+
+    Con staging=True escribe en las tablas *_rebuild (create_rebuild_staging) sin tocar
+    las vivas ni los snapshots; swap_rebuild_staging las publica. shard=(i, n) procesa solo
+    los jugadores con hash(user_id) % n == i, asi varios workers reparten un mismo ladder.
+    """
+    if shard is not None and not staging:
+        raise ValueError("shard solo se admite con staging=True")
+    suffix = REBUILD_STAGING_SUFFIX if staging else ""
+
+    params: dict[str, object] = {}
+    if ladder_code is not None:
+        params["l"] = ladder_code
+    if not staging:
+        scope = "WHERE ladder_code=:l" if ladder_code is not None else ""
+        for table in ANALYTICS_REBUILD_TABLES:
+            db.execute(sa.text(f"DELETE FROM {table} {scope}"), params)
+
+    total_matches = int(db.execute(sa.text(f"""
+        SELECT count(*)
+        FROM matches m
+        WHERE m.status='verified'
+          AND EXISTS (SELECT 1 FROM match_scores ms WHERE ms.match_id = m.id)
+          {"AND m.ladder_code=:l" if ladder_code is not None else ""}
+    """), params).scalar_one())
+
+    replay = _AnalyticsReplay()
+    applied_buffer: list[tuple] = []
+    processed = 0
+
+    for ctx, ratings, ladder_ratings in _stream_verified_matches(db, ladder_code):
+        for a in _participant_applies(ctx, ratings):
+            if shard is not None and _user_shard(a.user_id, shard[1]) != shard[0]:
+                continue
+            current_rating = a.rating_after if a.rating_after is not None else ladder_ratings.get(a.user_id)
+            nxt = replay.advance(ctx, a, current_rating)
+            applied_buffer.append(_applied_copy_row(ctx, a, nxt))
+
+        processed += 1
+        if len(applied_buffer) >= REBUILD_COPY_ROWS:
+            _copy_rows(db, f"user_analytics_match_applied{suffix}", _APPLIED_COPY_COLUMNS, applied_buffer)
+            applied_buffer.clear()
+        if progress is not None and processed % REBUILD_PROGRESS_EVERY == 0:
+            progress(processed, total_matches)
+
+    if applied_buffer:
+        _copy_rows(db, f"user_analytics_match_applied{suffix}", _APPLIED_COPY_COLUMNS, applied_buffer)
+    replay.copy_out(db, suffix)
+
+    if progress is not None:
+        progress(processed, total_matches)
+
+    if not staging:
+        refresh_pair_leaderboard(db, ladder_code=ladder_code)
+        refresh_opponent_diff_histogram(db, ladder_code=ladder_code)
+        rebuild_dashboard_snapshots(db, ladder_code=ladder_code)
+        invalidate_public_dashboards(db, ladder_code=ladder_code)
+    return {"matches": processed, "participants": replay.applied, "states": len(replay.states)}
+
+
+def resolve_repair_targets(
+    db: Session,
+    user_ids: list[str],
+    match_ids: list[str],
+    since: datetime | None,
+) -> tuple[list[str], datetime | None]:
+    """
+    Une los jugadores pedidos con los participantes de los partidos indicados. Si no se
+    da `since`, se usa el played_at mas antiguo de esos partidos (None si no hay partidos).
+    """
+    users = set(user_ids)
+    if match_ids:
+        rows = db.execute(sa.text("""
+            SELECT m.played_at, mp.user_id::text as user_id
+            FROM matches m
+            JOIN match_participants mp ON mp.match_id = m.id
+            WHERE m.id = ANY(CAST(:matches AS uuid[]))
+        """), {"matches": list(match_ids)}).mappings().all()
+        users.update(r["user_id"] for r in rows)
+        if since is None and rows:
+            since = min(r["played_at"] for r in rows)
+    return sorted(users), since
+
+
+def repair_analytics(
+    db: Session,
+    user_ids: list[str],
+    *,
+    since: datetime | None = None,
+    ladder_code: str | None = None,
+) -> dict[str, int]:
+    """
+    Recalcula la analitica de unos jugadores desde `since` (None = desde el inicio) sin
+    tocar al resto: siembra el estado con su historial aplicado anterior a `since`,
+    reproduce sus partidos verificados desde ahi y reescribe sus filas de estado, partidos
+    aplicados y parejas/rivales en la transaccion actual. Las filas aplicadas de partidos
+    que ya no estan verificados se descartan aunque sean anteriores a `since`.
+    """
+    users = sorted(set(user_ids))
+    out = {"users": len(users), "seeded": 0, "replayed_matches": 0, "applied": 0, "states": 0}
+    if not users:
+        return out
+
+    params: dict[str, object] = {"users": users}
+    ladder_sql = ""
+    if ladder_code is not None:
+        ladder_sql = "AND ladder_code=:l"
+        params["l"] = ladder_code
+    previous_ladders = db.execute(sa.text(f"""
+        SELECT user_id::text as user_id, ladder_code
+        FROM user_analytics_state
+        WHERE user_id = ANY(CAST(:users AS uuid[])) {ladder_sql}
+        ORDER BY user_id, ladder_code
+        FOR UPDATE
+    """), params).all()
+
+    replay = _AnalyticsReplay()
+    if since is not None:
+        seed = db.execute(
+            sa.text(f"""
+                SELECT
+                    a.user_id::text as user_id,
+                    a.match_id::text as match_id,
+                    a.ladder_code,
+                    a.played_at,
+                    a.is_win,
+                    a.is_close_match,
+                    a.teammate_user_id::text as teammate_user_id,
+                    a.opponent_a_user_id::text as opponent_a_user_id,
+                    a.opponent_b_user_id::text as opponent_b_user_id,
+                    a.opponent_avg_rating,
+                    a.quality_bucket,
+                    a.rating_before,
+                    a.rating_after,
+                    a.rating_delta,
+                    uls.rating as ladder_rating
+                FROM user_analytics_match_applied a
+                JOIN matches m ON m.id = a.match_id
+                LEFT JOIN user_ladder_state uls ON uls.user_id = a.user_id AND uls.ladder_code = a.ladder_code
+                WHERE a.user_id = ANY(CAST(:users AS uuid[]))
+                  AND a.played_at < :since
+                  AND m.status = 'verified'
+                  {ladder_sql.replace("ladder_code", "a.ladder_code")}
+                ORDER BY a.played_at, m.created_at, m.id, a.user_id
+            """),
+            {**params, "since": since},
+            execution_options={"stream_results": True, "yield_per": REBUILD_STREAM_ROWS},
+        ).mappings()
+        for r in seed:
+            ctx = _VerifiedMatchContext(
+                match_id=r["match_id"],
+                ladder_code=r["ladder_code"],
+                played_at=r["played_at"],
+                is_close_match=bool(r["is_close_match"]),
+                participants=[],
+            )
+            a = _ParticipantApply(
+                user_id=r["user_id"],
+                is_win=bool(r["is_win"]),
+                teammate_user_id=r["teammate_user_id"],
+                opponent_user_ids=[uid for uid in (r["opponent_a_user_id"], r["opponent_b_user_id"]) if uid],
+                opponent_avg_rating=r["opponent_avg_rating"],
+                quality_bucket=r["quality_bucket"],
+                rating_before=r["rating_before"],
+                rating_after=r["rating_after"],
+                rating_delta=r["rating_delta"],
             )
+            current_rating = a.rating_after if a.rating_after is not None else r["ladder_rating"]
+            replay.advance(ctx, a, current_rating)
+        out["seeded"] = replay.applied
+
+    if since is None:
+        db.execute(sa.text(f"""
+            DELETE FROM user_analytics_match_applied
+            WHERE user_id = ANY(CAST(:users AS uuid[])) {ladder_sql}
+        """), params)
+    else:
+        db.execute(sa.text(f"""
+            DELETE FROM user_analytics_match_applied a
+            USING matches m
+            WHERE m.id = a.match_id
+              AND a.user_id = ANY(CAST(:users AS uuid[]))
+              {ladder_sql.replace("ladder_code", "a.ladder_code")}
+              AND (a.played_at >= :since OR m.status <> 'verified')
+        """), {**params, "since": since})
+    for table in (
+        "user_analytics_daily_activity",
+        "user_analytics_rival_stats",
+        "user_analytics_partner_stats",
+        "user_analytics_state",
+    ):
+        db.execute(sa.text(f"""
+            DELETE FROM {table}
+            WHERE user_id = ANY(CAST(:users AS uuid[])) {ladder_sql}
+        """), params)
+
+    targets = set(users)
+    applied_buffer: list[tuple] = []
+    for ctx, ratings, ladder_ratings in _stream_verified_matches(db, ladder_code, user_ids=users, since=since):
+        for a in _participant_applies(ctx, ratings):
+            if a.user_id not in targets:
+                continue
+            current_rating = a.rating_after if a.rating_after is not None else ladder_ratings.get(a.user_id)
+            nxt = replay.advance(ctx, a, current_rating)
+            applied_buffer.append(_applied_copy_row(ctx, a, nxt))
+        out["replayed_matches"] += 1
+        if len(applied_buffer) >= REBUILD_COPY_ROWS:
+            _copy_rows(db, "user_analytics_match_applied", _APPLIED_COPY_COLUMNS, applied_buffer)
+            out["applied"] += len(applied_buffer)
+            applied_buffer.clear()
+    if applied_buffer:
+        _copy_rows(db, "user_analytics_match_applied", _APPLIED_COPY_COLUMNS, applied_buffer)
+        out["applied"] += len(applied_buffer)
+    replay.copy_out(db)
+    refresh_pair_leaderboard(db, ladder_code=ladder_code, user_ids=users)
+    refresh_opponent_diff_histogram(db, ladder_code=ladder_code, user_ids=users)
+    out["states"] = len(replay.states)
+
+    by_ladder: dict[str, set[str]] = defaultdict(set)
+    for uid, ladder in previous_ladders:
+        by_ladder[ladder].add(uid)
+    for uid, ladder in replay.states:
+        by_ladder[ladder].add(uid)
+    for ladder, ladder_users in sorted(by_ladder.items()):
+        mark_dashboard_snapshots_stale(db, ladder, sorted(ladder_users))
+    invalidate_public_dashboards(db, user_ids=users)
+    return out
+
+
+def try_lock_analytics_rebuild(conn: sa.Connection) -> bool:
+    """
+    Lock de sesion (no de transaccion) que serializa las corridas de rebuild: las tablas
+    *_rebuild son compartidas, asi que dos corridas se borrarian el staging. Se toma sobre
+    una conexion dedicada que vive toda la corrida; se libera con unlock_analytics_rebuild
+    o al cerrarse la conexion.
+    """
+    return bool(conn.execute(
+        sa.text("SELECT pg_try_advisory_lock(hashtextextended(:k, 0))"), {"k": _REBUILD_LOCK_KEY}
+    ).scalar())
+
+
+def unlock_analytics_rebuild(conn: sa.Connection) -> None:
+    conn.execute(sa.text("SELECT pg_advisory_unlock(hashtextextended(:k, 0))"), {"k": _REBUILD_LOCK_KEY})
+
+
+def create_rebuild_staging(db: Session) -> None:
+    """(Re)crea las tablas *_rebuild vacias con la forma de las vivas (UNLOGGED, sin indices)."""
+    for table in ANALYTICS_REBUILD_TABLES:
+        db.execute(sa.text(f"DROP TABLE IF EXISTS {table}{REBUILD_STAGING_SUFFIX}"))
+        db.execute(sa.text(
+            f"CREATE UNLOGGED TABLE {table}{REBUILD_STAGING_SUFFIX} (LIKE {table} INCLUDING DEFAULTS)"
+        ))
+
+
+def drop_rebuild_staging(db: Session) -> None:
+    for table in ANALYTICS_REBUILD_TABLES:
+        db.execute(sa.text(f"DROP TABLE IF EXISTS {table}{REBUILD_STAGING_SUFFIX}"))
+
+
+def swap_rebuild_staging(db: Session, ladder_codes: list[str]) -> dict[str, int]:
+    """
+    Publica el staging de los ladders indicados en una sola transaccion: los lectores ven
+    el read model anterior hasta el commit. Bloquea escrituras concurrentes (no lecturas)
+    y aplica de forma incremental, por participante, los partidos verificados despues del
+    snapshot del worker de su shard (cada shard corre en su propia transaccion).
+
+    Los snapshots de dashboard de esos ladders se borran y encolan aqui (la lectura los
+    calcula en vivo si faltan) y se reconstruyen tras el commit con
+    refresh_queued_dashboard_snapshots, fuera del lock.
+    """
+    # Mismo orden en que apply_verified_match_analytics escribe, para no cruzar locks.
+    db.execute(sa.text("""
+        LOCK TABLE user_analytics_match_applied, user_analytics_state,
+                   user_analytics_partner_stats, user_analytics_rival_stats,
+                   user_analytics_daily_activity
+        IN EXCLUSIVE MODE
+    """))
+    ladders_param = sa.bindparam("ladders", expanding=True)
+    params = {"ladders": list(ladder_codes)}
+    for table in ANALYTICS_REBUILD_TABLES:
+        db.execute(sa.text(f"DELETE FROM {table} WHERE ladder_code IN :ladders").bindparams(ladders_param), params)
+    copied = 0
+    for table in reversed(ANALYTICS_REBUILD_TABLES):
+        copied += db.execute(sa.text(f"""
+            INSERT INTO {table}
+            SELECT * FROM {table}{REBUILD_STAGING_SUFFIX}
+            WHERE ladder_code IN :ladders
+        """).bindparams(ladders_param), params).rowcount or 0
+    for ladder_code in ladder_codes:
+        refresh_pair_leaderboard(db, ladder_code=ladder_code)
+        refresh_opponent_diff_histogram(db, ladder_code=ladder_code)
+        invalidate_public_dashboards(db, ladder_code=ladder_code)
+
+    missed = db.execute(sa.text("""
+        SELECT m.id::text
+        FROM matches m
+        WHERE m.status='verified'
+          AND m.ladder_code IN :ladders
+          AND EXISTS (SELECT 1 FROM match_scores ms WHERE ms.match_id = m.id)
+          AND EXISTS (
+              SELECT 1
+              FROM match_participants mp
+              WHERE mp.match_id = m.id
+                AND NOT EXISTS (
+                    SELECT 1
+                    FROM user_analytics_match_applied a
+                    WHERE a.match_id = m.id
+                      AND a.user_id = mp.user_id
+                )
+          )
+        ORDER BY m.played_at, m.created_at, m.id
+    """).bindparams(ladders_param), params).scalars().all()
+    # El insert ON CONFLICT DO NOTHING de applied deja fuera a los participantes ya aplicados.
+    # Snapshots y cache publica de estos ladders ya se invalidan enteros en este swap.
+    for match_id in missed:
+        _apply_verified_match(db, match_id)
+
+    for ladder_code in ladder_codes:
+        mark_dashboard_snapshots_stale(db, ladder_code)
+    drop_rebuild_staging(db)
+    return {"rows": copied, "caught_up_matches": len(missed)}
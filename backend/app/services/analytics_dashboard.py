@@ -0,0 +1,766 @@
+from __future__ import annotations
+
+import json
+from datetime import date, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.schemas.analytics import (
+    PartnerStatOut,
+    RatingTrendPointOut,
+    RivalStatOut,
+    RollingWinRatePointOut,
+    StreakPointOut,
+    VolumePointOut,
+)
+from app.services.trend_downsampling import LttbStream
+
+
+DASHBOARD_TREND_INTERVALS = ("match", "week", "month")
+# Los snapshots se guardan con el maximo que admite el endpoint y se recortan al leer.
+DASHBOARD_SNAPSHOT_POINTS = 200
+DASHBOARD_SNAPSHOT_TOP_N = 20
+DASHBOARD_SNAPSHOT_REBUILD_BATCH = 200
+# recent: ultimos N puntos; full: historial completo reducido a N puntos con LTTB.
+DASHBOARD_TREND_MODES = ("recent", "full")
+# Puntos de trend_mode=full que precalcula el worker (defaults del dashboard y del export).
+FULL_TREND_CACHE_POINTS = (50, 100)
+TREND_STREAM_ROWS = 2000
+
+
+def _to_float(value: object | None) -> float:
+    return float(value or 0.0)
+
+
+def _trend_bucket_expr(interval: str) -> str:
+    if interval == "week":
+        return "date_trunc('week', played_at)"
+    if interval == "month":
+        return "date_trunc('month', played_at)"
+    raise ValueError("interval debe ser week|month")
+
+
+def _query_rating_trend(
+    db: Session,
+    *,
+    user_id: str,
+    ladder_code: str,
+    trend_interval: str,
+    points: int,
+) -> list[RatingTrendPointOut]:
+    params = {"u": user_id, "l": ladder_code, "limit": points}
+    if trend_interval == "match":
+        rows = db.execute(sa.text("""
+            SELECT
+                t.match_id::text AS match_id,
+                t.played_at AS at,
+                t.rating_after AS rating
+            FROM (
+                SELECT match_id, played_at, rating_after
+                FROM user_analytics_match_applied
+                WHERE user_id=:u
+                  AND ladder_code=:l
+                  AND rating_after IS NOT NULL
+                ORDER BY played_at DESC, match_id DESC
+                LIMIT :limit
+            ) t
+            ORDER BY t.played_at ASC, t.match_id ASC
+        """), params).mappings().all()
+        return [
+            RatingTrendPointOut(
+                at=r["at"],
+                rating=int(r["rating"]) if r["rating"] is not None else None,
+                match_id=r["match_id"],
+            )
+            for r in rows
+        ]
+
+    bucket_expr = _trend_bucket_expr(trend_interval)
+    rows = db.execute(sa.text(f"""
+        WITH bucketed AS (
+            SELECT
+                {bucket_expr} AS bucket_start,
+                played_at,
+                rating_after
+            FROM user_analytics_match_applied
+            WHERE user_id=:u
+              AND ladder_code=:l
+              AND rating_after IS NOT NULL
+        ),
+        latest AS (
+            SELECT DISTINCT ON (bucket_start)
+                bucket_start,
+                played_at,
+                rating_after
+            FROM bucketed
+            ORDER BY bucket_start DESC, played_at DESC
+        ),
+        limited AS (
+            SELECT bucket_start, rating_after
+            FROM latest
+            ORDER BY bucket_start DESC
+            LIMIT :limit
+        )
+        SELECT
+            bucket_start AS at,
+            rating_after AS rating
+        FROM limited
+        ORDER BY at ASC
+    """), params).mappings().all()
+    return [
+        RatingTrendPointOut(
+            at=r["at"],
+            rating=int(r["rating"]) if r["rating"] is not None else None,
+            match_id=None,
+        )
+        for r in rows
+    ]
+
+
+def _query_rolling_win_rate(
+    db: Session,
+    *,
+    user_id: str,
+    ladder_code: str,
+    trend_interval: str,
+    points: int,
+) -> list[RollingWinRatePointOut]:
+    params = {"u": user_id, "l": ladder_code, "limit": points}
+    if trend_interval == "match":
+        rows = db.execute(sa.text("""
+            SELECT
+                t.played_at AS at,
+                t.rolling_10_win_rate,
+                t.rolling_20_win_rate,
+                t.rolling_50_win_rate
+            FROM (
+                SELECT played_at, rolling_10_win_rate, rolling_20_win_rate, rolling_50_win_rate, match_id
+                FROM user_analytics_match_applied
+                WHERE user_id=:u
+                  AND ladder_code=:l
+                ORDER BY played_at DESC, match_id DESC
+                LIMIT :limit
+            ) t
+            ORDER BY t.played_at ASC
+        """), params).mappings().all()
+    else:
+        bucket_expr = _trend_bucket_expr(trend_interval)
+        rows = db.execute(sa.text(f"""
+            WITH bucketed AS (
+                SELECT
+                    {bucket_expr} AS bucket_start,
+                    played_at,
+                    rolling_10_win_rate,
+                    rolling_20_win_rate,
+                    rolling_50_win_rate
+                FROM user_analytics_match_applied
+                WHERE user_id=:u
+                  AND ladder_code=:l
+            ),
+            latest AS (
+                SELECT DISTINCT ON (bucket_start)
+                    bucket_start,
+                    played_at,
+                    rolling_10_win_rate,
+                    rolling_20_win_rate,
+                    rolling_50_win_rate
+                FROM bucketed
+                ORDER BY bucket_start DESC, played_at DESC
+            ),
+            limited AS (
+                SELECT bucket_start, rolling_10_win_rate, rolling_20_win_rate, rolling_50_win_rate
+                FROM latest
+                ORDER BY bucket_start DESC
+                LIMIT :limit
+            )
+            SELECT
+                bucket_start AS at,
+                rolling_10_win_rate,
+                rolling_20_win_rate,
+                rolling_50_win_rate
+            FROM limited
+            ORDER BY at ASC
+        """), params).mappings().all()
+    return [
+        RollingWinRatePointOut(
+            at=r["at"],
+            rolling_10_win_rate=_to_float(r["rolling_10_win_rate"]) if r["rolling_10_win_rate"] is not None else None,
+            rolling_20_win_rate=_to_float(r["rolling_20_win_rate"]) if r["rolling_20_win_rate"] is not None else None,
+            rolling_50_win_rate=_to_float(r["rolling_50_win_rate"]) if r["rolling_50_win_rate"] is not None else None,
+        )
+        for r in rows
+    ]
+
+
+def _query_volume(
+    db: Session,
+    *,
+    user_id: str,
+    ladder_code: str,
+    bucket: str,
+    points: int,
+) -> list[VolumePointOut]:
+    # Sobre el rollup diario: unas decenas de filas por usuario en lugar de todo el historial.
+    if bucket not in ("week", "month"):
+        raise ValueError("bucket debe ser week|month")
+    rows = db.execute(sa.text(f"""
+        SELECT
+            (date_trunc('{bucket}', activity_date::timestamp) AT TIME ZONE 'UTC') AS at,
+            SUM(matches)::int AS matches
+        FROM user_analytics_daily_activity
+        WHERE user_id=:u
+          AND ladder_code=:l
+        GROUP BY 1
+        ORDER BY 1 DESC
+        LIMIT :limit
+    """), {"u": user_id, "l": ladder_code, "limit": points}).mappings().all()
+    return [VolumePointOut(at=r["at"], matches=int(r["matches"] or 0)) for r in reversed(rows)]
+
+
+def query_activity_range(
+    db: Session,
+    *,
+    user_id: str,
+    ladder_code: str,
+    date_from: date,
+    date_to: date,
+    bucket: str | None,
+) -> dict[str, object]:
+    """
+    Totales de actividad en [date_from, date_to] (dias UTC) y, opcionalmente, por
+    bucket day|week|month. Lee solo filas del rollup diario.
+    """
+    rows = db.execute(sa.text("""
+        SELECT activity_date, matches, wins, close_matches, rating_delta
+        FROM user_analytics_daily_activity
+        WHERE user_id=:u
+          AND ladder_code=:l
+          AND activity_date BETWEEN :f AND :t
+        ORDER BY activity_date
+    """), {"u": user_id, "l": ladder_code, "f": date_from, "t": date_to}).mappings().all()
+
+    totals = {"matches": 0, "wins": 0, "close_matches": 0, "rating_delta": 0}
+    buckets: dict[date, dict[str, int]] = {}
+    for r in rows:
+        day = r["activity_date"]
+        if bucket == "week":
+            start = day - timedelta(days=day.weekday())
+        elif bucket == "month":
+            start = day.replace(day=1)
+        else:
+            start = day
+        acc = buckets.setdefault(start, {"matches": 0, "wins": 0, "close_matches": 0, "rating_delta": 0})
+        for key in totals:
+            totals[key] += int(r[key] or 0)
+            acc[key] += int(r[key] or 0)
+
+    return {
+        **totals,
+        "losses": totals["matches"] - totals["wins"],
+        "win_rate": round((totals["wins"] * 100.0) / totals["matches"], 2) if totals["matches"] else 0.0,
+        "buckets": (
+            [{"start": start, **acc} for start, acc in sorted(buckets.items())]
+            if bucket is not None
+            else []
+        ),
+    }
+
+
+def _query_streak_timeline(
+    db: Session,
+    *,
+    user_id: str,
+    ladder_code: str,
+    points: int,
+) -> list[StreakPointOut]:
+    rows = db.execute(sa.text("""
+        SELECT
+            t.match_id::text AS match_id,
+            t.played_at AS at,
+            t.streak_type_after AS streak_type,
+            t.streak_len_after AS streak_len
+        FROM (
+            SELECT match_id, played_at, streak_type_after, streak_len_after
+            FROM user_analytics_match_applied
+            WHERE user_id=:u
+              AND ladder_code=:l
+              AND streak_type_after IS NOT NULL
+              AND streak_len_after IS NOT NULL
+            ORDER BY played_at DESC, match_id DESC
+            LIMIT :limit
+        ) t
+        ORDER BY t.played_at ASC, t.match_id ASC
+    """), {"u": user_id, "l": ladder_code, "limit": points}).mappings().all()
+    return [
+        StreakPointOut(
+            at=r["at"],
+            match_id=r["match_id"],
+            streak_type=r["streak_type"],
+            streak_len=int(r["streak_len"] or 0),
+        )
+        for r in rows
+    ]
+
+
+def _query_top_partners(
+    db: Session,
+    *,
+    user_id: str,
+    ladder_code: str,
+    top_n: int,
+) -> list[PartnerStatOut]:
+    rows = db.execute(sa.text("""
+        SELECT
+            s.partner_user_id::text AS partner_user_id,
+            p.alias AS partner_alias,
+            s.matches,
+            s.wins,
+            s.losses,
+            s.win_rate,
+            s.last_played_at
+        FROM user_analytics_partner_stats s
+        LEFT JOIN user_profiles p ON p.user_id = s.partner_user_id
+        WHERE s.user_id=:u
+          AND s.ladder_code=:l
+        ORDER BY s.matches DESC, s.win_rate DESC, s.partner_user_id
+        LIMIT :limit
+    """), {"u": user_id, "l": ladder_code, "limit": top_n}).mappings().all()
+    return [
+        PartnerStatOut(
+            partner_user_id=r["partner_user_id"],
+            partner_alias=r["partner_alias"],
+            matches=int(r["matches"] or 0),
+            wins=int(r["wins"] or 0),
+            losses=int(r["losses"] or 0),
+            win_rate=_to_float(r["win_rate"]),
+            last_played_at=r["last_played_at"],
+        )
+        for r in rows
+    ]
+
+
+def _query_top_rivals(
+    db: Session,
+    *,
+    user_id: str,
+    ladder_code: str,
+    top_n: int,
+) -> list[RivalStatOut]:
+    rows = db.execute(sa.text("""
+        SELECT
+            s.rival_user_id::text AS rival_user_id,
+            p.alias AS rival_alias,
+            s.matches,
+            s.wins,
+            s.losses,
+            s.win_rate,
+            s.last_played_at
+        FROM user_analytics_rival_stats s
+        LEFT JOIN user_profiles p ON p.user_id = s.rival_user_id
+        WHERE s.user_id=:u
+          AND s.ladder_code=:l
+        ORDER BY s.matches DESC, s.win_rate DESC, s.rival_user_id
+        LIMIT :limit
+    """), {"u": user_id, "l": ladder_code, "limit": top_n}).mappings().all()
+    return [
+        RivalStatOut(
+            rival_user_id=r["rival_user_id"],
+            rival_alias=r["rival_alias"],
+            matches=int(r["matches"] or 0),
+            wins=int(r["wins"] or 0),
+            losses=int(r["losses"] or 0),
+            win_rate=_to_float(r["win_rate"]),
+            last_played_at=r["last_played_at"],
+        )
+        for r in rows
+    ]
+
+
+def query_dashboard_series(
+    db: Session,
+    *,
+    user_id: str,
+    ladder_code: str,
+    trend_interval: str,
+    points: int,
+    top_n: int,
+) -> dict[str, list]:
+    """Series del dashboard calculadas en vivo (7 consultas); fuente de los snapshots."""
+    return {
+        "rating_trend": _query_rating_trend(
+            db,
+            user_id=user_id,
+            ladder_code=ladder_code,
+            trend_interval=trend_interval,
+            points=points,
+        ),
+        "rolling_win_rate_trend": _query_rolling_win_rate(
+            db,
+            user_id=user_id,
+            ladder_code=ladder_code,
+            trend_interval=trend_interval,
+            points=points,
+        ),
+        "volume_weekly": _query_volume(
+            db,
+            user_id=user_id,
+            ladder_code=ladder_code,
+            bucket="week",
+            points=points,
+        ),
+        "volume_monthly": _query_volume(
+            db,
+            user_id=user_id,
+            ladder_code=ladder_code,
+            bucket="month",
+            points=points,
+        ),
+        "streak_timeline": _query_streak_timeline(
+            db,
+            user_id=user_id,
+            ladder_code=ladder_code,
+            points=points,
+        ),
+        "top_partners": _query_top_partners(
+            db,
+            user_id=user_id,
+            ladder_code=ladder_code,
+            top_n=top_n,
+        ),
+        "top_rivals": _query_top_rivals(
+            db,
+            user_id=user_id,
+            ladder_code=ladder_code,
+            top_n=top_n,
+        ),
+    }
+
+
+def _snapshot_document(series: dict[str, list]) -> tuple[dict[str, list], list[str]]:
+    # Los alias no se congelan: se resuelven al leer desde related_user_ids.
+    doc = {key: [item.model_dump(mode="json") for item in items] for key, items in series.items()}
+    related: list[str] = []
+    for item in doc["top_partners"]:
+        item.pop("partner_alias", None)
+        related.append(item["partner_user_id"])
+    for item in doc["top_rivals"]:
+        item.pop("rival_alias", None)
+        related.append(item["rival_user_id"])
+    return doc, sorted(set(related))
+
+
+def store_dashboard_snapshot(
+    db: Session,
+    *,
+    user_id: str,
+    ladder_code: str,
+    trend_interval: str,
+    series: dict[str, list],
+) -> None:
+    doc, related = _snapshot_document(series)
+    db.execute(sa.text("""
+        INSERT INTO user_analytics_dashboard_snapshots (
+            user_id, ladder_code, trend_interval, payload, related_user_ids, built_at
+        )
+        VALUES (:u, :l, :i, CAST(:payload AS jsonb), CAST(:related AS uuid[]), now())
+        ON CONFLICT (user_id, ladder_code, trend_interval) DO UPDATE
+        SET payload = EXCLUDED.payload,
+            related_user_ids = EXCLUDED.related_user_ids,
+            built_at = now()
+    """), {
+        "u": user_id,
+        "l": ladder_code,
+        "i": trend_interval,
+        "payload": json.dumps(doc, separators=(",", ":")),
+        "related": related,
+    })
+
+
+def refresh_dashboard_snapshots(db: Session, user_ids: list[str], ladder_code: str) -> None:
+    """
+    Reconstruye los snapshots (user, ladder, trend_interval) de los usuarios dados y su
+    cache de tendencias completas. Volumen, racha y top partners/rivals no dependen del
+    intervalo: se consultan una vez.
+    """
+    for user_id in sorted(set(user_ids)):
+        refresh_trend_cache(db, user_id, ladder_code)
+        shared = query_dashboard_series(
+            db,
+            user_id=user_id,
+            ladder_code=ladder_code,
+            trend_interval="match",
+            points=DASHBOARD_SNAPSHOT_POINTS,
+            top_n=DASHBOARD_SNAPSHOT_TOP_N,
+        )
+        for interval in DASHBOARD_TREND_INTERVALS:
+            series = dict(shared)
+            if interval != "match":
+                series["rating_trend"] = _query_rating_trend(
+                    db,
+                    user_id=user_id,
+                    ladder_code=ladder_code,
+                    trend_interval=interval,
+                    points=DASHBOARD_SNAPSHOT_POINTS,
+                )
+                series["rolling_win_rate_trend"] = _query_rolling_win_rate(
+                    db,
+                    user_id=user_id,
+                    ladder_code=ladder_code,
+                    trend_interval=interval,
+                    points=DASHBOARD_SNAPSHOT_POINTS,
+                )
+            store_dashboard_snapshot(
+                db,
+                user_id=user_id,
+                ladder_code=ladder_code,
+                trend_interval=interval,
+                series=series,
+            )
+
+
+def rebuild_dashboard_snapshots(db: Session, ladder_code: str | None = None) -> dict[str, int]:
+    """Recalcula los snapshots desde user_analytics_state (tras rebuild_analytics)."""
+    scope = "WHERE ladder_code=:l" if ladder_code is not None else ""
+    params = {"l": ladder_code} if ladder_code is not None else {}
+    db.execute(sa.text(f"DELETE FROM user_analytics_dashboard_snapshots {scope}"), params)
+    db.execute(sa.text(f"DELETE FROM user_analytics_dashboard_refresh_queue {scope}"), params)
+    rows = db.execute(sa.text(f"""
+        SELECT user_id::text as user_id, ladder_code
+        FROM user_analytics_state
+        {scope}
+        ORDER BY ladder_code, user_id
+    """), params).mappings().all()
+    for r in rows:
+        refresh_dashboard_snapshots(db, [r["user_id"]], r["ladder_code"])
+    return {"snapshots": len(rows) * len(DASHBOARD_TREND_INTERVALS)}
+
+
+def mark_dashboard_snapshots_stale(db: Session, ladder_code: str, user_ids: list[str] | None = None) -> None:
+    """
+    Borra los snapshots de los usuarios dados (None: todo el ladder) y los encola para
+    refresh_queued_dashboard_snapshots. Dos sentencias: es lo unico que paga la
+    transaccion que verifica el partido; la lectura calcula en vivo mientras tanto.
+    """
+    if user_ids is not None and not user_ids:
+        return
+    users_sql = "AND user_id = ANY(CAST(:users AS uuid[]))" if user_ids is not None else ""
+    params = {"l": ladder_code, "users": sorted(set(user_ids or []))}
+    db.execute(sa.text(f"""
+        DELETE FROM user_analytics_dashboard_snapshots
+        WHERE ladder_code=:l {users_sql}
+    """), params)
+    db.execute(sa.text(f"""
+        INSERT INTO user_analytics_dashboard_refresh_queue (user_id, ladder_code)
+        SELECT user_id, ladder_code
+        FROM user_analytics_state
+        WHERE ladder_code=:l {users_sql}
+        ORDER BY user_id
+        ON CONFLICT (user_id, ladder_code) DO NOTHING
+    """), params)
+
+
+def refresh_queued_dashboard_snapshots(
+    db: Session,
+    *,
+    limit: int = DASHBOARD_SNAPSHOT_REBUILD_BATCH,
+) -> list[tuple[str, str]]:
+    """
+    Reconstruye los snapshots del siguiente lote de la cola y devuelve los (user_id,
+    ladder_code) desencolados; lista vacia si no hubo nada que procesar. Varios workers pueden
+    correr a la vez (SKIP LOCKED). Los estados se bloquean FOR SHARE SKIP LOCKED: un partido
+    verificado en paralelo espera como mucho a este lote, y si su apply va primero la fila
+    se queda en cola para el siguiente. El llamador hace commit entre lotes.
+    """
+    claimed = [tuple(r) for r in db.execute(sa.text("""
+        SELECT user_id::text, ladder_code
+        FROM user_analytics_dashboard_refresh_queue
+        ORDER BY queued_at, ladder_code, user_id
+        LIMIT :n
+        FOR UPDATE SKIP LOCKED
+    """), {"n": limit}).all()]
+    if not claimed:
+        return []
+    params = {"users": [u for u, _ in claimed], "ladders": [l for _, l in claimed]}
+    pairs_sql = """
+        FROM user_analytics_state s
+        JOIN unnest(CAST(:users AS uuid[]), CAST(:ladders AS text[])) AS c(user_id, ladder_code)
+          ON c.user_id = s.user_id AND c.ladder_code = s.ladder_code
+    """
+    done = [tuple(r) for r in db.execute(sa.text(f"""
+        SELECT s.user_id::text, s.ladder_code
+        {pairs_sql}
+        ORDER BY s.ladder_code, s.user_id
+        FOR SHARE OF s SKIP LOCKED
+    """), params).all()]
+    existing = {tuple(r) for r in db.execute(sa.text(f"SELECT s.user_id::text, s.ladder_code {pairs_sql}"), params).all()}
+    busy = existing.difference(done)
+    # Se desencolan los procesados y los que ya no tienen estado (reparados o borrados).
+    drop = [c for c in claimed if c not in busy]
+    db.execute(sa.text("""
+        DELETE FROM user_analytics_dashboard_refresh_queue q
+        USING unnest(CAST(:users AS uuid[]), CAST(:ladders AS text[])) AS c(user_id, ladder_code)
+        WHERE q.user_id = c.user_id
+          AND q.ladder_code = c.ladder_code
+    """), {"users": [u for u, _ in drop], "ladders": [l for _, l in drop]})
+    for user_id, ladder_code in done:
+        refresh_dashboard_snapshots(db, [user_id], ladder_code)
+    return drop
+
+
+def dashboard_series_from_snapshot(
+    payload: dict[str, list],
+    aliases: dict[str, str] | None,
+    *,
+    points: int,
+    top_n: int,
+) -> dict[str, list]:
+    aliases = aliases or {}
+    return {
+        "rating_trend": [RatingTrendPointOut(**p) for p in payload["rating_trend"][-points:]],
+        "rolling_win_rate_trend": [RollingWinRatePointOut(**p) for p in payload["rolling_win_rate_trend"][-points:]],
+        "volume_weekly": [VolumePointOut(**p) for p in payload["volume_weekly"][-points:]],
+        "volume_monthly": [VolumePointOut(**p) for p in payload["volume_monthly"][-points:]],
+        "streak_timeline": [StreakPointOut(**p) for p in payload["streak_timeline"][-points:]],
+        "top_partners": [
+            PartnerStatOut(**p, partner_alias=aliases.get(p["partner_user_id"]))
+            for p in payload["top_partners"][:top_n]
+        ],
+        "top_rivals": [
+            RivalStatOut(**p, rival_alias=aliases.get(p["rival_user_id"]))
+            for p in payload["top_rivals"][:top_n]
+        ],
+    }
+
+
+def _downsample_full_trends(
+    db: Session,
+    *,
+    user_id: str,
+    ladder_code: str,
+    points: tuple[int, ...],
+) -> dict[int, dict[str, list]]:
+    """
+    Rating y win rate de todo el historial en una sola pasada sobre
+    user_analytics_match_applied (una reduccion por cada valor de points); el win rate se
+    reduce sobre rolling_20_win_rate. Mismo orden que el apply, que calculo los rolling.
+    """
+    params = {"u": user_id, "l": ladder_code}
+    counts = db.execute(sa.text("""
+        SELECT count(*)::int AS total,
+               count(rating_after)::int AS rated
+        FROM user_analytics_match_applied
+        WHERE user_id=:u
+          AND ladder_code=:l
+    """), params).mappings().one()
+    streams = {
+        n: (
+            LttbStream[RatingTrendPointOut](int(counts["rated"]), n),
+            LttbStream[RollingWinRatePointOut](int(counts["total"]), n),
+        )
+        for n in points
+    }
+
+    rows = db.execute(
+        sa.text("""
+            SELECT a.match_id::text AS match_id,
+                   a.played_at,
+                   a.rating_after,
+                   a.rolling_10_win_rate,
+                   a.rolling_20_win_rate,
+                   a.rolling_50_win_rate
+            FROM user_analytics_match_applied a
+            JOIN matches m ON m.id = a.match_id
+            WHERE a.user_id=:u
+              AND a.ladder_code=:l
+            ORDER BY a.played_at ASC, m.created_at ASC, m.id ASC
+        """),
+        params,
+        execution_options={"stream_results": True, "yield_per": TREND_STREAM_ROWS},
+    ).mappings()
+    for r in rows:
+        x = r["played_at"].timestamp()
+        rating_point = None
+        if r["rating_after"] is not None:
+            rating_point = RatingTrendPointOut(
+                at=r["played_at"],
+                rating=int(r["rating_after"]),
+                match_id=r["match_id"],
+            )
+        win_rate_point = RollingWinRatePointOut(
+            at=r["played_at"],
+            rolling_10_win_rate=_to_float(r["rolling_10_win_rate"]) if r["rolling_10_win_rate"] is not None else None,
+            rolling_20_win_rate=_to_float(r["rolling_20_win_rate"]) if r["rolling_20_win_rate"] is not None else None,
+            rolling_50_win_rate=_to_float(r["rolling_50_win_rate"]) if r["rolling_50_win_rate"] is not None else None,
+        )
+        for rating, win_rate in streams.values():
+            if rating_point is not None:
+                rating.push(x, float(r["rating_after"]), rating_point)
+            win_rate.push(x, _to_float(r["rolling_20_win_rate"]), win_rate_point)
+    return {
+        n: {"rating_trend": rating.finish(), "rolling_win_rate_trend": win_rate.finish()}
+        for n, (rating, win_rate) in streams.items()
+    }
+
+
+def query_full_trends(
+    db: Session,
+    *,
+    user_id: str,
+    ladder_code: str,
+    points: int,
+    state_updated_at: object,
+) -> dict[str, list]:
+    """
+    Tendencias de historial completo (LTTB) desde el cache por (user, ladder, points) si
+    esta al dia con state_updated_at; si no, se calculan en vivo. Solo lectura: el cache
+    lo llena refresh_trend_cache desde el worker de snapshots.
+    """
+    cached = db.execute(sa.text("""
+        SELECT payload
+        FROM user_analytics_trend_cache
+        WHERE user_id=:u
+          AND ladder_code=:l
+          AND points=:n
+          AND state_updated_at=:v
+    """), {"u": user_id, "l": ladder_code, "n": points, "v": state_updated_at}).scalar()
+    if cached is not None:
+        return {
+            "rating_trend": [RatingTrendPointOut(**p) for p in cached["rating_trend"]],
+            "rolling_win_rate_trend": [RollingWinRatePointOut(**p) for p in cached["rolling_win_rate_trend"]],
+        }
+    return _downsample_full_trends(db, user_id=user_id, ladder_code=ladder_code, points=(points,))[points]
+
+
+def refresh_trend_cache(db: Session, user_id: str, ladder_code: str) -> None:
+    """
+    Recalcula FULL_TREND_CACHE_POINTS en una pasada y los marca con el updated_at del
+    estado, leido antes que el historial: si un apply lo adelanta, la entrada queda vieja y
+    la lectura calcula en vivo hasta el siguiente refresh.
+    """
+    state_updated_at = db.execute(sa.text("""
+        SELECT updated_at
+        FROM user_analytics_state
+        WHERE user_id=:u
+          AND ladder_code=:l
+    """), {"u": user_id, "l": ladder_code}).scalar()
+    db.execute(sa.text("""
+        DELETE FROM user_analytics_trend_cache
+        WHERE user_id=:u
+          AND ladder_code=:l
+    """), {"u": user_id, "l": ladder_code})
+    if state_updated_at is None:
+        return
+    by_points = _downsample_full_trends(db, user_id=user_id, ladder_code=ladder_code, points=FULL_TREND_CACHE_POINTS)
+    for n, series in by_points.items():
+        doc = {name: [item.model_dump(mode="json") for item in items] for name, items in series.items()}
+        db.execute(sa.text("""
+            INSERT INTO user_analytics_trend_cache (user_id, ladder_code, points, state_updated_at, payload, built_at)
+            VALUES (:u, :l, :n, :v, CAST(:payload AS jsonb), now())
+        """), {
+            "u": user_id,
+            "l": ladder_code,
+            "n": n,
+            "v": state_updated_at,
+            "payload": json.dumps(doc, separators=(",", ":")),
+        })
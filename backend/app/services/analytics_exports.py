@@ -0,0 +1,421 @@
+from __future__ import annotations
+
+import csv
+import importlib.util
+import io
+import json
+import os
+import pickle
+import tempfile
+import zipfile
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Iterator
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+
+EXPORT_FORMATS = ("csv", "parquet")
+# Filas por pagina al volcar un dataset a disco; cada pagina es una transaccion corta.
+EXPORT_PAGE_ROWS = 2000
+# Filas por row group de Parquet (y por lote en memoria al escribirlo).
+EXPORT_PARQUET_BATCH_ROWS = 10000
+_ERROR_MAX_CHARS = 500
+
+
+def parquet_available() -> bool:
+    """Parquet es opcional: requiere pyarrow instalado en el worker y en la API."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+class LocalExportStorage:
+    """Archivos de export en disco local bajo `root`; las claves son rutas relativas."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError("storage_key fuera del directorio de exports")
+        return path
+
+    @contextmanager
+    def open_write(self, key: str) -> Iterator[IO[bytes]]:
+        # Se escribe a un temporal y se renombra: una descarga nunca ve un archivo a medias.
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        try:
+            with open(tmp, "wb") as fh:
+                yield fh
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def size(self, key: str) -> int:
+        return self.path(key).stat().st_size
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).is_file()
+
+    def delete(self, key: str) -> None:
+        self.path(key).unlink(missing_ok=True)
+
+
+def get_export_storage() -> LocalExportStorage:
+    return LocalExportStorage(settings.ANALYTICS_EXPORT_DIR)
+
+
+@dataclass(frozen=True)
+class _ExportDataset:
+    name: str
+    sql: str
+    # (columna, tipo) con tipo en text|int|float|bool|timestamp; fija el esquema Parquet.
+    columns: tuple[tuple[str, str], ...]
+    # Orden unico para paginar por keyset: (columna, tipo SQL) en el orden del ORDER BY.
+    # Sin keyset el dataset esta acotado (una fila, o una por pareja) y se lee de una vez.
+    keyset: tuple[tuple[str, str], ...] = ()
+
+
+_EXPORT_DATASETS = (
+    _ExportDataset(
+        "state",
+        """
+            SELECT ladder_code, total_verified_matches, wins, losses, win_rate,
+                   current_streak_type, current_streak_len, best_win_streak, best_loss_streak,
+                   recent_10_matches, recent_10_wins, recent_10_win_rate,
+                   rolling_5_win_rate, rolling_20_win_rate, rolling_50_win_rate,
+                   close_matches, close_match_rate,
+                   vs_stronger_matches, vs_stronger_wins, vs_stronger_win_rate,
+                   vs_similar_matches, vs_similar_wins, vs_similar_win_rate,
+                   vs_weaker_matches, vs_weaker_wins, vs_weaker_win_rate,
+                   current_rating, peak_rating, last_match_at, updated_at
+            FROM user_analytics_state
+            WHERE user_id=:u
+              AND ladder_code=:l
+        """,
+        (
+            ("ladder_code", "text"), ("total_verified_matches", "int"), ("wins", "int"), ("losses", "int"),
+            ("win_rate", "float"), ("current_streak_type", "text"), ("current_streak_len", "int"),
+            ("best_win_streak", "int"), ("best_loss_streak", "int"), ("recent_10_matches", "int"),
+            ("recent_10_wins", "int"), ("recent_10_win_rate", "float"), ("rolling_5_win_rate", "float"),
+            ("rolling_20_win_rate", "float"), ("rolling_50_win_rate", "float"), ("close_matches", "int"),
+            ("close_match_rate", "float"), ("vs_stronger_matches", "int"), ("vs_stronger_wins", "int"),
+            ("vs_stronger_win_rate", "float"), ("vs_similar_matches", "int"), ("vs_similar_wins", "int"),
+            ("vs_similar_win_rate", "float"), ("vs_weaker_matches", "int"), ("vs_weaker_wins", "int"),
+            ("vs_weaker_win_rate", "float"), ("current_rating", "int"), ("peak_rating", "int"),
+            ("last_match_at", "timestamp"), ("updated_at", "timestamp"),
+        ),
+    ),
+    _ExportDataset(
+        "matches",
+        """
+            SELECT match_id::text AS match_id, played_at, is_win, is_close_match,
+                   teammate_user_id::text AS teammate_user_id,
+                   opponent_a_user_id::text AS opponent_a_user_id,
+                   opponent_b_user_id::text AS opponent_b_user_id,
+                   opponent_avg_rating, quality_bucket,
+                   rating_before, rating_after, rating_delta,
+                   rolling_10_win_rate, rolling_20_win_rate, rolling_50_win_rate,
+                   streak_type_after, streak_len_after
+            FROM user_analytics_match_applied
+            WHERE user_id=:u
+              AND ladder_code=:l
+              {after}
+            ORDER BY played_at ASC, match_id ASC
+            LIMIT :page_rows
+        """,
+        (
+            ("match_id", "text"), ("played_at", "timestamp"), ("is_win", "bool"), ("is_close_match", "bool"),
+            ("teammate_user_id", "text"), ("opponent_a_user_id", "text"), ("opponent_b_user_id", "text"),
+            ("opponent_avg_rating", "int"), ("quality_bucket", "text"), ("rating_before", "int"),
+            ("rating_after", "int"), ("rating_delta", "int"), ("rolling_10_win_rate", "float"),
+            ("rolling_20_win_rate", "float"), ("rolling_50_win_rate", "float"),
+            ("streak_type_after", "text"), ("streak_len_after", "int"),
+        ),
+        keyset=(("played_at", "timestamptz"), ("match_id", "uuid")),
+    ),
+    _ExportDataset(
+        "partners",
+        """
+            SELECT s.partner_user_id::text AS partner_user_id, p.alias AS partner_alias,
+                   s.matches, s.wins, s.losses, s.win_rate, s.last_played_at
+            FROM user_analytics_partner_stats s
+            LEFT JOIN user_profiles p ON p.user_id = s.partner_user_id
+            WHERE s.user_id=:u
+              AND s.ladder_code=:l
+            ORDER BY s.matches DESC, s.win_rate DESC, s.partner_user_id
+        """,
+        (
+            ("partner_user_id", "text"), ("partner_alias", "text"), ("matches", "int"), ("wins", "int"),
+            ("losses", "int"), ("win_rate", "float"), ("last_played_at", "timestamp"),
+        ),
+    ),
+    _ExportDataset(
+        "rivals",
+        """
+            SELECT s.rival_user_id::text AS rival_user_id, p.alias AS rival_alias,
+                   s.matches, s.wins, s.losses, s.win_rate, s.last_played_at
+            FROM user_analytics_rival_stats s
+            LEFT JOIN user_profiles p ON p.user_id = s.rival_user_id
+            WHERE s.user_id=:u
+              AND s.ladder_code=:l
+            ORDER BY s.matches DESC, s.win_rate DESC, s.rival_user_id
+        """,
+        (
+            ("rival_user_id", "text"), ("rival_alias", "text"), ("matches", "int"), ("wins", "int"),
+            ("losses", "int"), ("win_rate", "float"), ("last_played_at", "timestamp"),
+        ),
+    ),
+)
+
+
+def _export_value(value: object, kind: str) -> object:
+    if value is None:
+        return None
+    if kind == "float":
+        return float(value)
+    if kind == "int":
+        return int(value)
+    return value
+
+
+def _dataset_page(
+    db: Session,
+    dataset: _ExportDataset,
+    params: dict[str, object],
+    after: tuple | None,
+) -> list[tuple]:
+    if not dataset.keyset:
+        result = db.execute(sa.text(dataset.sql), params)
+    else:
+        cond = ""
+        page_params = {**params, "page_rows": EXPORT_PAGE_ROWS}
+        if after is not None:
+            cols = ", ".join(col for col, _ in dataset.keyset)
+            vals = ", ".join(f"CAST(:after_{i} AS {sql_type})" for i, (_, sql_type) in enumerate(dataset.keyset))
+            cond = f"AND ({cols}) > ({vals})"
+            page_params.update({f"after_{i}": v for i, v in enumerate(after)})
+        result = db.execute(sa.text(dataset.sql.format(after=cond)), page_params)
+    kinds = [kind for _, kind in dataset.columns]
+    return [tuple(_export_value(v, kind) for v, kind in zip(row, kinds)) for row in result]
+
+
+def _spool_dataset(db: Session, dataset: _ExportDataset, params: dict[str, object], spool: IO[bytes]) -> None:
+    """
+    Vuelca el dataset a `spool` (paginas pickle) sin codificar nada: cada pagina se lee en
+    su propia transaccion y la conexion vuelve al pool entre paginas, asi un export grande
+    no retiene una conexion ni el horizonte xmin mientras se escribe el ZIP.
+    """
+    names = [name for name, _ in dataset.columns]
+    key_idx = [names.index(col) for col, _ in dataset.keyset]
+    after: tuple | None = None
+    while True:
+        try:
+            page = _dataset_page(db, dataset, params, after)
+        finally:
+            db.rollback()
+        if page:
+            pickle.dump(page, spool, protocol=pickle.HIGHEST_PROTOCOL)
+        if not dataset.keyset or len(page) < EXPORT_PAGE_ROWS:
+            break
+        after = tuple(page[-1][i] for i in key_idx)
+    spool.seek(0)
+
+
+def _read_spool(spool: IO[bytes]) -> Iterator[tuple]:
+    while True:
+        try:
+            page = pickle.load(spool)
+        except EOFError:
+            return
+        yield from page
+
+
+def _write_csv(out: IO[bytes], dataset: _ExportDataset, rows: Iterator[tuple]) -> int:
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow([name for name, _ in dataset.columns])
+    n = 0
+    for row in rows:
+        writer.writerow(["" if v is None else (v.isoformat() if hasattr(v, "isoformat") else v) for v in row])
+        n += 1
+    text.flush()
+    text.detach()
+    return n
+
+
+def _write_parquet(out: IO[bytes], dataset: _ExportDataset, rows: Iterator[tuple]) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {
+        "text": pa.string(),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "bool": pa.bool_(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+    }
+    schema = pa.schema([(name, types[kind]) for name, kind in dataset.columns])
+    n = 0
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        batch: list[tuple] = []
+
+        def _flush() -> None:
+            columns = list(zip(*batch)) if batch else [[] for _ in dataset.columns]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(list(col), type=field.type) for col, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            batch.clear()
+
+        for row in rows:
+            batch.append(row)
+            n += 1
+            if len(batch) >= EXPORT_PARQUET_BATCH_ROWS:
+                _flush()
+        if batch or n == 0:
+            _flush()
+    return n
+
+
+def write_analytics_export(db: Session, out: IO[bytes], *, user_id: str, ladder_code: str, fmt: str) -> dict[str, int]:
+    """
+    Escribe un ZIP con state, matches, partners y rivals (.csv o .parquet). Primero vuelca
+    cada tabla a un temporal en transacciones cortas (matches paginado por keyset) y
+    devuelve la conexion; la codificacion y compresion corren sin tocar la base. La
+    memoria no crece con el historial del jugador.
+
+    Los datasets ya no salen de una unica foto: un partido aplicado durante el volcado
+    puede aparecer en state y no en matches (o al reves). Se acepta a cambio de no
+    retener una conexion ni el xmin durante todo el export.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError("format debe ser csv|parquet")
+    params = {"u": user_id, "l": ladder_code}
+    counts: dict[str, int] = {}
+    # Parquet ya va comprimido por columna; CSV se comprime en el ZIP.
+    compression = zipfile.ZIP_STORED if fmt == "parquet" else zipfile.ZIP_DEFLATED
+    with ExitStack() as stack:
+        spools: dict[str, IO[bytes]] = {}
+        for dataset in _EXPORT_DATASETS:
+            spools[dataset.name] = stack.enter_context(tempfile.TemporaryFile())
+            _spool_dataset(db, dataset, params, spools[dataset.name])
+        with zipfile.ZipFile(out, "w", compression=compression) as archive:
+            for dataset in _EXPORT_DATASETS:
+                with archive.open(f"{dataset.name}.{fmt}", "w", force_zip64=True) as member:
+                    rows = _read_spool(spools[dataset.name])
+                    if fmt == "csv":
+                        counts[dataset.name] = _write_csv(member, dataset, rows)
+                    else:
+                        counts[dataset.name] = _write_parquet(member, dataset, rows)
+    return counts
+
+
+def _claim_next_job(db: Session) -> dict[str, object] | None:
+    row = db.execute(sa.text("""
+        UPDATE analytics_export_jobs
+        SET status='running',
+            started_at=now(),
+            attempts=attempts + 1
+        WHERE id = (
+            SELECT id
+            FROM analytics_export_jobs
+            WHERE status='queued'
+            ORDER BY requested_at ASC, id ASC
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING id::text AS id, user_id::text AS user_id, ladder_code, format
+    """)).mappings().first()
+    db.commit()
+    return dict(row) if row else None
+
+
+def _run_job(db: Session, storage: LocalExportStorage, job: dict[str, object]) -> bool:
+    key = f"{job['user_id']}/{job['id']}.zip"
+    try:
+        with storage.open_write(key) as fh:
+            counts = write_analytics_export(
+                db,
+                fh,
+                user_id=str(job["user_id"]),
+                ladder_code=str(job["ladder_code"]),
+                fmt=str(job["format"]),
+            )
+        db.execute(sa.text("""
+            UPDATE analytics_export_jobs
+            SET status='done',
+                finished_at=now(),
+                expires_at=now() + make_interval(hours => :ttl),
+                storage_key=:key,
+                size_bytes=:size,
+                row_counts=CAST(:counts AS jsonb),
+                error=NULL
+            WHERE id=:id
+        """), {
+            "id": job["id"],
+            "ttl": settings.ANALYTICS_EXPORT_TTL_HOURS,
+            "key": key,
+            "size": storage.size(key),
+            "counts": json.dumps(counts, separators=(",", ":")),
+        })
+        db.commit()
+        return True
+    except Exception as exc:
+        db.rollback()
+        storage.delete(key)
+        db.execute(sa.text("""
+            UPDATE analytics_export_jobs
+            SET status='failed',
+                finished_at=now(),
+                error=:error
+            WHERE id=:id
+        """), {"id": job["id"], "error": f"{type(exc).__name__}: {exc}"[:_ERROR_MAX_CHARS]})
+        db.commit()
+        return False
+
+
+def process_export_jobs(db: Session, *, limit: int | None = None) -> dict[str, int]:
+    """
+    Procesa jobs en cola de uno en uno (commit por job). Varios workers pueden correr a
+    la vez: cada job se reclama con FOR UPDATE SKIP LOCKED.
+    """
+    storage = get_export_storage()
+    out = {"done": 0, "failed": 0}
+    while limit is None or out["done"] + out["failed"] < limit:
+        job = _claim_next_job(db)
+        if job is None:
+            break
+        out["done" if _run_job(db, storage, job) else "failed"] += 1
+    return out
+
+
+def expire_export_jobs(db: Session) -> dict[str, int]:
+    """Borra archivos vencidos y marca como fallidos los jobs colgados en running."""
+    storage = get_export_storage()
+    expired = db.execute(sa.text("""
+        UPDATE analytics_export_jobs
+        SET status='expired'
+        WHERE status='done'
+          AND expires_at <= now()
+        RETURNING storage_key
+    """)).scalars().all()
+    stale = db.execute(sa.text("""
+        UPDATE analytics_export_jobs
+        SET status='failed',
+            finished_at=now(),
+            error='worker interrumpido'
+        WHERE status='running'
+          AND started_at <= now() - make_interval(mins => :stale)
+    """), {"stale": settings.ANALYTICS_EXPORT_STALE_MINUTES}).rowcount
+    db.commit()
+    for key in expired:
+        if key:
+            storage.delete(key)
+    return {"expired": len(expired), "stale": int(stale or 0)}
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.security import now_utc
+
+
+def club_window_start(as_of: date) -> date:
+    """Primer dia (inclusive) de la ventana movil de membresia de club."""
+    return as_of - timedelta(days=settings.CLUB_RANKING_WINDOW_DAYS - 1)
+
+
+def apply_verified_match_club_activity(db: Session, match_id: str) -> None:
+    """
+    Suma el partido verificado a la actividad diaria y a la membresia de su club.
+    Se llama una sola vez por partido, en la misma transaccion que lo verifica.
+    """
+    m = db.execute(sa.text("""
+        SELECT club_id::text as club_id,
+               ladder_code,
+               status,
+               (played_at AT TIME ZONE 'UTC')::date as played_on
+        FROM matches
+        WHERE id=:m
+    """), {"m": match_id}).mappings().first()
+    if not m or m["club_id"] is None or m["status"] != "verified":
+        return
+    if m["played_on"] < club_window_start(now_utc().date()):
+        return
+
+    params = {"m": match_id, "club": m["club_id"], "l": m["ladder_code"], "d": m["played_on"]}
+    db.execute(sa.text("""
+        INSERT INTO club_player_activity (club_id, ladder_code, user_id, activity_date, matches)
+        SELECT :club, :l, mp.user_id, :d, 1
+        FROM match_participants mp
+        WHERE mp.match_id=:m
+        ON CONFLICT (club_id, ladder_code, user_id, activity_date) DO UPDATE
+        SET matches = club_player_activity.matches + 1
+    """), params)
+    db.execute(sa.text("""
+        INSERT INTO club_memberships (club_id, ladder_code, user_id, last_played_on, updated_at)
+        SELECT :club, :l, mp.user_id, :d, now()
+        FROM match_participants mp
+        WHERE mp.match_id=:m
+        ON CONFLICT (club_id, ladder_code, user_id) DO UPDATE
+        SET last_played_on = GREATEST(club_memberships.last_played_on, EXCLUDED.last_played_on),
+            updated_at = now()
+    """), params)
+
+
+def refresh_club_memberships(db: Session, as_of: date, rebuild: bool = False) -> dict[str, int]:
+    """
+    Desliza la ventana: descarta buckets fuera de rango y recalcula membresias desde
+    club_player_activity. Con rebuild=True reconstruye los buckets desde matches. El
+    ranking cuenta los partidos de la ventana al leer, asi que este refresh solo poda.
+    """
+    window_start = club_window_start(as_of)
+    if rebuild:
+        db.execute(sa.text("DELETE FROM club_player_activity"))
+        db.execute(sa.text("""
+            INSERT INTO club_player_activity (club_id, ladder_code, user_id, activity_date, matches)
+            SELECT m.club_id,
+                   m.ladder_code,
+                   mp.user_id,
+                   (m.played_at AT TIME ZONE 'UTC')::date,
+                   count(*)::int
+            FROM matches m
+            JOIN match_participants mp ON mp.match_id = m.id
+            WHERE m.status = 'verified'
+              AND m.club_id IS NOT NULL
+              AND (m.played_at AT TIME ZONE 'UTC')::date BETWEEN :start AND :as_of
+            GROUP BY 1, 2, 3, 4
+        """), {"start": window_start, "as_of": as_of})
+    else:
+        db.execute(sa.text("""
+            DELETE FROM club_player_activity
+            WHERE activity_date < :start
+        """), {"start": window_start})
+
+    db.execute(sa.text("DELETE FROM club_memberships"))
+    members = db.execute(sa.text("""
+        INSERT INTO club_memberships (club_id, ladder_code, user_id, last_played_on, updated_at)
+        SELECT club_id, ladder_code, user_id, max(activity_date), now()
+        FROM club_player_activity
+        GROUP BY club_id, ladder_code, user_id
+    """)).rowcount
+
+    return {"members": int(members or 0)}
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+
+# "Neiva, Huila" y "Neiva (Huila)" se agrupan en la ciudad "Neiva".
+_CITY_QUALIFIER_RE = re.compile(r"[,(]")
+# "Bogota D.C." y "Bogota DC" son la misma ciudad que "Bogota, D.C.".
+_CITY_DISTRICT_RE = re.compile(r"\s+D\.?\s*C\.?\s*$", re.IGNORECASE)
+# Tras un guion solo se corta un departamento conocido ("Neiva-Huila"); "Saint-Denis"
+# y "Saint-Etienne" siguen siendo ciudades distintas. Claves ya normalizadas.
+_CITY_REGION_KEYS = frozenset({
+    "amazonas", "antioquia", "arauca", "atlantico", "bolivar", "boyaca", "caldas", "caqueta",
+    "casanare", "cauca", "cesar", "choco", "cordoba", "cundinamarca", "guainia", "guaviare",
+    "huila", "la guajira", "magdalena", "meta", "narino", "norte de santander", "putumayo",
+    "quindio", "risaralda", "san andres", "santander", "sucre", "tolima", "valle",
+    "valle del cauca", "vaupes", "vichada",
+})
+
+
+def _fold(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    ascii_only = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(ascii_only.replace(".", "").replace("-", " ").lower().split())
+
+
+def _city_base(raw: str) -> str:
+    head = _CITY_QUALIFIER_RE.split(raw, maxsplit=1)[0]
+    head = _CITY_DISTRICT_RE.sub("", head)
+    city, sep, region = head.rpartition("-")
+    if sep and city.strip() and _fold(region) in _CITY_REGION_KEYS:
+        head = city
+    return " ".join(head.split())
+
+
+def normalize_city_key(raw: str | None) -> str | None:
+    if raw is None:
+        return None
+    base = _city_base(raw)
+    if not base:
+        return None
+    return _fold(base) or None
+
+
+def city_display_name(raw: str) -> str:
+    base = _city_base(raw)
+    if base == base.lower() or base == base.upper():
+        return base.title()
+    return base
+
+
+def resolve_city_id(db: Session, country: str | None, city: str | None) -> int | None:
+    """Lectura pura: id canonico de (country, city) o None si no existe."""
+    key = normalize_city_key(city)
+    if not country or key is None:
+        return None
+    return db.execute(sa.text("""
+        SELECT id
+        FROM location_cities
+        WHERE country_code=:country AND city_key=:key
+    """), {"country": country, "key": key}).scalar()
+
+
+def ensure_city_id(db: Session, country: str | None, city: str | None) -> int | None:
+    """Canonicaliza (country, city) en location_cities y retorna su id."""
+    key = normalize_city_key(city)
+    if not country or key is None:
+        return None
+    row = db.execute(sa.text("""
+        INSERT INTO location_cities (country_code, city_key, name)
+        VALUES (:country, :key, :name)
+        ON CONFLICT (country_code, city_key) DO NOTHING
+        RETURNING id
+    """), {"country": country, "key": key, "name": city_display_name(city or "")}).scalar()
+    if row is not None:
+        return int(row)
+    return int(db.execute(sa.text("""
+        SELECT id
+        FROM location_cities
+        WHERE country_code=:country AND city_key=:key
+    """), {"country": country, "key": key}).scalar_one())
+
+
+def resolve_city_ids_by_name(db: Session, city: str) -> list[int]:
+    """Ids canonicos de una ciudad en cualquier pais (filtros sin pais, ej. club_city)."""
+    key = normalize_city_key(city)
+    if key is None:
+        return []
+    rows = db.execute(sa.text("""
+        SELECT id
+        FROM location_cities
+        WHERE city_key=:key
+        ORDER BY id
+    """), {"key": key}).scalars().all()
+    return [int(r) for r in rows]
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+
+# Proyeccion completa de user_match_timeline desde las tablas fuente (la migracion
+# 0026 guarda una copia congelada para el backfill).
+TIMELINE_UPSERT_SQL = """
+    INSERT INTO user_match_timeline (
+        user_id, match_id, played_at, ladder_code, category_id, club_id,
+        status, confirmation_deadline, focus_team_no, teammate_id, rival_ids,
+        did_win, rating_delta, updated_at
+    )
+    SELECT
+        mp.user_id,
+        m.id,
+        m.played_at,
+        m.ladder_code,
+        m.category_id,
+        m.club_id,
+        m.status,
+        m.confirmation_deadline,
+        mp.team_no,
+        (
+            SELECT tm.user_id
+            FROM match_participants tm
+            WHERE tm.match_id = m.id
+              AND tm.team_no = mp.team_no
+              AND tm.user_id <> mp.user_id
+            LIMIT 1
+        ),
+        ARRAY(
+            SELECT rv.user_id
+            FROM match_participants rv
+            WHERE rv.match_id = m.id
+              AND rv.team_no <> mp.team_no
+            ORDER BY rv.user_id
+        ),
+        CASE
+            WHEN ms.winner_team_no IS NULL THEN NULL
+            ELSE ms.winner_team_no = mp.team_no
+        END,
+        re.delta,
+        now()
+    FROM matches m
+    JOIN match_participants mp ON mp.match_id = m.id
+    LEFT JOIN match_scores ms ON ms.match_id = m.id
+    LEFT JOIN rating_events re ON re.match_id = m.id AND re.user_id = mp.user_id
+    WHERE {where}
+    ON CONFLICT (user_id, match_id) DO UPDATE
+    SET played_at = EXCLUDED.played_at,
+        ladder_code = EXCLUDED.ladder_code,
+        category_id = EXCLUDED.category_id,
+        club_id = EXCLUDED.club_id,
+        status = EXCLUDED.status,
+        confirmation_deadline = EXCLUDED.confirmation_deadline,
+        focus_team_no = EXCLUDED.focus_team_no,
+        teammate_id = EXCLUDED.teammate_id,
+        rival_ids = EXCLUDED.rival_ids,
+        did_win = EXCLUDED.did_win,
+        rating_delta = EXCLUDED.rating_delta,
+        updated_at = now(),
+        change_xid = EXCLUDED.change_xid
+"""
+
+
+# Indice de parejas (head-to-head y filtros partner/rival): 12 filas por partido.
+PAIRS_UPSERT_SQL = """
+    INSERT INTO user_match_pairs (
+        user_id, other_user_id, match_id, relation, played_at, status,
+        confirmation_deadline, did_win
+    )
+    SELECT
+        a.user_id,
+        b.user_id,
+        m.id,
+        CASE WHEN a.team_no = b.team_no THEN 'partner' ELSE 'rival' END,
+        m.played_at,
+        m.status,
+        m.confirmation_deadline,
+        CASE
+            WHEN ms.winner_team_no IS NULL THEN NULL
+            ELSE ms.winner_team_no = a.team_no
+        END
+    FROM matches m
+    JOIN match_participants a ON a.match_id = m.id
+    JOIN match_participants b ON b.match_id = m.id AND b.user_id <> a.user_id
+    LEFT JOIN match_scores ms ON ms.match_id = m.id
+    WHERE {where}
+    ON CONFLICT (user_id, other_user_id, match_id) DO UPDATE
+    SET relation = EXCLUDED.relation,
+        played_at = EXCLUDED.played_at,
+        status = EXCLUDED.status,
+        confirmation_deadline = EXCLUDED.confirmation_deadline,
+        did_win = EXCLUDED.did_win
+"""
+
+
+def sync_match_timeline(db: Session, match_id: str) -> None:
+    """
+    Re-proyecta el partido en user_match_timeline (4 filas) y user_match_pairs (12 filas).
+    Idempotente; llamar en la misma transaccion de cada escritura que cambie estado, score o rating.
+
+    Las filas quedan marcadas con el xid de la transaccion (change_xid, default de la
+    columna); el change feed solo las entrega cuando ese xid ya no esta en curso, asi que
+    no hace falta serializar las escrituras de partidos.
+    """
+    db.execute(sa.text(TIMELINE_UPSERT_SQL.format(where="m.id = :m")), {"m": match_id})
+    db.execute(sa.text(PAIRS_UPSERT_SQL.format(where="m.id = :m")), {"m": match_id})
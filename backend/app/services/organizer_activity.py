@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+
+@dataclass(frozen=True)
+class _Scope:
+    name: str
+    key_column: str
+    daily_table: str
+    weekly_table: str
+    players_table: str
+    # Expresion de la clave sobre matches m JOIN clubs c (rebuild).
+    source_expr: str
+
+
+_CLUB = _Scope("club", "club_id", "club_activity_daily", "club_activity_weekly", "club_activity_weekly_players", "m.club_id")
+_CITY = _Scope("city", "city_id", "city_activity_daily", "city_activity_weekly", "city_activity_weekly_players", "c.city_id")
+ORGANIZER_SCOPES = {s.name: s for s in (_CLUB, _CITY)}
+
+
+def week_start(day: date) -> date:
+    """Lunes (UTC) de la semana ISO de `day`."""
+    return day - timedelta(days=day.weekday())
+
+
+def apply_verified_match_organizer_activity(db: Session, match_id: str) -> None:
+    """
+    Suma el partido verificado a los rollups de su club y de la ciudad del club.
+    Se llama una sola vez por partido, en la misma transaccion que lo verifica y despues
+    de escribir rating_events (el rating medio usa el rating previo de cada jugador).
+    """
+    m = db.execute(sa.text("""
+        SELECT m.club_id::text as club_id,
+               c.city_id,
+               m.ladder_code,
+               m.status,
+               (m.played_at AT TIME ZONE 'UTC')::date as played_on
+        FROM matches m
+        LEFT JOIN clubs c ON c.id = m.club_id
+        WHERE m.id=:m
+    """), {"m": match_id}).mappings().first()
+    if not m or m["club_id"] is None or m["status"] != "verified":
+        return
+
+    players = db.execute(sa.text("""
+        SELECT mp.user_id::text as user_id, re.old_rating
+        FROM match_participants mp
+        LEFT JOIN rating_events re ON re.match_id = mp.match_id AND re.user_id = mp.user_id
+        WHERE mp.match_id=:m
+        ORDER BY mp.user_id
+    """), {"m": match_id}).mappings().all()
+    ratings = [int(p["old_rating"]) for p in players if p["old_rating"] is not None]
+    user_ids = [p["user_id"] for p in players]
+    week = week_start(m["played_on"])
+
+    # Siempre club y luego ciudad, filas en orden fijo: verificaciones concurrentes no se cruzan.
+    for scope, key in ((_CLUB, m["club_id"]), (_CITY, m["city_id"])):
+        if key is None:
+            continue
+        db.execute(sa.text(f"""
+            INSERT INTO {scope.daily_table} (
+                {scope.key_column}, activity_date, ladder_code, matches, player_slots, rated_players, rating_sum
+            )
+            VALUES (:k, :d, :l, 1, :slots, :rated, :rating_sum)
+            ON CONFLICT ({scope.key_column}, activity_date, ladder_code) DO UPDATE
+            SET matches = {scope.daily_table}.matches + 1,
+                player_slots = {scope.daily_table}.player_slots + EXCLUDED.player_slots,
+                rated_players = {scope.daily_table}.rated_players + EXCLUDED.rated_players,
+                rating_sum = {scope.daily_table}.rating_sum + EXCLUDED.rating_sum
+        """), {
+            "k": key,
+            "d": m["played_on"],
+            "l": m["ladder_code"],
+            "slots": len(players),
+            "rated": len(ratings),
+            "rating_sum": sum(ratings),
+        })
+        new_players = len(db.execute(sa.text(f"""
+            INSERT INTO {scope.players_table} ({scope.key_column}, week_start, user_id)
+            SELECT :k, :w, u
+            FROM unnest(CAST(:users AS uuid[])) AS u
+            ORDER BY u
+            ON CONFLICT DO NOTHING
+            RETURNING user_id
+        """), {"k": key, "w": week, "users": user_ids}).all())
+        if new_players:
+            db.execute(sa.text(f"""
+                INSERT INTO {scope.weekly_table} ({scope.key_column}, week_start, active_players)
+                VALUES (:k, :w, :n)
+                ON CONFLICT ({scope.key_column}, week_start) DO UPDATE
+                SET active_players = {scope.weekly_table}.active_players + EXCLUDED.active_players
+            """), {"k": key, "w": week, "n": new_players})
+
+
+def rebuild_organizer_activity(db: Session) -> dict[str, int]:
+    """
+    Recalcula los rollups de club y ciudad desde matches (reparacion, partidos anulados
+    o cambios de ciudad de un club). Escribe en la transaccion actual.
+    """
+    out: dict[str, int] = {}
+    for scope in (_CLUB, _CITY):
+        for table in (scope.weekly_table, scope.players_table, scope.daily_table):
+            db.execute(sa.text(f"DELETE FROM {table}"))
+        out[f"{scope.name}_days"] = int(db.execute(sa.text(f"""
+            INSERT INTO {scope.daily_table} (
+                {scope.key_column}, activity_date, ladder_code, matches, player_slots, rated_players, rating_sum
+            )
+            SELECT {scope.source_expr},
+                   (m.played_at AT TIME ZONE 'UTC')::date,
+                   m.ladder_code,
+                   count(DISTINCT m.id)::int,
+                   count(*)::int,
+                   count(re.old_rating)::int,
+                   COALESCE(sum(re.old_rating), 0)
+            FROM matches m
+            JOIN clubs c ON c.id = m.club_id
+            JOIN match_participants mp ON mp.match_id = m.id
+            LEFT JOIN rating_events re ON re.match_id = m.id AND re.user_id = mp.user_id
+            WHERE m.status = 'verified'
+              AND {scope.source_expr} IS NOT NULL
+            GROUP BY 1, 2, 3
+        """)).rowcount or 0)
+        db.execute(sa.text(f"""
+            INSERT INTO {scope.players_table} ({scope.key_column}, week_start, user_id)
+            SELECT DISTINCT {scope.source_expr},
+                   date_trunc('week', m.played_at AT TIME ZONE 'UTC')::date,
+                   mp.user_id
+            FROM matches m
+            JOIN clubs c ON c.id = m.club_id
+            JOIN match_participants mp ON mp.match_id = m.id
+            WHERE m.status = 'verified'
+              AND {scope.source_expr} IS NOT NULL
+        """))
+        out[f"{scope.name}_weeks"] = int(db.execute(sa.text(f"""
+            INSERT INTO {scope.weekly_table} ({scope.key_column}, week_start, active_players)
+            SELECT {scope.key_column}, week_start, count(*)::int
+            FROM {scope.players_table}
+            GROUP BY 1, 2
+        """)).rowcount or 0)
+    return out
+
+
+def query_organizer_activity(
+    db: Session,
+    *,
+    scope: str,
+    key: object,
+    week_from: date,
+    week_to: date,
+) -> dict[str, object]:
+    """
+    Partidos, jugadores activos, mezcla de ladders y rating medio por semana en
+    [week_from, week_to] (lunes UTC). Lee solo filas de los rollups: como mucho
+    7 x ladders filas diarias y una fila de jugadores activos por semana.
+    """
+    s = ORGANIZER_SCOPES[scope]
+    params = {"k": key, "f": week_from, "t": week_to + timedelta(days=6)}
+    rows = db.execute(sa.text(f"""
+        SELECT date_trunc('week', activity_date)::date AS week_start,
+               ladder_code,
+               sum(matches)::int AS matches,
+               sum(rated_players)::int AS rated_players,
+               sum(rating_sum)::bigint AS rating_sum
+        FROM {s.daily_table}
+        WHERE {s.key_column}=:k
+          AND activity_date BETWEEN :f AND :t
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+    """), params).mappings().all()
+    active = dict(db.execute(sa.text(f"""
+        SELECT week_start, active_players
+        FROM {s.weekly_table}
+        WHERE {s.key_column}=:k
+          AND week_start BETWEEN :f AND :t
+    """), params).all())
+
+    weeks: dict[date, dict[str, object]] = {}
+    mix: dict[str, int] = {}
+    rated_total = 0
+    rating_total = 0
+    for r in rows:
+        acc = weeks.setdefault(r["week_start"], {"matches": 0, "rated": 0, "rating_sum": 0, "ladders": {}})
+        acc["matches"] += int(r["matches"])
+        acc["rated"] += int(r["rated_players"])
+        acc["rating_sum"] += int(r["rating_sum"])
+        acc["ladders"][r["ladder_code"]] = int(r["matches"])
+        mix[r["ladder_code"]] = mix.get(r["ladder_code"], 0) + int(r["matches"])
+        rated_total += int(r["rated_players"])
+        rating_total += int(r["rating_sum"])
+
+    total_matches = sum(mix.values())
+    return {
+        "matches": total_matches,
+        "average_rating": round(rating_total / rated_total, 2) if rated_total else None,
+        "ladder_mix": _ladder_mix(mix),
+        "weeks": [
+            {
+                "week_start": start,
+                "matches": acc["matches"],
+                "active_players": int(active.get(start, 0)),
+                "average_rating": round(acc["rating_sum"] / acc["rated"], 2) if acc["rated"] else None,
+                "ladder_mix": _ladder_mix(acc["ladders"]),
+            }
+            for start, acc in sorted(weeks.items())
+        ],
+    }
+
+
+def _ladder_mix(matches_by_ladder: dict[str, int]) -> list[dict[str, object]]:
+    total = sum(matches_by_ladder.values())
+    return [
+        {"ladder_code": code, "matches": n, "share": round((n * 100.0) / total, 2) if total else 0.0}
+        for code, n in sorted(matches_by_ladder.items())
+    ]
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+
+import sqlalchemy as sa
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import engine
+
+
+PUBLIC_DASHBOARD_CACHE = "public_dashboard"
+PUBLIC_DASHBOARD_ALL_LADDERS = "ALL"
+
+
+@dataclass(frozen=True)
+class PublicDashboardKey:
+    user_id: str
+    ladder_scope: str
+    trend_interval: str
+    trend_mode: str
+    points: int
+    top_n: int
+
+    def params(self) -> dict[str, object]:
+        return {
+            "u": self.user_id,
+            "scope": self.ladder_scope,
+            "i": self.trend_interval,
+            "m": self.trend_mode,
+            "n": self.points,
+            "t": self.top_n,
+        }
+
+
+def public_dashboard_cache_enabled() -> bool:
+    return settings.ANALYTICS_PUBLIC_DASHBOARD_CACHE_TTL_SECONDS > 0
+
+
+def lookup_public_dashboard(db: Session, key: PublicDashboardKey) -> tuple[bool | None, list | None]:
+    """
+    Visibilidad del perfil y payload cacheado en una sola lectura.
+    Devuelve (None, None) si el perfil no existe. El payload solo llega si el perfil es
+    publico, la entrada no expiro y su state_version coincide con el estado actual; los
+    alias de partners/rivals se leen de user_profiles, como en los snapshots.
+    """
+    row = db.execute(sa.text("""
+        SELECT p.is_public,
+               c.payload,
+               (
+                   SELECT jsonb_object_agg(a.user_id::text, a.alias)
+                   FROM user_profiles a
+                   WHERE a.user_id = ANY(c.related_user_ids)
+               ) AS aliases
+        FROM user_profiles p
+        LEFT JOIN analytics_public_dashboard_cache c
+          ON c.user_id = p.user_id
+         AND p.is_public = true
+         AND c.ladder_scope = :scope
+         AND c.trend_interval = :i
+         AND c.trend_mode = :m
+         AND c.points = :n
+         AND c.top_n = :t
+         AND c.expires_at > now()
+         AND c.state_version IS NOT DISTINCT FROM (
+                SELECT max(s.updated_at)
+                FROM user_analytics_state s
+                WHERE s.user_id = p.user_id
+                  AND (:scope = 'ALL' OR s.ladder_code = :scope)
+             )
+        WHERE p.user_id = :u
+    """), key.params()).mappings().first()
+    if not row:
+        return None, None
+    payload = row["payload"]
+    if payload is not None:
+        aliases = row["aliases"] or {}
+        for item in payload:
+            for partner in item["top_partners"]:
+                partner["partner_alias"] = aliases.get(partner["partner_user_id"])
+            for rival in item["top_rivals"]:
+                rival["rival_alias"] = aliases.get(rival["rival_user_id"])
+    return bool(row["is_public"]), payload
+
+
+def _cache_expires_at(now: datetime) -> datetime:
+    # Las ventanas 7d/30d/90d dependen del dia UTC: ninguna entrada sobrevive a medianoche.
+    midnight = datetime.combine(now.date() + timedelta(days=1), dt_time.min, tzinfo=timezone.utc)
+    return min(now + timedelta(seconds=settings.ANALYTICS_PUBLIC_DASHBOARD_CACHE_TTL_SECONDS), midnight)
+
+
+def store_public_dashboard(
+    db: Session,
+    key: PublicDashboardKey,
+    *,
+    state_version: datetime | None,
+    payload: list[dict],
+) -> None:
+    """
+    Guarda el payload (ya en modo JSON) sin los alias de partners/rivals: se resuelven al
+    leer desde related_user_ids, asi un alias cambiado o anonimizado no queda congelado.
+    state_version es max(updated_at) de los estados con los que se construyo: si un apply
+    posterior lo adelanta, la entrada deja de servirse aunque la invalidacion llegue antes
+    que este insert. El llamador hace commit.
+    """
+    related: set[str] = set()
+    for item in payload:
+        for partner in item["top_partners"]:
+            partner.pop("partner_alias", None)
+            related.add(partner["partner_user_id"])
+        for rival in item["top_rivals"]:
+            rival.pop("rival_alias", None)
+            related.add(rival["rival_user_id"])
+    params = key.params()
+    db.execute(sa.text("""
+        DELETE FROM analytics_public_dashboard_cache
+        WHERE user_id=:u
+          AND expires_at <= now()
+    """), {"u": params["u"]})
+    db.execute(sa.text("""
+        INSERT INTO analytics_public_dashboard_cache (
+            user_id, ladder_scope, trend_interval, trend_mode, points, top_n,
+            state_version, payload, related_user_ids, built_at, expires_at
+        )
+        VALUES (:u, :scope, :i, :m, :n, :t, :v, CAST(:payload AS jsonb), CAST(:related AS uuid[]), now(), :expires_at)
+        ON CONFLICT (user_id, ladder_scope, trend_interval, trend_mode, points, top_n) DO UPDATE
+        SET state_version = EXCLUDED.state_version,
+            payload = EXCLUDED.payload,
+            related_user_ids = EXCLUDED.related_user_ids,
+            built_at = now(),
+            expires_at = EXCLUDED.expires_at
+    """), {
+        **params,
+        "v": state_version,
+        "payload": json.dumps(payload, separators=(",", ":")),
+        "related": sorted(related),
+        "expires_at": _cache_expires_at(datetime.now(timezone.utc)),
+    })
+
+
+def invalidate_public_dashboards(
+    db: Session,
+    *,
+    user_ids: list[str] | None = None,
+    ladder_code: str | None = None,
+) -> int:
+    """Borra las entradas de los usuarios/ladder dados (ALL incluye cualquier ladder)."""
+    where: list[str] = []
+    params: dict[str, object] = {}
+    if user_ids is not None:
+        if not user_ids:
+            return 0
+        where.append("user_id = ANY(CAST(:users AS uuid[]))")
+        params["users"] = sorted(set(user_ids))
+    if ladder_code is not None:
+        where.append("ladder_scope IN (:l, 'ALL')")
+        params["l"] = ladder_code
+    return int(db.execute(sa.text(f"""
+        DELETE FROM analytics_public_dashboard_cache
+        {"WHERE " + " AND ".join(where) if where else ""}
+    """), params).rowcount or 0)
+
+
+class CacheStats:
+    """
+    Contadores hit/miss en memoria del proceso. Se vuelcan a analytics_cache_stats como
+    mucho cada flush_seconds, en una conexion propia para no mezclarse con la transaccion
+    de la peticion. Si el volcado falla, los contadores se conservan para el siguiente.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pending: dict[tuple[str, date], list[int]] = defaultdict(lambda: [0, 0])
+        self._last_flush = time.monotonic()
+
+    def record(self, cache_name: str, *, hit: bool) -> None:
+        with self._lock:
+            counts = self._pending[(cache_name, datetime.now(timezone.utc).date())]
+            counts[0 if hit else 1] += 1
+            due = time.monotonic() - self._last_flush >= settings.ANALYTICS_CACHE_STATS_FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: [0, 0])
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        try:
+            with engine.begin() as conn:
+                for (cache_name, stat_date), (hits, misses) in sorted(pending.items()):
+                    conn.execute(sa.text("""
+                        INSERT INTO analytics_cache_stats (cache_name, stat_date, hits, misses, updated_at)
+                        VALUES (:c, :d, :h, :m, now())
+                        ON CONFLICT (cache_name, stat_date) DO UPDATE
+                        SET hits = analytics_cache_stats.hits + EXCLUDED.hits,
+                            misses = analytics_cache_stats.misses + EXCLUDED.misses,
+                            updated_at = now()
+                    """), {"c": cache_name, "d": stat_date, "h": hits, "m": misses})
+        except SQLAlchemyError:
+            with self._lock:
+                for k, (hits, misses) in pending.items():
+                    self._pending[k][0] += hits
+                    self._pending[k][1] += misses
+
+
+cache_stats = CacheStats()
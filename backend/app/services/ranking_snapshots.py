@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from datetime import date
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+
+# Rank order must match GET /rankings/{ladder_code}/{category_id} (public profiles only),
+# plus user_id as a deterministic tie-breaker so daily deltas are stable.
+_CURRENT_RANKS_SQL = """
+    SELECT
+        s.ladder_code,
+        s.category_id,
+        s.user_id,
+        s.rating,
+        ROW_NUMBER() OVER (
+            PARTITION BY s.ladder_code, s.category_id
+            ORDER BY s.rating DESC, s.verified_matches DESC, s.user_id
+        )::int AS rank
+    FROM user_ladder_state s
+    JOIN user_profiles p ON p.user_id = s.user_id
+    WHERE p.is_public = true
+"""
+
+_LAST_SNAPSHOT_SQL = """
+    SELECT DISTINCT ON (ladder_code, category_id, user_id)
+        ladder_code,
+        category_id,
+        user_id,
+        rank,
+        rating
+    FROM ranking_snapshots
+    WHERE snapshot_date < :d
+      AND snapshot_date >= :anchor
+    ORDER BY ladder_code, category_id, user_id, snapshot_date DESC
+"""
+
+
+def capture_ranking_snapshots(db: Session, snapshot_date: date) -> dict[str, int]:
+    """
+    Guarda el snapshot diario de ranking por ladder/categoria.
+    Solo escribe filas para jugadores cuyo rank o rating cambio respecto al ultimo
+    snapshot guardado; rank NULL marca la salida del leaderboard. Re-ejecutable por fecha.
+
+    El estado anterior se reconstruye desde el ultimo keyframe (captura completa), no desde
+    todo el historial; cada RANKING_SNAPSHOT_KEYFRAME_DAYS la captura escribe todas las
+    filas y pasa a ser el nuevo ancla.
+    """
+    db.execute(sa.text("DELETE FROM ranking_snapshots WHERE snapshot_date=:d"), {"d": snapshot_date})
+    anchor = db.execute(sa.text("""
+        SELECT max(snapshot_date)
+        FROM ranking_snapshot_runs
+        WHERE is_keyframe
+          AND snapshot_date < :d
+    """), {"d": snapshot_date}).scalar_one()
+    keyframe = anchor is None or (snapshot_date - anchor).days >= settings.RANKING_SNAPSHOT_KEYFRAME_DAYS
+    params = {"d": snapshot_date, "anchor": anchor or date.min, "keyframe": keyframe}
+
+    changed_rows = db.execute(sa.text(f"""
+        WITH cur AS ({_CURRENT_RANKS_SQL}),
+        last AS ({_LAST_SNAPSHOT_SQL})
+        INSERT INTO ranking_snapshots (snapshot_date, ladder_code, category_id, user_id, rank, rating)
+        SELECT :d, cur.ladder_code, cur.category_id, cur.user_id, cur.rank, cur.rating
+        FROM cur
+        LEFT JOIN last
+          ON last.ladder_code = cur.ladder_code
+         AND last.category_id = cur.category_id
+         AND last.user_id = cur.user_id
+        WHERE :keyframe
+           OR last.user_id IS NULL
+           OR last.rank IS DISTINCT FROM cur.rank
+           OR last.rating IS DISTINCT FROM cur.rating
+        UNION ALL
+        SELECT :d, last.ladder_code, last.category_id, last.user_id, NULL, NULL
+        FROM last
+        LEFT JOIN cur
+          ON cur.ladder_code = last.ladder_code
+         AND cur.category_id = last.category_id
+         AND cur.user_id = last.user_id
+        WHERE cur.user_id IS NULL
+          AND last.rank IS NOT NULL
+    """), params).rowcount
+
+    players = db.execute(sa.text(f"SELECT count(*) FROM ({_CURRENT_RANKS_SQL}) cur")).scalar_one()
+
+    db.execute(sa.text("""
+        INSERT INTO ranking_snapshot_runs (snapshot_date, players, changed_rows, is_keyframe, captured_at)
+        VALUES (:d, :players, :changed, :keyframe, now())
+        ON CONFLICT (snapshot_date) DO UPDATE
+        SET players = EXCLUDED.players,
+            changed_rows = EXCLUDED.changed_rows,
+            is_keyframe = EXCLUDED.is_keyframe,
+            captured_at = EXCLUDED.captured_at
+    """), {"d": snapshot_date, "players": int(players), "changed": int(changed_rows or 0), "keyframe": keyframe})
+
+    return {"players": int(players), "changed_rows": int(changed_rows or 0), "keyframe": keyframe}
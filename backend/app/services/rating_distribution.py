@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from collections import defaultdict
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+
+# Ancho fijo de bucket; cambiarlo exige reconstruir (scripts/rebuild_rating_histograms.py).
+RATING_BUCKET_WIDTH = 25
+
+
+def rating_bucket_floor(rating: int) -> int:
+    return (int(rating) // RATING_BUCKET_WIDTH) * RATING_BUCKET_WIDTH
+
+
+def apply_rating_histogram_changes(
+    db: Session,
+    ladder_code: str,
+    category_id: str,
+    changes: list[tuple[int | None, int | None]],
+) -> None:
+    """
+    Aplica cambios (old_rating, new_rating) al histograma en la transaccion actual.
+    None en old = alta en la categoria; None en new = baja. Los buckets se actualizan
+    en orden ascendente para no provocar deadlocks entre partidos concurrentes.
+    """
+    net: dict[int, int] = defaultdict(int)
+    for old, new in changes:
+        if old is not None:
+            net[rating_bucket_floor(old)] -= 1
+        if new is not None:
+            net[rating_bucket_floor(new)] += 1
+
+    for floor in sorted(net):
+        delta = net[floor]
+        if delta == 0:
+            continue
+        db.execute(sa.text("""
+            INSERT INTO rating_histogram_buckets (ladder_code, category_id, bucket_floor, players, updated_at)
+            VALUES (:l, :c, :b, :d, now())
+            ON CONFLICT (ladder_code, category_id, bucket_floor) DO UPDATE
+            SET players = rating_histogram_buckets.players + EXCLUDED.players,
+                updated_at = now()
+        """), {"l": ladder_code, "c": category_id, "b": floor, "d": delta})
+
+
+def rebuild_rating_histograms(db: Session) -> dict[str, int]:
+    """Recalcula todos los buckets desde user_ladder_state (reparacion/cambio de ancho)."""
+    db.execute(sa.text("DELETE FROM rating_histogram_buckets"))
+    buckets = db.execute(sa.text("""
+        INSERT INTO rating_histogram_buckets (ladder_code, category_id, bucket_floor, players, updated_at)
+        SELECT ladder_code,
+               category_id,
+               (floor(rating::numeric / :w) * :w)::int,
+               count(*)::int,
+               now()
+        FROM user_ladder_state
+        GROUP BY 1, 2, 3
+    """), {"w": RATING_BUCKET_WIDTH}).rowcount
+    return {"buckets": int(buckets or 0)}
+
+
+def histogram_quantile(buckets: list[tuple[int, int]], q: float) -> float | None:
+    """
+    Rating en el cuantil q (0..1) interpolando linealmente dentro del bucket.
+    buckets: (bucket_floor, players) ordenados por bucket_floor.
+    """
+    total = sum(players for _, players in buckets)
+    if total <= 0:
+        return None
+    target = q * total
+    seen = 0
+    for floor, players in buckets:
+        if players <= 0:
+            continue
+        if seen + players >= target:
+            return floor + RATING_BUCKET_WIDTH * ((target - seen) / players)
+        seen += players
+    last_floor = buckets[-1][0]
+    return float(last_floor + RATING_BUCKET_WIDTH)
+
+
+def histogram_share_below(buckets: list[tuple[int, int]], rating: int) -> float | None:
+    """Fraccion (0..1) de jugadores con rating por debajo de `rating`."""
+    total = sum(players for _, players in buckets)
+    if total <= 0:
+        return None
+    below = 0.0
+    for floor, players in buckets:
+        if floor + RATING_BUCKET_WIDTH <= rating:
+            below += players
+        elif floor <= rating:
+            below += players * ((rating - floor) / RATING_BUCKET_WIDTH)
+    return below / total
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+
+# Facetas de un partido verificado por participante. Mismo criterio que
+# _timeline_where_for_scope("verified"): solo status='verified'. Mes en UTC.
+_MATCH_FACETS_SQL = """
+    SELECT mp.user_id, f.facet, f.facet_key
+    FROM matches m
+    JOIN match_participants mp ON mp.match_id = m.id
+    LEFT JOIN match_scores ms ON ms.match_id = m.id
+    CROSS JOIN LATERAL (
+        VALUES
+            ('month', to_char(m.played_at AT TIME ZONE 'UTC', 'YYYY-MM')),
+            ('ladder', m.ladder_code),
+            ('club', m.club_id::text),
+            ('outcome', CASE
+                WHEN ms.winner_team_no IS NULL THEN NULL
+                WHEN ms.winner_team_no = mp.team_no THEN 'win'
+                ELSE 'loss'
+            END)
+    ) AS f(facet, facet_key)
+    WHERE m.status = 'verified'
+      AND f.facet_key IS NOT NULL
+      AND {where}
+"""
+
+
+def apply_verified_match_facets(db: Session, match_id: str) -> None:
+    """
+    Suma el partido verificado a los contadores de facetas de sus 4 participantes.
+    Se llama una sola vez por partido, en la misma transaccion que lo verifica; las filas
+    se bloquean en orden de PK para no provocar deadlocks entre partidos concurrentes.
+    """
+    db.execute(sa.text(f"""
+        INSERT INTO user_timeline_facets (user_id, facet, facet_key, matches)
+        SELECT user_id, facet, facet_key, 1
+        FROM ({_MATCH_FACETS_SQL.format(where="m.id = :m")}) f
+        ORDER BY user_id, facet, facet_key
+        ON CONFLICT (user_id, facet, facet_key) DO UPDATE
+        SET matches = user_timeline_facets.matches + 1
+    """), {"m": match_id})
+
+
+def rebuild_timeline_facets(db: Session) -> dict[str, int]:
+    """Recalcula todos los contadores desde matches (reparacion)."""
+    db.execute(sa.text("DELETE FROM user_timeline_facets"))
+    rows = db.execute(sa.text(f"""
+        INSERT INTO user_timeline_facets (user_id, facet, facet_key, matches)
+        SELECT user_id, facet, facet_key, count(*)::int
+        FROM ({_MATCH_FACETS_SQL.format(where="true")}) f
+        GROUP BY user_id, facet, facet_key
+    """)).rowcount
+    return {"rows": int(rows or 0)}
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import math
+from typing import Generic, TypeVar
+
+
+T = TypeVar("T")
+
+
+class LttbStream(Generic[T]):
+    """
+    Largest-Triangle-Three-Buckets en una sola pasada sobre una serie ordenada por x.
+
+    Conserva el primer y el ultimo punto y, de cada bucket intermedio, el que forma el
+    triangulo de mayor area con el punto elegido antes y la media del bucket siguiente.
+    Necesita el total de puntos por adelantado y solo retiene dos buckets en memoria.
+    Con total <= threshold (o threshold < 3) devuelve la serie completa.
+    """
+
+    def __init__(self, total: int, threshold: int):
+        self.passthrough = threshold < 3 or total <= threshold
+        self.out: list[T] = []
+        self._current: list[tuple[float, float, T]] = []
+        self._pending: list[tuple[float, float, T]] = []
+        self._bucket = 0
+        self._cursor = 0
+        self._seen = 0
+        self._prev: tuple[float, float] | None = None
+        self._last: tuple[float, float, T] | None = None
+        self._starts: list[int] = []
+        if not self.passthrough:
+            every = (total - 2) / (threshold - 2)
+            # Indice inicial de cada bucket intermedio; el ultimo arranca en el ultimo punto.
+            self._starts = [int(math.floor(i * every)) + 1 for i in range(threshold - 1)]
+
+    def push(self, x: float, y: float, item: T) -> None:
+        idx = self._seen
+        self._seen += 1
+        if self.passthrough:
+            self.out.append(item)
+            return
+        if idx == 0:
+            self.out.append(item)
+            self._prev = (x, y)
+            return
+
+        point = (x, y, item)
+        self._last = point
+        while self._cursor + 1 < len(self._starts) and idx >= self._starts[self._cursor + 1]:
+            self._cursor += 1
+        if self._cursor == self._bucket:
+            self._current.append(point)
+        elif self._cursor == self._bucket + 1:
+            self._pending.append(point)
+        else:
+            # El bucket siguiente esta completo: ya se puede elegir el punto del actual.
+            self._select(self._current, _mean(self._pending))
+            self._current, self._pending = self._pending, [point]
+            self._bucket += 1
+
+    def finish(self) -> list[T]:
+        if self.passthrough or self._last is None:
+            return self.out
+        # El ultimo punto se conserva siempre; si el total cambio durante la lectura,
+        # los buckets que queden se cierran contra el.
+        for bucket in (self._pending, self._current):
+            if bucket and bucket[-1] is self._last:
+                bucket.pop()
+                break
+        if not self._current:
+            self._current, self._pending = self._pending, []
+        if self._current and self._pending:
+            self._select(self._current, _mean(self._pending))
+            self._current, self._pending = self._pending, []
+        if self._current:
+            self._select(self._current, (self._last[0], self._last[1]))
+        self.out.append(self._last[2])
+        self._current, self._pending, self._last = [], [], None
+        return self.out
+
+    def _select(self, bucket: list[tuple[float, float, T]], target: tuple[float, float]) -> None:
+        ax, ay = self._prev
+        cx, cy = target
+        best = max(bucket, key=lambda p: abs((ax - cx) * (p[1] - ay) - (ax - p[0]) * (cy - ay)))
+        self.out.append(best[2])
+        self._prev = (best[0], best[1])
+
+
+def _mean(points: list[tuple[float, float, object]]) -> tuple[float, float]:
+    return (
+        sum(p[0] for p in points) / len(points),
+        sum(p[1] for p in points) / len(points),
+    )
@@ -1,6 +1,7 @@
 import sqlalchemy as sa
 
 from app.db.session import SessionLocal
+from app.services.public_dashboard_cache import invalidate_public_dashboards
 
 
 def _anonymize_user(db, user_id: str):
@@ -40,6 +41,7 @@ def _anonymize_user(db, user_id: str):
                 alias=:alias,
                 is_public=false,
                 city=NULL,
+                city_id=NULL,
                 country='ZZ',
                 first_name=NULL,
                 last_name=NULL,
@@ -53,6 +55,7 @@ def _anonymize_user(db, user_id: str):
         ),
         {"u": user_id, "alias": alias},
     )
+    invalidate_public_dashboards(db, user_ids=[user_id])
 
 
 def main():
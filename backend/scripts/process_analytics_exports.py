@@ -0,0 +1,42 @@
+import argparse
+import time
+
+from app.db.session import SessionLocal
+from app.services.analytics_exports import expire_export_jobs, process_export_jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Procesa los exports de analitica en cola y borra los archivos vencidos."
+    )
+    parser.add_argument("--limit", type=int, default=None, help="Maximo de jobs a procesar en esta corrida.")
+    parser.add_argument(
+        "--poll-seconds",
+        type=float,
+        default=None,
+        help="Modo worker: sigue consultando la cola cada N segundos en lugar de salir.",
+    )
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        while True:
+            expired = expire_export_jobs(db)
+            stats = process_export_jobs(db, limit=args.limit)
+            print(
+                "ok: exports procesados "
+                f"(completados={stats['done']}, fallidos={stats['failed']}, "
+                f"vencidos={expired['expired']}, interrumpidos={expired['stale']})"
+            )
+            if args.poll_seconds is None:
+                break
+            time.sleep(args.poll_seconds)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
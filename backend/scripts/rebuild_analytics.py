@@ -1,19 +1,137 @@
-from app.db.session import SessionLocal
-from app.services.analytics import rebuild_analytics
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+import sqlalchemy as sa
 
-def main():
+from app.db.session import SessionLocal, engine
+from app.services.analytics import (
+    create_rebuild_staging,
+    drop_rebuild_staging,
+    rebuild_analytics,
+    swap_rebuild_staging,
+    try_lock_analytics_rebuild,
+    unlock_analytics_rebuild,
+)
+from app.services.analytics_dashboard import refresh_queued_dashboard_snapshots
+
+
+def _rebuild_partition(ladder_code: str, shard: int, shards: int) -> dict[str, int]:
+    """Worker: reconstruye un ladder (o un shard de jugadores del ladder) en las tablas *_rebuild."""
+    label = f"[{ladder_code} {shard + 1}/{shards}]"
+    started = time.monotonic()
+
+    def progress(done: int, total: int):
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed > 0 else 0.0
+        print(f"  {label} {done}/{total} partidos ({rate:.0f}/s)", file=sys.stderr, flush=True)
+
+    db = SessionLocal()
+    try:
+        stats = rebuild_analytics(
+            db,
+            ladder_code=ladder_code,
+            shard=(shard, shards) if shards > 1 else None,
+            staging=True,
+            progress=progress,
+        )
+        db.commit()
+        return stats
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _drop_staging():
+    db = SessionLocal()
+    try:
+        drop_rebuild_staging(db)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _run(args):
     db = SessionLocal()
     try:
-        rebuild_analytics(db)
+        ladders = args.ladder or list(db.execute(sa.text("SELECT code FROM ladders ORDER BY code")).scalars())
+        create_rebuild_staging(db)
         db.commit()
-        print("ok: analitica reconstruida")
+    finally:
+        db.close()
+
+    tasks = [(ladder_code, shard, args.shards) for ladder_code in ladders for shard in range(args.shards)]
+    workers = max(1, args.workers or min(len(tasks), os.cpu_count() or 1))
+    totals = {"matches": 0, "participants": 0, "states": 0}
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_rebuild_partition, *task) for task in tasks]
+            for future in as_completed(futures):
+                stats = future.result()
+                for key in totals:
+                    totals[key] += stats[key]
+    except BaseException:
+        _drop_staging()
+        raise
+
+    db = SessionLocal()
+    try:
+        try:
+            swapped = swap_rebuild_staging(db, ladders)
+            db.commit()
+        except BaseException:
+            db.rollback()
+            _drop_staging()
+            raise
+        # El swap encola los snapshots; se reconstruyen fuera de su lock, un lote por transaccion.
+        snapshot_users = 0
+        while batch := refresh_queued_dashboard_snapshots(db):
+            db.commit()
+            snapshot_users += len(batch)
     except Exception:
         db.rollback()
         raise
     finally:
         db.close()
 
+    return ladders, workers, totals, swapped, snapshot_users
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Reconstruye el read model de analitica en paralelo (un worker por ladder/shard) y lo publica de forma atomica."
+    )
+    parser.add_argument("--ladder", action="append", default=None, help="Ladder a reconstruir (repetible; por defecto, todos).")
+    parser.add_argument("--shards", type=int, default=1, help="Workers por ladder (reparto por hash de user_id).")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos en paralelo (por defecto, min(tareas, CPUs)).")
+    args = parser.parse_args()
+    if args.shards < 1:
+        parser.error("--shards debe ser >= 1")
+
+    # Una corrida a la vez: el staging es compartido entre ladders.
+    with engine.connect() as lock_conn:
+        if not try_lock_analytics_rebuild(lock_conn):
+            sys.exit("error: ya hay otra reconstruccion de analitica en curso")
+        lock_conn.commit()
+        try:
+            ladders, workers, totals, swapped, snapshot_users = _run(args)
+        finally:
+            unlock_analytics_rebuild(lock_conn)
+            lock_conn.commit()
+
+    # Con shards, cada worker recorre todos los partidos del ladder.
+    matches = totals["matches"] // args.shards
+    print(
+        f"ok: analitica reconstruida (ladders={','.join(ladders)}, workers={workers}, "
+        f"partidos={matches}, aplicaciones={totals['participants']}, estados={totals['states']}, "
+        f"rezagados={swapped['caught_up_matches']}, snapshots={snapshot_users})"
+    )
+
 
 if __name__ == "__main__":
     main()
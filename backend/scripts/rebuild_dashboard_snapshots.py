@@ -0,0 +1,19 @@
+from app.db.session import SessionLocal
+from app.services.analytics_dashboard import rebuild_dashboard_snapshots
+
+
+def main():
+    db = SessionLocal()
+    try:
+        result = rebuild_dashboard_snapshots(db)
+        db.commit()
+        print(f"ok: snapshots de dashboard reconstruidos (snapshots={result['snapshots']})")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+from app.db.session import SessionLocal
+from app.services.organizer_activity import rebuild_organizer_activity
+
+
+def main():
+    db = SessionLocal()
+    try:
+        result = rebuild_organizer_activity(db)
+        db.commit()
+        print(
+            "ok: rollups de club y ciudad reconstruidos "
+            f"(club_days={result['club_days']}, club_weeks={result['club_weeks']}, "
+            f"city_days={result['city_days']}, city_weeks={result['city_weeks']})"
+        )
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
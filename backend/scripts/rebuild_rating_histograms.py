@@ -0,0 +1,19 @@
+from app.db.session import SessionLocal
+from app.services.rating_distribution import RATING_BUCKET_WIDTH, rebuild_rating_histograms
+
+
+def main():
+    db = SessionLocal()
+    try:
+        result = rebuild_rating_histograms(db)
+        db.commit()
+        print(f"ok: histogramas de rating reconstruidos (width={RATING_BUCKET_WIDTH}, buckets={result['buckets']})")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
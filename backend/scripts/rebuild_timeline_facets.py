@@ -0,0 +1,19 @@
+from app.db.session import SessionLocal
+from app.services.timeline_facets import rebuild_timeline_facets
+
+
+def main():
+    db = SessionLocal()
+    try:
+        result = rebuild_timeline_facets(db)
+        db.commit()
+        print(f"ok: facetas de historial reconstruidas (rows={result['rows']})")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
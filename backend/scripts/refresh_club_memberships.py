@@ -0,0 +1,32 @@
+import argparse
+from datetime import date
+
+from app.core.security import now_utc
+from app.db.session import SessionLocal
+from app.services.club_memberships import refresh_club_memberships
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Desliza la ventana de membresia de clubes.")
+    parser.add_argument("--date", dest="as_of", default=None, help="YYYY-MM-DD (default: hoy UTC)")
+    parser.add_argument("--rebuild", action="store_true", help="reconstruye la actividad desde matches")
+    args = parser.parse_args()
+    as_of = date.fromisoformat(args.as_of) if args.as_of else now_utc().date()
+
+    db = SessionLocal()
+    try:
+        result = refresh_club_memberships(db, as_of, rebuild=args.rebuild)
+        db.commit()
+        print(
+            "ok: membresias de club actualizadas "
+            f"(date={as_of.isoformat()}, rebuild={args.rebuild}, members={result['members']})"
+        )
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
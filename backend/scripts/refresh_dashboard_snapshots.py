@@ -0,0 +1,49 @@
+import argparse
+import time
+
+from app.db.session import SessionLocal
+from app.services.analytics_dashboard import refresh_queued_dashboard_snapshots
+
+
+def drain(db, *, limit: int | None = None) -> int:
+    """Procesa la cola por lotes (commit por lote) hasta vaciarla o llegar a `limit`."""
+    done = 0
+    while limit is None or done < limit:
+        batch = refresh_queued_dashboard_snapshots(db)
+        db.commit()
+        if not batch:
+            break
+        done += len(batch)
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Reconstruye los snapshots de dashboard encolados por los partidos verificados."
+    )
+    parser.add_argument("--limit", type=int, default=None, help="Maximo de (usuario, ladder) a procesar en esta corrida.")
+    parser.add_argument(
+        "--poll-seconds",
+        type=float,
+        default=None,
+        help="Modo worker: sigue consultando la cola cada N segundos en lugar de salir.",
+    )
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        while True:
+            done = drain(db, limit=args.limit)
+            print(f"ok: snapshots de dashboard reconstruidos (usuarios={done})")
+            if args.poll_seconds is None:
+                break
+            time.sleep(args.poll_seconds)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
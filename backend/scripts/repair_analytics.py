@@ -0,0 +1,43 @@
+import argparse
+from datetime import datetime, timezone
+
+from app.db.session import SessionLocal
+from app.services.analytics import repair_analytics, resolve_repair_targets
+
+
+def _parse_since(raw: str) -> datetime:
+    value = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recalcula la analitica de jugadores concretos desde un played_at, sin rebuild completo."
+    )
+    parser.add_argument("--user", action="append", default=[], help="user_id a reparar (repetible).")
+    parser.add_argument("--match", action="append", default=[], help="match_id corregido/anulado: repara a sus participantes (repetible).")
+    parser.add_argument("--since", type=_parse_since, default=None, help="ISO-8601; por defecto, el played_at mas antiguo de --match.")
+    parser.add_argument("--ladder", default=None, help="Limita la reparacion a un ladder.")
+    args = parser.parse_args()
+    if not args.user and not args.match:
+        parser.error("indica --user o --match")
+
+    db = SessionLocal()
+    try:
+        users, since = resolve_repair_targets(db, args.user, args.match, args.since)
+        stats = repair_analytics(db, users, since=since, ladder_code=args.ladder)
+        db.commit()
+        print(
+            f"ok: analitica reparada (jugadores={stats['users']}, desde={since.isoformat() if since else 'inicio'}, "
+            f"sembrados={stats['seeded']}, partidos={stats['replayed_matches']}, aplicados={stats['applied']}, "
+            f"estados={stats['states']})"
+        )
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import argparse
+from datetime import date
+
+from app.core.security import now_utc
+from app.db.session import SessionLocal
+from app.services.ranking_snapshots import capture_ranking_snapshots
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot diario de ranking (delta-encoded).")
+    parser.add_argument("--date", dest="snapshot_date", default=None, help="YYYY-MM-DD (default: hoy UTC)")
+    args = parser.parse_args()
+    snapshot_date = date.fromisoformat(args.snapshot_date) if args.snapshot_date else now_utc().date()
+
+    db = SessionLocal()
+    try:
+        result = capture_ranking_snapshots(db, snapshot_date)
+        db.commit()
+        print(
+            "ok: snapshot de ranking guardado "
+            f"(date={snapshot_date.isoformat()}, players={result['players']}, changed_rows={result['changed_rows']})"
+        )
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
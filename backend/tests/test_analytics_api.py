@@ -154,6 +154,57 @@ def test_analytics_recent_trend_and_public_visibility(api, identity_factory):
     assert self_rows[0]["total_verified_matches"] == 3
 
 
+def test_analytics_dashboard_snapshots_rebuilt_from_queue(api, identity_factory):
+    import sqlalchemy as sa
+
+    from app.db.session import SessionLocal
+    from app.services.analytics_dashboard import refresh_queued_dashboard_snapshots
+
+    users = _build_mx_users(api, identity_factory, "ana_snap_queue")
+    ids = sorted(u["id"] for u in users)
+    focus = users[0]
+    m = create_match(api, focus["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+    confirm_match(api, users[1]["token"], m["id"])
+
+    def counts(db) -> tuple[int, int]:
+        params = {"ids": ids}
+        snapshots = db.execute(sa.text("""
+            SELECT count(*) FROM user_analytics_dashboard_snapshots
+            WHERE ladder_code='MX' AND user_id::text = ANY(:ids)
+        """), params).scalar_one()
+        queued = db.execute(sa.text("""
+            SELECT count(*) FROM user_analytics_dashboard_refresh_queue
+            WHERE ladder_code='MX' AND user_id::text = ANY(:ids)
+        """), params).scalar_one()
+        return snapshots, queued
+
+    db = SessionLocal()
+    try:
+        # La verificacion solo encola; la lectura calcula en vivo y no escribe.
+        assert counts(db) == (0, 4)
+        live = api.call("GET", "/analytics/me/dashboard?ladder=MX&points=5", token=focus["token"])[0]
+        assert [p["match_id"] for p in live["rating_trend"]] == [m["id"]]
+        db.rollback()
+        assert counts(db) == (0, 4)
+
+        # Primeros en la cola para no depender de lo que hayan encolado otros tests.
+        db.execute(sa.text("""
+            UPDATE user_analytics_dashboard_refresh_queue
+            SET queued_at = now() - interval '10 years'
+            WHERE ladder_code='MX' AND user_id::text = ANY(:ids)
+        """), {"ids": ids})
+        db.commit()
+        assert refresh_queued_dashboard_snapshots(db, limit=4) == [(uid, "MX") for uid in ids]
+        db.commit()
+        assert counts(db) == (12, 0)
+        db.rollback()
+    finally:
+        db.close()
+
+    snap = api.call("GET", "/analytics/me/dashboard?ladder=MX&points=5", token=focus["token"])[0]
+    assert snap == live
+
+
 def test_analytics_dashboard_series_and_top_stats(api, identity_factory):
     users = _build_mx_users(api, identity_factory, "ana_dash")
     focus = users[0]
@@ -223,3 +274,604 @@ def test_analytics_dashboard_series_and_top_stats(api, identity_factory):
     with pytest.raises(ApiError) as hidden_err:
         api.call("GET", f"/analytics/users/{focus['id']}/dashboard?ladder=MX", token=viewer["token"])
     assert hidden_err.value.status_code == 404
+
+
+def test_analytics_admin_repair_after_void(api, identity_factory):
+    import os
+    from datetime import datetime, timedelta, timezone
+
+    admin_token = os.getenv("ADMIN_API_TOKEN")
+    if not admin_token:
+        pytest.skip("ADMIN_API_TOKEN no configurado.")
+
+    import sqlalchemy as sa
+
+    from app.db.session import SessionLocal
+
+    users = _build_mx_users(api, identity_factory, "ana_repair")
+    focus = users[0]
+    now = datetime.now(timezone.utc)
+    match_ids = []
+    for days_ago, sets in (
+        (3, [{"t1": 6, "t2": 4}, {"t1": 6, "t2": 3}]),
+        (2, [{"t1": 2, "t2": 6}, {"t1": 3, "t2": 6}]),
+        (1, [{"t1": 6, "t2": 4}, {"t1": 7, "t2": 5}]),
+    ):
+        m = create_match(
+            api,
+            focus["token"],
+            u1=users[0],
+            u2=users[1],
+            u3=users[2],
+            u4=users[3],
+            played_at=(now - timedelta(days=days_ago)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            score_json={"sets": sets},
+        )
+        confirm_match(api, users[1]["token"], m["id"])
+        match_ids.append(m["id"])
+
+    before = api.call("GET", "/analytics/me?ladder=MX", token=focus["token"])[0]
+    assert (before["total_verified_matches"], before["losses"], before["current_streak_len"]) == (3, 1, 1)
+
+    with pytest.raises(ApiError) as forbidden:
+        api.call("POST", "/analytics/admin/repair", body={"match_ids": [match_ids[1]]})
+    assert forbidden.value.status_code == 403
+
+    # No hay flujo de anulacion en la API: se simula la correccion de operaciones.
+    db = SessionLocal()
+    try:
+        db.execute(sa.text("UPDATE matches SET status='void' WHERE id=:m"), {"m": match_ids[1]})
+        db.commit()
+    finally:
+        db.close()
+
+    out = api.call(
+        "POST",
+        "/analytics/admin/repair",
+        body={"match_ids": [match_ids[1]], "ladder": "MX"},
+        headers={"X-Admin-Token": admin_token},
+    )
+    assert out["users"] == 4
+    assert out["seeded"] == 4
+    assert out["replayed_matches"] == 1
+    assert out["applied"] == 4
+
+    after = api.call("GET", "/analytics/me?ladder=MX", token=focus["token"])[0]
+    assert after["total_verified_matches"] == 2
+    assert after["wins"] == 2
+    assert after["losses"] == 0
+    assert after["current_streak_type"] == "W"
+    assert after["current_streak_len"] == 2
+    assert after["best_loss_streak"] == 0
+
+    dash = api.call("GET", "/analytics/me/dashboard?ladder=MX&top_n=5", token=focus["token"])[0]
+    assert dash["state"]["total_verified_matches"] == 2
+    assert dash["top_partners"][0]["matches"] == 2
+    assert all(r["matches"] == 2 for r in dash["top_rivals"])
+
+
+def test_analytics_activity_windows_and_ranges(api, identity_factory):
+    from datetime import datetime, timedelta, timezone
+
+    users = _build_mx_users(api, identity_factory, "ana_activity")
+    focus = users[0]
+    now = datetime.now(timezone.utc)
+    for days_ago, sets in (
+        (40, [{"t1": 6, "t2": 4}, {"t1": 6, "t2": 3}]),
+        (10, [{"t1": 2, "t2": 6}, {"t1": 3, "t2": 6}]),
+        (0, [{"t1": 6, "t2": 4}, {"t1": 4, "t2": 6}, {"t1": 6, "t2": 3}]),
+    ):
+        m = create_match(
+            api,
+            focus["token"],
+            u1=users[0],
+            u2=users[1],
+            u3=users[2],
+            u4=users[3],
+            played_at=(now - timedelta(days=days_ago, minutes=1)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            score_json={"sets": sets},
+        )
+        confirm_match(api, users[1]["token"], m["id"])
+
+    me = api.call("GET", "/analytics/me?ladder=MX", token=focus["token"])[0]
+    assert (me["matches_7d"], me["matches_30d"], me["matches_90d"]) == (1, 2, 3)
+
+    full = api.call("GET", "/analytics/me/activity?ladder=MX&bucket=day", token=focus["token"])
+    assert full["matches"] == 3
+    assert full["wins"] == 2
+    assert full["losses"] == 1
+    assert full["close_matches"] == 1
+    assert len(full["buckets"]) == 3
+    assert sum(b["rating_delta"] for b in full["buckets"]) == full["rating_delta"]
+
+    date_to = (now - timedelta(minutes=1)).date()
+    recent = api.call(
+        "GET",
+        f"/analytics/me/activity?ladder=MX&from={(date_to - timedelta(days=15)).isoformat()}&to={date_to.isoformat()}",
+        token=focus["token"],
+    )
+    assert recent["matches"] == 2
+    assert recent["buckets"] == []
+
+    public = api.call(
+        "GET",
+        f"/analytics/users/{focus['id']}/activity?ladder=MX&bucket=month",
+        token=users[1]["token"],
+    )
+    assert public["matches"] == 3
+    assert sum(b["matches"] for b in public["buckets"]) == 3
+
+    with pytest.raises(ApiError) as bad_bucket:
+        api.call("GET", "/analytics/me/activity?ladder=MX&bucket=year", token=focus["token"])
+    assert bad_bucket.value.status_code == 400
+
+
+def test_analytics_full_history_trends_downsampled(api, identity_factory):
+    from datetime import datetime, timedelta, timezone
+
+    users = _build_mx_users(api, identity_factory, "ana_lttb")
+    focus = users[0]
+    now = datetime.now(timezone.utc)
+
+    def play(days_ago: float, won: bool) -> str:
+        sets = [{"t1": 6, "t2": 2}, {"t1": 6, "t2": 3}] if won else [{"t1": 2, "t2": 6}, {"t1": 3, "t2": 6}]
+        m = create_match(
+            api,
+            focus["token"],
+            u1=users[0],
+            u2=users[1],
+            u3=users[2],
+            u4=users[3],
+            played_at=(now - timedelta(days=days_ago)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            score_json={"sets": sets},
+        )
+        confirm_match(api, users[1]["token"], m["id"])
+        return m["id"]
+
+    match_ids = [play(days_ago, won) for days_ago, won in zip(range(9, 1, -1), [1, 1, 0, 1, 0, 0, 1, 1])]
+
+    url = "/analytics/me/dashboard?ladder=MX&trend_mode=full&points=5"
+    first = api.call("GET", url, token=focus["token"])[0]
+    assert len(first["rating_trend"]) == 5
+    assert len(first["rolling_win_rate_trend"]) == 5
+    assert first["rating_trend"][0]["match_id"] == match_ids[0]
+    assert first["rating_trend"][-1]["match_id"] == match_ids[-1]
+    ats = [p["at"] for p in first["rating_trend"]]
+    assert ats == sorted(ats)
+    # El resto del dashboard no cambia con el modo.
+    recent = api.call("GET", "/analytics/me/dashboard?ladder=MX&points=5", token=focus["token"])[0]
+    assert first["volume_weekly"] == recent["volume_weekly"]
+    assert [p["match_id"] for p in recent["rating_trend"]] == match_ids[-5:]
+
+    cached = api.call("GET", url, token=focus["token"])[0]
+    assert cached["rating_trend"] == first["rating_trend"]
+    assert cached["rolling_win_rate_trend"] == first["rolling_win_rate_trend"]
+
+    newest = play(1, True)
+    fresh = api.call("GET", url, token=focus["token"])[0]
+    assert fresh["rating_trend"][0]["match_id"] == match_ids[0]
+    assert fresh["rating_trend"][-1]["match_id"] == newest
+
+    public = api.call(
+        "GET",
+        f"/analytics/users/{focus['id']}/dashboard?ladder=MX&trend_mode=full&points=5",
+        token=users[1]["token"],
+    )[0]
+    assert public["rating_trend"] == fresh["rating_trend"]
+
+    # Mismo played_at: la serie sigue el orden del apply (created_at), no el del match_id.
+    play(0.5, False)
+    last_tied = play(0.5, True)
+    tied = api.call("GET", url, token=focus["token"])[0]
+    assert tied["rating_trend"][-1]["match_id"] == last_tied
+
+    # La lectura no escribe el cache; lo llena el worker de snapshots.
+    import sqlalchemy as sa
+
+    from app.db.session import SessionLocal
+    from app.services.analytics_dashboard import refresh_dashboard_snapshots
+
+    cache_sql = sa.text("""
+        SELECT c.points
+        FROM user_analytics_trend_cache c
+        JOIN user_analytics_state s ON s.user_id = c.user_id AND s.ladder_code = c.ladder_code
+        WHERE c.user_id=:u
+          AND c.ladder_code='MX'
+          AND c.state_updated_at = s.updated_at
+        ORDER BY c.points
+    """)
+    api.call("GET", "/analytics/me/dashboard?ladder=MX&trend_mode=full", token=focus["token"])
+    with SessionLocal() as db:
+        assert db.execute(cache_sql, {"u": focus["id"]}).scalars().all() == []
+        refresh_dashboard_snapshots(db, [focus["id"]], "MX")
+        db.commit()
+        assert db.execute(cache_sql, {"u": focus["id"]}).scalars().all() == [50, 100]
+    from_cache = api.call("GET", "/analytics/me/dashboard?ladder=MX&trend_mode=full", token=focus["token"])[0]
+    assert from_cache["rating_trend"][-1]["match_id"] == last_tied
+    assert len(from_cache["rating_trend"]) == 11
+
+    with pytest.raises(ApiError) as bad_mode:
+        api.call("GET", "/analytics/me/dashboard?ladder=MX&trend_mode=full&trend_interval=week", token=focus["token"])
+    assert bad_mode.value.status_code == 400
+
+
+def test_analytics_pair_leaderboards_count_each_pair_once(api, identity_factory):
+    from datetime import datetime, timedelta, timezone
+
+    import sqlalchemy as sa
+
+    from app.db.session import SessionLocal
+    from app.services.analytics import refresh_pair_leaderboard
+
+    users = _build_mx_users(api, identity_factory, "ana_pairs")
+    ids = [u["id"] for u in users]
+    now = datetime.now(timezone.utc)
+    for days_ago, sets in (
+        (3, [{"t1": 6, "t2": 4}, {"t1": 6, "t2": 3}]),
+        (2, [{"t1": 2, "t2": 6}, {"t1": 3, "t2": 6}]),
+        (1, [{"t1": 6, "t2": 4}, {"t1": 7, "t2": 5}]),
+    ):
+        m = create_match(
+            api,
+            users[0]["token"],
+            u1=users[0],
+            u2=users[1],
+            u3=users[2],
+            u4=users[3],
+            played_at=(now - timedelta(days=days_ago)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            score_json={"sets": sets},
+        )
+        confirm_match(api, users[1]["token"], m["id"])
+
+    query = sa.text("""
+        SELECT relation, user_low_id::text AS low, user_high_id::text AS high,
+               matches, wins, losses, win_rate, last_played_at
+        FROM analytics_pair_leaderboard
+        WHERE ladder_code='MX'
+          AND user_low_id = ANY(CAST(:ids AS uuid[]))
+          AND user_high_id = ANY(CAST(:ids AS uuid[]))
+        ORDER BY relation, user_low_id, user_high_id
+    """)
+    db = SessionLocal()
+    try:
+        rows = [dict(r) for r in db.execute(query, {"ids": ids}).mappings().all()]
+        # Mismo resultado que proyectar de nuevo desde partner/rival stats.
+        refresh_pair_leaderboard(db, ladder_code="MX", user_ids=ids)
+        assert [dict(r) for r in db.execute(query, {"ids": ids}).mappings().all()] == rows
+        db.rollback()
+    finally:
+        db.close()
+
+    by_pair = {(r["relation"], frozenset((r["low"], r["high"]))): r for r in rows}
+    assert len(rows) == len(by_pair) == 6
+    partners = by_pair[("partner", frozenset((ids[0], ids[2])))]
+    assert (partners["matches"], partners["wins"], partners["losses"]) == (3, 2, 1)
+    assert by_pair[("partner", frozenset((ids[1], ids[3])))]["wins"] == 1
+    rivalry = by_pair[("rival", frozenset((ids[0], ids[1])))]
+    low_wins = 2 if rivalry["low"] == ids[0] else 1
+    assert (rivalry["matches"], rivalry["wins"], rivalry["losses"]) == (3, low_wins, 3 - low_wins)
+
+    best = api.call("GET", "/analytics/leaderboards/MX/partners?min_matches=3&limit=100", token=users[0]["token"])
+    assert best["min_matches"] == 3
+    assert [r["rank"] for r in best["rows"]] == list(range(1, len(best["rows"]) + 1))
+    assert all(r["matches"] >= 3 for r in best["rows"])
+    rates = [r["win_rate"] for r in best["rows"]]
+    assert rates == sorted(rates, reverse=True)
+
+    rivalries = api.call("GET", "/analytics/leaderboards/MX/rivalries?limit=100", token=users[0]["token"])
+    played = [r["matches"] for r in rivalries["rows"]]
+    assert played == sorted(played, reverse=True)
+    assert all(r["user_a_wins"] + r["user_b_wins"] == r["matches"] for r in rivalries["rows"])
+    assert all(r["user_a_id"] < r["user_b_id"] for r in rivalries["rows"])
+
+    with pytest.raises(ApiError) as bad_ladder:
+        api.call("GET", "/analytics/leaderboards/XX/rivalries", token=users[0]["token"])
+    assert bad_ladder.value.status_code == 400
+
+
+def test_analytics_export_jobs_csv_parquet_and_ranges(api, identity_factory, monkeypatch):
+    import csv
+    import io
+    import zipfile
+    from datetime import datetime, timedelta, timezone
+
+    import sqlalchemy as sa
+
+    from app.db.session import SessionLocal
+    from app.services import analytics_exports
+    from app.services.analytics_exports import expire_export_jobs, parquet_available, process_export_jobs
+
+    users = _build_mx_users(api, identity_factory, "ana_export_job")
+    focus = users[0]
+    now = datetime.now(timezone.utc)
+    match_ids = []
+    for days_ago in (3, 2, 1):
+        m = create_match(
+            api,
+            focus["token"],
+            u1=users[0],
+            u2=users[1],
+            u3=users[2],
+            u4=users[3],
+            played_at=(now - timedelta(days=days_ago)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            score_json={"sets": [{"t1": 6, "t2": 4}, {"t1": 6, "t2": 3}]},
+        )
+        confirm_match(api, users[1]["token"], m["id"])
+        match_ids.append(m["id"])
+
+    with pytest.raises(ApiError) as free_user:
+        api.call("POST", "/analytics/me/exports", token=focus["token"], body={"ladder": "MX"})
+    assert free_user.value.status_code == 403
+
+    api.call(
+        "POST",
+        "/billing/simulate/subscription",
+        token=focus["token"],
+        body={
+            "provider": "manual",
+            "provider_subscription_id": f"sub_export_job_{identity_factory.seed}",
+            "plan_code": "RIVIO_PLUS",
+            "status": "active",
+            "period_days": 30,
+        },
+    )
+    formats = ["csv", "parquet" if parquet_available() else "csv"]
+    jobs = [
+        api.call("POST", "/analytics/me/exports", token=focus["token"], body={"ladder": "MX", "format": fmt})
+        for fmt in formats
+    ]
+    assert [j["status"] for j in jobs] == ["queued", "queued"]
+    assert jobs[0]["download_url"] is None
+    with pytest.raises(ApiError) as too_many:
+        api.call("POST", "/analytics/me/exports", token=focus["token"], body={"ladder": "MX"})
+    assert too_many.value.status_code == 429
+    with pytest.raises(ApiError) as not_ready:
+        api.fetch(f"/analytics/me/exports/{jobs[0]['id']}/download", token=focus["token"])
+    assert not_ready.value.status_code == 409
+
+    # El worker corre fuera de la API (scripts/process_analytics_exports.py).
+    # Paginas de 2 filas: los 3 partidos cruzan un corte de keyset.
+    monkeypatch.setattr(analytics_exports, "EXPORT_PAGE_ROWS", 2)
+    db = SessionLocal()
+    try:
+        processed = process_export_jobs(db)
+    finally:
+        db.close()
+    assert processed["done"] >= 2
+
+    csv_job = api.call("GET", f"/analytics/me/exports/{jobs[0]['id']}", token=focus["token"])
+    assert csv_job["status"] == "done"
+    assert csv_job["row_counts"] == {"state": 1, "matches": 3, "partners": 1, "rivals": 2}
+    status, headers, body = api.fetch(csv_job["download_url"], token=focus["token"])
+    assert status == 200
+    assert len(body) == csv_job["size_bytes"]
+    with zipfile.ZipFile(io.BytesIO(body)) as archive:
+        assert sorted(archive.namelist()) == ["matches.csv", "partners.csv", "rivals.csv", "state.csv"]
+        rows = list(csv.DictReader(io.TextIOWrapper(archive.open("matches.csv"), encoding="utf-8")))
+    assert [r["match_id"] for r in rows] == match_ids
+    assert all(r["is_win"] == "True" for r in rows)
+
+    status, headers, part = api.fetch(csv_job["download_url"], token=focus["token"], headers={"Range": "bytes=10-29"})
+    assert status == 206
+    assert part == body[10:30]
+    assert headers["content-range"] == f"bytes 10-29/{len(body)}"
+
+    if parquet_available():
+        import pyarrow.parquet as pq
+
+        pq_job = api.call("GET", f"/analytics/me/exports/{jobs[1]['id']}", token=focus["token"])
+        assert pq_job["status"] == "done"
+        _, _, pq_body = api.fetch(pq_job["download_url"], token=focus["token"])
+        with zipfile.ZipFile(io.BytesIO(pq_body)) as archive:
+            table = pq.read_table(io.BytesIO(archive.read("matches.parquet")))
+        assert table.column("match_id").to_pylist() == match_ids
+
+    with pytest.raises(ApiError) as foreign:
+        api.call("GET", f"/analytics/me/exports/{jobs[0]['id']}", token=users[1]["token"])
+    assert foreign.value.status_code == 404
+
+    db = SessionLocal()
+    try:
+        db.execute(sa.text("""
+            UPDATE analytics_export_jobs SET expires_at = now() - interval '1 minute' WHERE id=:id
+        """), {"id": jobs[0]["id"]})
+        db.commit()
+        assert expire_export_jobs(db)["expired"] >= 1
+    finally:
+        db.close()
+    with pytest.raises(ApiError) as expired:
+        api.fetch(csv_job["download_url"], token=focus["token"])
+    assert expired.value.status_code == 410
+
+
+def test_analytics_public_dashboard_cache_invalidation_and_stats(api, identity_factory):
+    import os
+
+    import sqlalchemy as sa
+
+    from app.db.session import SessionLocal
+
+    users = _build_mx_users(api, identity_factory, "ana_pcache")
+    focus = users[0]
+    viewer = users[1]
+    admin_headers = {"X-Admin-Token": os.getenv("ADMIN_API_TOKEN") or ""}
+
+    def cache_rows() -> int:
+        db = SessionLocal()
+        try:
+            return int(db.execute(sa.text("""
+                SELECT count(*)
+                FROM analytics_public_dashboard_cache
+                WHERE user_id=:u
+            """), {"u": focus["id"]}).scalar_one())
+        finally:
+            db.close()
+
+    def stats() -> tuple[int, int]:
+        rows = api.call("GET", "/analytics/admin/cache-stats?days=1", headers=admin_headers)
+        row = next((r for r in rows if r["cache_name"] == "public_dashboard"), None)
+        return (row["hits"], row["misses"]) if row else (0, 0)
+
+    m1 = create_match(api, focus["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+    confirm_match(api, users[1]["token"], m1["id"])
+
+    path = f"/analytics/users/{focus['id']}/dashboard?ladder=MX&top_n=3"
+    hits0, misses0 = stats()
+    first = api.call("GET", path, token=viewer["token"])
+    second = api.call("GET", path, token=viewer["token"])
+    assert second == first
+    assert first[0]["state"]["total_verified_matches"] == 1
+    assert cache_rows() == 1
+    hits1, misses1 = stats()
+    assert (hits1 - hits0, misses1 - misses0) == (1, 1)
+
+    # Verificar un partido invalida al jugador en la misma transaccion.
+    m2 = create_match(api, focus["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+    confirm_match(api, users[1]["token"], m2["id"])
+    assert cache_rows() == 0
+    fresh = api.call("GET", path, token=viewer["token"])
+    assert fresh[0]["state"]["total_verified_matches"] == 2
+    assert fresh[0]["top_partners"][0]["matches"] == 2
+
+    # Un estado mas nuevo que la entrada la deja fuera aunque nadie la haya borrado.
+    db = SessionLocal()
+    try:
+        db.execute(sa.text("""
+            UPDATE user_analytics_state SET updated_at = now() WHERE user_id=:u
+        """), {"u": focus["id"]})
+        db.commit()
+    finally:
+        db.close()
+    api.call("GET", path, token=viewer["token"])
+    hits2, misses2 = stats()
+    assert (hits2 - hits1, misses2 - misses1) == (0, 2)
+
+    # Los alias de partners/rivals no se congelan en la entrada: un cambio se ve en el hit.
+    partner = next(u for u in users if u["id"] == fresh[0]["top_partners"][0]["partner_user_id"])
+    renamed = f"{partner['alias']}_x"
+    api.call("PATCH", "/me/profile", token=partner["token"], body={"alias": renamed})
+    cached = api.call("GET", path, token=viewer["token"])
+    assert cache_rows() == 1
+    assert stats() == (hits2 + 1, misses2)
+    assert cached[0]["top_partners"][0]["partner_alias"] == renamed
+    assert {r["rival_alias"] for r in cached[0]["top_rivals"]} == {
+        u["alias"] for u in users[1:] if u["id"] != partner["id"]
+    }
+
+    api.call("PATCH", "/me/profile", token=focus["token"], body={"is_public": False})
+    assert cache_rows() == 0
+    with pytest.raises(ApiError) as hidden_err:
+        api.call("GET", path, token=viewer["token"])
+    assert hidden_err.value.status_code == 404
+    # El propio usuario sigue viendo su dashboard, pero un perfil privado no se cachea.
+    assert api.call("GET", path, token=focus["token"])[0]["state"]["total_verified_matches"] == 2
+    assert cache_rows() == 0
+
+
+def test_organizer_club_and_city_activity_rollups(api, identity_factory):
+    import uuid
+
+    from app.db.session import SessionLocal
+    from app.services.organizer_activity import rebuild_organizer_activity
+
+    users = _build_mx_users(api, identity_factory, "ana_org")
+    club = next(c for c in api.call("GET", "/clubs") if c["city_id"] is not None)
+    club_path = f"/analytics/clubs/{club['id']}/activity?weeks=1"
+    city_path = f"/analytics/cities/{club['city_id']}/activity?weeks=1"
+
+    def mx_matches(out) -> int:
+        return next((m["matches"] for m in out["ladder_mix"] if m["ladder_code"] == "MX"), 0)
+
+    club_before = api.call("GET", club_path, token=users[0]["token"])
+    city_before = api.call("GET", city_path, token=users[0]["token"])
+    active_before = club_before["weeks"][0]["active_players"] if club_before["weeks"] else 0
+
+    for _ in range(2):
+        m = create_match(api, users[0]["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3], club_id=club["id"])
+        confirm_match(api, users[1]["token"], m["id"])
+    # Sin club no suma a ningun rollup.
+    m = create_match(api, users[0]["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+    confirm_match(api, users[1]["token"], m["id"])
+
+    club_after = api.call("GET", club_path, token=users[0]["token"])
+    assert club_after["name"] == club["name"]
+    assert club_after["week_from"] == club_after["week_to"]
+    assert club_after["matches"] - club_before["matches"] == 2
+    assert mx_matches(club_after) - mx_matches(club_before) == 2
+    assert sum(m["share"] for m in club_after["ladder_mix"]) == pytest.approx(100.0, abs=0.05)
+    week = club_after["weeks"][0]
+    assert week["week_start"] == club_after["week_from"]
+    assert week["active_players"] - active_before == 4
+    assert week["average_rating"] is not None
+
+    city_after = api.call("GET", city_path, token=users[0]["token"])
+    assert city_after["matches"] - city_before["matches"] == 2
+
+    # El rebuild desde matches deja exactamente lo mismo que el camino incremental.
+    db = SessionLocal()
+    try:
+        rebuild_organizer_activity(db)
+        db.commit()
+    finally:
+        db.close()
+    assert api.call("GET", club_path, token=users[0]["token"]) == club_after
+    assert api.call("GET", city_path, token=users[0]["token"]) == city_after
+
+    with pytest.raises(ApiError) as missing:
+        api.call("GET", f"/analytics/clubs/{uuid.uuid4()}/activity", token=users[0]["token"])
+    assert missing.value.status_code == 404
+
+
+def test_analytics_vs_threshold_from_rating_diff_histogram(api, identity_factory):
+    import sqlalchemy as sa
+
+    from app.db.session import SessionLocal
+
+    users = _build_mx_users(api, identity_factory, "ana_vsdiff")
+    focus = users[0]
+    for sets in (
+        [{"t1": 6, "t2": 4}, {"t1": 6, "t2": 3}],
+        [{"t1": 2, "t2": 6}, {"t1": 3, "t2": 6}],
+        [{"t1": 6, "t2": 4}, {"t1": 7, "t2": 5}],
+    ):
+        m = create_match(
+            api, focus["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3], score_json={"sets": sets}
+        )
+        confirm_match(api, users[1]["token"], m["id"])
+
+    default = api.call("GET", "/analytics/me?ladder=MX", token=focus["token"])[0]
+    assert default["vs_threshold"] == 75
+    assert api.call("GET", "/analytics/me?ladder=MX&vs_threshold=75", token=focus["token"])[0] == default
+
+    db = SessionLocal()
+    try:
+        applied = db.execute(sa.text("""
+            SELECT opponent_avg_rating - rating_before AS diff, is_win
+            FROM user_analytics_match_applied
+            WHERE user_id=:u AND ladder_code='MX'
+        """), {"u": focus["id"]}).mappings().all()
+    finally:
+        db.close()
+    assert len(applied) == 3
+
+    for threshold in (5, 10, 50, 100, 500):
+        row = api.call("GET", f"/analytics/me?ladder=MX&vs_threshold={threshold}", token=focus["token"])[0]
+        assert row["vs_threshold"] == threshold
+        stronger = [a for a in applied if a["diff"] is not None and a["diff"] >= threshold]
+        weaker = [a for a in applied if a["diff"] is not None and a["diff"] <= -threshold]
+        assert row["vs_stronger_matches"] == len(stronger)
+        assert row["vs_stronger_wins"] == sum(1 for a in stronger if a["is_win"])
+        assert row["vs_weaker_matches"] == len(weaker)
+        assert row["vs_weaker_wins"] == sum(1 for a in weaker if a["is_win"])
+        assert row["vs_similar_matches"] == 3 - len(stronger) - len(weaker)
+        assert row["vs_stronger_wins"] + row["vs_similar_wins"] + row["vs_weaker_wins"] == row["wins"]
+
+    viewer = users[1]
+    public = api.call("GET", f"/analytics/users/{focus['id']}?ladder=MX&vs_threshold=500", token=viewer["token"])[0]
+    assert public["vs_threshold"] == 500
+    dash = api.call("GET", "/analytics/me/dashboard?ladder=MX&vs_threshold=10", token=focus["token"])[0]
+    assert dash["state"]["vs_threshold"] == 10
+
+    with pytest.raises(ApiError) as bad:
+        api.call("GET", "/analytics/me?vs_threshold=77", token=focus["token"])
+    assert bad.value.status_code == 400
@@ -3,6 +3,8 @@ from __future__ import annotations
 import math
 import os
 import time
+from types import SimpleNamespace
+from uuid import UUID
 
 import pytest
 
@@ -54,3 +56,352 @@ def test_analytics_me_latency_smoke(api, identity_factory):
         f"Latencia alta en analytics/me. avg_ms={avg_ms:.1f}, "
         f"p95_ms={p95_ms:.1f}, threshold_ms={p95_limit_ms:.1f}"
     )
+
+
+@pytest.mark.performance
+def test_analytics_dashboard_snapshot_single_read(api, identity_factory):
+    if os.getenv("RUN_PERF_TESTS", "0") != "1":
+        pytest.skip("Smoke de rendimiento deshabilitado. Usa RUN_PERF_TESTS=1.")
+
+    import sqlalchemy as sa
+
+    from app.db.session import SessionLocal, engine
+    from app.modules.analytics.api import analytics_me_dashboard
+    from app.services.analytics_dashboard import query_dashboard_series, refresh_dashboard_snapshots
+
+    users = [
+        create_user_with_profile(
+            api,
+            identity_factory,
+            alias_prefix=f"ana_snap_{i+1}",
+            gender=gender,
+            primary_category_code=cat,
+            country="CO",
+            city="Neiva",
+            is_public=True,
+        )
+        for i, (gender, cat) in enumerate([("M", "6ta"), ("M", "6ta"), ("F", "D"), ("F", "D")])
+    ]
+    focus = users[0]
+    for _ in range(4):
+        m = create_match(api, focus["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+        confirm_match(api, users[1]["token"], m["id"])
+    # Lo que haria el worker de la cola (scripts/refresh_dashboard_snapshots.py).
+    with SessionLocal() as setup:
+        refresh_dashboard_snapshots(setup, [focus["id"]], "MX")
+        setup.commit()
+
+    statements: list[str] = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db = SessionLocal()
+    sa.event.listen(engine, "before_cursor_execute", _count)
+    try:
+        for interval in ("match", "week", "month"):
+            statements.clear()
+            dash = analytics_me_dashboard(
+                ladder="MX",
+                trend_interval=interval,
+                trend_mode="recent",
+                points=3,
+                top_n=2,
+                vs_threshold=None,
+                current=SimpleNamespace(id=UUID(focus["id"])),
+                db=db,
+            )
+            assert len(statements) == 1, statements
+
+            live = query_dashboard_series(
+                db,
+                user_id=focus["id"],
+                ladder_code="MX",
+                trend_interval=interval,
+                points=3,
+                top_n=2,
+            )
+            assert len(dash) == 1
+            for key, items in live.items():
+                assert getattr(dash[0], key) == items, key
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", _count)
+        db.close()
+
+
+def _analytics_rows(db, user_ids: list[str]) -> dict[str, list[tuple]]:
+    """Filas del read model de analitica (ladder MX) de los usuarios, sin timestamps de escritura."""
+    import sqlalchemy as sa
+
+    queries = {
+        "state": "SELECT * FROM user_analytics_state WHERE ladder_code='MX' AND user_id::text IN :ids",
+        "applied": "SELECT * FROM user_analytics_match_applied WHERE user_id::text IN :ids",
+        "partner": "SELECT * FROM user_analytics_partner_stats WHERE ladder_code='MX' AND user_id::text IN :ids",
+        "rival": "SELECT * FROM user_analytics_rival_stats WHERE ladder_code='MX' AND user_id::text IN :ids",
+    }
+    out = {}
+    for name, sql in queries.items():
+        rows = db.execute(
+            sa.text(sql).bindparams(sa.bindparam("ids", expanding=True)), {"ids": user_ids}
+        ).mappings().all()
+        out[name] = sorted(
+            tuple(sorted((k, str(v)) for k, v in r.items() if k not in ("created_at", "updated_at"))) for r in rows
+        )
+    return out
+
+
+@pytest.mark.performance
+def test_analytics_streaming_rebuild_matches_incremental(api, identity_factory):
+    if os.getenv("RUN_PERF_TESTS", "0") != "1":
+        pytest.skip("Smoke de rendimiento deshabilitado. Usa RUN_PERF_TESTS=1.")
+
+    from datetime import datetime, timedelta, timezone
+
+    from app.db.session import SessionLocal
+    from app.services.analytics import rebuild_analytics
+
+    users = [
+        create_user_with_profile(
+            api,
+            identity_factory,
+            alias_prefix=f"ana_rebuild_{i+1}",
+            gender=gender,
+            primary_category_code=cat,
+            country="CO",
+            city="Neiva",
+            is_public=True,
+        )
+        for i, (gender, cat) in enumerate([("M", "6ta"), ("M", "6ta"), ("F", "D"), ("F", "D")])
+    ]
+    now = datetime.now(timezone.utc)
+    for days_ago, score in ((95, None), (40, None), (12, {"sets": [{"t1": 6, "t2": 4}, {"t1": 3, "t2": 6}, {"t1": 7, "t2": 6}]}), (2, None)):
+        m = create_match(
+            api,
+            users[0]["token"],
+            u1=users[0],
+            u2=users[1],
+            u3=users[2],
+            u4=users[3],
+            played_at=(now - timedelta(days=days_ago)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            score_json=score,
+        )
+        confirm_match(api, users[1]["token"], m["id"])
+
+    ids = [u["id"] for u in users]
+    db = SessionLocal()
+    try:
+        incremental = _analytics_rows(db, ids)
+        assert len(incremental["applied"]) == 16
+
+        seen: list[tuple[int, int]] = []
+        stats = rebuild_analytics(db, ladder_code="MX", progress=lambda done, total: seen.append((done, total)))
+        assert seen and seen[-1] == (stats["matches"], stats["matches"])
+        assert _analytics_rows(db, ids) == incremental
+    finally:
+        # El rebuild corre en la transaccion del test; no se publica.
+        db.rollback()
+        db.close()
+
+
+@pytest.mark.performance
+def test_analytics_staging_rebuild_swap_catches_up(api, identity_factory):
+    if os.getenv("RUN_PERF_TESTS", "0") != "1":
+        pytest.skip("Smoke de rendimiento deshabilitado. Usa RUN_PERF_TESTS=1.")
+
+    from app.db.session import SessionLocal
+    from app.services.analytics import create_rebuild_staging, rebuild_analytics, swap_rebuild_staging
+
+    users = [
+        create_user_with_profile(
+            api,
+            identity_factory,
+            alias_prefix=f"ana_swap_{i+1}",
+            gender=gender,
+            primary_category_code=cat,
+            country="CO",
+            city="Neiva",
+            is_public=True,
+        )
+        for i, (gender, cat) in enumerate([("M", "6ta"), ("M", "6ta"), ("F", "D"), ("F", "D")])
+    ]
+    ids = [u["id"] for u in users]
+    for _ in range(2):
+        m = create_match(api, users[0]["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+        confirm_match(api, users[1]["token"], m["id"])
+
+    db = SessionLocal()
+    try:
+        create_rebuild_staging(db)
+        for shard in range(2):
+            rebuild_analytics(db, ladder_code="MX", shard=(shard, 2), staging=True)
+
+        # Partido verificado despues del snapshot de los workers: el swap debe recuperarlo.
+        m = create_match(api, users[0]["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+        confirm_match(api, users[1]["token"], m["id"])
+        incremental = _analytics_rows(db, ids)
+        assert len(incremental["applied"]) == 12
+
+        swapped = swap_rebuild_staging(db, ["MX"])
+        assert swapped["caught_up_matches"] >= 1
+        assert _analytics_rows(db, ids) == incremental
+    finally:
+        # Todo (DDL de staging incluido) corre en la transaccion del test; no se publica.
+        db.rollback()
+        db.close()
+
+
+@pytest.mark.performance
+def test_analytics_swap_catches_up_match_verified_between_shards(api, identity_factory):
+    if os.getenv("RUN_PERF_TESTS", "0") != "1":
+        pytest.skip("Smoke de rendimiento deshabilitado. Usa RUN_PERF_TESTS=1.")
+
+    import sqlalchemy as sa
+
+    from app.db.session import SessionLocal
+    from app.services.analytics import _user_shard, create_rebuild_staging, rebuild_analytics, swap_rebuild_staging
+
+    users = [
+        create_user_with_profile(
+            api,
+            identity_factory,
+            alias_prefix=f"ana_shard_{i+1}",
+            gender=gender,
+            primary_category_code=cat,
+            country="CO",
+            city="Neiva",
+            is_public=True,
+        )
+        for i, (gender, cat) in enumerate([("M", "6ta"), ("M", "6ta"), ("F", "D"), ("F", "D")])
+    ]
+    ids = [u["id"] for u in users]
+    m = create_match(api, users[0]["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+    confirm_match(api, users[1]["token"], m["id"])
+
+    # Menor numero de shards que reparte a los cuatro jugadores en mas de un shard.
+    shards = next(n for n in range(2, 64) if len({_user_shard(uid, n) for uid in ids}) > 1)
+    first = min(_user_shard(uid, shards) for uid in ids)
+
+    db = SessionLocal()
+    try:
+        create_rebuild_staging(db)
+        for shard in range(shards):
+            rebuild_analytics(db, ladder_code="MX", shard=(shard, shards), staging=True)
+            if shard == first:
+                # Verificado entre dos shards: los siguientes lo ven, los anteriores no.
+                late = create_match(api, users[0]["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+                confirm_match(api, users[1]["token"], late["id"])
+
+        staged = set(db.execute(sa.text("""
+            SELECT user_id::text FROM user_analytics_match_applied_rebuild WHERE match_id=:m
+        """), {"m": late["id"]}).scalars())
+        assert staged and staged != set(ids)
+
+        incremental = _analytics_rows(db, ids)
+        assert len(incremental["applied"]) == 8
+
+        swapped = swap_rebuild_staging(db, ["MX"])
+        assert swapped["caught_up_matches"] >= 1
+        assert _analytics_rows(db, ids) == incremental
+
+        # El swap borra y encola los snapshots del ladder: se reconstruyen fuera del lock.
+        assert db.execute(sa.text("""
+            SELECT count(*) FROM user_analytics_dashboard_snapshots
+            WHERE ladder_code='MX' AND user_id::text = ANY(:ids)
+        """), {"ids": ids}).scalar_one() == 0
+        assert db.execute(sa.text("""
+            SELECT count(*) FROM user_analytics_dashboard_refresh_queue
+            WHERE ladder_code='MX' AND user_id::text = ANY(:ids)
+        """), {"ids": ids}).scalar_one() == 4
+    finally:
+        # Todo (DDL de staging incluido) corre en la transaccion del test; no se publica.
+        db.rollback()
+        db.close()
+
+
+@pytest.mark.performance
+def test_analytics_rebuild_lock_rejects_concurrent_run():
+    if os.getenv("RUN_PERF_TESTS", "0") != "1":
+        pytest.skip("Smoke de rendimiento deshabilitado. Usa RUN_PERF_TESTS=1.")
+
+    from app.db.session import engine
+    from app.services.analytics import try_lock_analytics_rebuild, unlock_analytics_rebuild
+
+    with engine.connect() as first, engine.connect() as second:
+        assert try_lock_analytics_rebuild(first)
+        # El lock es de sesion: sobrevive al commit de la primera conexion.
+        first.commit()
+        assert not try_lock_analytics_rebuild(second)
+        unlock_analytics_rebuild(first)
+        assert try_lock_analytics_rebuild(second)
+        unlock_analytics_rebuild(second)
+
+
+@pytest.mark.performance
+def test_analytics_out_of_order_verification_matches_rebuild(api, identity_factory):
+    if os.getenv("RUN_PERF_TESTS", "0") != "1":
+        pytest.skip("Smoke de rendimiento deshabilitado. Usa RUN_PERF_TESTS=1.")
+
+    from datetime import datetime, timedelta, timezone
+
+    from app.db.session import SessionLocal
+    from app.services.analytics import rebuild_analytics
+
+    users = [
+        create_user_with_profile(
+            api,
+            identity_factory,
+            alias_prefix=f"ana_ooo_{i+1}",
+            gender=gender,
+            primary_category_code=cat,
+            country="CO",
+            city="Neiva",
+            is_public=True,
+        )
+        for i, (gender, cat) in enumerate([("M", "6ta"), ("M", "6ta"), ("F", "D"), ("F", "D")])
+    ]
+    now = datetime.now(timezone.utc)
+    win = {"sets": [{"t1": 6, "t2": 4}, {"t1": 6, "t2": 3}]}
+    loss = {"sets": [{"t1": 2, "t2": 6}, {"t1": 3, "t2": 6}]}
+    close = {"sets": [{"t1": 6, "t2": 4}, {"t1": 3, "t2": 6}, {"t1": 7, "t2": 6}]}
+
+    created = 0
+
+    def _create(days_ago: float, score: dict):
+        # Maximo 2 pendientes por creador: se reparte la creacion entre los cuatro.
+        nonlocal created
+        creator = users[(0, 2, 1, 3)[created % 4]]
+        created += 1
+        m = create_match(
+            api,
+            creator["token"],
+            u1=users[0],
+            u2=users[1],
+            u3=users[2],
+            u4=users[3],
+            played_at=(now - timedelta(days=days_ago)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            score_json=score,
+        )
+        confirmer = users[1] if creator in (users[0], users[2]) else users[0]
+        return m["id"], confirmer
+
+    # Creados en orden de played_at salvo el ultimo; se verifican desordenados.
+    m_old = _create(100, win)
+    m_mid = _create(20, loss)
+    m_tie_a = _create(6, close)
+    m_tie_b = _create(6, loss)
+    m_new = _create(1, win)
+    m_late = _create(50, loss)
+    for match_id, confirmer in (m_new, m_tie_b, m_mid, m_old, m_tie_a, m_late):
+        confirm_match(api, confirmer["token"], match_id)
+
+    ids = [u["id"] for u in users]
+    db = SessionLocal()
+    try:
+        incremental = _analytics_rows(db, ids)
+        assert len(incremental["applied"]) == 24
+
+        rebuild_analytics(db, ladder_code="MX")
+        assert _analytics_rows(db, ids) == incremental
+    finally:
+        db.rollback()
+        db.close()
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import csv
 from datetime import datetime, timedelta, timezone
+import io
+import json
 
 import pytest
 
-from tests.testkit import ApiError, confirm_match, create_match, create_user_with_profile
+from tests.testkit import ApiError, confirm_match, create_match, create_user_with_profile, get_ladder_state
 
 
 def _build_mx_users(api, identity_factory, prefix: str):
@@ -56,6 +59,35 @@ def test_history_me_verified_pending_filters(api, identity_factory):
     assert {r["match_id"] for r in ladder_rows} == all_ids
 
 
+def test_history_timeline_projection_follows_match_lifecycle(api, identity_factory):
+    users = _build_mx_users(api, identity_factory, "hist_fanout")
+    focus = users[0]
+    rating_before = get_ladder_state(api, focus["token"], "MX")["rating"]
+
+    match = create_match(api, focus["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+    pending = api.call("GET", "/history/me?state_scope=pending", token=focus["token"])["rows"]
+    assert [r["match_id"] for r in pending] == [match["id"]]
+    assert pending[0]["rating_delta"] is None
+    assert len(pending[0]["rival_aliases"]) == 2
+
+    confirm_match(api, users[1]["token"], match["id"])
+    rows = api.call("GET", "/history/me", token=focus["token"])["rows"]
+    row = next(r for r in rows if r["match_id"] == match["id"])
+    assert row["status"] == "verified"
+    assert row["ranking_impact"] is True
+    assert row["focus_team_no"] == 1
+    assert row["winner_team_no"] == 1
+    assert row["did_focus_user_win"] is True
+    assert row["rating_delta"] == get_ladder_state(api, focus["token"], "MX")["rating"] - rating_before
+    assert sorted(row["rival_aliases"]) == sorted([users[1]["alias"], users[3]["alias"]])
+
+    rival_rows = api.call("GET", "/history/me", token=users[1]["token"])["rows"]
+    rival_row = next(r for r in rival_rows if r["match_id"] == match["id"])
+    assert rival_row["focus_team_no"] == 2
+    assert rival_row["did_focus_user_win"] is False
+    assert rival_row["rating_delta"] < 0
+
+
 def test_history_me_cursor_pagination(api, identity_factory):
     users = _build_mx_users(api, identity_factory, "hist_cursor")
     focus = users[0]
@@ -115,6 +147,162 @@ def test_history_me_cursor_pagination(api, identity_factory):
     assert mixed_err.value.status_code == 400
 
 
+def test_history_facets_match_verified_timeline(api, identity_factory):
+    users = _build_mx_users(api, identity_factory, "hist_facets")
+    focus = users[0]
+    club = api.call("GET", "/clubs")[0]
+
+    with_club = create_match(
+        api, focus["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3], club_id=club["id"]
+    )
+    confirm_match(api, users[1]["token"], with_club["id"])
+    no_club = create_match(api, focus["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+    confirm_match(api, users[1]["token"], no_club["id"])
+    create_match(api, focus["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+
+    facets = api.call("GET", "/history/me/facets", token=focus["token"])
+    verified_rows = api.call("GET", "/history/me?state_scope=verified&limit=100", token=focus["token"])["rows"]
+    assert facets["total"] == len(verified_rows) == 2
+    assert facets["ladders"] == [{"key": "MX", "label": None, "matches": 2}]
+    assert facets["outcomes"] == [{"key": "win", "label": None, "matches": 2}]
+    assert facets["clubs"] == [{"key": club["id"], "label": club["name"], "matches": 1}]
+    assert sum(f["matches"] for f in facets["months"]) == 2
+
+    club_rows = api.call("GET", f"/history/me?club_id={club['id']}", token=focus["token"])["rows"]
+    assert len(club_rows) == facets["clubs"][0]["matches"]
+
+    public = api.call("GET", f"/history/users/{users[1]['id']}/facets", token=focus["token"])
+    assert public["outcomes"] == [{"key": "loss", "label": None, "matches": 2}]
+
+
+def test_history_changes_feed_sync_token(api, identity_factory):
+    users = _build_mx_users(api, identity_factory, "hist_sync")
+    focus = users[0]
+
+    first = create_match(api, focus["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+    second = create_match(api, focus["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+
+    full = api.call("GET", "/history/me/changes?limit=1", token=focus["token"])
+    assert [r["match_id"] for r in full["rows"]] == [first["id"]]
+    assert full["has_more"] is True
+    rest = api.call("GET", f"/history/me/changes?since={full['next_token']}", token=focus["token"])
+    assert [r["match_id"] for r in rest["rows"]] == [second["id"]]
+    assert rest["has_more"] is False
+    token = rest["next_token"]
+
+    idle = api.call("GET", f"/history/me/changes?since={token}", token=focus["token"])
+    assert idle["rows"] == [] and idle["tombstones"] == []
+    assert idle["next_token"] != ""
+
+    confirm_match(api, users[1]["token"], first["id"])
+    delta = api.call("GET", f"/history/me/changes?since={idle['next_token']}", token=focus["token"])
+    assert [r["match_id"] for r in delta["rows"]] == [first["id"]]
+    assert delta["rows"][0]["status"] == "verified"
+    assert delta["rows"][0]["rating_delta"] is not None
+
+    caught_up = api.call("GET", f"/history/me/changes?since={delta['next_token']}", token=focus["token"])
+    assert caught_up["rows"] == []
+
+    # Una transaccion mas antigua aun abierta (podria confirmar despues con filas de este
+    # usuario) retiene el watermark: lo confirmado despues no se entrega ni se salta.
+    import sqlalchemy as sa
+
+    from app.db.session import SessionLocal
+
+    older = SessionLocal()
+    try:
+        older.execute(sa.text("SELECT pg_current_xact_id()"))
+        third = create_match(api, focus["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+        held = api.call("GET", f"/history/me/changes?since={caught_up['next_token']}", token=focus["token"])
+        assert held["rows"] == []
+    finally:
+        older.rollback()
+        older.close()
+    released = api.call("GET", f"/history/me/changes?since={held['next_token']}", token=focus["token"])
+    assert [r["match_id"] for r in released["rows"]] == [third["id"]]
+
+    with pytest.raises(ApiError) as bad_token:
+        api.call("GET", "/history/me/changes?since=not-a-token", token=focus["token"])
+    assert bad_token.value.status_code == 400
+
+
+def test_history_head_to_head_record_and_pages(api, identity_factory):
+    users = _build_mx_users(api, identity_factory, "hist_h2h")
+    focus = users[0]
+
+    verified_ids: list[str] = []
+    for hours in (3, 2):
+        m = create_match(
+            api,
+            focus["token"],
+            u1=users[0],
+            u2=users[1],
+            u3=users[2],
+            u4=users[3],
+            played_at=(datetime.now(timezone.utc) - timedelta(hours=hours)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        )
+        confirm_match(api, users[1]["token"], m["id"])
+        verified_ids.append(m["id"])
+    pending = create_match(api, focus["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+
+    rival = api.call("GET", f"/history/me/head-to-head/{users[1]['id']}", token=focus["token"])
+    assert rival["other_alias"] == users[1]["alias"]
+    assert rival["as_rivals"] == {"matches": 2, "wins": 2, "losses": 0}
+    assert rival["as_partners"] == {"matches": 0, "wins": 0, "losses": 0}
+    assert [r["match_id"] for r in rival["rows"]] == list(reversed(verified_ids))
+
+    partner = api.call(
+        "GET",
+        f"/history/me/head-to-head/{users[2]['id']}?relation=partner&limit=1",
+        token=focus["token"],
+    )
+    assert partner["as_partners"] == {"matches": 2, "wins": 2, "losses": 0}
+    assert [r["match_id"] for r in partner["rows"]] == [verified_ids[1]]
+    page2 = api.call(
+        "GET",
+        f"/history/me/head-to-head/{users[2]['id']}?relation=partner&limit=1&cursor={partner['next_cursor']}",
+        token=focus["token"],
+    )
+    assert [r["match_id"] for r in page2["rows"]] == [verified_ids[0]]
+
+    mismatch = api.call(
+        "GET",
+        f"/history/me/head-to-head/{users[1]['id']}?relation=partner",
+        token=focus["token"],
+    )
+    assert mismatch["rows"] == []
+
+    loser_view = api.call("GET", f"/history/me/head-to-head/{focus['id']}?state_scope=all", token=users[3]["token"])
+    assert loser_view["as_rivals"] == {"matches": 2, "wins": 0, "losses": 2}
+    assert pending["id"] in {r["match_id"] for r in loser_view["rows"]}
+
+    with pytest.raises(ApiError) as self_err:
+        api.call("GET", f"/history/me/head-to-head/{focus['id']}", token=focus["token"])
+    assert self_err.value.status_code == 400
+
+    with pytest.raises(ApiError) as missing_err:
+        api.call("GET", "/history/me/head-to-head/00000000-0000-0000-0000-000000000000", token=focus["token"])
+    assert missing_err.value.status_code == 404
+
+    # Perfil privado con partidos compartidos: el alias sigue visible.
+    api.call("PATCH", "/me/profile", token=users[1]["token"], body={"is_public": False})
+    shared = api.call("GET", f"/history/me/head-to-head/{users[1]['id']}", token=focus["token"])
+    assert shared["other_alias"] == users[1]["alias"]
+
+    stranger = create_user_with_profile(
+        api,
+        identity_factory,
+        alias_prefix="hist_h2h_priv",
+        gender="M",
+        primary_category_code="6ta",
+        is_public=False,
+    )
+    unrelated = api.call("GET", f"/history/me/head-to-head/{stranger['id']}", token=focus["token"])
+    assert unrelated["other_alias"] == "[private]"
+    assert unrelated["as_rivals"] == {"matches": 0, "wins": 0, "losses": 0}
+    assert unrelated["rows"] == []
+
+
 def test_history_user_visibility_and_scope(api, identity_factory):
     users = _build_mx_users(api, identity_factory, "hist_pub")
     focus = users[0]
@@ -248,3 +436,101 @@ def test_history_public_masks_private_participants(api, identity_factory):
     private_part = next(p for p in detail["participants"] if p["user_id"] == private_rival["id"])
     assert private_part["alias"] == "[private]"
     assert private_part["gender"] is None
+
+
+def test_history_partner_and_rival_filters(api, identity_factory):
+    users = _build_mx_users(api, identity_factory, "hist_pairf")
+    focus = users[0]
+    other_users = _build_mx_users(api, identity_factory, "hist_pairf_other")
+    viewer = other_users[0]
+
+    shared_ids: list[str] = []
+    for hours in (3, 2):
+        m = create_match(
+            api,
+            focus["token"],
+            u1=users[0],
+            u2=users[1],
+            u3=users[2],
+            u4=users[3],
+            played_at=(datetime.now(timezone.utc) - timedelta(hours=hours)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        )
+        confirm_match(api, users[1]["token"], m["id"])
+        shared_ids.append(m["id"])
+    unrelated = create_match(
+        api, focus["token"], u1=users[0], u2=other_users[1], u3=other_users[2], u4=other_users[3]
+    )
+    confirm_match(api, other_users[1]["token"], unrelated["id"])
+
+    page1 = api.call("GET", f"/history/me?rival_id={users[1]['id']}&limit=1", token=focus["token"])
+    assert [r["match_id"] for r in page1["rows"]] == [shared_ids[1]]
+    page2 = api.call(
+        "GET",
+        f"/history/me?rival_id={users[1]['id']}&limit=1&cursor={page1['next_cursor']}",
+        token=focus["token"],
+    )
+    assert [r["match_id"] for r in page2["rows"]] == [shared_ids[0]]
+
+    partner_rows = api.call("GET", f"/history/me?partner_id={users[2]['id']}", token=focus["token"])["rows"]
+    assert {r["match_id"] for r in partner_rows} == set(shared_ids)
+    assert api.call("GET", f"/history/me?partner_id={users[1]['id']}", token=focus["token"])["rows"] == []
+
+    api.call("PATCH", "/me/profile", token=users[3]["token"], body={"is_public": False})
+    public_rows = api.call(
+        "GET", f"/history/users/{focus['id']}?rival_id={users[1]['id']}", token=viewer["token"]
+    )["rows"]
+    assert {r["match_id"] for r in public_rows} == set(shared_ids)
+    assert all("[private]" in r["rival_aliases"] for r in public_rows)
+
+    with pytest.raises(ApiError) as private_err:
+        api.call("GET", f"/history/users/{focus['id']}?rival_id={users[3]['id']}", token=viewer["token"])
+    assert private_err.value.status_code == 404
+
+    with pytest.raises(ApiError) as both_err:
+        api.call(
+            "GET",
+            f"/history/me?rival_id={users[1]['id']}&partner_id={users[2]['id']}",
+            token=focus["token"],
+        )
+    assert both_err.value.status_code == 400
+
+
+def test_history_export_streams_full_timeline_with_masking(api, identity_factory):
+    users = _build_mx_users(api, identity_factory, "hist_export")
+    focus = users[0]
+    viewer = create_user_with_profile(
+        api,
+        identity_factory,
+        alias_prefix="hist_export_viewer",
+        gender="M",
+        primary_category_code="6ta",
+        country="CO",
+        city="Neiva",
+        is_public=True,
+    )
+    match_ids = []
+    for _ in range(3):
+        m = create_match(api, focus["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+        confirm_match(api, users[1]["token"], m["id"])
+        match_ids.append(m["id"])
+    api.call("PATCH", "/me/profile", token=users[1]["token"], body={"is_public": False})
+
+    raw = api.call("GET", "/history/me/export", token=focus["token"], raw=True)
+    exported = [json.loads(line) for line in raw.splitlines() if line]
+    assert [r["match_id"] for r in exported] == [
+        r["match_id"] for r in api.call("GET", "/history/me?limit=100", token=focus["token"])["rows"]
+    ]
+    assert set(match_ids).issubset({r["match_id"] for r in exported})
+    assert all(users[1]["alias"] in r["rival_aliases"] for r in exported if r["match_id"] in match_ids)
+
+    public_csv = api.call("GET", f"/history/users/{focus['id']}/export?format=csv", token=viewer["token"], raw=True)
+    public_rows = list(csv.DictReader(io.StringIO(public_csv)))
+    assert {r["match_id"] for r in public_rows} >= set(match_ids)
+    assert all(r["visibility_reason"] == "public_verified_history" for r in public_rows)
+    masked = [r for r in public_rows if r["match_id"] in match_ids]
+    assert all("[private]" in r["rival_aliases"].split("|") for r in masked)
+    assert all(users[1]["alias"] not in r["rival_aliases"] for r in masked)
+
+    with pytest.raises(ApiError) as scope_err:
+        api.call("GET", f"/history/users/{focus['id']}/export?state_scope=all", token=viewer["token"], raw=True)
+    assert scope_err.value.status_code == 403
@@ -3,6 +3,8 @@ from __future__ import annotations
 import math
 import os
 import time
+from types import SimpleNamespace
+from uuid import UUID
 
 import pytest
 
@@ -54,3 +56,73 @@ def test_history_timeline_latency_smoke(api, identity_factory):
         f"Latencia alta en timeline history. avg_ms={avg_ms:.1f}, "
         f"p95_ms={p95_ms:.1f}, threshold_ms={p95_limit_ms:.1f}"
     )
+
+
+@pytest.mark.performance
+def test_history_match_detail_single_round_trip(api, identity_factory):
+    if os.getenv("RUN_PERF_TESTS", "0") != "1":
+        pytest.skip("Smoke de rendimiento deshabilitado. Usa RUN_PERF_TESTS=1.")
+
+    import sqlalchemy as sa
+
+    from app.db.session import SessionLocal, engine
+    from app.modules.history.api import history_match_detail
+
+    users = [
+        create_user_with_profile(
+            api,
+            identity_factory,
+            alias_prefix=f"hist_detail_perf_{i+1}",
+            gender=gender,
+            primary_category_code=cat,
+            country="CO",
+            city="Neiva",
+            is_public=(i != 1),
+        )
+        for i, (gender, cat) in enumerate([("M", "6ta"), ("M", "6ta"), ("F", "D"), ("F", "D")])
+    ]
+    focus, viewer = users[0], users[2]
+    m = create_match(api, focus["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+    confirm_match(api, users[1]["token"], m["id"])
+
+    statements: list[str] = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db = SessionLocal()
+    sa.event.listen(engine, "before_cursor_execute", _count)
+    try:
+        for current_id in (focus["id"], viewer["id"]):
+            statements.clear()
+            detail = history_match_detail(
+                focus["id"],
+                m["id"],
+                current=SimpleNamespace(id=UUID(current_id)),
+                db=db,
+            )
+            assert detail.event.match_id == m["id"]
+            assert len(detail.participants) == 4
+            assert len(statements) == 1, statements
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", _count)
+        db.close()
+
+    path = f"/history/users/{focus['id']}/matches/{m['id']}"
+    for _ in range(3):
+        api.call("GET", path, token=viewer["token"])
+
+    iterations = int(os.getenv("HISTORY_PERF_ITERATIONS", "25"))
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        api.call("GET", path, token=viewer["token"])
+        durations.append(time.perf_counter() - start)
+
+    durations.sort()
+    p95_idx = max(0, math.ceil(len(durations) * 0.95) - 1)
+    p95_ms = durations[p95_idx] * 1000.0
+    p95_limit_ms = float(os.getenv("HISTORY_DETAIL_P95_THRESHOLD_MS", "300"))
+    assert p95_ms <= p95_limit_ms, (
+        f"Latencia alta en detalle de history. p95_ms={p95_ms:.1f}, threshold_ms={p95_limit_ms:.1f}"
+    )
@@ -0,0 +1,29 @@
+from app.services.locations import city_display_name, normalize_city_key
+
+
+def test_city_key_groups_free_text_variants():
+    variants = ["Neiva", "neiva ", "Neiva-Huila", "Neiva, Huila", "NEIVA (Huila)"]
+    assert {normalize_city_key(v) for v in variants} == {"neiva"}
+
+
+def test_city_key_strips_accents_and_punctuation():
+    variants = ["Bogotá D.C.", "Bogotá, D.C.", "bogota dc ", "Bogotá (D.C.)", "Bogota"]
+    assert {normalize_city_key(v) for v in variants} == {"bogota"}
+    assert normalize_city_key("  San   Gil ") == "san gil"
+    assert normalize_city_key("   ") is None
+
+
+def test_city_key_keeps_hyphenated_city_names():
+    assert normalize_city_key("Saint-Denis") == "saint denis"
+    assert normalize_city_key("Saint-Étienne") == "saint etienne"
+    assert normalize_city_key("Saint Denis") == normalize_city_key("saint-denis")
+    assert normalize_city_key("Neiva - Huila") == normalize_city_key("Neiva-Huila") == "neiva"
+    assert normalize_city_key("Bucaramanga-Santander") == "bucaramanga"
+    assert normalize_city_key("Cali-Valle del Cauca") == "cali"
+
+
+def test_city_display_name_titles_flat_case():
+    assert city_display_name("neiva ") == "Neiva"
+    assert city_display_name("Neiva-Huila") == "Neiva"
+    assert city_display_name("Saint-Étienne") == "Saint-Étienne"
+    assert city_display_name("Bogotá D.C.") == "Bogotá"
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+
+from tests.testkit import ApiError, confirm_match, create_match, create_user_with_profile, get_ladder_state
+
+
+def test_ranking_snapshot_and_movement_contract(api, identity_factory):
+    user = create_user_with_profile(
+        api,
+        identity_factory,
+        alias_prefix="rank_snap",
+        gender="M",
+        primary_category_code="6ta",
+        country="CO",
+        city="Neiva",
+    )
+    category_id = get_ladder_state(api, user["token"], "HM")["category_id"]
+    today = datetime.now(timezone.utc).date().isoformat()
+
+    snap = api.call("GET", f"/rankings/HM/{category_id}/snapshot?as_of={today}")
+    assert snap["ladder_code"] == "HM"
+    assert snap["category_id"] == category_id
+    ranks = [r["rank"] for r in snap["rows"]]
+    assert ranks == sorted(ranks)
+
+    for days in (1, 7, 30):
+        movement = api.call("GET", f"/rankings/HM/{category_id}/movement?days={days}")
+        assert movement["days"] == days
+        for row in movement["rows"]:
+            if row["previous_rank"] is not None:
+                assert row["rank_delta"] == row["previous_rank"] - row["rank"]
+
+    with pytest.raises(ApiError) as bad_days:
+        api.call("GET", f"/rankings/HM/{category_id}/movement?days=3")
+    assert bad_days.value.status_code == 400
+
+
+def test_ranking_snapshot_capture_anchors_on_keyframe():
+    from datetime import date
+
+    import sqlalchemy as sa
+
+    from app.core.config import settings
+    from app.db.session import SessionLocal
+    from app.services.ranking_snapshots import capture_ranking_snapshots
+
+    # Fechas lejanas y rollback: no toca el historico real.
+    first = date(2100, 1, 1)
+    db = SessionLocal()
+    try:
+        full = capture_ranking_snapshots(db, first)
+        assert full["keyframe"] is True
+        assert full["changed_rows"] >= full["players"]
+
+        # Sin cambios de rating, el delta contra el keyframe queda vacio.
+        delta = capture_ranking_snapshots(db, first + timedelta(days=1))
+        assert delta == {"players": full["players"], "changed_rows": 0, "keyframe": False}
+
+        # Historial anterior al keyframe ya no se lee: un jugador rankeado solo antes del
+        # keyframe (y ausente de el) no genera tombstone.
+        db.execute(sa.text("""
+            INSERT INTO ranking_snapshots (snapshot_date, ladder_code, category_id, user_id, rank, rating)
+            SELECT :before, k.ladder_code, k.category_id, u.id, 1, 1000
+            FROM (SELECT ladder_code, category_id FROM ranking_snapshots WHERE snapshot_date=:first LIMIT 1) k
+            CROSS JOIN LATERAL (
+                SELECT u.id
+                FROM users u
+                WHERE NOT EXISTS (
+                    SELECT 1
+                    FROM ranking_snapshots r
+                    WHERE r.snapshot_date=:first
+                      AND r.ladder_code=k.ladder_code
+                      AND r.category_id=k.category_id
+                      AND r.user_id=u.id
+                )
+                LIMIT 1
+            ) u
+        """), {"before": first - timedelta(days=1), "first": first})
+        again = capture_ranking_snapshots(db, first + timedelta(days=2))
+        assert again["changed_rows"] == 0
+
+        rekey = capture_ranking_snapshots(db, first + timedelta(days=settings.RANKING_SNAPSHOT_KEYFRAME_DAYS))
+        assert rekey["keyframe"] is True
+    finally:
+        db.rollback()
+        db.close()
+
+
+def test_ranking_city_scope_uses_canonical_location(api, identity_factory):
+    # Ciudad unica por corrida: con muchos empates en 1000 la primera pagina no es estable.
+    city_name = f"Neiva{uuid4().hex[:8]}"
+    users = [
+        create_user_with_profile(
+            api,
+            identity_factory,
+            alias_prefix="rank_loc",
+            gender="F",
+            primary_category_code="D",
+            country="CO",
+            city=city,
+        )
+        for city in (city_name, f"{city_name.lower()} ", f"{city_name}-Huila")
+    ]
+    category_id = get_ladder_state(api, users[0]["token"], "WM")["category_id"]
+
+    by_name = api.call("GET", f"/rankings/WM/{category_id}?country=CO&city={city_name.upper()}")
+    ids = {r["user_id"] for r in by_name["rows"]}
+    assert {u["id"] for u in users}.issubset(ids)
+
+    cities = api.call("GET", "/cities?country=CO")
+    neiva = [c for c in cities if c["name"] == city_name]
+    assert len(neiva) == 1
+
+    by_id = api.call("GET", f"/rankings/WM/{category_id}?city_id={neiva[0]['id']}")
+    assert {r["user_id"] for r in by_id["rows"]} == ids
+
+
+def test_ranking_club_scope_uses_membership_index(api, identity_factory):
+    users = [
+        create_user_with_profile(
+            api,
+            identity_factory,
+            alias_prefix="rank_club",
+            gender="M",
+            primary_category_code="6ta",
+            country="CO",
+            city="Neiva",
+        )
+        for _ in range(4)
+    ]
+    category_id = get_ladder_state(api, users[0]["token"], "HM")["category_id"]
+    club = api.call("GET", "/clubs")[0]
+
+    for _ in range(2):
+        match = create_match(
+            api,
+            users[0]["token"],
+            u1=users[0],
+            u2=users[1],
+            u3=users[2],
+            u4=users[3],
+            club_id=club["id"],
+        )
+        confirm_match(api, users[1]["token"], match["id"])
+
+    ids = {u["id"] for u in users}
+    members = api.call("GET", f"/rankings/HM/{category_id}?club_id={club['id']}&min_matches=2")
+    assert ids.issubset({r["user_id"] for r in members["rows"]})
+    ratings = [r["rating"] for r in members["rows"]]
+    assert ratings == sorted(ratings, reverse=True)
+
+    strict = api.call("GET", f"/rankings/HM/{category_id}?club_id={club['id']}&min_matches=1000")
+    assert not ids.intersection({r["user_id"] for r in strict["rows"]})
+
+    # Un dia que salio de la ventana deja de contar aunque el refresh diario no haya corrido.
+    import sqlalchemy as sa
+
+    from app.core.security import now_utc
+    from app.db.session import SessionLocal
+    from app.services.club_memberships import club_window_start
+
+    db = SessionLocal()
+    try:
+        db.execute(sa.text("""
+            UPDATE club_player_activity
+            SET activity_date = :expired
+            WHERE club_id=:club AND ladder_code='HM' AND user_id=:u
+        """), {"expired": club_window_start(now_utc().date()) - timedelta(days=1), "club": club["id"], "u": users[0]["id"]})
+        db.commit()
+    finally:
+        db.close()
+    window = api.call("GET", f"/rankings/HM/{category_id}?club_id={club['id']}&min_matches=1")
+    window_ids = {r["user_id"] for r in window["rows"]}
+    assert users[0]["id"] not in window_ids
+    assert {u["id"] for u in users[1:]}.issubset(window_ids)
+
+    with pytest.raises(ApiError) as bad_min:
+        api.call("GET", f"/rankings/HM/{category_id}?min_matches=2")
+    assert bad_min.value.status_code == 400
+
+
+def test_rating_distribution_tracks_rating_changes(api, identity_factory):
+    users = [
+        create_user_with_profile(
+            api,
+            identity_factory,
+            alias_prefix="rank_dist",
+            gender="M",
+            primary_category_code="6ta",
+            country="CO",
+        )
+        for _ in range(4)
+    ]
+    category_id = get_ladder_state(api, users[0]["token"], "HM")["category_id"]
+    before = api.call("GET", f"/rankings/HM/{category_id}/distribution")
+
+    match = create_match(api, users[0]["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+    confirm_match(api, users[1]["token"], match["id"])
+
+    after = api.call("GET", f"/rankings/HM/{category_id}/distribution?q=0.5&q=0.99&rating=1000")
+    assert after["players"] == before["players"]
+    assert sum(b["players"] for b in after["buckets"]) == after["players"]
+    assert [x["q"] for x in after["quantiles"]] == [0.5, 0.99]
+    assert after["quantiles"][0]["rating"] <= after["quantiles"][1]["rating"]
+    assert 0 <= after["top_percent"] <= 100
+
+    winner_rating = get_ladder_state(api, users[0]["token"], "HM")["rating"]
+    floor = winner_rating - winner_rating % after["bucket_width"]
+    assert any(b["floor"] == floor and b["players"] >= 1 for b in after["buckets"])
+
+    with pytest.raises(ApiError) as bad_q:
+        api.call("GET", f"/rankings/HM/{category_id}/distribution?q=1.5")
+    assert bad_q.value.status_code == 400
+
+
+def test_ranking_movers_reads_daily_rollups(api, identity_factory):
+    users = [
+        create_user_with_profile(
+            api,
+            identity_factory,
+            alias_prefix="rank_movers",
+            gender="M",
+            primary_category_code="6ta",
+            country="CO",
+            city="Pitalito",
+        )
+        for _ in range(4)
+    ]
+    match = create_match(api, users[0]["token"], u1=users[0], u2=users[1], u3=users[2], u4=users[3])
+    confirm_match(api, users[1]["token"], match["id"])
+
+    movers = api.call("GET", "/rankings/HM/movers?days=7&country=CO&city=Pitalito&limit=200")
+    assert movers["days"] == 7
+    by_user = {r["user_id"]: r for r in movers["rows"]}
+    assert {u["id"] for u in users}.issubset(by_user)
+    deltas = [r["rating_delta"] for r in movers["rows"]]
+    assert deltas == sorted(deltas, reverse=True)
+
+    winner = by_user[users[0]["id"]]
+    assert winner["rating_delta"] > 0
+    assert winner["matches"] >= 1
+    assert winner["rating"] == get_ladder_state(api, users[0]["token"], "HM")["rating"]
+
+    with pytest.raises(ApiError) as bad_days:
+        api.call("GET", "/rankings/HM/movers?days=14")
+    assert bad_days.value.status_code == 400
@@ -0,0 +1,40 @@
+from app.services.analytics import (
+    RATING_DIFF_BUCKET_WIDTH,
+    RATING_DIFF_MAX,
+    RIVAL_BUCKET_DELTA,
+    _quality_bucket,
+    rating_diff_bucket,
+)
+
+
+def _split(diff_bucket: int, threshold: int) -> str:
+    if diff_bucket >= threshold:
+        return "stronger"
+    if diff_bucket <= -threshold:
+        return "weaker"
+    return "similar"
+
+
+def test_buckets_truncate_toward_zero_and_clamp():
+    w = RATING_DIFF_BUCKET_WIDTH
+    assert rating_diff_bucket(1000, 1000 + w - 1) == 0
+    assert rating_diff_bucket(1000, 1000 - w + 1) == 0
+    assert rating_diff_bucket(1000, 1000 + w) == w
+    assert rating_diff_bucket(1000, 1000 - w - 1) == -w
+    assert rating_diff_bucket(1000, 1000 + 10 * RATING_DIFF_MAX) == RATING_DIFF_MAX
+    assert rating_diff_bucket(1000, 1000 - 10 * RATING_DIFF_MAX) == -RATING_DIFF_MAX
+    assert rating_diff_bucket(None, 1000) == 0
+    assert rating_diff_bucket(1000, None) == 0
+
+
+def test_any_threshold_multiple_of_width_is_exact():
+    for threshold in range(RATING_DIFF_BUCKET_WIDTH, RATING_DIFF_MAX + 1, RATING_DIFF_BUCKET_WIDTH):
+        for diff in range(-RATING_DIFF_MAX - 50, RATING_DIFF_MAX + 51):
+            expected = "stronger" if diff >= threshold else "weaker" if diff <= -threshold else "similar"
+            assert _split(rating_diff_bucket(1500, 1500 + diff), threshold) == expected
+
+
+def test_default_threshold_matches_materialized_quality_bucket():
+    for diff in range(-300, 301):
+        assert _split(rating_diff_bucket(1200, 1200 + diff), RIVAL_BUCKET_DELTA) == _quality_bucket(1200, 1200 + diff)
+    assert _split(rating_diff_bucket(None, None), RIVAL_BUCKET_DELTA) == _quality_bucket(None, None)
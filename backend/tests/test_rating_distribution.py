@@ -0,0 +1,30 @@
+from app.services.rating_distribution import (
+    RATING_BUCKET_WIDTH,
+    histogram_quantile,
+    histogram_share_below,
+    rating_bucket_floor,
+)
+
+
+def test_bucket_floor_is_fixed_width():
+    assert rating_bucket_floor(1000) == 1000
+    assert rating_bucket_floor(1000 + RATING_BUCKET_WIDTH - 1) == 1000
+    assert rating_bucket_floor(999) == 1000 - RATING_BUCKET_WIDTH
+
+
+def test_quantiles_interpolate_inside_buckets():
+    w = RATING_BUCKET_WIDTH
+    buckets = [(1000, 50), (1000 + w, 50)]
+    assert histogram_quantile(buckets, 0.0) == 1000
+    assert histogram_quantile(buckets, 0.5) == 1000 + w
+    assert histogram_quantile(buckets, 0.25) == 1000 + w / 2
+    assert histogram_quantile(buckets, 1.0) == 1000 + 2 * w
+    assert histogram_quantile([], 0.5) is None
+
+
+def test_share_below_supports_top_percent():
+    w = RATING_BUCKET_WIDTH
+    buckets = [(1000, 50), (1000 + w, 50)]
+    assert histogram_share_below(buckets, 900) == 0.0
+    assert histogram_share_below(buckets, 1000 + w) == 0.5
+    assert histogram_share_below(buckets, 2000) == 1.0
@@ -0,0 +1,69 @@
+import random
+
+from app.services.trend_downsampling import LttbStream
+
+
+def _lttb_reference(points: list[tuple[float, float]], threshold: int) -> list[int]:
+    # Implementacion clasica (con toda la serie en memoria) para contrastar la de una pasada.
+    n = len(points)
+    if threshold < 3 or n <= threshold:
+        return list(range(n))
+    every = (n - 2) / (threshold - 2)
+    out = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        avg_start = end
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_x = sum(p[0] for p in points[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(p[1] for p in points[avg_start:avg_end]) / (avg_end - avg_start)
+        ax, ay = points[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (points[j][1] - ay) - (ax - points[j][0]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(best)
+        a = best
+    out.append(n - 1)
+    return out
+
+
+def _stream(points: list[tuple[float, float]], threshold: int, total: int | None = None) -> list[int]:
+    lttb: LttbStream[int] = LttbStream(len(points) if total is None else total, threshold)
+    for i, (x, y) in enumerate(points):
+        lttb.push(x, y, i)
+    return lttb.finish()
+
+
+def test_lttb_stream_matches_reference():
+    rng = random.Random(7)
+    for n, threshold in ((10, 5), (100, 20), (1000, 37), (503, 200), (7, 3)):
+        y = 1000.0
+        points = []
+        for i in range(n):
+            y += rng.uniform(-25, 25)
+            points.append((float(i * 3600 + rng.randint(0, 1800)), y))
+        assert _stream(points, threshold) == _lttb_reference(points, threshold)
+
+
+def test_lttb_stream_keeps_short_series_and_endpoints():
+    points = [(float(i), float(i % 3)) for i in range(6)]
+    assert _stream(points, 10) == list(range(6))
+    assert _stream([], 10) == []
+
+    picked = _stream([(float(i), float((i * 7) % 11)) for i in range(50)], 8)
+    assert len(picked) == 8
+    assert picked[0] == 0 and picked[-1] == 49
+    assert picked == sorted(set(picked))
+
+
+def test_lttb_stream_tolerates_total_drift():
+    points = [(float(i), float(i % 5)) for i in range(40)]
+    short = _stream(points[:35], 8, total=40)
+    assert short[0] == 0 and short[-1] == 34
+    assert short == sorted(set(short))
+    longer = _stream(points, 8, total=35)
+    assert longer[0] == 0 and longer[-1] == 39
+    assert longer == sorted(set(longer))
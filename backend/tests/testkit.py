@@ -17,9 +17,19 @@ class ApiClient:
     def __init__(self, base_url: str):
         self.base_url = base_url.rstrip("/")
 
-    def call(self, method: str, path: str, *, token: str | None = None, body=None, timeout: int = 20):
+    def call(
+        self,
+        method: str,
+        path: str,
+        *,
+        token: str | None = None,
+        body=None,
+        timeout: int = 20,
+        raw: bool = False,
+        headers: dict[str, str] | None = None,
+    ):
         url = f"{self.base_url}{path}"
-        headers = {"Accept": "application/json"}
+        headers = {"Accept": "application/json", **(headers or {})}
         payload = None
         if token:
             headers["Authorization"] = f"Bearer {token}"
@@ -30,11 +40,31 @@ class ApiClient:
         req = request.Request(url=url, data=payload, headers=headers, method=method.upper())
         try:
             with request.urlopen(req, timeout=timeout) as resp:
-                raw = resp.read().decode("utf-8")
-                return _parse_payload(raw)
+                text = resp.read().decode("utf-8")
+                return text if raw else _parse_payload(text)
         except error.HTTPError as exc:
-            raw = exc.read().decode("utf-8")
-            raise ApiError(exc.code, _parse_payload(raw)) from exc
+            text = exc.read().decode("utf-8")
+            raise ApiError(exc.code, _parse_payload(text)) from exc
+
+    def fetch(
+        self,
+        path: str,
+        *,
+        token: str | None = None,
+        headers: dict[str, str] | None = None,
+        timeout: int = 20,
+    ) -> tuple[int, dict[str, str], bytes]:
+        """GET binario (descargas): devuelve status, cabeceras y cuerpo sin decodificar."""
+        headers = dict(headers or {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        req = request.Request(url=f"{self.base_url}{path}", headers=headers, method="GET")
+        try:
+            with request.urlopen(req, timeout=timeout) as resp:
+                return resp.status, dict(resp.headers.items()), resp.read()
+        except error.HTTPError as exc:
+            text = exc.read().decode("utf-8")
+            raise ApiError(exc.code, _parse_payload(text)) from exc
 
 
 @dataclass